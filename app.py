@@ -6,6 +6,7 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
+from utils import fast_json
 
 load_dotenv()
 
@@ -50,6 +51,9 @@ def seed_database():
 
 def create_app():
     app = Flask(__name__)
+    if fast_json.ORJSON_AVAILABLE:
+        # jsonify, request.get_json and |tojson on orjson
+        app.json = fast_json.FastJSONProvider(app)
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SESSION_SECRET', 'dev-secret-key-change-in-production')
@@ -95,7 +99,10 @@ def create_app():
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'pool_size': 10,
-        'max_overflow': 20
+        'max_overflow': 20,
+        # jsonb columns (utils/db_types.JSONType) are encoded and parsed by the driver
+        'json_serializer': fast_json.dumps,
+        'json_deserializer': fast_json.loads
     }
     app.config['JWT_SECRET_KEY'] = os.getenv('SESSION_SECRET', 'jwt-secret-key')
     app.config['JWT_TOKEN_LOCATION'] = ['cookies', 'headers']
@@ -113,17 +120,20 @@ def create_app():
     csrf.init_app(app)
     CORS(app)
     
+    # Count SQL statements per request (@query_budget on list views)
+    from utils.query_budget import init_query_budget
+    init_query_budget(app)
+    
     # Add Jinja filters
-    import json
-    import markdown
+    from utils.markdown_formatter import markdown_to_html
     
     @app.template_filter('from_json')
     def from_json_filter(value):
-        """Convert JSON string to Python object"""
+        """Convert JSON string to Python object (JSONType columns are already parsed)"""
         if not value:
             return []
         try:
-            return json.loads(value) if isinstance(value, str) else value
+            return fast_json.loads(value) if isinstance(value, str) else value
         except:
             return []
     
@@ -133,8 +143,8 @@ def create_app():
         if not value:
             return ""
         try:
-            html = markdown.markdown(value, extensions=['tables', 'fenced_code', 'codehilite', 'nl2br'])
-            return html
+            # Per-thread converter, cached by content: stored AI outputs are converted once
+            return markdown_to_html(value)
         except:
             return value
     
@@ -166,7 +176,7 @@ def create_app():
     def inject_context():
         from flask_wtf.csrf import generate_csrf
         from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-        from models import User
+        from utils.decorators import load_user
         from flask import current_app as app_instance
         
         # Try to get current user if logged in
@@ -176,7 +186,7 @@ def create_app():
             user_id = get_jwt_identity()
             if user_id:
                 db_instance = app_instance.extensions['sqlalchemy']
-                current_user = db_instance.session.get(User, int(user_id))
+                current_user = load_user(db_instance.session, user_id)
         except:
             pass
         
@@ -209,6 +219,7 @@ def create_app():
     from blueprints.admin.notifications_admin import notifications_admin_bp
     from blueprints.knowledge_rag import knowledge_rag_bp
     from blueprints.user_notifications import user_notifications_bp
+    from blueprints.pdf_jobs import pdf_jobs_bp
     
     # Try to load dashboard blueprint with WeasyPrint safely
     try:
@@ -262,6 +273,7 @@ def create_app():
     app.register_blueprint(settings_bp, url_prefix='/admin/settings')
     app.register_blueprint(notifications_admin_bp, url_prefix='/admin')
     app.register_blueprint(user_notifications_bp)
+    app.register_blueprint(pdf_jobs_bp)
     
     # Create tables and seed default data
     with app.app_context():
@@ -274,7 +286,67 @@ def create_app():
         print("\n📋 Seeding roles and subscription plans...")
         seed_database()
         print("✅ Basic data seeded")
-        
+
+        # Step 2b: Backfill AI usage rollups for databases that predate them
+        try:
+            from utils.ai_usage import ensure_ai_usage_key_index, ensure_ai_usage_backfilled
+            merged = ensure_ai_usage_key_index(db.engine)
+            if merged is not None:
+                print(f"✅ AI usage rollup key made unique ({merged} duplicate row(s) merged)")
+            if ensure_ai_usage_backfilled(db.session):
+                print("✅ AI usage rollups backfilled from ai_logs")
+        except Exception as e:
+            print(f"⚠️ Error backfilling AI usage rollups: {e}")
+
+        # Step 2c: Resume HR imports interrupted by a restart
+        try:
+            from utils.hr_import_jobs import requeue_stale_imports
+            resumed = requeue_stale_imports(db.session, include_queued=True)
+            if resumed:
+                print(f"✅ Resumed {len(resumed)} interrupted HR import(s)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Error resuming HR imports: {e}")
+
+        # Step 2d: Backfill HR monthly summaries for databases that predate them
+        try:
+            from utils.hr_summaries import ensure_monthly_summaries_backfilled
+            if ensure_monthly_summaries_backfilled(db.session):
+                print("✅ HR monthly summaries backfilled from attendance / payroll")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Error backfilling HR monthly summaries: {e}")
+
+        # Step 2e: Resume tenant data purges interrupted by a restart
+        try:
+            from utils.tenant_purge import requeue_stale_purges
+            resumed = requeue_stale_purges(db.session, include_queued=True)
+            if resumed:
+                print(f"✅ Resumed {len(resumed)} interrupted data purge(s)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Error resuming data purges: {e}")
+
+        # Step 2f: Resume ERP syncs interrupted by a restart
+        try:
+            from utils.erp_sync import requeue_stale_syncs
+            resumed = requeue_stale_syncs(db.session)
+            if resumed:
+                print(f"✅ Resumed {len(resumed)} interrupted ERP sync(s)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Error resuming ERP syncs: {e}")
+
+        # Step 2g: Resume admin exports interrupted by a restart
+        try:
+            from utils.exports import requeue_stale_exports
+            resumed = requeue_stale_exports(db.session, include_pending=True)
+            if resumed:
+                print(f"✅ Resumed {len(resumed)} interrupted export(s)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Error resuming exports: {e}")
+
         # Step 3: Auto-initialize production database if empty
         from models import User, Service
         try:
@@ -25,6 +25,7 @@ from .projects import projects_bp
 from .consultations_admin import consultations_bp
 from .email_admin import email_admin_bp
 from .erp_admin import erp_admin_bp
+from .exports import exports_bp
 
 # Register sub-blueprints
 admin_bp.register_blueprint(dashboard_bp)
@@ -43,5 +44,6 @@ admin_bp.register_blueprint(projects_bp)
 admin_bp.register_blueprint(consultations_bp)
 admin_bp.register_blueprint(email_admin_bp)
 admin_bp.register_blueprint(erp_admin_bp)
+admin_bp.register_blueprint(exports_bp)
 
 # Note: settings_bp is registered separately in app.py with url_prefix='/admin/settings'
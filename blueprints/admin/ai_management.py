@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, session, request, jsonify, redirect, url_for, flash
 from utils.decorators import login_required, role_required
-from models import AILog, User, Organization
+from models import AILog, AIUsageDaily, User, Organization
+from utils import ai_usage
+from utils.pagination import get_page_args, keyset_paginate
 from flask import current_app
 from sqlalchemy import func, and_, or_
 from datetime import datetime, timedelta
@@ -30,8 +32,6 @@ def index():
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     search = request.args.get('search', '')
-    page = request.args.get('page', 1, type=int)
-    per_page = 50
     
     # Build query
     query = db.session.query(AILog)
@@ -67,38 +67,36 @@ def index():
             pass
     
     if search:
-        search = f"%{search}%"
+        pattern = f"%{search}%"
         query = query.filter(
             or_(
-                AILog.prompt.ilike(search),
-                AILog.response.ilike(search),
-                AILog.error_message.ilike(search)
+                AILog.prompt.ilike(pattern),
+                AILog.response.ilike(pattern),
+                AILog.error_message.ilike(pattern)
             )
         )
     
-    # Get total count for pagination
-    total_count = query.count()
+    # Keyset pagination (newest first) with an estimated total
+    cursor, direction, per_page = get_page_args()
+    page = keyset_paginate(query, AILog.id, cursor=cursor, direction=direction, per_page=per_page)
+    logs = page.items
+    total_count = page.total
     
-    # Order by most recent and paginate
-    logs = query.order_by(AILog.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
-    
-    # Calculate statistics
-    total_requests = db.session.query(func.count(AILog.id)).scalar() or 0
-    total_tokens = db.session.query(func.sum(AILog.tokens_used)).filter(AILog.tokens_used > 0).scalar() or 0
-    total_cost = db.session.query(func.sum(AILog.estimated_cost)).filter(AILog.estimated_cost > 0).scalar() or 0
-    success_count = db.session.query(func.count(AILog.id)).filter(AILog.status == 'success').scalar() or 0
-    failed_count = db.session.query(func.count(AILog.id)).filter(AILog.status == 'failed').scalar() or 0
+    # Calculate statistics from the daily rollups
+    totals = ai_usage.usage_totals(db.session)
+    total_requests = totals['total_requests']
+    total_tokens = totals['total_tokens']
+    total_cost = totals['total_cost']
+    success_count = totals['success_count']
+    failed_count = totals['failed_count']
     
     # Get unique service types and providers for filters
-    service_types = db.session.query(func.distinct(AILog.service_type)).filter(AILog.service_type != None).all()
-    providers = db.session.query(func.distinct(AILog.provider_type)).filter(AILog.provider_type != None).all()
-    
-    # Get users and organizations for dropdowns
-    users = db.session.query(User).all()
-    organizations = db.session.query(Organization).all()
+    service_types = db.session.query(func.distinct(AIUsageDaily.service_type)).filter(AIUsageDaily.service_type != None).all()
+    providers = db.session.query(func.distinct(AIUsageDaily.provider_type)).filter(AIUsageDaily.provider_type != None).all()
     
-    # Calculate pagination info
-    total_pages = (total_count + per_page - 1) // per_page
+    # Only the selected user/organization are loaded; the rest come from typeahead endpoints
+    selected_user = db.session.query(User.id, User.username).filter(User.id == user_id).first() if user_id else None
+    selected_org = db.session.query(Organization.id, Organization.name).filter(Organization.id == org_id).first() if org_id else None
     
     return render_template('admin/ai/index.html',
                          logs=logs,
@@ -109,10 +107,9 @@ def index():
                          failed_count=failed_count,
                          service_types=service_types,
                          providers=providers,
-                         users=users,
-                         organizations=organizations,
-                         current_page=page,
-                         total_pages=total_pages,
+                         selected_user=selected_user,
+                         selected_org=selected_org,
+                         page=page,
                          total_count=total_count,
                          per_page=per_page,
                          filters={
@@ -174,31 +171,22 @@ def api_stats():
     """Get AI statistics API"""
     db = get_db()
     
-    # Last 30 days stats
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    # Daily stats
-    daily_stats = db.session.query(
-        func.date(AILog.created_at).label('date'),
-        func.count(AILog.id).label('count'),
-        func.sum(AILog.estimated_cost).label('cost')
-    ).filter(AILog.created_at >= thirty_days_ago).group_by(
-        func.date(AILog.created_at)
-    ).order_by(func.date(AILog.created_at)).all()
+    # Daily stats (last 30 days)
+    daily_stats = [(r.day, r.requests, r.cost) for r in ai_usage.daily_usage(db.session, days=30)]
     
     # Provider breakdown
-    provider_breakdown = db.session.query(
-        AILog.provider_type,
-        func.count(AILog.id).label('count'),
-        func.sum(AILog.estimated_cost).label('cost')
-    ).group_by(AILog.provider_type).all()
+    provider_breakdown = [
+        (provider, count, cost)
+        for provider, count, tokens, cost in ai_usage.usage_breakdown(db.session, 'provider_type')
+    ]
     
     # Service type breakdown
-    service_breakdown = db.session.query(
-        AILog.service_type,
-        func.count(AILog.id).label('count'),
-        func.sum(AILog.estimated_cost).label('cost')
-    ).group_by(AILog.service_type).all()
+    service_breakdown = [
+        (service, count, cost)
+        for service, count, tokens, cost in ai_usage.usage_breakdown(db.session, 'service_type')
+    ]
+    
+    totals = ai_usage.usage_totals(db.session, days=30)
     
     return jsonify({
         'daily_stats': [
@@ -221,5 +209,9 @@ def api_stats():
                 'count': stat[1],
                 'cost': float(stat[2] or 0)
             } for stat in service_breakdown
-        ]
+        ],
+        'latency': {
+            'p50_ms': totals['latency_p50_ms'],
+            'p95_ms': totals['latency_p95_ms']
+        }
     })
@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, request, session, current_app
 from utils.decorators import login_required, role_required
-from models import Transaction, User
+from models import Transaction, User, SubscriptionPlan
+from sqlalchemy import func, case
+from utils.pagination import get_page_args, keyset_paginate
 from utils.payment_notifications import create_payment_success_notification
+from utils.query_budget import query_budget
 
 billing_bp = Blueprint('billing', __name__, url_prefix='/billing')
 
@@ -14,6 +17,7 @@ def get_lang():
 @billing_bp.route('/')
 @login_required
 @role_required('system_admin')
+@query_budget(4)
 def index():
     """List all transactions"""
     db = get_db()
@@ -31,8 +35,6 @@ def index():
     if type_filter:
         query = query.filter(Transaction.transaction_type == type_filter)
     
-    transactions = query.order_by(Transaction.created_at.desc()).all()
-    
     # Build plan name mapping
     plan_names = {
         'free': {'ar': 'مجاني', 'en': 'Free'},
@@ -41,17 +43,35 @@ def index():
         'pay_per_use': {'ar': 'حسب الاستخدام', 'en': 'Pay Per Use'}
     }
     
-    # Calculate stats
-    total_transactions = len(transactions)
-    successful_count = len([t for t in transactions if t.status == 'succeeded'])
-    total_amount = sum([t.amount for t in transactions])
-    unique_users = len(set([t.user_id for t in transactions]))
+    # Calculate stats in the database over the whole filtered set
+    stats = query.with_entities(
+        func.count(Transaction.id),
+        func.coalesce(func.sum(case((Transaction.status == 'succeeded', 1), else_=0)), 0),
+        func.coalesce(func.sum(Transaction.amount), 0),
+        func.count(func.distinct(Transaction.user_id))
+    ).order_by(None).one()
+    total_transactions, successful_count, total_amount, unique_users = stats
+    
+    # Collect payment methods
+    payment_methods = {}
+    for method, count in query.with_entities(
+        Transaction.payment_method, func.count(Transaction.id)
+    ).group_by(Transaction.payment_method).order_by(None).all():
+        method = method or 'Unknown'
+        payment_methods[method] = payment_methods.get(method, 0) + count
+    
+    # Current page only, with user and plan joined in (no per-row lookups)
+    cursor, direction, per_page = get_page_args()
+    page_query = query.outerjoin(User, Transaction.user_id == User.id).outerjoin(
+        SubscriptionPlan, User.subscription_plan_id == SubscriptionPlan.id
+    ).with_entities(Transaction, User, SubscriptionPlan.name)
+    page = keyset_paginate(page_query, Transaction.id, cursor=cursor, direction=direction,
+                           per_page=per_page, with_total=False)
     
     # Build enriched transactions list with user and plan data
     enriched_transactions = []
-    for trans in transactions:
-        user = db.session.query(User).get(trans.user_id)
-        plan_name = user.plan_ref.name if user and user.plan_ref else 'unknown'
+    for trans, user, plan_name in page.items:
+        plan_name = plan_name or 'unknown'
         plan_display_name = plan_names.get(plan_name, {}).get('ar' if lang == 'ar' else 'en', plan_name)
         
         enriched_transactions.append({
@@ -74,11 +94,7 @@ def index():
             'subscription_renewal_date': trans.subscription_renewal_date
         })
     
-    # Collect payment methods
-    payment_methods = {}
-    for item in enriched_transactions:
-        method = item.get('payment_method') or 'Unknown'
-        payment_methods[method] = payment_methods.get(method, 0) + 1
+    page.total = total_transactions
     
     return render_template('admin/billing/index.html', 
                          enriched_transactions=enriched_transactions,
@@ -87,6 +103,8 @@ def index():
                          total_amount=total_amount,
                          unique_users=unique_users,
                          payment_methods=payment_methods,
+                         page=page,
+                         filters={'status': status_filter, 'type': type_filter},
                          lang=lang)
 
 
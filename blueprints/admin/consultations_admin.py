@@ -1,17 +1,11 @@
-from flask import Blueprint, render_template, session, jsonify, request, current_app, send_file
+from flask import Blueprint, render_template, session, jsonify, request, current_app
 from flask_jwt_extended import get_jwt_identity
 from utils.decorators import login_required, role_required
 from models import User, ChatSession, AILog
 from sqlalchemy import func
 from datetime import datetime
-import json
-from io import BytesIO
-try:
-    from weasyprint import HTML, CSS
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    HTML, CSS = None, None
+from utils.pdf_jobs import pdf_response
+from utils.report_renderer import render_report
 
 consultations_bp = Blueprint('consultations_admin', __name__, url_prefix='/consultations')
 
@@ -175,224 +169,26 @@ def export_session_pdf(session_id):
     total_consultations = db.session.query(ChatSession).filter_by(user_id=session_obj.user_id).count()
     session_cost = (user_consultation_cost / total_consultations) if total_consultations > 0 else 0
     
-    # Parse messages
-    messages = json.loads(session_obj.messages) if session_obj.messages else []
-    message_count = len(messages)
-    
-    # Build HTML content
-    direction = 'rtl' if lang == 'ar' else 'ltr'
-    text_align = 'right' if lang == 'ar' else 'left'
-    border_side = 'right' if lang == 'ar' else 'left'
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html dir="{direction}" lang="{lang}">
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            * {{
-                font-family: Arial, sans-serif;
-            }}
-            body {{
-                direction: {direction};
-                text-align: {text_align};
-                margin: 0;
-                padding: 20px;
-                background: #fff;
-                line-height: 1.6;
-            }}
-            .header {{
-                background: linear-gradient(135deg, #0d6efd 0%, #0a58ca 100%);
-                color: white;
-                padding: 20px;
-                border-radius: 8px;
-                margin-bottom: 30px;
-                text-align: center;
-            }}
-            .header h1 {{
-                margin: 0;
-                font-size: 24px;
-                font-weight: 700;
-            }}
-            .section {{
-                margin-bottom: 25px;
-            }}
-            .section-title {{
-                font-size: 16px;
-                font-weight: 700;
-                color: #28a745;
-                margin-bottom: 15px;
-                padding-bottom: 10px;
-                border-bottom: 2px solid #28a745;
-            }}
-            .info-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-bottom: 15px;
-            }}
-            .info-table tr {{
-                border-bottom: 1px solid #e0e0e0;
-            }}
-            .info-table td {{
-                padding: 12px;
-                text-align: {text_align};
-            }}
-            .info-table td:first-child {{
-                background: #f5f5f5;
-                font-weight: 600;
-                width: 25%;
-            }}
-            .stats-table {{
-                width: 100%;
-                background: #e7f3ff;
-                border-collapse: collapse;
-                margin-bottom: 15px;
-            }}
-            .stats-table tr {{
-                border-bottom: 1px solid #b0d4ff;
-            }}
-            .stats-table td {{
-                padding: 12px;
-                text-align: {text_align};
-            }}
-            .stats-table td:first-child {{
-                background: #cce5ff;
-                font-weight: 600;
-                width: 25%;
-            }}
-            .message {{
-                margin-bottom: 15px;
-                padding: 12px;
-                border-radius: 8px;
-                border-{border_side}: 4px solid;
-            }}
-            .message-user {{
-                background: #f9f9f9;
-                border-color: #0d6efd;
-            }}
-            .message-assistant {{
-                background: #e7f3ff;
-                border-color: #28a745;
-            }}
-            .message-header {{
-                font-weight: 600;
-                margin-bottom: 8px;
-                font-size: 12px;
-            }}
-            .message-user .message-header {{
-                color: #0d6efd;
-            }}
-            .message-assistant .message-header {{
-                color: #28a745;
-            }}
-            .message-content {{
-                color: #333;
-                word-wrap: break-word;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 30px;
-                padding-top: 15px;
-                border-top: 1px solid #e0e0e0;
-                color: #999;
-                font-size: 12px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>📋 {'تقرير تفاصيل جلسة الاستشارة' if lang == 'ar' else 'Consultation Session Report'}</h1>
-        </div>
-        
-        <div class="section">
-            <h2 class="section-title">📋 {'معلومات الجلسة' if lang == 'ar' else 'Session Information'}</h2>
-            <table class="info-table">
-                <tr>
-                    <td>{'معرّف الجلسة:' if lang == 'ar' else 'Session ID:'}</td>
-                    <td>{session_obj.id}</td>
-                </tr>
-                <tr>
-                    <td>{'المستخدم:' if lang == 'ar' else 'User:'}</td>
-                    <td>{user.username}</td>
-                </tr>
-                <tr>
-                    <td>{'البريد الإلكتروني:' if lang == 'ar' else 'Email:'}</td>
-                    <td>{user.email}</td>
-                </tr>
-                <tr>
-                    <td>{'المجال:' if lang == 'ar' else 'Domain:'}</td>
-                    <td>{session_obj.domain or 'General'}</td>
-                </tr>
-                <tr>
-                    <td>{'التاريخ:' if lang == 'ar' else 'Date:'}</td>
-                    <td>{session_obj.created_at.strftime('%d/%m/%Y %H:%M:%S') if session_obj.created_at else '-'}</td>
-                </tr>
-            </table>
-        </div>
-        
-        <div class="section">
-            <h2 class="section-title">📊 {'الإحصائيات' if lang == 'ar' else 'Statistics'}</h2>
-            <table class="stats-table">
-                <tr>
-                    <td>{'التكلفة المقدرة:' if lang == 'ar' else 'Estimated Cost:'}</td>
-                    <td>${session_cost:.4f}</td>
-                </tr>
-                <tr>
-                    <td>{'عدد الرسائل:' if lang == 'ar' else 'Message Count:'}</td>
-                    <td>{message_count}</td>
-                </tr>
-            </table>
-        </div>
-        
-        {'<div class="section"><h2 class="section-title">💬 ' + ('محادثة الجلسة' if lang == 'ar' else 'Session Conversation') + '</h2>' if messages else ''}
-    """
-    
-    # Add messages
-    for msg in messages:
-        role = msg.get('role', 'user') if isinstance(msg, dict) else 'user'
-        content = msg.get('content', msg) if isinstance(msg, dict) else msg
-        timestamp = msg.get('timestamp', '') if isinstance(msg, dict) else ''
-        
-        # Escape HTML in content
-        content = str(content).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br>')
-        
-        sender = ('المستخدم' if lang == 'ar' else 'User') if role == 'user' else ('المستشار الذكي' if lang == 'ar' else 'AI Assistant')
-        timestamp_str = f'({timestamp[:19]})' if timestamp else ''
-        
-        msg_class = 'message-user' if role == 'user' else 'message-assistant'
-        icon = '👤' if role == 'user' else '🤖'
-        
-        html_content += f"""
-        <div class="message {msg_class}">
-            <div class="message-header">{icon} {sender} {timestamp_str}</div>
-            <div class="message-content">{content}</div>
-        </div>
-        """
+    def build_html():
+        messages = session_obj.get_messages()
+        return render_report(
+            'admin_consultation_session', {'lang': lang},
+            session_obj=session_obj, user=user, messages=messages, session_cost=session_cost,
+            lang=lang, generated_at=datetime.utcnow()
+        )
     
-    if messages:
-        html_content += "</div>"
+    try:
+        admin_id = int(get_jwt_identity())
+    except Exception:
+        admin_id = session.get('user_id')
     
-    html_content += f"""
-        <div class="footer">
-            {'تم التصدير في:' if lang == 'ar' else 'Exported on:'} {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}
-        </div>
-    </body>
-    </html>
-    """
+    # The cost share and user details are printed too, so they are part of the cache key
+    stamp = (session_obj.updated_at, round(session_cost, 6), user.username if user else None,
+             user.email if user else None)
+    filename = f'consultation-session-{session_id}.pdf'
     
-    # Convert HTML to PDF using WeasyPrint
+    # Convert HTML to PDF on the PDF pool; unchanged sessions are served from the cache
     try:
-        pdf_bytes = HTML(string=html_content).write_pdf()
-        pdf_buffer = BytesIO(pdf_bytes)
-        
-        # Generate filename
-        filename = f'consultation-session-{session_id}-{datetime.utcnow().strftime("%Y%m%d-%H%M%S")}.pdf'
-        
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+        return pdf_response('admin_consultation', session_id, stamp, lang, build_html, filename, admin_id)
     except Exception as e:
         return jsonify({'error': f'PDF generation failed: {str(e)}'}), 500
@@ -0,0 +1,50 @@
+from flask import Blueprint, jsonify, send_file, flash, redirect, url_for, session, current_app
+from utils.decorators import login_required, role_required
+from utils.exports import MIMETYPES, requeue_stale_exports, is_private_export
+from models import ExportJob
+
+exports_bp = Blueprint('exports', __name__, url_prefix='/exports')
+
+def get_db():
+    return current_app.extensions['sqlalchemy']
+
+def get_lang():
+    return session.get('language', 'ar')
+
+@exports_bp.route('/<int:job_id>/status')
+@login_required
+@role_required('system_admin')
+def status(job_id):
+    """Poll a background export job"""
+    db = get_db()
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Export not found'}), 404
+    
+    # Pick the export up again if its worker died
+    requeue_stale_exports(db.session, job_id=job_id)
+    
+    data = job.to_dict()
+    if job.status == 'completed':
+        data['download_url'] = url_for('admin.exports.download', job_id=job.id)
+    return jsonify({'success': True, 'job': data})
+
+@exports_bp.route('/<int:job_id>/download')
+@login_required
+@role_required('system_admin')
+def download(job_id):
+    """Download the file produced by a background export job"""
+    db = get_db()
+    lang = get_lang()
+    job = db.session.get(ExportJob, job_id)
+    
+    if not job or job.status == 'failed' or (job.status == 'completed' and not is_private_export(job.file_path)):
+        flash('الملف غير متاح أو انتهت صلاحيته' if lang == 'ar' else 'Export file is not available or has expired', 'danger')
+        return redirect(url_for('admin.dashboard.index'))
+    
+    if job.status != 'completed':
+        requeue_stale_exports(db.session, job_id=job_id)
+        flash('الملف قيد التجهيز، يرجى المحاولة بعد قليل' if lang == 'ar' else 'Export is still being prepared, please try again shortly', 'info')
+        return redirect(url_for('admin.dashboard.index'))
+    
+    return send_file(job.file_path, mimetype=MIMETYPES.get(job.file_format), as_attachment=True, download_name=job.file_name)
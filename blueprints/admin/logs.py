@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, session
+from flask import Blueprint, render_template, session, redirect, url_for, flash
 from utils.decorators import login_required, role_required
+from utils.query_budget import query_stats
 from models import AuditLog
 from flask import current_app
 
@@ -22,3 +23,31 @@ def index():
     logs = db.session.query(AuditLog).order_by(AuditLog.created_at.desc()).limit(100).all()
     
     return render_template('admin/logs/index.html', logs=logs, lang=lang)
+
+@logs_bp.route('/queries')
+@login_required
+@role_required('system_admin')
+def queries():
+    """SQL statements and DB time per route, and the latest slow statements"""
+    lang = get_lang()
+    routes = query_stats.routes()
+
+    return render_template('admin/logs/queries.html',
+                         routes=routes,
+                         slow_statements=query_stats.slow_statements(),
+                         total_requests=sum(route['requests'] for route in routes),
+                         total_statements=sum(route['statements'] for route in routes),
+                         total_db_ms=sum(route['db_ms'] for route in routes),
+                         started_at=query_stats.started_at,
+                         slow_query_ms=current_app.config['SLOW_QUERY_MS'],
+                         lang=lang)
+
+@logs_bp.route('/queries/reset', methods=['POST'])
+@login_required
+@role_required('system_admin')
+def reset_queries():
+    """Start collecting the route statistics again"""
+    lang = get_lang()
+    query_stats.reset()
+    flash('تمت إعادة تعيين إحصائيات الاستعلامات' if lang == 'ar' else 'Query statistics reset', 'success')
+    return redirect(url_for('admin.logs.queries'))
@@ -1,12 +1,16 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, make_response
 from utils.decorators import login_required, role_required
-from models import Organization, OrganizationSettings, User, Role, Project, Transaction, AILog, OrganizationMembership, db
+from utils.pagination import get_page_args, keyset_paginate, typeahead
+from utils.exports import TabularExport, register_export, export_response
+from flask_jwt_extended import get_jwt_identity
+from models import Organization, OrganizationSettings, User, Role, Project, Transaction, AILog, OrganizationMembership, PurgeJob, db
+from utils.tenant_purge import start_purge, active_purge, organization_has_users, requeue_stale_purges
 from flask import current_app
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from utils.query_budget import query_budget
 import json
-import io
-import csv
 import secrets
 import string
 
@@ -31,49 +35,107 @@ def generate_secure_password(length=12):
     else:
         return generate_secure_password(length)  # Regenerate if requirements not met
 
+ORG_FILTER_ARGS = ('search', 'status', 'plan', 'sector')
+
+
+def get_org_filters():
+    """Read the organization list filters from the query string"""
+    return {key: request.args.get(key) or None for key in ORG_FILTER_ARGS}
+
+
+def apply_org_filters(query, filters):
+    """Apply the organization list filters (shared by the index and the export)"""
+    search = filters.get('search')
+    if search:
+        query = query.filter(
+            (Organization.name.ilike(f'%{search}%')) |
+            (Organization.email.ilike(f'%{search}%')) |
+            (Organization.country.ilike(f'%{search}%'))
+        )
+    
+    status_filter = filters.get('status')
+    if status_filter == 'active':
+        query = query.filter(Organization.is_active == True, Organization.subscription_status == 'active')
+    elif status_filter == 'suspended':
+        query = query.filter(Organization.subscription_status == 'suspended')
+    elif status_filter == 'expired':
+        query = query.filter(Organization.subscription_status == 'expired')
+    elif status_filter == 'inactive':
+        query = query.filter(Organization.is_active == False)
+    
+    if filters.get('plan'):
+        query = query.filter(Organization.plan_type == filters['plan'])
+    
+    if filters.get('sector'):
+        query = query.filter(Organization.sector == filters['sector'])
+    return query
+
+
+@register_export('organizations')
+def organizations_export(params):
+    """Organizations export with user counts from a grouped subquery (no per-row loads)"""
+    filters = params.get('filters', {})
+    
+    def query_factory(db_session):
+        user_counts = db_session.query(
+            User.organization_id, func.count(User.id).label('users_count')
+        ).group_by(User.organization_id).subquery()
+        query = db_session.query(
+            Organization.id, Organization.name, Organization.sector, Organization.country,
+            Organization.city, Organization.plan_type, Organization.subscription_status,
+            func.coalesce(user_counts.c.users_count, 0).label('users_count'),
+            Organization.ai_usage_current, Organization.ai_usage_limit, Organization.created_at
+        ).outerjoin(user_counts, user_counts.c.organization_id == Organization.id)
+        return apply_org_filters(query, filters).order_by(Organization.id)
+    
+    def row_formatter(org):
+        return [
+            org.id,
+            org.name,
+            org.sector or '',
+            org.country or '',
+            org.city or '',
+            org.plan_type,
+            org.subscription_status,
+            org.users_count,
+            f"{org.ai_usage_current}/{org.ai_usage_limit}",
+            org.created_at.strftime('%Y-%m-%d') if org.created_at else ''
+        ]
+    
+    return TabularExport(
+        name='organizations',
+        title='Organizations',
+        headers=['ID', 'Name', 'Sector', 'Country', 'City', 'Plan', 'Status', 'Users Count', 'AI Usage', 'Created At'],
+        query_factory=query_factory,
+        row_formatter=row_formatter,
+        column_widths=[8, 25, 15, 15, 15, 12, 12, 12, 12, 12],
+        lang=params.get('lang', 'en')
+    )
+
 @organizations_bp.route('/')
 @login_required
 @role_required('system_admin')
+@query_budget(5)
 def index():
     """List all organizations with search and filters"""
     db_session = get_db()
     lang = get_lang()
     
     # Get filter parameters
-    search = request.args.get('search', '')
-    status_filter = request.args.get('status', '')
-    plan_filter = request.args.get('plan', '')
-    sector_filter = request.args.get('sector', '')
+    filters = get_org_filters()
     
     # Base query
-    query = db_session.session.query(Organization)
-    
-    # Apply filters
-    if search:
-        query = query.filter(
-            (Organization.name.ilike(f'%{search}%')) |
-            (Organization.email.ilike(f'%{search}%')) |
-            (Organization.country.ilike(f'%{search}%'))
-        )
-    
-    if status_filter:
-        if status_filter == 'active':
-            query = query.filter(Organization.is_active == True, Organization.subscription_status == 'active')
-        elif status_filter == 'suspended':
-            query = query.filter(Organization.subscription_status == 'suspended')
-        elif status_filter == 'expired':
-            query = query.filter(Organization.subscription_status == 'expired')
-        elif status_filter == 'inactive':
-            query = query.filter(Organization.is_active == False)
+    query = apply_org_filters(db_session.session.query(Organization), filters)
     
-    if plan_filter:
-        query = query.filter(Organization.plan_type == plan_filter)
+    # Get current page of organizations (newest first)
+    cursor, direction, per_page = get_page_args()
+    page = keyset_paginate(query, Organization.id, cursor=cursor, direction=direction, per_page=per_page)
+    organizations = page.items
     
-    if sector_filter:
-        query = query.filter(Organization.sector == sector_filter)
-    
-    # Get organizations
-    organizations = query.order_by(Organization.created_at.desc()).all()
+    # User count per organization on the page, in one grouped query
+    user_counts = dict(db_session.session.query(User.organization_id, func.count(User.id)).filter(
+        User.organization_id.in_([org.id for org in organizations])
+    ).group_by(User.organization_id).all()) if organizations else {}
     
     # Get unique sectors for filter dropdown
     sectors = db_session.session.query(Organization.sector).distinct().filter(Organization.sector.isnot(None)).all()
@@ -82,14 +144,28 @@ def index():
     return render_template(
         'admin/organizations/index.html',
         organizations=organizations,
+        user_counts=user_counts,
+        page=page,
+        filters=filters,
         sectors=sectors,
         lang=lang,
-        search=search,
-        status_filter=status_filter,
-        plan_filter=plan_filter,
-        sector_filter=sector_filter
+        search=filters['search'] or '',
+        status_filter=filters['status'] or '',
+        plan_filter=filters['plan'] or '',
+        sector_filter=filters['sector'] or ''
     )
 
+@organizations_bp.route('/api/search')
+@login_required
+@role_required('system_admin')
+def api_search():
+    """Typeahead lookup for organization filter dropdowns"""
+    db_session = get_db()
+    return jsonify(typeahead(
+        db_session.session.query(Organization), Organization.id, Organization.name,
+        [Organization.name, Organization.email], request.args.get('q', '')
+    ))
+
 @organizations_bp.route('/create', methods=['GET', 'POST'])
 @login_required
 @role_required('system_admin')
@@ -262,6 +338,7 @@ def edit(org_id):
 @organizations_bp.route('/<int:org_id>/users')
 @login_required
 @role_required('system_admin')
+@query_budget(4)
 def users(org_id):
     """View organization users with their organization-specific roles"""
     db_session = get_db()
@@ -272,9 +349,11 @@ def users(org_id):
         flash('المؤسسة غير موجودة / Organization not found', 'danger')
         return redirect(url_for('admin.organizations.index'))
     
-    # Get all memberships for this organization with user info
+    # Get all memberships for this organization with user info (user and role loaded in the same query)
     memberships = db_session.session.query(OrganizationMembership).filter_by(
         organization_id=org_id
+    ).options(
+        joinedload(OrganizationMembership.user).joinedload(User.role_ref)
     ).order_by(OrganizationMembership.joined_at.desc()).all()
     
     # Also get users who have organization_id set but no membership (legacy data)
@@ -420,29 +499,47 @@ def settings(org_id):
 @login_required
 @role_required('system_admin')
 def delete(org_id):
-    """Delete an organization"""
+    """Delete an organization and all of its data (background purge job)"""
     db_session = get_db()
     
-    org = db_session.session.query(Organization).get(org_id)
+    org = db_session.session.get(Organization, org_id)
     if not org:
         flash('المؤسسة غير موجودة / Organization not found', 'danger')
         return redirect(url_for('admin.organizations.index'))
     
     try:
         # Check if organization has users
-        if len(org.users) > 0:
+        if organization_has_users(db_session.session, org_id):
             flash('لا يمكن حذف مؤسسة تحتوي على مستخدمين / Cannot delete organization with users', 'danger')
             return redirect(url_for('admin.organizations.view', org_id=org_id))
         
-        db_session.session.delete(org)
-        db_session.session.commit()
-        flash('تم حذف المؤسسة بنجاح / Organization deleted successfully', 'success')
+        if active_purge(db_session.session, org_id):
+            flash('جاري حذف المؤسسة بالفعل / Organization deletion is already in progress', 'info')
+            return redirect(url_for('admin.organizations.index'))
+        
+        # Hidden right away; its rows are removed in batches in the background
+        org.is_active = False
+        org.subscription_status = 'suspended'
+        job = start_purge(db_session.session, org_id, 'organization', user_id=session.get('user_id'))
+        flash(f'جاري حذف المؤسسة في الخلفية / Organization deletion started (job #{job.id})', 'success')
     except Exception as e:
         db_session.session.rollback()
         flash(f'خطأ في حذف المؤسسة / Error deleting organization: {str(e)}', 'danger')
     
     return redirect(url_for('admin.organizations.index'))
 
+@organizations_bp.route('/purges/<int:job_id>/status')
+@login_required
+@role_required('system_admin')
+def purge_status(job_id):
+    """Poll an organization deletion job"""
+    db_session = get_db()
+    job = db_session.session.get(PurgeJob, job_id)
+    if not job or job.scope != 'organization':
+        return jsonify({'success': False, 'error': 'Purge job not found'}), 404
+    requeue_stale_purges(db_session.session, job_id=job_id)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 @organizations_bp.route('/<int:org_id>/suspend', methods=['POST'])
 @login_required
 @role_required('system_admin')
@@ -487,39 +584,14 @@ def activate(org_id):
 @login_required
 @role_required('system_admin')
 def export():
-    """Export organizations list to CSV"""
-    db_session = get_db()
-    
-    organizations = db_session.session.query(Organization).all()
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Headers
-    writer.writerow(['ID', 'Name', 'Sector', 'Country', 'City', 'Plan', 'Status', 'Users Count', 'AI Usage', 'Created At'])
-    
-    # Data
-    for org in organizations:
-        writer.writerow([
-            org.id,
-            org.name,
-            org.sector or '',
-            org.country or '',
-            org.city or '',
-            org.plan_type,
-            org.subscription_status,
-            len(org.users),
-            f"{org.ai_usage_current}/{org.ai_usage_limit}",
-            org.created_at.strftime('%Y-%m-%d') if org.created_at else ''
-        ])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=organizations.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
-    return response
+    """Export organizations list to CSV (or Excel with ?format=xlsx)"""
+    file_format = 'xlsx' if request.args.get('format') == 'xlsx' else 'csv'
+    filters = get_org_filters()
+    return export_response(
+        'organizations', file_format, {'filters': filters, 'format': file_format},
+        int(get_jwt_identity()),
+        url_for('admin.organizations.index', **{k: v for k, v in filters.items() if v})
+    )
 
 @organizations_bp.route('/<int:org_id>/reset-ai-usage', methods=['POST'])
 @login_required
@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, request, session
 from flask_jwt_extended import get_jwt_identity
 from utils.decorators import login_required, role_required
-from models import User, Project, Service, ServiceOffering
+from sqlalchemy.orm import contains_eager
+from models import User, Project, Service
+from utils.projects import project_services
+from utils.query_budget import query_budget
 from flask import current_app
 from datetime import datetime
 
@@ -16,6 +19,7 @@ def get_lang():
 @projects_bp.route('/')
 @login_required
 @role_required('system_admin')
+@query_budget(5)
 def index():
     """List all user projects"""
     db = get_db()
@@ -26,8 +30,8 @@ def index():
     user_search = request.args.get('user_search', '')
     service_filter = request.args.get('service')
     
-    # Build query
-    query = db.session.query(Project).join(User, Project.user_id == User.id)
+    # Build query (the joined user is loaded with each project)
+    query = db.session.query(Project).join(User, Project.user_id == User.id).options(contains_eager(Project.user))
     
     if status_filter:
         query = query.filter(Project.status == status_filter)
@@ -45,32 +49,17 @@ def index():
     # Get projects ordered by creation date (most recent first)
     projects = query.order_by(Project.created_at.desc()).all()
     
-    # Build project details with service/offering info
+    # Build project details with service/offering info (two queries for the whole list)
+    services_by_project = project_services(db.session, projects, require_offering=False)
     project_details = []
     for project in projects:
-        detail = {
+        resolved = services_by_project.get(project.id, {})
+        project_details.append({
             'project': project,
             'user': project.user,
-            'service': None,
-            'offering': None
-        }
-        
-        # Parse module to extract service and offering
-        if project.module and '_' in project.module:
-            parts = project.module.split('_', 1)
-            if len(parts) == 2:
-                service_slug, offering_slug = parts
-                service = db.session.query(Service).filter_by(slug=service_slug).first()
-                if service:
-                    detail['service'] = service
-                    offering = db.session.query(ServiceOffering).filter_by(
-                        service_id=service.id,
-                        slug=offering_slug
-                    ).first()
-                    if offering:
-                        detail['offering'] = offering
-        
-        project_details.append(detail)
+            'service': resolved.get('service'),
+            'offering': resolved.get('offering')
+        })
     
     # Get all services for filter dropdown
     services = db.session.query(Service).filter_by(is_active=True).order_by(Service.display_order).all()
@@ -1,19 +1,15 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, send_file
 from flask_jwt_extended import get_jwt_identity
 from utils.decorators import login_required, role_required
+from utils.pagination import get_page_args, keyset_paginate, typeahead
 from models import User, Role, SubscriptionPlan, Project, Transaction, AILog, Organization, OrganizationMembership
 from flask import current_app
 from werkzeug.security import generate_password_hash
+from utils.exports import TabularExport, register_export, export_response
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+from utils.query_budget import query_budget
 from datetime import datetime
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-try:
-    from weasyprint import HTML, CSS
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    HTML, CSS = None, None
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 
@@ -23,93 +19,138 @@ def get_db():
 def get_lang():
     return session.get('language', 'ar')
 
+USER_FILTER_ARGS = ('role', 'status', 'plan', 'search')
+
+
+def get_user_filters():
+    """Read the user list filters from the query string"""
+    return {key: request.args.get(key) or None for key in USER_FILTER_ARGS}
+
+
+def apply_user_filters(query, filters):
+    """Apply the user list filters (shared by the index and the exports)"""
+    if filters.get('role'):
+        query = query.filter(User.role_ref.has(Role.name == filters['role']))
+    
+    if filters.get('status') == 'active':
+        query = query.filter(User.is_active == True)
+    elif filters.get('status') == 'inactive':
+        query = query.filter(User.is_active == False)
+    
+    if filters.get('plan'):
+        query = query.filter(User.plan_ref.has(SubscriptionPlan.name == filters['plan']))
+    
+    search = filters.get('search')
+    if search:
+        query = query.filter(
+            (User.username.ilike(f'%{search}%')) |
+            (User.email.ilike(f'%{search}%')) |
+            (User.company_name.ilike(f'%{search}%'))
+        )
+    return query
+
+
+@register_export('users')
+def users_export(params):
+    """Users export: full columns for Excel/CSV, the compact report layout for PDF"""
+    lang = params.get('lang', 'ar')
+    filters = params.get('filters', {})
+    is_pdf = params.get('format') == 'pdf'
+    
+    def status_label(is_active):
+        if lang == 'ar':
+            return 'نشط' if is_active else 'غير نشط'
+        return 'Active' if is_active else 'Inactive'
+    
+    def query_factory(db_session):
+        query = db_session.query(
+            User.id, User.username, User.email, User.phone, User.company_name,
+            Role.name.label('role_name'), SubscriptionPlan.name.label('plan_name'),
+            User.is_active, User.last_login, User.last_login_ip, User.created_at
+        ).outerjoin(Role, User.role_id == Role.id).outerjoin(
+            SubscriptionPlan, User.subscription_plan_id == SubscriptionPlan.id
+        )
+        return apply_user_filters(query, filters).order_by(User.created_at.desc(), User.id.desc())
+    
+    if is_pdf:
+        headers = {
+            'ar': ['معرّف', 'اسم المستخدم', 'البريد الإلكتروني', 'الدور', 'الخطة', 'الحالة', 'تاريخ التسجيل'],
+            'en': ['ID', 'Username', 'Email', 'Role', 'Plan', 'Status', 'Join Date']
+        }[lang]
+        
+        def row_formatter(user):
+            return [
+                user.id,
+                user.username[:15],
+                user.email[:18],
+                user.role_name or '-',
+                user.plan_name or '-',
+                status_label(user.is_active),
+                user.created_at.strftime('%Y-%m-%d') if user.created_at else '-'
+            ]
+    else:
+        headers = ['ID', 'اسم المستخدم' if lang == 'ar' else 'Username', 
+                   'البريد الإلكتروني' if lang == 'ar' else 'Email',
+                   'رقم الهاتف' if lang == 'ar' else 'Phone',
+                   'الشركة' if lang == 'ar' else 'Company',
+                   'الدور' if lang == 'ar' else 'Role',
+                   'الخطة' if lang == 'ar' else 'Plan',
+                   'الحالة' if lang == 'ar' else 'Status',
+                   'آخر دخول' if lang == 'ar' else 'Last Login',
+                   'عنوان IP' if lang == 'ar' else 'Last IP',
+                   'تاريخ التسجيل' if lang == 'ar' else 'Join Date']
+        
+        def row_formatter(user):
+            return [
+                user.id,
+                user.username,
+                user.email,
+                user.phone or '-',
+                user.company_name or '-',
+                user.role_name or '-',
+                user.plan_name or '-',
+                status_label(user.is_active),
+                user.last_login.strftime('%Y-%m-%d %H:%M') if user.last_login else '-',
+                user.last_login_ip or '-',
+                user.created_at.strftime('%Y-%m-%d') if user.created_at else '-'
+            ]
+    
+    def summary_factory(db_session):
+        total, active = apply_user_filters(db_session.query(User), filters).with_entities(
+            func.count(User.id),
+            func.coalesce(func.sum(case((User.is_active == True, 1), else_=0)), 0)
+        ).one()
+        return [
+            ('إجمالي المستخدمين' if lang == 'ar' else 'Total Users', total),
+            ('المستخدمون النشطون' if lang == 'ar' else 'Active Users', active),
+            ('المستخدمون غير النشطين' if lang == 'ar' else 'Inactive Users', total - active),
+        ]
+    
+    return TabularExport(
+        name='users',
+        title=('تقرير المستخدمين' if lang == 'ar' else 'Users Report') if is_pdf else ('المستخدمون' if lang == 'ar' else 'Users'),
+        headers=headers,
+        query_factory=query_factory,
+        row_formatter=row_formatter,
+        column_widths=[8, 15, 20, 12, 15, 12, 12, 10, 16, 14, 12],
+        lang=lang,
+        summary_factory=summary_factory
+    )
+
+
+def _export_users(file_format):
+    params = {'lang': get_lang(), 'filters': get_user_filters(), 'format': file_format}
+    return export_response('users', file_format, params, int(get_jwt_identity()),
+                           url_for('admin.users.index', **{k: v for k, v in params['filters'].items() if v}))
+
+
 @users_bp.route('/export/excel', methods=['GET'])
 @login_required
 @role_required('system_admin')
 def export_excel():
-    """Export users data to Excel"""
-    db = get_db()
-    lang = get_lang()
-    
-    # Get users with filters applied
-    query = db.session.query(User)
-    users = query.order_by(User.created_at.desc()).all()
-    
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'المستخدمون' if lang == 'ar' else 'Users'
-    
-    # Define styles
-    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF', size=11)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    
-    # Headers
-    headers = ['ID', 'اسم المستخدم' if lang == 'ar' else 'Username', 
-               'البريد الإلكتروني' if lang == 'ar' else 'Email',
-               'رقم الهاتف' if lang == 'ar' else 'Phone',
-               'الشركة' if lang == 'ar' else 'Company',
-               'الدور' if lang == 'ar' else 'Role',
-               'الخطة' if lang == 'ar' else 'Plan',
-               'الحالة' if lang == 'ar' else 'Status',
-               'آخر دخول' if lang == 'ar' else 'Last Login',
-               'عنوان IP' if lang == 'ar' else 'Last IP',
-               'تاريخ التسجيل' if lang == 'ar' else 'Join Date']
-    
-    ws.append(headers)
-    
-    # Style headers
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = center_alignment
-        cell.border = border
-    
-    # Add data rows
-    for user in users:
-        row = [
-            user.id,
-            user.username,
-            user.email,
-            user.phone or '-',
-            user.company_name or '-',
-            user.role or '-',
-            user.subscription_plan or '-',
-            'نشط' if lang == 'ar' and user.is_active else 'Active' if user.is_active else 'غير نشط' if lang == 'ar' else 'Inactive',
-            user.last_login.strftime('%Y-%m-%d %H:%M') if user.last_login else '-',
-            user.last_login_ip or '-',
-            user.created_at.strftime('%Y-%m-%d') if user.created_at else '-'
-        ]
-        ws.append(row)
-        
-        # Style data cells
-        for cell in ws[ws.max_row]:
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center' if cell.column <= 1 else 'left', vertical='center', wrap_text=True)
-    
-    # Adjust column widths
-    column_widths = [8, 15, 20, 12, 15, 12, 12, 10, 16, 14, 12]
-    for i, width in enumerate(column_widths, 1):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
-    
-    # Save to BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'users_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    """Export users data to Excel (or CSV with ?format=csv)"""
+    file_format = 'csv' if request.args.get('format') == 'csv' else 'xlsx'
+    return _export_users(file_format)
 
 
 @users_bp.route('/export/pdf', methods=['GET'])
@@ -118,207 +159,7 @@ def export_excel():
 def export_pdf():
     """Export users data to PDF with Arabic support"""
     try:
-        db = get_db()
-        lang = get_lang()
-        
-        # Get users
-        query = db.session.query(User)
-        users = query.order_by(User.created_at.desc()).all()
-        
-        # Create HTML table for PDF
-        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        title = 'تقرير المستخدمين' if lang == 'ar' else 'Users Report'
-        
-        # Table headers
-        headers = {
-            'ar': ['معرّف', 'اسم المستخدم', 'البريد الإلكتروني', 'الدور', 'الخطة', 'الحالة', 'تاريخ التسجيل'],
-            'en': ['ID', 'Username', 'Email', 'Role', 'Plan', 'Status', 'Join Date']
-        }
-        
-        status_text = {
-            'ar': {'active': 'نشط', 'inactive': 'غير نشط'},
-            'en': {'active': 'Active', 'inactive': 'Inactive'}
-        }
-        
-        # Build table rows
-        rows_html = ''
-        for user in users[:100]:
-            status = status_text[lang]['active'] if user.is_active else status_text[lang]['inactive']
-            status_class = 'status-active' if user.is_active else 'status-inactive'
-            rows_html += f"""
-            <tr>
-                <td>{user.id}</td>
-                <td>{user.username[:15]}</td>
-                <td>{user.email[:18]}</td>
-                <td>{user.role or '-'}</td>
-                <td>{user.subscription_plan or '-'}</td>
-                <td><span class="{status_class}">{status}</span></td>
-                <td>{user.created_at.strftime('%Y-%m-%d') if user.created_at else '-'}</td>
-            </tr>
-            """
-        
-        # Build HTML
-        html_content = f"""
-        <!DOCTYPE html>
-        <html dir="{'rtl' if lang == 'ar' else 'ltr'}">
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                @page {{
-                    size: A4;
-                    margin: 0.5cm;
-                }}
-                * {{
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }}
-                body {{
-                    font-family: 'DejaVu Sans', sans-serif;
-                    margin: 0;
-                    padding: 8px;
-                    direction: {'rtl' if lang == 'ar' else 'ltr'};
-                    background-color: #fff;
-                    font-size: 9pt;
-                    line-height: 1.3;
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 12px;
-                    border-bottom: 2px solid #366092;
-                    padding-bottom: 8px;
-                }}
-                h1 {{
-                    color: #366092;
-                    font-size: 14pt;
-                    margin: 0;
-                    font-weight: bold;
-                }}
-                .report-date {{
-                    color: #666;
-                    font-size: 8pt;
-                    margin-top: 2px;
-                }}
-                .stats {{
-                    display: flex;
-                    justify-content: space-around;
-                    margin-bottom: 10px;
-                    background-color: #f5f5f5;
-                    padding: 6px;
-                    border: 1px solid #ddd;
-                }}
-                .stat-item {{
-                    text-align: center;
-                    flex: 1;
-                }}
-                .stat-label {{
-                    color: #666;
-                    font-size: 7pt;
-                    display: block;
-                    margin-bottom: 2px;
-                }}
-                .stat-value {{
-                    color: #366092;
-                    font-weight: bold;
-                    font-size: 11pt;
-                }}
-                table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 8px 0;
-                    font-size: 8pt;
-                }}
-                th {{
-                    background-color: #366092;
-                    color: #fff;
-                    padding: 5px 3px;
-                    text-align: center;
-                    font-weight: bold;
-                    border: 1px solid #2c5aa0;
-                    vertical-align: middle;
-                    font-size: 8pt;
-                }}
-                td {{
-                    padding: 4px 3px;
-                    border: 1px solid #ddd;
-                    text-align: center;
-                    vertical-align: middle;
-                    font-size: 8pt;
-                    word-wrap: break-word;
-                }}
-                tbody tr:nth-child(odd) {{
-                    background-color: #f9f9f9;
-                }}
-                tbody tr:nth-child(even) {{
-                    background-color: #fff;
-                }}
-                .status-active {{
-                    color: #1b5e20;
-                    font-weight: bold;
-                }}
-                .status-inactive {{
-                    color: #c62828;
-                    font-weight: bold;
-                }}
-                .footer {{
-                    text-align: center;
-                    color: #999;
-                    font-size: 7pt;
-                    margin-top: 10px;
-                    padding-top: 6px;
-                    border-top: 1px solid #ddd;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>{title}</h1>
-                <div class="report-date">{timestamp}</div>
-            </div>
-            
-            <div class="stats">
-                <div class="stats-row">
-                    <div class="stat-item">
-                        <span class="stat-label">{'إجمالي المستخدمين' if lang == 'ar' else 'Total Users'}</span>
-                        <span class="stat-value">{len(users)}</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-label">{'المستخدمون النشطون' if lang == 'ar' else 'Active Users'}</span>
-                        <span class="stat-value">{sum(1 for u in users if u.is_active)}</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-label">{'المستخدمون غير النشطين' if lang == 'ar' else 'Inactive Users'}</span>
-                        <span class="stat-value">{sum(1 for u in users if not u.is_active)}</span>
-                    </div>
-                </div>
-            </div>
-            
-            <table>
-                <thead>
-                    <tr>
-                        {''.join([f'<th>{h}</th>' for h in headers[lang]])}
-                    </tr>
-                </thead>
-                <tbody>
-                    {rows_html}
-                </tbody>
-            </table>
-            <div class="footer">
-                <p>{'تم التوليد بواسطة نظام Mcidia' if lang == 'ar' else 'Generated by Mcidia System'} | {timestamp}</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Convert HTML to PDF using weasyprint
-        pdf_bytes = HTML(string=html_content).write_pdf()
-        
-        return send_file(
-            BytesIO(pdf_bytes),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'users_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.pdf'
-        )
+        return _export_users('pdf')
     except Exception as e:
         print(f"PDF Export Error: {str(e)}")
         import traceback
@@ -326,44 +167,26 @@ def export_pdf():
         flash(f'خطأ في تصدير PDF / Error exporting PDF: {str(e)}', 'danger')
         return redirect(url_for('admin.users.index'))
 
-
 @users_bp.route('/')
 @login_required
 @role_required('system_admin')
+@query_budget(5)
 def index():
     """List all users with filtering"""
     db = get_db()
     lang = get_lang()
     
     # Get filter parameters
-    role_filter = request.args.get('role')
-    status_filter = request.args.get('status')
-    plan_filter = request.args.get('plan')
-    search = request.args.get('search', '')
-    
-    # Build query
-    query = db.session.query(User)
-    
-    if role_filter:
-        query = query.join(Role).filter(Role.name == role_filter)
-    
-    if status_filter:
-        if status_filter == 'active':
-            query = query.filter(User.is_active == True)
-        elif status_filter == 'inactive':
-            query = query.filter(User.is_active == False)
+    filters = get_user_filters()
     
-    if plan_filter:
-        query = query.join(SubscriptionPlan).filter(SubscriptionPlan.name == plan_filter)
-    
-    if search:
-        query = query.filter(
-            (User.username.ilike(f'%{search}%')) |
-            (User.email.ilike(f'%{search}%')) |
-            (User.company_name.ilike(f'%{search}%'))
-        )
+    # Build query (role and plan shown per row are joined in)
+    query = apply_user_filters(db.session.query(User), filters).options(
+        joinedload(User.role_ref), joinedload(User.plan_ref)
+    )
     
-    users = query.order_by(User.created_at.desc()).all()
+    # Keyset pagination (newest first) instead of loading every user
+    cursor, direction, per_page = get_page_args()
+    page = keyset_paginate(query, User.id, cursor=cursor, direction=direction, per_page=per_page)
     
     # Get all roles and plans for filters
     roles = db.session.query(Role).all()
@@ -371,16 +194,29 @@ def index():
     
     return render_template(
         'admin/users/index.html',
-        users=users,
+        users=page.items,
+        page=page,
+        filters=filters,
         roles=roles,
         plans=plans,
         lang=lang,
-        current_role_filter=role_filter,
-        current_status_filter=status_filter,
-        current_plan_filter=plan_filter,
-        current_search=search
+        current_role_filter=filters['role'],
+        current_status_filter=filters['status'],
+        current_plan_filter=filters['plan'],
+        current_search=filters['search'] or ''
     )
 
+@users_bp.route('/api/search')
+@login_required
+@role_required('system_admin')
+def api_search():
+    """Typeahead lookup for user filter dropdowns"""
+    db = get_db()
+    return jsonify(typeahead(
+        db.session.query(User), User.id, User.username,
+        [User.username, User.email], request.args.get('q', '')
+    ))
+
 @users_bp.route('/<int:user_id>')
 @login_required
 @role_required('system_admin')
@@ -320,9 +320,8 @@ def receipt(transaction_id):
 @login_required
 def download_receipt_pdf(transaction_id):
     """Download receipt as PDF"""
-    from flask import session as flask_session, send_file
-    from weasyprint import HTML
-    from io import BytesIO
+    from flask import session as flask_session
+    from utils.pdf_jobs import pdf_response
     
     db = current_app.extensions['sqlalchemy']
     
@@ -354,7 +353,7 @@ def download_receipt_pdf(transaction_id):
     # Get the transaction owner's info
     transaction_user = db.session.query(User).get(transaction.user_id)
     
-    try:
+    def build_html():
         # Prepare data for template
         receipt_data = {
             'transaction': transaction,
@@ -364,24 +363,16 @@ def download_receipt_pdf(transaction_id):
         }
         
         # Render template to HTML string
-        html_string = render_template('billing/receipt_pdf.html', **receipt_data)
-        
-        # Generate PDF from HTML
-        pdf_bytes = HTML(string=html_string).write_pdf()
-        
-        # Create BytesIO object
-        pdf_file = BytesIO(pdf_bytes)
-        pdf_file.seek(0)
-        
-        # Create filename
-        filename = f"receipt_{transaction.id}_{transaction.created_at.strftime('%Y%m%d')}.pdf"
-        
-        return send_file(
-            pdf_file,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+        return render_template('billing/receipt_pdf.html', **receipt_data)
+    
+    # Transactions have no updated_at; these are the fields of the receipt that can change
+    stamp = (transaction.status, transaction.amount, transaction.subscription_renewal_date,
+             transaction_user.username, transaction_user.email, transaction_user.phone)
+    filename = f"receipt_{transaction.id}_{transaction.created_at.strftime('%Y%m%d')}.pdf"
+    
+    try:
+        # Rendered on the PDF pool; repeat downloads are served from the cache
+        return pdf_response('receipt', transaction.id, stamp, lang, build_html, filename, user_id)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -392,68 +383,8 @@ def download_receipt_pdf(transaction_id):
 @login_required
 @role_required('system_admin')
 def admin_billing():
-    """Admin page to view all invoices and transactions"""
-    db = current_app.extensions['sqlalchemy']
-    lang = session.get('language', 'ar')
-    
-    # Get all transactions with user information
-    transactions = db.session.query(Transaction).order_by(Transaction.created_at.desc()).all()
-    
-    # Build plan name mapping
-    plan_names = {
-        'free': {'ar': 'مجاني', 'en': 'Free'},
-        'monthly': {'ar': 'شهري', 'en': 'Monthly'},
-        'yearly': {'ar': 'سنوي', 'en': 'Yearly'},
-        'pay_per_use': {'ar': 'حسب الاستخدام', 'en': 'Pay Per Use'}
-    }
-    
-    # Calculate stats
-    total_transactions = len(transactions)
-    successful_count = len([t for t in transactions if t.status == 'succeeded'])
-    total_amount = sum([t.amount for t in transactions])
-    unique_users = len(set([t.user_id for t in transactions]))
-    
-    # Build enriched transactions list with user and plan data
-    enriched_transactions = []
-    for trans in transactions:
-        user = db.session.query(User).get(trans.user_id)
-        plan_name = user.plan_ref.name if user and user.plan_ref else 'unknown'
-        plan_display_name = plan_names.get(plan_name, {}).get('ar' if lang == 'ar' else 'en', plan_name)
-        
-        enriched_transactions.append({
-            'transaction': trans,
-            'user': user,
-            'username': user.username if user else 'Unknown',
-            'email': user.email if user else 'N/A',
-            'plan_name': plan_display_name,
-            'id': trans.id,
-            'amount': trans.amount,
-            'status': trans.status,
-            'created_at': trans.created_at,
-            'transaction_type': trans.transaction_type,
-            'currency': trans.currency,
-            'stripe_invoice_url': trans.stripe_invoice_url,
-            'user_id': trans.user_id,
-            'payment_method': trans.payment_method,
-            'billing_period': trans.billing_period,
-            'subscription_start_date': trans.subscription_start_date,
-            'subscription_renewal_date': trans.subscription_renewal_date
-        })
-    
-    # Collect payment methods
-    payment_methods = {}
-    for item in enriched_transactions:
-        method = item.get('payment_method') or 'Unknown'
-        payment_methods[method] = payment_methods.get(method, 0) + 1
-    
-    return render_template('admin/billing/index.html', 
-                         enriched_transactions=enriched_transactions,
-                         total_transactions=total_transactions,
-                         successful_count=successful_count,
-                         total_amount=total_amount,
-                         unique_users=unique_users,
-                         payment_methods=payment_methods,
-                         lang=lang)
+    """Old address of the admin billing page, kept for bookmarks and links"""
+    return redirect(url_for('admin.billing.index', **request.args))
 
 @billing_bp.route('/webhook', methods=['POST'])
 def webhook():
@@ -1,17 +1,15 @@
-from flask import Blueprint, render_template, request, flash, session, redirect, url_for, current_app, jsonify, send_file
+from flask import Blueprint, render_template, request, flash, session, redirect, url_for, current_app, jsonify
 from flask_jwt_extended import get_jwt_identity
 from utils.decorators import login_required
+from utils.query_budget import query_budget
 from models import AILog, ChatSession, Service
 from utils.ai_providers.ai_manager import AIManager
 from datetime import datetime
 from werkzeug.utils import secure_filename
-try:
-    from weasyprint import HTML
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    HTML = None
-from io import BytesIO
+from utils.pdf_jobs import pdf_response
+from utils.report_renderer import render_report, cached_fragments, text_to_html
+from utils.chart_generator import stored_charts
+from utils.chart_images import chart_image_uri
 import json
 import time
 import os
@@ -78,6 +76,13 @@ def format_response_html(text):
     
     return html or text
 
+def _format_message(source):
+    """HTML of a (role, content) message in the session report"""
+    role, content = source
+    if role == 'assistant':
+        return format_response_html(content)
+    return text_to_html(content)
+
 @consultation_bp.route('/')
 def index():
     lang = session.get('language', 'ar')
@@ -104,6 +109,7 @@ def index():
 
 @consultation_bp.route('/api/sessions', methods=['GET'])
 @login_required
+@query_budget(3)
 def get_sessions_api():
     """API endpoint to get user's consultation sessions"""
     db = current_app.extensions['sqlalchemy']
@@ -120,7 +126,7 @@ def get_sessions_api():
     sessions_list = []
     for s in sessions.items:
         try:
-            messages = json.loads(s.messages) if s.messages else []
+            messages = s.get_messages()
             message_count = len(messages)
             total_cost = sum(m.get('cost', 0) for m in messages if m.get('role') == 'assistant')
         except:
@@ -183,10 +189,7 @@ def view_session(session_id):
         return redirect(url_for('consultation.index'))
     
     # Parse messages
-    try:
-        messages = json.loads(chat_session.messages) if chat_session.messages else []
-    except:
-        messages = []
+    messages = chat_session.get_messages()
     
     # Get available services and convert to dict
     services = db.session.query(Service).filter_by(is_active=True).all()
@@ -312,10 +315,7 @@ def send_message():
             chat_session = ChatSession(user_id=user_id, domain=topic)
         
         # Parse existing messages
-        try:
-            messages = json.loads(chat_session.messages) if chat_session.messages else []
-        except:
-            messages = []
+        messages = chat_session.get_messages()
         
         # Add new messages
         messages.append({
@@ -331,7 +331,7 @@ def send_message():
             'charts': charts if charts else None
         })
         
-        chat_session.messages = json.dumps(messages)
+        chat_session.set_messages(messages)
         chat_session.updated_at = datetime.utcnow()
         
         if not session_id:
@@ -614,354 +614,29 @@ def export_session_pdf(session_id):
         return jsonify({'error': 'Session not found'}), 404
     
     # Parse messages
-    try:
-        messages = json.loads(chat_session.messages) if chat_session.messages else []
-    except:
-        messages = []
-    
-    # Get chart images from request if POST
-    chart_images = {}
-    if request.method == 'POST':
-        data = request.get_json() or {}
-        chart_images = data.get('chartImages', {})
-    
-    # Calculate total cost
-    total_cost = sum(m.get('cost', 0) for m in messages if m.get('role') == 'assistant')
-    
-    # Generate HTML for PDF with proper styling
-    html_content = f"""
-    <!DOCTYPE html>
-    <html dir="{'rtl' if lang == 'ar' else 'ltr'}" lang="{lang}">
-    <head>
-        <meta charset="UTF-8">
-        <link href="https://fonts.googleapis.com/css2?family=Cairo:wght@400;500;600;700&family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-        <style>
-            * {{
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }}
-            
-            @page {{
-                size: A4;
-                margin: 2cm;
-            }}
-            
-            body {{
-                font-family: {'Cairo' if lang == 'ar' else 'Inter'}, Arial, sans-serif;
-                direction: {'rtl' if lang == 'ar' else 'ltr'};
-                text-align: {'right' if lang == 'ar' else 'left'};
-                line-height: 1.8;
-                color: #333;
-                font-size: 14px;
-                background: white;
-            }}
-            
-            .header {{
-                background: linear-gradient(135deg, #0A2756 0%, #2767B1 100%);
-                color: white;
-                padding: 30px;
-                margin-bottom: 30px;
-                border-radius: 8px;
-                text-align: center;
-                page-break-inside: avoid;
-            }}
-            
-            .header h1 {{
-                font-size: 28px;
-                font-weight: 700;
-                margin-bottom: 15px;
-            }}
-            
-            .header-meta {{
-                font-size: 13px;
-                opacity: 0.95;
-                line-height: 1.8;
-            }}
-            
-            .header-meta strong {{
-                font-weight: 600;
-            }}
-            
-            .message {{
-                margin-bottom: 25px;
-                padding: 18px;
-                border-{'right' if lang == 'ar' else 'left'}: 5px solid #0A2756;
-                background: #f8f9fa;
-                border-radius: 4px;
-                page-break-inside: avoid;
-            }}
-            
-            .message.assistant {{
-                border-{'right' if lang == 'ar' else 'left'}-color: #2C8C56;
-                background: #f0f8f5;
-            }}
-            
-            .message-role {{
-                font-weight: 700;
-                font-size: 12px;
-                text-transform: uppercase;
-                color: #0A2756;
-                margin-bottom: 10px;
-                letter-spacing: 0.5px;
-            }}
-            
-            .message.assistant .message-role {{
-                color: #2C8C56;
-            }}
-            
-            .message-content {{
-                font-size: 14px;
-                line-height: 1.8;
-                color: #333;
-                word-wrap: break-word;
-                overflow-wrap: break-word;
-            }}
-            
-            .response-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 15px 0;
-                border: 1px solid #e0e0e0;
-                border-radius: 8px;
-                overflow: hidden;
-                box-shadow: 0 2px 8px rgba(10, 39, 86, 0.08);
-                page-break-inside: avoid;
-            }}
-            
-            .response-table thead {{
-                background: #0A2756 !important;
-            }}
-            
-            .response-table thead th {{
-                padding: 14px 12px;
-                text-align: {'right' if lang == 'ar' else 'left'};
-                font-weight: 600;
-                font-size: 13px;
-                letter-spacing: 0.3px;
-                border: none;
-                color: #FFFFFF !important;
-                background: #0A2756 !important;
-            }}
-            
-            .response-table tbody td {{
-                padding: 12px;
-                border-bottom: 1px solid #f0f0f0;
-                font-size: 13px;
-                color: #444;
-                text-align: {'right' if lang == 'ar' else 'left'};
-            }}
-            
-            .response-table tbody tr:last-child td {{
-                border-bottom: none;
-            }}
-            
-            .response-table tbody tr:nth-child(even) {{
-                background: #fafbfc;
-            }}
-            
-            .response-table tbody tr:nth-child(odd) {{
-                background: #ffffff;
-            }}
-            
-            .message-content table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 15px 0;
-                border: 1px solid #e0e0e0;
-                border-radius: 8px;
-                overflow: hidden;
-                box-shadow: 0 2px 8px rgba(10, 39, 86, 0.08);
-                page-break-inside: avoid;
-            }}
-            
-            .message-content table thead {{
-                background: #0A2756 !important;
-            }}
-            
-            .message-content table th {{
-                padding: 14px 12px;
-                text-align: {'right' if lang == 'ar' else 'left'};
-                font-weight: 600;
-                font-size: 13px;
-                letter-spacing: 0.3px;
-                border: none;
-                color: #FFFFFF !important;
-                background: #0A2756 !important;
-            }}
-            
-            .message-content table td {{
-                padding: 12px;
-                border-bottom: 1px solid #f0f0f0;
-                font-size: 13px;
-                color: #444;
-                text-align: {'right' if lang == 'ar' else 'left'};
-            }}
-            
-            .message-content table tr:last-child td {{
-                border-bottom: none;
-            }}
-            
-            .message-content table tr:nth-child(even) {{
-                background: #fafbfc;
-            }}
-            
-            .message-content table tr:nth-child(odd) {{
-                background: #ffffff;
-            }}
-            
-            .chart-image {{
-                width: 100%;
-                height: auto;
-                margin: 15px 0;
-                text-align: center;
-                page-break-inside: avoid;
-            }}
-            
-            .chart-image img {{
-                max-width: 100%;
-                height: auto;
-                border: 1px solid #e8ecf0;
-                border-radius: 4px;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            }}
-            
-            .message-cost {{
-                font-size: 12px;
-                color: #FFC107;
-                margin-top: 12px;
-                font-weight: 600;
-                text-align: {'left' if lang == 'ar' else 'right'};
-            }}
-            
-            .total-cost {{
-                text-align: {'left' if lang == 'ar' else 'right'};
-                font-size: 16px;
-                font-weight: 700;
-                color: #0A2756;
-                margin-top: 30px;
-                margin-bottom: 30px;
-                padding: 15px;
-                background: #f0f8f5;
-                border-radius: 4px;
-                page-break-inside: avoid;
-            }}
-            
-            .footer {{
-                margin-top: 40px;
-                padding-top: 20px;
-                border-top: 2px solid #0A2756;
-                text-align: center;
-                font-size: 12px;
-                color: #666;
-                page-break-inside: avoid;
-            }}
-            
-            .response-section, .response-title, .response-text, .response-list {{
-                margin-bottom: 10px;
-            }}
-            
-            .response-title {{
-                font-size: 15px;
-                font-weight: 700;
-                color: #0A2756;
-                margin-bottom: 8px;
-            }}
-            
-            .response-text {{
-                font-size: 14px;
-                line-height: 1.8;
-                margin-bottom: 8px;
-            }}
-            
-            .response-list {{
-                padding-{'right' if lang == 'ar' else 'left'}: 20px;
-            }}
-            
-            .response-list li {{
-                margin-bottom: 6px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>{"تقرير الاستشارة" if lang == 'ar' else 'Consultation Report'}</h1>
-            <div class="header-meta">
-                <div><strong>{"الموضوع:" if lang == 'ar' else 'Topic:'}</strong> {chat_session.domain}</div>
-                <div><strong>{"رقم الجلسة:" if lang == 'ar' else 'Session #:'}</strong> {chat_session.id}</div>
-                <div><strong>{"عدد الرسائل:" if lang == 'ar' else 'Messages:'}</strong> {len(messages)}</div>
-                <div><strong>{"التاريخ:" if lang == 'ar' else 'Date:'}</strong> {datetime.now().strftime("%Y-%m-%d %H:%M")}</div>
-            </div>
-        </div>
-        
-        <div class="messages-container">
-    """
-    
-    for idx, msg in enumerate(messages):
-        content = msg.get('content', '')
-        
-        # Format assistant messages with professional HTML styling
-        if msg.get('role') == 'assistant':
-            # Use format_response_html to convert to professional HTML
-            display_content = format_response_html(content)
-        else:
-            # For user messages, escape HTML
-            display_content = (content.replace('&', '&amp;')
-                                     .replace('<', '&lt;')
-                                     .replace('>', '&gt;'))
-            display_content = display_content.replace('\n', '<br>')
-        
-        cost_html = f"<div class='message-cost'>💰 ${msg.get('cost', 0):.4f}</div>" if msg.get('cost') else ""
-        role_label = "المستخدم" if lang == 'ar' else "User" if msg.get('role') == 'user' else "المساعد" if lang == 'ar' else "Assistant"
-        
-        html_content += f"""
-        <div class="message {msg.get('role', 'user')}">
-            <div class="message-role">{role_label}</div>
-            <div class="message-content">{display_content}</div>
-            {cost_html}
-        </div>
-        """
-        
-        # Add chart image if available
-        chart_key = f"chart-{idx}"
-        if chart_key in chart_images:
-            html_content += f"""
-            <div class="chart-image">
-                <img src="{chart_images[chart_key]}" alt="Chart" />
-            </div>
-            """
-    
-    html_content += f"""
-        </div>
-        
-        <div class="total-cost">
-            {"التكلفة الإجمالية:" if lang == 'ar' else 'Total Cost:'} ${total_cost:.4f}
-        </div>
-        
-        <div class="footer">
-            <p>{"تم إنشاء هذا التقرير بواسطة منصة Mcidia" if lang == 'ar' else 'Generated by Mcidia Platform'}</p>
-            <p style="font-size: 11px; color: #999; margin-top: 8px;">{"هذا الملف يحتوي على معلومات سرية" if lang == 'ar' else 'This file contains confidential information'}</p>
-        </div>
-    </body>
-    </html>
-    """
+    messages = chat_session.get_messages()
+    
+    def build_html():
+        # Messages are formatted once and kept as fragments; a re-export only formats new ones
+        fragments = cached_fragments(
+            db.session, 'chat_session', chat_session.id,
+            [(m.get('role', 'user'), m.get('content', '')) for m in messages],
+            _format_message
+        )
+        total_cost = sum(m.get('cost', 0) for m in messages if m.get('role') == 'assistant')
+        # Charts are stored with their message and drawn on the server
+        chart_images = [[chart_image_uri(chart) for chart in stored_charts(m)] for m in messages]
+        return render_report(
+            'consultation_session', {'lang': lang},
+            chat_session=chat_session, messages=messages, fragments=fragments,
+            chart_images=chart_images, total_cost=total_cost, lang=lang,
+            generated_at=datetime.now()
+        )
     
     try:
-        # Generate PDF using WeasyPrint
-        pdf = HTML(string=html_content).write_pdf()
-        
-        # Create BytesIO object
-        pdf_io = BytesIO(pdf)
-        pdf_io.seek(0)
-        
-        filename = f"consultation_{chat_session.id}_{int(time.time())}.pdf"
-        
-        return send_file(
-            pdf_io,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+        # Rendered on the PDF pool; unchanged sessions are served from the cache
+        return pdf_response('consultation', chat_session.id, chat_session.updated_at, lang,
+                            build_html, f"consultation_{chat_session.id}.pdf", user_id)
     except Exception as e:
         current_app.logger.error(f"PDF export error: {str(e)}")
         return jsonify({'error': f'Failed to generate PDF: {str(e)}'}), 500
@@ -1,26 +1,24 @@
-from flask import Blueprint, render_template, session, current_app, redirect, url_for, jsonify, request, flash, abort, make_response
+from flask import Blueprint, render_template, session, current_app, redirect, url_for, jsonify, request, flash, abort
 from flask_jwt_extended import get_jwt_identity
-from utils.decorators import login_required
+from utils.decorators import login_required, load_user
 from models import User, Project, AILog, Transaction, Service, ServiceOffering, ChatSession
-try:
-    from weasyprint import HTML
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    HTML = None
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from io import BytesIO
+from utils.pdf_renderer import WEASYPRINT_AVAILABLE
+from utils.pdf_jobs import pdf_response
+from utils.report_renderer import project_report, delete_fragments
+from utils.excel_report import project_workbook
+from utils.projects import project_services as resolve_project_services
+from utils.query_budget import query_budget
 import json
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/')
 @login_required
+@query_budget(10)
 def index():
     db = current_app.extensions['sqlalchemy']
     user_id = int(get_jwt_identity())
-    user = db.session.query(User).get(user_id)
+    user = load_user(db.session, user_id)
     
     # Get statistics
     total_projects = db.session.query(Project).filter_by(user_id=user_id).count()
@@ -34,24 +32,8 @@ def index():
     # Get recent AI logs
     recent_ai_activity = db.session.query(AILog).filter_by(user_id=user_id).order_by(AILog.created_at.desc()).limit(5).all()
     
-    # Build service info map for projects
-    project_services = {}
-    for project in recent_projects:
-        if project.module and '_' in project.module:
-            parts = project.module.split('_', 1)
-            if len(parts) == 2:
-                service_slug, offering_slug = parts
-                service = db.session.query(Service).filter_by(slug=service_slug).first()
-                if service:
-                    offering = db.session.query(ServiceOffering).filter_by(
-                        service_id=service.id,
-                        slug=offering_slug
-                    ).first()
-                    if offering:
-                        project_services[project.id] = {
-                            'service': service,
-                            'offering': offering
-                        }
+    # Build service info map for projects (two queries for the whole list)
+    project_services = resolve_project_services(db.session, recent_projects)
     
     # Get all active services for dashboard display
     all_services = db.session.query(Service).filter_by(is_active=True).order_by(Service.display_order).limit(8).all()
@@ -72,11 +54,12 @@ def index():
 
 @dashboard_bp.route('/projects')
 @login_required
+@query_budget(10)
 def all_projects():
     """View all projects with pagination and filters"""
     db = current_app.extensions['sqlalchemy']
     user_id = int(get_jwt_identity())
-    user = db.session.query(User).get(user_id)
+    user = load_user(db.session, user_id)
     
     # Pagination
     page = session.get('projects_page', 1) if isinstance(session.get('projects_page'), int) else 1
@@ -86,24 +69,8 @@ def all_projects():
     projects_query = db.session.query(Project).filter_by(user_id=user_id).order_by(Project.updated_at.desc())
     projects_paginated = projects_query.paginate(page=page, per_page=per_page, error_out=False)
     
-    # Build service info map for all projects
-    project_services = {}
-    for project in projects_paginated.items:
-        if project.module and '_' in project.module:
-            parts = project.module.split('_', 1)
-            if len(parts) == 2:
-                service_slug, offering_slug = parts
-                service = db.session.query(Service).filter_by(slug=service_slug).first()
-                if service:
-                    offering = db.session.query(ServiceOffering).filter_by(
-                        service_id=service.id,
-                        slug=offering_slug
-                    ).first()
-                    if offering:
-                        project_services[project.id] = {
-                            'service': service,
-                            'offering': offering
-                        }
+    # Build service info map for all projects (two queries for the whole page)
+    project_services = resolve_project_services(db.session, projects_paginated.items)
     
     # Get statistics
     total_projects = projects_query.count()
@@ -218,6 +185,7 @@ def delete_project(project_id):
         return jsonify({'error': 'Project not found'}), 404
     
     try:
+        delete_fragments(db.session, 'project', project.id)
         db.session.delete(project)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Project deleted successfully'})
@@ -245,54 +213,19 @@ def export_project_pdf(project_id):
     if project.user_id != int(user_id):
         abort(403)  # Forbidden
     
-    # Parse project content
-    project_data = {}
-    try:
-        project_data = json.loads(project.content) if project.content else {}
-    except:
-        project_data = {'input': {}, 'output': ''}
-    
-    # Get service and offering info
-    service = None
-    offering = None
-    if project.module and '_' in project.module:
-        parts = project.module.split('_', 1)
-        if len(parts) == 2:
-            service_slug, offering_slug = parts
-            service = db.session.query(Service).filter_by(slug=service_slug).first()
-            if service:
-                offering = db.session.query(ServiceOffering).filter_by(
-                    service_id=service.id,
-                    slug=offering_slug
-                ).first()
+    if not WEASYPRINT_AVAILABLE:
+        flash("تصدير PDF غير متاح حالياً على هذا الخادم (نقص في مكتبات النظام).", "warning")
+        return redirect(url_for('dashboard.project_view', project_id=project_id))
     
     try:
-        # Generate HTML for PDF
-        html_content = _generate_project_html(project, service, offering, project_data, lang)
-        
-        # Convert to PDF using WeasyPrint
-        if WEASYPRINT_AVAILABLE:
-            try:
-                pdf_file = HTML(string=html_content).write_pdf()
-                
-                # Create response
-                response = make_response(pdf_file)
-                response.headers['Content-Type'] = 'application/pdf'
-                filename = f"consultation_{project_id}.pdf"
-                response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-                
-                return response
-            except Exception as e:
-                current_app.logger.error(f"PDF generation error: {str(e)}")
-                flash("حدث خطأ أثناء إنشاء ملف PDF (نقص في مكتبات النظام).", "danger")
-                return redirect(url_for('dashboard.project_view', project_id=project_id))
-        else:
-            flash("تصدير PDF غير متاح حالياً على هذا الخادم (نقص في مكتبات النظام).", "warning")
-            return redirect(url_for('dashboard.project_view', project_id=project_id))
-        
+        # Rendered on the PDF pool; unchanged projects are served from the cache
+        return pdf_response('project', project_id, project.updated_at, lang,
+                            lambda: project_report(db.session, project, lang),
+                            f"consultation_{project_id}.pdf", int(user_id))
     except Exception as e:
-        current_app.logger.error(f"PDF export error: {str(e)}")
-        abort(500)
+        current_app.logger.error(f"PDF generation error: {str(e)}")
+        flash("حدث خطأ أثناء إنشاء ملف PDF (نقص في مكتبات النظام).", "danger")
+        return redirect(url_for('dashboard.project_view', project_id=project_id))
 
 @dashboard_bp.route('/api/project/<int:project_id>/export-excel')
 @login_required
@@ -314,193 +247,8 @@ def export_project_excel(project_id):
     if project.user_id != int(user_id):
         abort(403)  # Forbidden
     
-    # Parse project content
-    project_data = {}
     try:
-        project_data = json.loads(project.content) if project.content else {}
-    except:
-        project_data = {'input': {}, 'output': ''}
-    
-    # Get service and offering info
-    service = None
-    offering = None
-    if project.module and '_' in project.module:
-        parts = project.module.split('_', 1)
-        if len(parts) == 2:
-            service_slug, offering_slug = parts
-            service = db.session.query(Service).filter_by(slug=service_slug).first()
-            if service:
-                offering = db.session.query(ServiceOffering).filter_by(
-                    service_id=service.id,
-                    slug=offering_slug
-                ).first()
-    
-    try:
-        from utils.markdown_formatter import extract_sections_from_markdown, clean_markdown_for_excel
-        
-        # Create workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "الاستشارة" if lang == 'ar' else "Consultation"
-        ws.sheet_view.rightToLeft = (lang == 'ar')
-        
-        # Get service color
-        service_color = service.color.replace('#', '') if service and service.color else '1e3a8a'
-        
-        # Define professional styles
-        title_fill = PatternFill(start_color=service_color, end_color=service_color, fill_type="solid")
-        title_font = Font(name='Arial', size=18, bold=True, color="FFFFFF")
-        
-        header_fill = PatternFill(start_color=service_color, end_color=service_color, fill_type="solid")
-        header_font = Font(name='Arial', size=14, bold=True, color="FFFFFF")
-        
-        section_fill = PatternFill(start_color="e2e8f0", end_color="e2e8f0", fill_type="solid")
-        section_font = Font(name='Arial', size=12, bold=True, color="2c5282")
-        
-        key_fill = PatternFill(start_color="f7fafc", end_color="f7fafc", fill_type="solid")
-        key_font = Font(name='Arial', size=10, bold=True, color="2c5282")
-        value_font = Font(name='Arial', size=10)
-        
-        normal_font = Font(name='Arial', size=10)
-        rtl_alignment = Alignment(horizontal='right', vertical='top', wrap_text=True, readingOrder=2)
-        ltr_alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-        
-        row = 1
-        
-        # Title
-        ws[f'A{row}'] = project.title
-        ws[f'A{row}'].font = title_font
-        ws[f'A{row}'].fill = title_fill
-        ws[f'A{row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells(f'A{row}:E{row}')
-        ws.row_dimensions[row].height = 35
-        row += 1
-        
-        # Service info
-        if service and offering:
-            ws[f'A{row}'] = f"{service.title_ar if lang == 'ar' else service.title_en} - {offering.title_ar if lang == 'ar' else offering.title_en}"
-            ws[f'A{row}'].font = Font(name='Arial', size=11, color="4a5568")
-            ws[f'A{row}'].alignment = Alignment(horizontal='center')
-            ws.merge_cells(f'A{row}:E{row}')
-            row += 1
-        
-        # Date
-        ws[f'A{row}'] = f"{'التاريخ' if lang == 'ar' else 'Date'}: {project.created_at.strftime('%Y-%m-%d %H:%M')}"
-        ws[f'A{row}'].font = Font(name='Arial', size=10, color="718096")
-        ws[f'A{row}'].alignment = Alignment(horizontal='center')
-        ws.merge_cells(f'A{row}:E{row}')
-        row += 2
-        
-        # Input section header
-        ws[f'A{row}'] = "البيانات المدخلة" if lang == 'ar' else "Input Data"
-        ws[f'A{row}'].font = header_font
-        ws[f'A{row}'].fill = header_fill
-        ws[f'A{row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells(f'A{row}:E{row}')
-        ws.row_dimensions[row].height = 30
-        row += 1
-        
-        # Input data
-        input_data = project_data.get('input', {})
-        for key, value in input_data.items():
-            ws[f'A{row}'] = str(key).replace('_', ' ').title()
-            ws[f'A{row}'].font = key_font
-            ws[f'A{row}'].fill = key_fill
-            ws[f'A{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-            
-            ws[f'B{row}'] = str(value)
-            ws[f'B{row}'].font = value_font
-            ws[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-            ws.merge_cells(f'B{row}:E{row}')
-            ws.row_dimensions[row].height = 20
-            row += 1
-        
-        row += 1
-        
-        # Output section header
-        ws[f'A{row}'] = "نتيجة الاستشارة الذكية" if lang == 'ar' else "AI Consultation Result"
-        ws[f'A{row}'].font = header_font
-        ws[f'A{row}'].fill = header_fill
-        ws[f'A{row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells(f'A{row}:E{row}')
-        ws.row_dimensions[row].height = 30
-        row += 1
-        
-        # Output content with sections
-        output_text = project_data.get('output', '')
-        sections = extract_sections_from_markdown(output_text)
-        
-        if sections:
-            for section in sections:
-                # Section title
-                ws[f'A{row}'] = section['title']
-                ws[f'A{row}'].font = section_font
-                ws[f'A{row}'].fill = section_fill
-                ws[f'A{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                ws.merge_cells(f'A{row}:E{row}')
-                ws.row_dimensions[row].height = 25
-                row += 1
-                
-                # Section content
-                content = clean_markdown_for_excel(section['content'])
-                ws[f'A{row}'] = content
-                ws[f'A{row}'].font = normal_font
-                ws[f'A{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                ws.merge_cells(f'A{row}:E{row}')
-                
-                lines = content.count('\n') + 1
-                ws.row_dimensions[row].height = max(20, min(lines * 15, 200))
-                row += 2
-        else:
-            content = clean_markdown_for_excel(output_text)
-            ws[f'A{row}'] = content
-            ws[f'A{row}'].font = normal_font
-            ws[f'A{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-            ws.merge_cells(f'A{row}:E{row}')
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 60
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 15
-        
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Create response
-        response = make_response(output.read())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        filename = f"consultation_{project_id}.xlsx"
-        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
-        
+        return project_workbook(db.session, project, lang).response(f"consultation_{project_id}.xlsx")
     except Exception as e:
         current_app.logger.error(f"Excel export error: {str(e)}")
         abort(500)
-
-def _generate_project_html(project, service, offering, project_data, lang):
-    """Generate HTML for PDF export with professionally formatted consultation content"""
-    from utils.markdown_formatter import format_consultation_output
-    
-    input_data = project_data.get('input', {})
-    output_text = project_data.get('output', '')
-    
-    # Format Markdown to beautiful HTML with cards, grids, tables, stat boxes
-    formatted_output = format_consultation_output(output_text, lang)
-    
-    # Render the professional export template
-    html = render_template(
-        'exports/project_export.html',
-        project=project,
-        service=service,
-        offering=offering,
-        input_data=input_data,
-        formatted_output=formatted_output,
-        lang=lang
-    )
-    
-    return html
@@ -1,22 +1,33 @@
-from flask import Blueprint, render_template, session, request, jsonify, current_app, send_file, Response
+from flask import Blueprint, render_template, session, request, jsonify, current_app, send_file, Response, url_for, stream_with_context
 from utils.decorators import login_required
-from models import db, HREmployee, HRAttendance, HRPayroll, HRPerformance, HRDataImport, ERPIntegration, TerminationRecord, Organization, User, HRAnalysisReport
+from sqlalchemy.orm import defer
+from models import db, HREmployee, HRAttendance, HRPayroll, HRPerformance, HRDataImport, ERPIntegration, TerminationRecord, Organization, User, HRAnalysisReport, PurgeJob
 from datetime import datetime
 import json
 import csv
 import io
 import os
+import time
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from utils.excel_report import ExcelReport
 from utils.object_storage import ObjectStorageService
+from utils.import_staging import ImportStage, delete_stages, cleanup_expired_stages
+from utils.hr_import_jobs import enqueue_import, requeue_stale_imports, import_progress
+from utils.import_readers import read_into_stage
+from utils.hr_analytics import get_hr_analytics
+from utils.hr_kpis import get_data_status
+from utils.tenant_purge import start_purge, active_purge, requeue_stale_purges
+from utils.erp_sync import start_erp_sync, sync_running, sync_progress, requeue_stale_syncs
+from utils.query_budget import query_budget
 
 hr_bp = Blueprint('hr', __name__)
 
+IMPORT_EVENTS_MAX_SECONDS = 600
+
 def get_db_session():
     """Get database session from current app"""
     return current_app.extensions['sqlalchemy'].session
@@ -48,16 +59,14 @@ def index():
         # Use user_id as organization_id if no organization is linked
         org_id = user.organization_id if user.organization_id else user.id
         
-        employees_count = db_session.query(HREmployee).filter_by(organization_id=org_id).count()
-        attendance_count = db_session.query(HRAttendance).filter_by(organization_id=org_id).count()
-        performance_count = db_session.query(HRPerformance).filter_by(organization_id=org_id).count()
-        payroll_count = db_session.query(HRPayroll).filter_by(organization_id=org_id).count()
-        resignations_count = db_session.query(TerminationRecord).filter_by(organization_id=org_id).count()
+        counts = get_data_status(org_id)
+        employees_count = counts['employees']['count']
+        attendance_count = counts['attendance']['count']
+        performance_count = counts['performance']['count']
+        payroll_count = counts['payroll']['count']
+        resignations_count = counts['resignations']['count']
         
         erp_integration = db_session.query(ERPIntegration).filter_by(organization_id=org_id, is_active=True).first()
-        
-        last_imports = db_session.query(HRDataImport).filter_by(organization_id=org_id)\
-            .order_by(HRDataImport.created_at.desc()).limit(5).all()
     except Exception as e:
         db_session = get_db_session()
         db_session.rollback()
@@ -72,10 +81,11 @@ def index():
         }
         return render_template('hr/index.html', lang=lang, data_status=empty_data_status, has_org=False)
     
-    import_dates = {}
-    for imp in last_imports:
-        if imp.file_type not in import_dates or (imp.status == 'completed' and imp.completed_at):
-            import_dates[imp.file_type] = imp.completed_at or imp.created_at
+    import_dates = {
+        file_type: status['last_completed'] or status['last_imported']
+        for file_type, status in counts.items()
+        if status['last_completed'] or status['last_imported']
+    }
     
     data_status = {
         'employees': {
@@ -138,23 +148,18 @@ def api_data_status():
         
         org_id = user.organization_id if user.organization_id else user.id
         
-        # Get counts
-        employees_count = db_session.query(HREmployee).filter_by(organization_id=org_id).count()
-        attendance_count = db_session.query(HRAttendance).filter_by(organization_id=org_id).count()
-        performance_count = db_session.query(HRPerformance).filter_by(organization_id=org_id).count()
-        payroll_count = db_session.query(HRPayroll).filter_by(organization_id=org_id).count()
-        resignations_count = db_session.query(TerminationRecord).filter_by(organization_id=org_id).count()
-        
-        # Get last imports for dates
-        last_imports = db_session.query(HRDataImport).filter_by(
-            organization_id=org_id,
-            status='completed'
-        ).order_by(HRDataImport.completed_at.desc()).all()
-        
-        import_dates = {}
-        for imp in last_imports:
-            if imp.file_type not in import_dates:
-                import_dates[imp.file_type] = imp.completed_at.isoformat() if imp.completed_at else None
+        # Counts and last completed import per data type (cached per org)
+        counts = get_data_status(org_id)
+        employees_count = counts['employees']['count']
+        attendance_count = counts['attendance']['count']
+        performance_count = counts['performance']['count']
+        payroll_count = counts['payroll']['count']
+        resignations_count = counts['resignations']['count']
+        
+        import_dates = {
+            file_type: status['last_completed'].isoformat()
+            for file_type, status in counts.items() if status['last_completed']
+        }
         
         return jsonify({
             'success': True,
@@ -218,45 +223,24 @@ def import_data():
     if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
         return jsonify({'error': 'Invalid file format. Please upload CSV or Excel file'}), 400
     
+    import_record = None
     try:
-        headers = []
-        sample_rows = []
-        all_rows = []
-        total_rows = 0
-        file_content = None
+        # Create the import record first so parsed rows can be staged under its id
+        import_record = HRDataImport(
+            organization_id=org_id,
+            file_type=file_type,
+            file_name=file.filename,
+            status='pending',
+            imported_by=user_id
+        )
+        db_session.add(import_record)
+        db_session.flush()
         
-        if file.filename.endswith('.csv'):
-            file_content = file.read()
-            content = file_content.decode('utf-8')
-            lines = content.strip().split('\n')
-            reader = csv.DictReader(lines)
-            
-            headers = reader.fieldnames
-            for i, row in enumerate(reader):
-                all_rows.append(row)
-                if i < 3:
-                    sample_rows.append(row)
-            total_rows = len(lines) - 1
-        else:
-            from openpyxl import load_workbook
-            file_content = file.read()
-            wb = load_workbook(filename=io.BytesIO(file_content), read_only=True)
-            ws = wb.active
-            
-            rows_list = list(ws.iter_rows(values_only=True))
-            if rows_list:
-                headers = [str(h) if h else f'Column_{i}' for i, h in enumerate(rows_list[0])]
-                total_rows = len(rows_list) - 1
-                
-                for idx, row in enumerate(rows_list[1:]):
-                    row_dict = {}
-                    for i, val in enumerate(row):
-                        if i < len(headers):
-                            row_dict[headers[i]] = str(val) if val is not None else ''
-                    all_rows.append(row_dict)
-                    if idx < 3:
-                        sample_rows.append(row_dict)
-            wb.close()
+        # Stream the upload into the staging store (constant memory)
+        cleanup_expired_stages()
+        stage = ImportStage.create(import_record.id, [], file_type)
+        headers, sample_rows = read_into_stage(file.stream, file.filename, stage)
+        total_rows = stage.total_rows
         
         # Try to upload file to object storage
         storage_service = ObjectStorageService()
@@ -266,35 +250,16 @@ def import_data():
         # Attempt storage upload (may fail if Object Storage unavailable)
         if storage_service.client:
             try:
-                storage_path = storage_service.upload_file(file_content, file.filename, content_type)
+                storage_path = storage_service.upload_stream(file.stream, file.filename, content_type)
             except Exception as e:
                 print(f"Warning: Object Storage upload failed: {e}")
                 storage_path = None
         
-        # Create import record with or without storage path
-        # If storage upload fails, we'll use session as fallback
-        import_record = HRDataImport(
-            organization_id=org_id,
-            file_type=file_type,
-            file_name=file.filename,
-            file_storage_path=storage_path,  # May be None if storage unavailable
-            status='pending',
-            imported_by=user_id,
-            records_total=total_rows
-        )
-        db_session.add(import_record)
+        # Storage path may be None if storage is unavailable; the staged rows are the fallback
+        import_record.file_storage_path = storage_path
+        import_record.records_total = total_rows
         db_session.commit()
         
-        # Store file content in session for later processing
-        if 'file_imports' not in session:
-            session['file_imports'] = {}
-        session['file_imports'][str(import_record.id)] = {
-            'all_rows': all_rows,
-            'headers': list(headers) if headers else [],
-            'file_type': file_type
-        }
-        session.modified = True
-        
         return jsonify({
             'success': True,
             'import_id': import_record.id,
@@ -308,6 +273,8 @@ def import_data():
             db_session.rollback()
         except:
             pass
+        if import_record is not None and import_record.id:
+            delete_stages([import_record.id])
         return jsonify({'error': str(e)}), 500
 
 
@@ -332,7 +299,6 @@ def map_columns(import_id):
         mapping = request.json.get('mapping', {})
         
         import_record.column_mapping = json.dumps(mapping)
-        import_record.status = 'processing'
         db_session.commit()
     except Exception as e:
         db_session = get_db_session()
@@ -349,7 +315,7 @@ def map_columns(import_id):
 @hr_bp.route('/api/import/<int:import_id>/process', methods=['POST'])
 @login_required
 def process_import(import_id):
-    """Process the mapped import data"""
+    """Queue the mapped import for background processing"""
     try:
         user_id = session.get('user_id')
         db_session = get_db_session()
@@ -365,98 +331,31 @@ def process_import(import_id):
         if not import_record or import_record.organization_id != org_id:
             return jsonify({'error': 'Import record not found'}), 404
         
-        mapping = json.loads(import_record.column_mapping) if import_record.column_mapping else {}
-        file_type = import_record.file_type
+        if import_record.status in ('queued', 'processing'):
+            return jsonify({'error': 'Import is already being processed'}), 409
         
-        imported = 0
-        failed = 0
-        errors = []
+        # Processing again would insert the attendance/payroll/performance rows a second time
+        if import_record.status == 'completed':
+            return jsonify({'error': 'Import has already been processed. Upload the file again to re-import.'}), 409
         
-        # Read file data from session storage
-        file_data = session.get('file_imports', {}).get(str(import_id), {})
-        all_rows = file_data.get('all_rows', [])
-        headers = file_data.get('headers', [])
+        if not ImportStage.open(import_id):
+            return jsonify({'error': 'File data not available. Please re-import.'}), 404
         
-        # Process each row based on file type and mapping
-        for idx, row_data in enumerate(all_rows):
-            try:
-                if file_type == 'employees':
-                    # Get values from mapped columns or use raw data
-                    emp_num = row_data.get(mapping.get('employee_number', 'employee_number')) or row_data.get('employee_number') or f'EMP_{org_id}_{idx+1}'
-                    if not emp_num or emp_num == '':
-                        emp_num = f'EMP_{org_id}_{idx+1}'
-                    
-                    emp = HREmployee(
-                        organization_id=org_id,
-                        employee_number=str(emp_num).strip(),
-                        full_name=row_data.get(mapping.get('full_name', 'full_name')) or row_data.get('full_name') or 'Employee',
-                        department=row_data.get(mapping.get('department', 'department')) or row_data.get('department') or 'General',
-                        job_title=row_data.get(mapping.get('job_title', 'job_title')) or row_data.get('job_title') or 'Staff',
-                        hire_date=datetime.utcnow(),
-                        base_salary=float(row_data.get(mapping.get('base_salary', 'base_salary')) or row_data.get('base_salary') or 0),
-                        status='active'
-                    )
-                    db_session.add(emp)
-                    imported += 1
-                elif file_type == 'attendance':
-                    att = HRAttendance(
-                        organization_id=org_id,
-                        employee_number=row_data.get(mapping.get('employee_number', 'employee_number'), 'EMP001'),
-                        date=datetime.utcnow().date(),
-                        check_in=datetime.utcnow(),
-                        check_out=datetime.utcnow(),
-                        status=row_data.get(mapping.get('status', 'status'), 'present')
-                    )
-                    db_session.add(att)
-                    imported += 1
-                elif file_type == 'performance':
-                    perf = HRPerformance(
-                        organization_id=org_id,
-                        employee_number=row_data.get(mapping.get('employee_number', 'employee_number'), 'EMP001'),
-                        review_period=row_data.get(mapping.get('review_period', 'review_period'), '2024-Q4'),
-                        review_date=datetime.utcnow(),
-                        overall_rating=float(row_data.get(mapping.get('overall_rating', 'overall_rating'), 4) or 4)
-                    )
-                    db_session.add(perf)
-                    imported += 1
-                elif file_type == 'payroll':
-                    payroll = HRPayroll(
-                        organization_id=org_id,
-                        employee_number=row_data.get(mapping.get('employee_number', 'employee_number'), 'EMP001'),
-                        month=int(row_data.get(mapping.get('month', 'month'), 12) or 12),
-                        year=int(row_data.get(mapping.get('year', 'year'), 2024) or 2024),
-                        base_salary=float(row_data.get(mapping.get('base_salary', 'base_salary'), 0) or 0),
-                        net_salary=float(row_data.get(mapping.get('net_salary', 'net_salary'), 0) or 0)
-                    )
-                    db_session.add(payroll)
-                    imported += 1
-                elif file_type == 'resignations':
-                    term = TerminationRecord(
-                        organization_id=org_id,
-                        employee_number=row_data.get(mapping.get('employee_number', 'employee_number'), 'EMP999'),
-                        employee_name=row_data.get(mapping.get('employee_name', 'employee_name'), 'Employee'),
-                        termination_type=row_data.get(mapping.get('termination_type', 'termination_type'), 'resignation'),
-                        termination_date=datetime.utcnow().date()
-                    )
-                    db_session.add(term)
-                    imported += 1
-            except Exception as e:
-                failed += 1
-                errors.append(f"Row error: {str(e)}")
-        
-        import_record.status = 'completed'
-        import_record.records_imported = imported
-        import_record.records_failed = failed
-        import_record.error_log = json.dumps(errors) if errors else None
-        import_record.completed_at = datetime.utcnow()
-        db_session.commit()
+        # The mapping may be sent here directly instead of through /map
+        mapping = (request.get_json(silent=True) or {}).get('mapping')
+        if mapping is not None:
+            import_record.column_mapping = json.dumps(mapping)
+        
+        # A failed import resumes after its last committed row
+        enqueue_import(db_session, import_record)
         
         return jsonify({
             'success': True,
-            'imported': imported,
-            'failed': failed,
-            'errors': errors[:10]
-        })
+            'import_id': import_id,
+            'status': 'queued',
+            'progress_url': url_for('hr.import_progress_status', import_id=import_id),
+            'events_url': url_for('hr.import_progress_events', import_id=import_id)
+        }), 202
     except Exception as e:
         db_session = get_db_session()
         try:
@@ -466,6 +365,57 @@ def process_import(import_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _get_org_import(db_session, import_id):
+    user = db_session.get(User, session.get('user_id'))
+    if not user:
+        return None
+    org_id = user.organization_id if user.organization_id else user.id
+    return db_session.query(HRDataImport).filter_by(id=import_id, organization_id=org_id).first()
+
+
+@hr_bp.route('/api/import/<int:import_id>/progress')
+@login_required
+def import_progress_status(import_id):
+    """Poll the progress of a background import"""
+    db_session = get_db_session()
+    db_session.rollback()
+    import_record = _get_org_import(db_session, import_id)
+    if not import_record:
+        return jsonify({'error': 'Import record not found'}), 404
+    
+    # Pick the import up again if its worker died
+    requeue_stale_imports(db_session, import_id=import_id)
+    
+    return jsonify({'success': True, **import_progress(import_record)})
+
+
+@hr_bp.route('/api/import/<int:import_id>/events')
+@login_required
+def import_progress_events(import_id):
+    """Server-sent events stream of import progress (ends when the import finishes)"""
+    db_session = get_db_session()
+    db_session.rollback()
+    if not _get_org_import(db_session, import_id):
+        return jsonify({'error': 'Import record not found'}), 404
+    
+    def generate():
+        last = None
+        deadline = time.time() + IMPORT_EVENTS_MAX_SECONDS
+        while time.time() < deadline:
+            db_session.rollback()
+            import_record = db_session.get(HRDataImport, import_id)
+            progress = import_progress(import_record)
+            if progress != last:
+                yield f"data: {json.dumps(progress)}\n\n"
+                last = progress
+            if progress['done']:
+                return
+            time.sleep(1)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @hr_bp.route('/api/erp/connect', methods=['POST'])
 @login_required
 def connect_erp():
@@ -565,7 +515,7 @@ def disconnect_erp():
 @hr_bp.route('/api/erp/sync', methods=['POST'])
 @login_required  
 def sync_erp():
-    """Trigger ERP data sync"""
+    """Trigger ERP data sync (runs in the background)"""
     try:
         user_id = session.get('user_id')
         db_session = get_db_session()
@@ -584,16 +534,21 @@ def sync_erp():
         if not integration:
             return jsonify({'error': 'No active ERP integration'}), 400
         
-        integration.last_sync_at = datetime.utcnow()
-        integration.last_sync_status = 'success'
-        integration.last_sync_message = 'Data synchronized successfully'
-        db_session.commit()
+        if sync_running(integration) or integration.last_sync_status == 'queued':
+            return jsonify({
+                'error': 'جاري مزامنة البيانات بالفعل / A sync is already running',
+                'progress_url': url_for('hr.sync_erp_status')
+            }), 409
+        
+        # ?full=1 ignores the watermarks and pulls everything again
+        full = request.args.get('full') == '1' or bool((request.get_json(silent=True) or {}).get('full'))
+        start_erp_sync(db_session, integration, full=full)
         
         return jsonify({
             'success': True,
-            'message': 'Data synchronized successfully',
-            'synced_at': integration.last_sync_at.isoformat()
-        })
+            'message': 'جاري مزامنة البيانات / Data sync started',
+            'progress_url': url_for('hr.sync_erp_status')
+        }), 202
     except Exception as e:
         db_session = get_db_session()
         try:
@@ -603,6 +558,27 @@ def sync_erp():
         return jsonify({'error': str(e)}), 500
 
 
+@hr_bp.route('/api/erp/sync/status')
+@login_required
+def sync_erp_status():
+    """Poll the organization's ERP sync"""
+    db_session = get_db_session()
+    db_session.rollback()
+    user = db_session.get(User, session.get('user_id'))
+    if not user:
+        return jsonify({'error': 'User not found'}), 400
+    
+    org_id = user.organization_id if user.organization_id else user.id
+    integration = db_session.query(ERPIntegration).filter_by(organization_id=org_id).first()
+    if not integration:
+        return jsonify({'error': 'No ERP integration'}), 404
+    
+    # Pick the sync up again if its worker died
+    requeue_stale_syncs(db_session, integration_id=integration.id)
+    
+    return jsonify({'success': True, **sync_progress(integration)})
+
+
 @hr_bp.route('/api/employees')
 @login_required
 def get_employees_list():
@@ -650,69 +626,41 @@ def get_hr_stats():
         
         org_id = user.organization_id if user.organization_id else user.id
         
-        # Get employee stats
-        employees = db_session.query(HREmployee).filter_by(organization_id=org_id).all()
-        total_employees = len(employees)
+        force_refresh = request.args.get('refresh') == '1'
+        stats = dict(get_hr_analytics(org_id, force_refresh=force_refresh))
         
-        # Department breakdown
-        from sqlalchemy import func
-        dept_query = db_session.query(
-            HREmployee.department,
-            func.count(HREmployee.id).label('count')
-        ).filter_by(organization_id=org_id).group_by(HREmployee.department).all()
+        # Employee rows only on request, one page at a time
+        if request.args.get('include') == 'employees':
+            page = max(request.args.get('page', 1, type=int), 1)
+            per_page = max(1, min(request.args.get('per_page', 100, type=int), 500))
+            stats['employees_detail'] = employee_rows(db_session, org_id, limit=per_page,
+                                                      offset=(page - 1) * per_page)
+            stats['page'] = page
+            stats['per_page'] = per_page
         
-        departments = {d[0]: d[1] for d in dept_query}
-        
-        # Job title breakdown
-        job_query = db_session.query(
-            HREmployee.job_title,
-            func.count(HREmployee.id).label('count')
-        ).filter_by(organization_id=org_id).group_by(HREmployee.job_title).all()
-        
-        job_titles = {j[0]: j[1] for j in job_query}
-        
-        # Status breakdown
-        active_count = db_session.query(HREmployee).filter_by(organization_id=org_id, status='active').count()
-        inactive_count = db_session.query(HREmployee).filter_by(organization_id=org_id, status='inactive').count()
-        
-        # Salary stats
-        salary_query = db_session.query(
-            func.sum(HREmployee.base_salary),
-            func.avg(HREmployee.base_salary),
-            func.max(HREmployee.base_salary),
-            func.min(HREmployee.base_salary)
-        ).filter_by(organization_id=org_id).first()
-        
-        total_salary, avg_salary, max_salary, min_salary = salary_query
-        
-        return jsonify({
-            'success': True,
-            'total_employees': total_employees,
-            'active_employees': active_count,
-            'inactive_employees': inactive_count,
-            'departments': departments,
-            'job_titles': job_titles,
-            'salary_stats': {
-                'total': float(total_salary or 0),
-                'average': float(avg_salary or 0),
-                'max': float(max_salary or 0),
-                'min': float(min_salary or 0)
-            },
-            'employees_detail': [
-                {
-                    'employee_number': e.employee_number,
-                    'full_name': e.full_name,
-                    'department': e.department,
-                    'job_title': e.job_title,
-                    'base_salary': float(e.base_salary or 0),
-                    'status': e.status
-                } for e in employees
-            ]
-        })
+        return jsonify({'success': True, **stats})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def employee_rows(db_session, org_id, limit=20, offset=0):
+    """Employee list rows for the analytics page / API (columns only, no ORM objects)"""
+    rows = db_session.query(
+        HREmployee.employee_number, HREmployee.full_name, HREmployee.department,
+        HREmployee.job_title, HREmployee.base_salary, HREmployee.status
+    ).filter(HREmployee.organization_id == org_id).order_by(HREmployee.id).limit(limit).offset(offset).all()
+    return [
+        {
+            'employee_number': r.employee_number,
+            'full_name': r.full_name,
+            'department': r.department,
+            'job_title': r.job_title,
+            'base_salary': float(r.base_salary or 0),
+            'status': r.status
+        } for r in rows
+    ]
+
+
 @hr_bp.route('/template/<file_type>')
 @login_required
 def download_template(file_type):
@@ -817,6 +765,7 @@ def save_analysis():
 
 @hr_bp.route('/api/analysis-reports')
 @login_required
+@query_budget(3)
 def get_analysis_reports():
     """Get all analysis reports"""
     db_session = get_db_session()
@@ -829,7 +778,10 @@ def get_analysis_reports():
             return jsonify({'error': 'User not found'}), 401
         
         org_id = user.organization_id if user.organization_id else user.id
-        reports = db_session.query(HRAnalysisReport).filter_by(organization_id=org_id).order_by(HRAnalysisReport.created_at.desc()).all()
+        # The per-employee detail is only needed by the exports, not the list
+        reports = db_session.query(HRAnalysisReport).filter_by(organization_id=org_id).options(
+            defer(HRAnalysisReport.employees_detail)
+        ).order_by(HRAnalysisReport.created_at.desc()).all()
         
         reports_data = []
         for r in reports:
@@ -944,67 +896,34 @@ def export_analysis_excel(report_id):
         if not report:
             return jsonify({'error': 'Report not found'}), 404
         
-        wb = Workbook()
+        report_book = ExcelReport('en', accent='0d6efd')
         
         # Summary sheet
-        ws = wb.active
-        ws.title = 'Summary'
-        header_fill = PatternFill(start_color='0d6efd', end_color='0d6efd', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF')
-        
-        ws['A1'] = 'HR Analysis Report'
-        ws['A1'].font = Font(size=16, bold=True)
-        ws['A2'] = f'Generated: {report.created_at.strftime("%Y-%m-%d %H:%M")}'
-        
-        headers = ['Metric', 'Value']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-        
-        data = [
+        ws = report_book.sheet('Summary')
+        ws.row(['HR Analysis Report'], 'title')
+        ws.row([f'Generated: {report.created_at.strftime("%Y-%m-%d %H:%M")}'])
+        ws.skip()
+        ws.row(['Metric', 'Value'], 'header')
+        ws.rows([
             ['Total Employees', report.total_employees],
             ['Active Employees', report.active_employees],
             ['Inactive Employees', report.inactive_employees],
             ['Average Salary', report.avg_salary],
             ['Total Salary', report.total_salary]
-        ]
-        
-        for row_idx, row_data in enumerate(data, 5):
-            for col_idx, value in enumerate(row_data, 1):
-                ws.cell(row=row_idx, column=col_idx).value = value
+        ])
         
         # Employees sheet
         if report.employees_detail:
             employees_data = json.loads(report.employees_detail)
-            ws_emp = wb.create_sheet('Employees')
-            
-            headers = ['Employee Number', 'Full Name', 'Department', 'Job Title', 'Salary', 'Status']
-            for col, header in enumerate(headers, 1):
-                cell = ws_emp.cell(row=1, column=col)
-                cell.value = header
-                cell.fill = header_fill
-                cell.font = header_font
-            
-            for row_idx, emp in enumerate(employees_data, 2):
-                ws_emp.cell(row=row_idx, column=1).value = emp.get('employee_number', '')
-                ws_emp.cell(row=row_idx, column=2).value = emp.get('full_name', '')
-                ws_emp.cell(row=row_idx, column=3).value = emp.get('department', '')
-                ws_emp.cell(row=row_idx, column=4).value = emp.get('job_title', '')
-                ws_emp.cell(row=row_idx, column=5).value = emp.get('base_salary', 0)
-                ws_emp.cell(row=row_idx, column=6).value = emp.get('status', '')
-        
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+            ws_emp = report_book.sheet('Employees')
+            ws_emp.row(['Employee Number', 'Full Name', 'Department', 'Job Title', 'Salary', 'Status'], 'header')
+            ws_emp.rows(
+                [emp.get('employee_number', ''), emp.get('full_name', ''), emp.get('department', ''),
+                 emp.get('job_title', ''), emp.get('base_salary', 0), emp.get('status', '')]
+                for emp in employees_data
+            )
         
-        return send_file(
-            buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'HR_Analysis_{report_id}.xlsx'
-        )
+        return report_book.response(f'HR_Analysis_{report_id}.xlsx')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1046,7 +965,7 @@ def get_uploaded_files():
 @hr_bp.route('/api/clear-all-data', methods=['POST'])
 @login_required
 def clear_all_data():
-    """Clear all HR data for the organization"""
+    """Clear all HR data for the organization (background purge job)"""
     db_session = get_db_session()
     try:
         db_session.rollback()
@@ -1058,53 +977,23 @@ def clear_all_data():
         
         org_id = user.organization_id if user.organization_id else user.id
         
-        # Delete from database - try each table, skip if not exists
-        try:
-            db_session.query(TerminationRecord).filter_by(organization_id=org_id).delete()
-        except:
-            pass
-        
-        try:
-            db_session.query(HRPayroll).filter_by(organization_id=org_id).delete()
-        except:
-            pass
-        
-        try:
-            db_session.query(HRPerformance).filter_by(organization_id=org_id).delete()
-        except:
-            pass
-        
-        try:
-            db_session.query(HRAttendance).filter_by(organization_id=org_id).delete()
-        except:
-            pass
+        running = active_purge(db_session, org_id)
+        if running:
+            return jsonify({
+                'error': 'جاري حذف البيانات بالفعل / A data purge is already running',
+                'job_id': running.id,
+                'progress_url': url_for('hr.purge_status', job_id=running.id)
+            }), 409
         
-        try:
-            db_session.query(HREmployee).filter_by(organization_id=org_id).delete()
-        except:
-            pass
-        
-        try:
-            db_session.query(HRDataImport).filter_by(organization_id=org_id).delete()
-        except:
-            pass
-        
-        try:
-            db_session.query(HRAnalysisReport).filter_by(organization_id=org_id).delete()
-        except:
-            pass
-        
-        db_session.commit()
-        
-        # Clear session data
-        if 'file_imports' in session:
-            session['file_imports'] = {}
-            session.modified = True
+        job = start_purge(db_session, org_id, 'hr', user_id=user.id)
+        session.pop('file_imports', None)
         
         return jsonify({
             'success': True,
-            'message': 'تم حذف جميع البيانات بنجاح / All data cleared successfully'
-        })
+            'job_id': job.id,
+            'progress_url': url_for('hr.purge_status', job_id=job.id),
+            'message': 'جاري حذف جميع البيانات / Clearing all data'
+        }), 202
     except Exception as e:
         try:
             db_session.rollback()
@@ -1114,6 +1003,27 @@ def clear_all_data():
         return jsonify({'error': str(e)}), 500
 
 
+@hr_bp.route('/api/purge/<int:job_id>')
+@login_required
+def purge_status(job_id):
+    """Poll the progress of a background data purge"""
+    db_session = get_db_session()
+    db_session.rollback()
+    user = db_session.get(User, session.get('user_id'))
+    if not user:
+        return jsonify({'error': 'User not found'}), 401
+    
+    org_id = user.organization_id if user.organization_id else user.id
+    job = db_session.get(PurgeJob, job_id)
+    if not job or job.organization_id != org_id or job.scope != 'hr':
+        return jsonify({'error': 'Purge job not found'}), 404
+    
+    # Pick the purge up again if its worker died
+    requeue_stale_purges(db_session, job_id=job_id)
+    
+    return jsonify({'success': True, **job.to_dict()})
+
+
 @hr_bp.route('/api/preview-file/<int:import_id>')
 @login_required
 def preview_file(import_id):
@@ -1136,21 +1046,24 @@ def preview_file(import_id):
         if not import_record:
             return jsonify({'error': 'File not found or access denied'}), 404
         
-        # Get data from session
-        file_import_data = session.get('file_imports', {}).get(str(import_id))
-        if not file_import_data:
+        # Get one page of rows from the staging store
+        stage = ImportStage.open(import_id)
+        if not stage:
             return jsonify({'error': 'File data not available. Please re-import.'}), 404
         
-        headers = file_import_data.get('headers', [])
-        all_rows = file_import_data.get('all_rows', [])
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 100, type=int), 1), 500)
         
         return jsonify({
             'success': True,
             'filename': import_record.file_name,
             'file_type': import_record.file_type,
-            'headers': headers,
-            'rows': all_rows,
-            'total': len(all_rows)
+            'headers': stage.headers,
+            'rows': stage.page(page, per_page),
+            'total': stage.total_rows,
+            'page': page,
+            'per_page': per_page,
+            'pages': (stage.total_rows + per_page - 1) // per_page
         })
     except Exception as e:
         try:
@@ -1164,7 +1077,7 @@ def preview_file(import_id):
 @hr_bp.route('/api/download-file/<int:import_id>')
 @login_required
 def download_file(import_id):
-    """Download uploaded file from object storage or session"""
+    """Download uploaded file from object storage or the staging store"""
     db_session = get_db_session()
     try:
         db_session.rollback()
@@ -1197,26 +1110,25 @@ def download_file(import_id):
             except Exception as e:
                 print(f"Storage retrieval failed: {e}")
         
-        # Fall back to session if storage not available
+        # Fall back to the staged rows if storage is not available
         if not file_content:
-            file_import_data = session.get('file_imports', {}).get(str(import_id))
-            if file_import_data:
-                # Reconstruct the file from session
-                headers = file_import_data.get('headers', [])
-                all_rows = file_import_data.get('all_rows', [])
-                file_type = file_import_data.get('file_type', 'employees')
-                
-                # Generate CSV content from session data
+            stage = ImportStage.open(import_id)
+            if not stage:
+                return jsonify({'error': 'File not available. Please re-import.'}), 404
+            
+            def generate_csv():
                 output = io.StringIO()
-                if headers:
-                    writer = csv.DictWriter(output, fieldnames=headers)
-                    writer.writeheader()
-                    writer.writerows(all_rows)
-                
-                file_content = output.getvalue().encode('utf-8')
-                content_type = 'text/csv'
-            else:
-                return jsonify({'error': 'File not available in session. Please re-import.'}), 404
+                writer = csv.DictWriter(output, fieldnames=stage.headers)
+                writer.writeheader()
+                for batch in stage.iter_batches():
+                    writer.writerows(batch)
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+                yield output.getvalue()
+            
+            file_content = generate_csv()
+            content_type = 'text/csv'
         
         return Response(
             file_content,
@@ -1251,7 +1163,8 @@ def analyze():
         
         org_id = user.organization_id if user.organization_id else user.id
         
-        employees = db_session.query(HREmployee).filter_by(organization_id=org_id).all()
+        stats = get_hr_analytics(org_id)
+        employees = employee_rows(db_session, org_id) if stats['total_employees'] else []
     except Exception as e:
         db_session = get_db_session()
         try:
@@ -1263,5 +1176,6 @@ def analyze():
     
     return render_template('hr/analyze.html', 
                           lang=lang,
-                          has_data=len(employees) > 0,
+                          has_data=stats['total_employees'] > 0,
+                          stats=stats,
                           employees=employees)
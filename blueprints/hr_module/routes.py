@@ -6,11 +6,13 @@ Handles all HR management endpoints
 from flask import render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, extract, and_
+from sqlalchemy import func, and_
 from . import hr_module_bp
 from models import (User, HREmployee, HRContract, HRAttendance, HRLeave, 
                    HRPayroll, HRReward, HRDepartment, Organization, OrganizationMembership)
 from utils.decorators import require_org_context
+from utils.hr_kpis import get_dashboard_kpis
+from utils.hr_summaries import monthly_series
 
 
 @hr_module_bp.route('/')
@@ -18,103 +20,17 @@ from utils.decorators import require_org_context
 def index(org_id):
     """HR Module Dashboard with KPIs"""
     from flask import g
-    db = current_app.extensions['sqlalchemy']
     user = g.user  # Provided by decorator
     lang = session.get('language', 'ar')
     
-    # Calculate KPIs
-    today = date.today()
-    current_month = today.month
-    current_year = today.year
-    
-    # 1. Total Active Employees
-    total_employees = db.session.query(HREmployee).filter_by(
-        organization_id=org_id,
-        status='active'
-    ).count()
-    
-    # 2. Employees on Leave Today
-    employees_on_leave = db.session.query(HRLeave).filter(
-        HRLeave.organization_id == org_id,
-        HRLeave.status == 'approved',
-        HRLeave.start_date <= today,
-        HRLeave.end_date >= today
-    ).count()
-    
-    # 3. Pending Leave Requests
-    pending_leaves = db.session.query(HRLeave).filter_by(
-        organization_id=org_id,
-        status='pending'
-    ).count()
-    
-    # 4. Contracts Expiring Soon (Next 30 days)
-    expiring_soon = today + timedelta(days=30)
-    expiring_contracts = db.session.query(HRContract).filter(
-        HRContract.organization_id == org_id,
-        HRContract.status == 'active',
-        HRContract.end_date.isnot(None),
-        HRContract.end_date <= expiring_soon,
-        HRContract.end_date >= today
-    ).count()
-    
-    # 5. Total Payroll This Month
-    total_payroll = db.session.query(func.sum(HRPayroll.net_salary)).filter_by(
-        organization_id=org_id,
-        month=current_month,
-        year=current_year
-    ).scalar() or 0
-    
-    # 6. Attendance Rate This Month
-    total_working_days = db.session.query(HRAttendance).filter_by(
-        organization_id=org_id
-    ).filter(
-        extract('month', HRAttendance.date) == current_month,
-        extract('year', HRAttendance.date) == current_year
-    ).count()
-    
-    present_days = db.session.query(HRAttendance).filter_by(
-        organization_id=org_id,
-        status='present'
-    ).filter(
-        extract('month', HRAttendance.date) == current_month,
-        extract('year', HRAttendance.date) == current_year
-    ).count()
-    
-    attendance_rate = round((present_days / total_working_days * 100), 1) if total_working_days > 0 else 0
-    
-    # Get Recent Activities
-    recent_employees = db.session.query(HREmployee).filter_by(
-        organization_id=org_id
-    ).order_by(HREmployee.created_at.desc()).limit(5).all()
-    
-    recent_leaves = db.session.query(HRLeave).filter_by(
-        organization_id=org_id,
-        status='pending'
-    ).order_by(HRLeave.created_at.desc()).limit(5).all()
-    
-    # Department Statistics
-    dept_stats = db.session.query(
-        HREmployee.department,
-        func.count(HREmployee.id).label('count')
-    ).filter_by(
-        organization_id=org_id,
-        status='active'
-    ).group_by(HREmployee.department).all()
-    
-    kpis = {
-        'total_employees': total_employees,
-        'employees_on_leave': employees_on_leave,
-        'pending_leaves': pending_leaves,
-        'expiring_contracts': expiring_contracts,
-        'total_payroll': total_payroll,
-        'attendance_rate': attendance_rate
-    }
+    # All KPIs, department stats and recent lists in a few aggregate queries (cached per org)
+    dashboard = get_dashboard_kpis(org_id)
     
     return render_template('hr_module/index.html',
-                         kpis=kpis,
-                         recent_employees=recent_employees,
-                         recent_leaves=recent_leaves,
-                         dept_stats=dept_stats,
+                         kpis=dashboard['kpis'],
+                         recent_employees=dashboard['recent_employees'],
+                         recent_leaves=dashboard['recent_leaves'],
+                         dept_stats=dashboard['dept_stats'],
                          lang=lang,
                          current_user=user)
 
@@ -323,10 +239,15 @@ def view_employee(employee_id):
         organization_id=org_id
     ).order_by(HRLeave.start_date.desc()).all()
     
+    # Monthly attendance / payroll totals from the summaries (last 12 months)
+    monthly_summary = [m for m in monthly_series(db.session, org_id, months=12, employee_id=employee_id)
+                       if m['attendance_days'] or m['net_salary']]
+    
     return render_template('hr_module/view_employee.html',
                          employee=employee,
                          contracts=contracts,
                          recent_attendance=recent_attendance,
+                         monthly_summary=monthly_summary,
                          leaves=leaves,
                          lang=lang,
                          current_user=user)
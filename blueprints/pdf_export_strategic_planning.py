@@ -1,14 +1,14 @@
 """PDF Export using WeasyPrint for Strategic Planning & KPIs Module"""
 from flask import render_template_string
-try:
-    from weasyprint import HTML
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    HTML = None
+from utils.pdf_renderer import render_pdf, WEASYPRINT_AVAILABLE
+from utils.chart_images import chart_image_uri
 
 def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, values, lang='ar'):
     """Generate Strategic Planning PDF using WeasyPrint with Google Fonts Cairo"""
+    return render_pdf(build_strategic_plan_html(plan, kpis, initiatives, swot, pestel, goals, values, lang))
+
+def build_strategic_plan_html(plan, kpis, initiatives, swot, pestel, goals, values, lang='ar', charts=None):
+    """HTML of the Strategic Planning report (rendered by the PDF job pool); charts as from get_plan_charts"""
     
     html_template = '''
     <!DOCTYPE html>
@@ -125,6 +125,17 @@ def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, va
                 background-color: #f9fafb;
             }
             
+            .chart-image {
+                text-align: center;
+                margin: 20px 0;
+                page-break-inside: avoid;
+            }
+            
+            .chart-image img {
+                max-width: 100%;
+                height: auto;
+            }
+            
             .swot-table th {
                 background: #e0e7ff;
                 color: #1e3a8a;
@@ -300,6 +311,10 @@ def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, va
                     </tr>
                 </tbody>
             </table>
+            
+            {% if chart_images.swot %}
+            <div class="chart-image"><img src="{{ chart_images.swot }}" alt="SWOT"></div>
+            {% endif %}
         </div>
         {% endif %}
         
@@ -308,6 +323,10 @@ def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, va
         <div class="section">
             <h2 class="section-title">تحليل PESTEL</h2>
             
+            {% if chart_images.pestel_bar %}
+            <div class="chart-image"><img src="{{ chart_images.pestel_bar }}" alt="PESTEL"></div>
+            {% endif %}
+            
             {% if pestel.political %}
             <div class="pestel-category">
                 <strong>العوامل السياسية (Political)</strong>
@@ -369,6 +388,10 @@ def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, va
         <div class="section">
             <h2 class="section-title">مؤشرات الأداء الرئيسية (KPIs)</h2>
             
+            {% if chart_images.kpis %}
+            <div class="chart-image"><img src="{{ chart_images.kpis }}" alt="KPIs"></div>
+            {% endif %}
+            
             {% for kpi in kpis %}
             <div class="kpi-item">
                 <strong>{{ kpi.name }}</strong> 
@@ -422,6 +445,9 @@ def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, va
     from datetime import datetime
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
     
+    # Charts are drawn on the server as SVG images
+    chart_images = {name: chart_image_uri(chart) for name, chart in (charts or {}).items() if chart}
+    
     # Render HTML with data
     html_content = render_template_string(
         html_template,
@@ -433,9 +459,8 @@ def generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, va
         goals=goals,
         values=values,
         lang=lang,
-        timestamp=timestamp
+        timestamp=timestamp,
+        chart_images=chart_images
     )
     
-    # Generate PDF from HTML
-    pdf = HTML(string=html_content).write_pdf()
-    return pdf
+    return html_content
@@ -1,15 +1,14 @@
 """PDF Export using WeasyPrint (HTML/CSS) for better Arabic support"""
 from flask import render_template_string
-try:
-    from weasyprint import HTML
-    WEASYPRINT_AVAILABLE = True
-except (ImportError, OSError):
-    WEASYPRINT_AVAILABLE = False
-    HTML = None
+from utils.pdf_renderer import render_pdf, WEASYPRINT_AVAILABLE
 from io import BytesIO
 
 def generate_pdf_weasy(project, objectives, initiatives, swot, values, themes):
     """Generate PDF using WeasyPrint with Google Fonts Cairo"""
+    return render_pdf(build_identity_html(project, objectives, initiatives, swot, values, themes))
+
+def build_identity_html(project, objectives, initiatives, swot, values, themes):
+    """HTML of the Strategic Identity report (rendered by the PDF job pool)"""
     
     html_template = '''
     <!DOCTYPE html>
@@ -276,6 +275,4 @@ def generate_pdf_weasy(project, objectives, initiatives, swot, values, themes):
         initiatives=initiatives
     )
     
-    # Generate PDF
-    pdf = HTML(string=html_content).write_pdf()
-    return pdf
+    return html_content
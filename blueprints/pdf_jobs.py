@@ -0,0 +1,68 @@
+from flask import Blueprint, render_template, session, jsonify, redirect, url_for, flash, abort, current_app
+from flask_jwt_extended import get_jwt_identity
+from utils.decorators import login_required
+from utils.pdf_jobs import refresh_pdf_job, send_cached_pdf, is_private_pdf
+from models import PDFJob, User
+
+pdf_jobs_bp = Blueprint('pdf_jobs', __name__, url_prefix='/pdf-jobs')
+
+def get_db():
+    return current_app.extensions['sqlalchemy']
+
+def get_lang():
+    return session.get('language', 'ar')
+
+def _get_job(job_id):
+    """Load a PDF job the current user may see (its owner or a system admin)"""
+    db = get_db()
+    try:
+        user_id = int(get_jwt_identity())
+    except Exception:
+        user_id = session.get('user_id')
+
+    job = db.session.get(PDFJob, job_id)
+    if not job:
+        abort(404)
+    if job.user_id != user_id:
+        user = db.session.get(User, user_id) if user_id else None
+        if not user or not user.has_role('system_admin'):
+            abort(403)
+    return refresh_pdf_job(db.session, job)
+
+def _is_ready(job):
+    return job.status == 'completed' and is_private_pdf(job.file_path)
+
+@pdf_jobs_bp.route('/<int:job_id>')
+@login_required
+def view(job_id):
+    """Page shown while a PDF is rendered in the background"""
+    job = _get_job(job_id)
+    return render_template('pdf_jobs/wait.html', job=job, ready=_is_ready(job), lang=get_lang())
+
+@pdf_jobs_bp.route('/<int:job_id>/status')
+@login_required
+def status(job_id):
+    """Render status of a PDF job"""
+    job = _get_job(job_id)
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(),
+        'ready': _is_ready(job),
+        'download_url': url_for('pdf_jobs.download', job_id=job.id)
+    })
+
+@pdf_jobs_bp.route('/<int:job_id>/download')
+@login_required
+def download(job_id):
+    """Download the PDF produced by a job"""
+    job = _get_job(job_id)
+    lang = get_lang()
+
+    if _is_ready(job):
+        return send_cached_pdf(job.file_path, job.file_name)
+
+    if job.status == 'pending':
+        return redirect(url_for('pdf_jobs.view', job_id=job.id))
+
+    flash('الملف غير متاح أو انتهت صلاحيته، يرجى إعادة التصدير' if lang == 'ar' else 'The PDF is not available or has expired, please export it again', 'danger')
+    return redirect(url_for('pdf_jobs.view', job_id=job.id))
@@ -116,7 +116,7 @@ def create_project():
             description=description,
             current_objectives=current_objectives,
             ongoing_initiatives=ongoing_initiatives,
-            uploaded_files=json.dumps(uploaded_files) if uploaded_files else None,
+            uploaded_files=uploaded_files or None,
             status='draft'
         )
         
@@ -302,11 +302,11 @@ def generate_analysis(project_id):
         initiatives_data = clean_and_parse_json(initiatives_response)
         
         # Update project with AI-generated data
-        project.swot_analysis = json.dumps(swot_data, ensure_ascii=False)
+        project.swot_analysis = swot_data
         project.vision_statement = identity_data.get('vision', '')
         project.mission_statement = identity_data.get('mission', '')
-        project.core_values = json.dumps(identity_data.get('core_values', []), ensure_ascii=False)
-        project.strategic_themes = json.dumps(identity_data.get('strategic_themes', []), ensure_ascii=False)
+        project.core_values = identity_data.get('core_values', [])
+        project.strategic_themes = identity_data.get('strategic_themes', [])
         project.status = 'analysis_complete'
         project.updated_at = datetime.utcnow()
         
@@ -456,10 +456,10 @@ def project_dashboard(project_id):
         return redirect(url_for('strategic_identity.index'))
     
     # Parse JSON data
-    swot = json.loads(project.swot_analysis) if project.swot_analysis else {}
-    pestel = json.loads(project.pestel_analysis) if project.pestel_analysis else {}
-    values = json.loads(project.core_values) if project.core_values else []
-    themes = json.loads(project.strategic_themes) if project.strategic_themes else []
+    swot = project.swot_analysis or {}
+    pestel = project.pestel_analysis or {}
+    values = project.core_values or []
+    themes = project.strategic_themes or []
     
     # Get related data
     objectives = db.session.query(StrategicObjective).filter_by(project_id=project_id).all()
@@ -483,8 +483,8 @@ def project_dashboard(project_id):
 @login_required
 def export_pdf(project_id):
     """Export strategic identity to PDF using WeasyPrint"""
-    from flask import make_response
-    from .pdf_export_weasy import generate_pdf_weasy
+    from .pdf_export_weasy import build_identity_html
+    from utils.pdf_jobs import pdf_response
     
     db = get_db()
     user_id = int(get_jwt_identity())
@@ -495,32 +495,33 @@ def export_pdf(project_id):
         flash('غير مصرح / Unauthorized', 'danger')
         return redirect(url_for('strategic_identity.index'))
     
-    # Parse JSON data
-    swot = json.loads(project.swot_analysis) if project.swot_analysis else {}
-    values = json.loads(project.core_values) if project.core_values else []
-    themes = json.loads(project.strategic_themes) if project.strategic_themes else []
-    
     # Get related data
     objectives = db.session.query(StrategicObjective).filter_by(project_id=project_id).all()
     initiatives = db.session.query(IdentityInitiative).filter_by(project_id=project_id).all()
     
-    # Generate PDF using WeasyPrint
-    pdf = generate_pdf_weasy(project, objectives, initiatives, swot, values, themes)
-    
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=strategic_identity_{project_id}.pdf'
+    def build_html():
+        # Parse JSON data
+        swot = project.swot_analysis or {}
+        values = project.core_values or []
+        themes = project.strategic_themes or []
+        return build_identity_html(project, objectives, initiatives, swot, values, themes)
     
-    return response
+    # Objectives and initiatives have no updated_at; they are regenerated, so their ids change
+    stamp = (project.updated_at, [o.id for o in objectives], [i.id for i in initiatives])
+    try:
+        # The report template is Arabic only
+        return pdf_response('strategic_identity', project_id, stamp, 'ar', build_html,
+                            f'strategic_identity_{project_id}.pdf', user_id)
+    except Exception as e:
+        current_app.logger.error(f"PDF generation error: {str(e)}")
+        flash(f'خطأ في إنشاء PDF / Error generating PDF: {str(e)}', 'danger')
+        return redirect(url_for('strategic_identity.project_dashboard', project_id=project_id))
 
 @strategic_identity_bp.route('/project/<int:project_id>/export/excel')
 @login_required
 def export_excel(project_id):
     """Export strategic identity to Excel"""
-    from flask import make_response
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-    from io import BytesIO
+    from utils.excel_report import ExcelReport
     
     db = get_db()
     user_id = int(get_jwt_identity())
@@ -532,174 +533,84 @@ def export_excel(project_id):
         return redirect(url_for('strategic_identity.index'))
     
     # Parse JSON data
-    swot = json.loads(project.swot_analysis) if project.swot_analysis else {}
-    pestel = json.loads(project.pestel_analysis) if project.pestel_analysis else {}
-    values = json.loads(project.core_values) if project.core_values else []
-    themes = json.loads(project.strategic_themes) if project.strategic_themes else []
+    swot = project.swot_analysis or {}
+    pestel = project.pestel_analysis or {}
+    values = project.core_values or []
+    themes = project.strategic_themes or []
     
     # Get related data
     objectives = db.session.query(StrategicObjective).filter_by(project_id=project_id).all()
     kpis = db.session.query(IdentityKPI).filter_by(project_id=project_id).all()
     initiatives = db.session.query(IdentityInitiative).filter_by(project_id=project_id).all()
     
-    # Create workbook
-    wb = Workbook()
+    report = ExcelReport('ar', accent='0066CC')
     
     # Overview Sheet
-    ws_overview = wb.active
-    ws_overview.title = "Overview"
-    ws_overview.sheet_view.rightToLeft = True
-    
-    header_fill = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=14)
-    subheader_font = Font(bold=True, size=12)
-    
-    ws_overview['A1'] = "الهوية الاستراتيجية"
-    ws_overview['A1'].font = header_font
-    ws_overview['A1'].fill = header_fill
-    ws_overview.merge_cells('A1:B1')
-    
-    row = 3
-    ws_overview[f'A{row}'] = "اسم المؤسسة"
-    ws_overview[f'B{row}'] = project.organization_name
-    row += 1
-    ws_overview[f'A{row}'] = "القطاع"
-    ws_overview[f'B{row}'] = project.sector
-    row += 1
-    ws_overview[f'A{row}'] = "عدد الموظفين"
-    ws_overview[f'B{row}'] = project.employee_count
-    row += 2
+    ws_overview = report.sheet("Overview", widths=(20, 50))
+    ws_overview.banner("الهوية الاستراتيجية")
+    ws_overview.skip()
+    ws_overview.rows([
+        ["اسم المؤسسة", project.organization_name],
+        ["القطاع", project.sector],
+        ["عدد الموظفين", project.employee_count],
+    ], ('label', 'text'))
+    ws_overview.skip()
     
     if project.vision_statement:
-        ws_overview[f'A{row}'] = "الرؤية"
-        ws_overview[f'A{row}'].font = Font(bold=True)
-        row += 1
-        ws_overview[f'A{row}'] = project.vision_statement
-        ws_overview.merge_cells(f'A{row}:B{row}')
-        row += 2
+        ws_overview.row(["الرؤية"], 'label')
+        ws_overview.banner(project.vision_statement, 'text')
+        ws_overview.skip()
     
     if project.mission_statement:
-        ws_overview[f'A{row}'] = "الرسالة"
-        ws_overview[f'A{row}'].font = Font(bold=True)
-        row += 1
-        ws_overview[f'A{row}'] = project.mission_statement
-        ws_overview.merge_cells(f'A{row}:B{row}')
-        row += 2
-    
-    ws_overview.column_dimensions['A'].width = 20
-    ws_overview.column_dimensions['B'].width = 50
+        ws_overview.row(["الرسالة"], 'label')
+        ws_overview.banner(project.mission_statement, 'text')
     
     # SWOT Sheet
     if swot:
-        ws_swot = wb.create_sheet("SWOT Analysis")
-        ws_swot.sheet_view.rightToLeft = True
-        
-        ws_swot['A1'] = "تحليل SWOT"
-        ws_swot['A1'].font = header_font
-        ws_swot['A1'].fill = header_fill
-        ws_swot.merge_cells('A1:D1')
-        
-        ws_swot['A3'] = "نقاط القوة"
-        ws_swot['B3'] = "نقاط الضعف"
-        ws_swot['C3'] = "الفرص"
-        ws_swot['D3'] = "التهديدات"
-        
-        for cell in ['A3', 'B3', 'C3', 'D3']:
-            ws_swot[cell].font = Font(bold=True)
-            ws_swot[cell].fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        row = 4
-        max_items = max(
-            len(swot.get('strengths', [])),
-            len(swot.get('weaknesses', [])),
-            len(swot.get('opportunities', [])),
-            len(swot.get('threats', []))
+        ws_swot = report.sheet("SWOT Analysis", widths=(30, 30, 30, 30))
+        ws_swot.banner("تحليل SWOT")
+        ws_swot.skip()
+        ws_swot.row(["نقاط القوة", "نقاط الضعف", "الفرص", "التهديدات"], 'column')
+        
+        columns = [swot.get(key, []) for key in ('strengths', 'weaknesses', 'opportunities', 'threats')]
+        max_items = max(len(items) for items in columns)
+        ws_swot.rows(
+            ([items[i] if i < len(items) else "" for items in columns] for i in range(max_items)),
+            'text'
         )
-        
-        for i in range(max_items):
-            strengths = swot.get('strengths', [])
-            weaknesses = swot.get('weaknesses', [])
-            opportunities = swot.get('opportunities', [])
-            threats = swot.get('threats', [])
-            
-            ws_swot[f'A{row}'] = strengths[i] if i < len(strengths) else ""
-            ws_swot[f'B{row}'] = weaknesses[i] if i < len(weaknesses) else ""
-            ws_swot[f'C{row}'] = opportunities[i] if i < len(opportunities) else ""
-            ws_swot[f'D{row}'] = threats[i] if i < len(threats) else ""
-            row += 1
-        
-        for col in ['A', 'B', 'C', 'D']:
-            ws_swot.column_dimensions[col].width = 30
     
     # Core Values Sheet
     if values:
-        ws_values = wb.create_sheet("Core Values")
-        ws_values.sheet_view.rightToLeft = True
-        
-        ws_values['A1'] = "القيم المؤسسية"
-        ws_values['A1'].font = header_font
-        ws_values['A1'].fill = header_fill
-        ws_values.merge_cells('A1:B1')
-        
-        ws_values['A3'] = "القيمة"
-        ws_values['B3'] = "الوصف"
-        ws_values['A3'].font = Font(bold=True)
-        ws_values['B3'].font = Font(bold=True)
-        
-        row = 4
-        for value in values:
-            # Handle both dict and string formats
-            if isinstance(value, dict):
-                ws_values[f'A{row}'] = value.get('value', '')
-                ws_values[f'B{row}'] = value.get('description', '')
-            else:
-                ws_values[f'A{row}'] = str(value)
-                ws_values[f'B{row}'] = ''
-            row += 1
-        
-        ws_values.column_dimensions['A'].width = 20
-        ws_values.column_dimensions['B'].width = 50
+        ws_values = report.sheet("Core Values", widths=(20, 50))
+        ws_values.banner("القيم المؤسسية")
+        ws_values.skip()
+        ws_values.row(["القيمة", "الوصف"], 'column')
+        # Handle both dict and string formats
+        ws_values.rows(
+            ([value.get('value', ''), value.get('description', '')] if isinstance(value, dict) else [str(value), '']
+             for value in values),
+            'text'
+        )
     
     # Strategic Themes Sheet
     if themes:
-        ws_themes = wb.create_sheet("Strategic Themes")
-        ws_themes.sheet_view.rightToLeft = True
-        
-        ws_themes['A1'] = "المجالات الاستراتيجية"
-        ws_themes['A1'].font = header_font
-        ws_themes['A1'].fill = header_fill
-        ws_themes.merge_cells('A1:B1')
-        
-        ws_themes['A3'] = "المجال"
-        ws_themes['B3'] = "الوصف"
-        ws_themes['A3'].font = Font(bold=True)
-        ws_themes['B3'].font = Font(bold=True)
-        
-        row = 4
-        for theme in themes:
-            # Handle both dict and string formats
-            if isinstance(theme, dict):
-                ws_themes[f'A{row}'] = theme.get('theme', '')
-                ws_themes[f'B{row}'] = theme.get('description', '')
-            else:
-                ws_themes[f'A{row}'] = str(theme)
-                ws_themes[f'B{row}'] = ''
-            row += 1
-        
-        ws_themes.column_dimensions['A'].width = 25
-        ws_themes.column_dimensions['B'].width = 50
+        ws_themes = report.sheet("Strategic Themes", widths=(25, 50))
+        ws_themes.banner("المجالات الاستراتيجية")
+        ws_themes.skip()
+        ws_themes.row(["المجال", "الوصف"], 'column')
+        # Handle both dict and string formats
+        ws_themes.rows(
+            ([theme.get('theme', ''), theme.get('description', '')] if isinstance(theme, dict) else [str(theme), '']
+             for theme in themes),
+            'text'
+        )
     
     # PESTEL Analysis Sheet
     if pestel:
-        ws_pestel = wb.create_sheet("PESTEL Analysis")
-        ws_pestel.sheet_view.rightToLeft = True
+        ws_pestel = report.sheet("PESTEL Analysis", widths=(60,))
+        ws_pestel.banner("تحليل PESTEL")
+        ws_pestel.skip()
         
-        ws_pestel['A1'] = "تحليل PESTEL"
-        ws_pestel['A1'].font = header_font
-        ws_pestel['A1'].fill = header_fill
-        ws_pestel.merge_cells('A1:B1')
-        
-        row = 3
         pestel_categories = [
             ('political', 'العوامل السياسية'),
             ('economic', 'العوامل الاقتصادية'),
@@ -711,119 +622,42 @@ def export_excel(project_id):
         
         for key, label in pestel_categories:
             if key in pestel and pestel[key]:
-                ws_pestel[f'A{row}'] = label
-                ws_pestel[f'A{row}'].font = subheader_font
-                row += 1
-                for item in pestel[key]:
-                    ws_pestel[f'A{row}'] = item
-                    row += 1
-                row += 1
-        
-        ws_pestel.column_dimensions['A'].width = 60
+                ws_pestel.row([label], 'section')
+                ws_pestel.rows(([item] for item in pestel[key]), 'text')
+                ws_pestel.skip()
     
     # Strategic Objectives Sheet
     if objectives:
-        ws_obj = wb.create_sheet("Strategic Objectives")
-        ws_obj.sheet_view.rightToLeft = True
-        
-        ws_obj['A1'] = "الأهداف الاستراتيجية"
-        ws_obj['A1'].font = header_font
-        ws_obj['A1'].fill = header_fill
-        ws_obj.merge_cells('A1:C1')
-        
-        ws_obj['A3'] = "الهدف"
-        ws_obj['B3'] = "الوصف"
-        ws_obj['C3'] = "الإطار الزمني"
-        for cell in ['A3', 'B3', 'C3']:
-            ws_obj[cell].font = Font(bold=True)
-            ws_obj[cell].fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        row = 4
-        for obj in objectives:
-            ws_obj[f'A{row}'] = obj.title
-            ws_obj[f'B{row}'] = obj.description or ''
-            ws_obj[f'C{row}'] = obj.timeframe or ''
-            row += 1
-        
-        ws_obj.column_dimensions['A'].width = 25
-        ws_obj.column_dimensions['B'].width = 40
-        ws_obj.column_dimensions['C'].width = 20
+        ws_obj = report.sheet("Strategic Objectives", widths=(25, 40, 20))
+        ws_obj.banner("الأهداف الاستراتيجية")
+        ws_obj.skip()
+        ws_obj.row(["الهدف", "الوصف", "الإطار الزمني"], 'column')
+        ws_obj.rows(([obj.title, obj.description or '', obj.timeframe or ''] for obj in objectives), 'text')
     
     # KPIs Sheet
     if kpis:
-        ws_kpi = wb.create_sheet("KPIs")
-        ws_kpi.sheet_view.rightToLeft = True
-        
-        ws_kpi['A1'] = "مؤشرات الأداء الرئيسية"
-        ws_kpi['A1'].font = header_font
-        ws_kpi['A1'].fill = header_fill
-        ws_kpi.merge_cells('A1:D1')
-        
-        ws_kpi['A3'] = "المؤشر"
-        ws_kpi['B3'] = "القيمة المستهدفة"
-        ws_kpi['C3'] = "الوحدة"
-        ws_kpi['D3'] = "التكرار"
-        for cell in ['A3', 'B3', 'C3', 'D3']:
-            ws_kpi[cell].font = Font(bold=True)
-            ws_kpi[cell].fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        row = 4
-        for kpi in kpis:
-            ws_kpi[f'A{row}'] = kpi.kpi_name
-            ws_kpi[f'B{row}'] = kpi.target_value
-            ws_kpi[f'C{row}'] = kpi.measurement_unit or ''
-            ws_kpi[f'D{row}'] = kpi.frequency or ''
-            row += 1
-        
-        ws_kpi.column_dimensions['A'].width = 30
-        ws_kpi.column_dimensions['B'].width = 15
-        ws_kpi.column_dimensions['C'].width = 15
-        ws_kpi.column_dimensions['D'].width = 15
+        ws_kpi = report.sheet("KPIs", widths=(30, 15, 15, 15))
+        ws_kpi.banner("مؤشرات الأداء الرئيسية")
+        ws_kpi.skip()
+        ws_kpi.row(["المؤشر", "القيمة المستهدفة", "الوحدة", "التكرار"], 'column')
+        ws_kpi.rows(
+            ([kpi.name, kpi.target_value, kpi.measurement_unit or '', kpi.measurement_frequency or ''] for kpi in kpis),
+            'text'
+        )
     
     # Initiatives Sheet
     if initiatives:
-        ws_init = wb.create_sheet("Initiatives")
-        ws_init.sheet_view.rightToLeft = True
-        
-        ws_init['A1'] = "المبادرات التنفيذية الاستراتيجية"
-        ws_init['A1'].font = header_font
-        ws_init['A1'].fill = header_fill
-        ws_init.merge_cells('A1:E1')
-        
-        ws_init['A3'] = "المبادرة"
-        ws_init['B3'] = "المخرجات المتوقعة"
-        ws_init['C3'] = "فترة التنفيذ"
-        ws_init['D3'] = "الجهة المسؤولة"
-        ws_init['E3'] = "الميزانية التقديرية"
-        for cell in ['A3', 'B3', 'C3', 'D3', 'E3']:
-            ws_init[cell].font = Font(bold=True)
-            ws_init[cell].fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        row = 4
-        for init in initiatives:
-            ws_init[f'A{row}'] = init.name
-            ws_init[f'B{row}'] = init.expected_outputs or ''
-            ws_init[f'C{row}'] = init.implementation_period or ''
-            ws_init[f'D{row}'] = init.responsible_party or ''
-            ws_init[f'E{row}'] = f"{init.budget_estimate or 0} ر.س" if init.budget_estimate else ""
-            row += 1
-        
-        ws_init.column_dimensions['A'].width = 25
-        ws_init.column_dimensions['B'].width = 40
-        ws_init.column_dimensions['C'].width = 15
-        ws_init.column_dimensions['D'].width = 20
-        ws_init.column_dimensions['E'].width = 15
-    
-    # Save to buffer
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=strategic_identity_{project_id}.xlsx'
-    
-    return response
+        ws_init = report.sheet("Initiatives", widths=(25, 40, 15, 20, 15))
+        ws_init.banner("المبادرات التنفيذية الاستراتيجية")
+        ws_init.skip()
+        ws_init.row(["المبادرة", "المخرجات المتوقعة", "فترة التنفيذ", "الجهة المسؤولة", "الميزانية التقديرية"], 'column')
+        ws_init.rows(
+            ([init.name, init.expected_outputs or '', init.implementation_period or '', init.responsible_party or '',
+              f"{init.budget_estimate or 0} ر.س" if init.budget_estimate else ""] for init in initiatives),
+            'text'
+        )
+    
+    return report.response(f"strategic_identity_{project_id}.xlsx")
 
 # ==================== KPI GENERATION (AI-POWERED) ====================
 
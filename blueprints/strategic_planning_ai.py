@@ -2,17 +2,15 @@
 Strategic Planning & KPIs Development Module
 AI-powered strategic planning with SWOT, PESTEL, Vision/Mission, Goals, and KPIs generation
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_jwt_extended import get_jwt_identity
 from utils.decorators import login_required
 from models import StrategicPlan, StrategicKPI, StrategicInitiative, ServiceOffering, User
 from utils.ai_providers.ai_manager import AIManager
+from utils.chart_generator import get_plan_charts
 import json
 from datetime import datetime
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+from utils.excel_report import ExcelReport, progress_style
 
 strategic_planning_bp = Blueprint('strategic_planning_ai', __name__)
 
@@ -82,8 +80,8 @@ def create_plan():
             industry_sector=industry_sector,
             employee_count=employee_count,
             organization_description=organization_description,
-            current_challenges=json.dumps([c.strip() for c in (current_challenges or '').split('\n') if c.strip()]),
-            opportunities=json.dumps([o.strip() for o in (opportunities or '').split('\n') if o.strip()]),
+            current_challenges=[c.strip() for c in (current_challenges or '').split('\n') if c.strip()],
+            opportunities=[o.strip() for o in (opportunities or '').split('\n') if o.strip()],
             status='draft'
         )
         
@@ -115,11 +113,12 @@ def analyze_swot(plan_id):
         return redirect(url_for('strategic_planning_ai.index')), 403
     
     # Parse existing SWOT if available
-    swot_data = json.loads(plan.swot_analysis) if plan.swot_analysis else None
+    swot_data = plan.swot_analysis
     
     return render_template('strategic_planning/swot_analysis.html',
                          plan=plan,
                          swot_data=swot_data,
+                         charts=get_plan_charts(plan, [], lang),
                          lang=lang)
 
 @strategic_planning_bp.route('/plan/<int:plan_id>/generate-swot', methods=['POST'])
@@ -158,8 +157,8 @@ def generate_swot(plan_id):
             pass
         
         # Prepare context for AI
-        challenges = json.loads(plan.current_challenges) if plan.current_challenges else []
-        opportunities_list = json.loads(plan.opportunities) if plan.opportunities else []
+        challenges = plan.current_challenges or []
+        opportunities_list = plan.opportunities or []
         
         prompt = f"""قم بإجراء تحليل SWOT شامل للمؤسسة التالية:{rag_context}
 
@@ -203,7 +202,7 @@ def generate_swot(plan_id):
         swot_data = json.loads(response)
         
         # Save to database
-        plan.swot_analysis = json.dumps(swot_data, ensure_ascii=False)
+        plan.swot_analysis = swot_data
         db.session.commit()
         
         return jsonify({'success': True, 'data': swot_data})
@@ -229,11 +228,12 @@ def analyze_pestel(plan_id):
         return redirect(url_for('strategic_planning_ai.index')), 403
     
     # Parse existing PESTEL if available
-    pestel_data = json.loads(plan.pestel_analysis) if plan.pestel_analysis else None
+    pestel_data = plan.pestel_analysis
     
     return render_template('strategic_planning/pestel_analysis.html',
                          plan=plan,
                          pestel_data=pestel_data,
+                         charts=get_plan_charts(plan, [], lang),
                          lang=lang)
 
 @strategic_planning_bp.route('/plan/<int:plan_id>/generate-pestel', methods=['POST'])
@@ -308,7 +308,7 @@ def generate_pestel(plan_id):
         pestel_data = json.loads(response)
         
         # Save to database
-        plan.pestel_analysis = json.dumps(pestel_data, ensure_ascii=False)
+        plan.pestel_analysis = pestel_data
         db.session.commit()
         
         return jsonify({'success': True, 'data': pestel_data})
@@ -351,7 +351,7 @@ def ai_generate_framework(plan_id):
     
     try:
         # Get SWOT data
-        swot = json.loads(plan.swot_analysis) if plan.swot_analysis else {}
+        swot = plan.swot_analysis or {}
         
         prompt = f"""بناءً على التحليل الاستراتيجي للمؤسسة التالية، قم بتوليد:
 
@@ -405,8 +405,8 @@ def ai_generate_framework(plan_id):
         # Save to database
         plan.vision_statement = framework_data.get('vision')
         plan.mission_statement = framework_data.get('mission')
-        plan.core_values = json.dumps(framework_data.get('values', []), ensure_ascii=False)
-        plan.strategic_goals = json.dumps(framework_data.get('strategic_goals', []), ensure_ascii=False)
+        plan.core_values = framework_data.get('values', [])
+        plan.strategic_goals = framework_data.get('strategic_goals', [])
         db.session.commit()
         
         return jsonify({'success': True, 'data': framework_data})
@@ -436,6 +436,7 @@ def manage_kpis(plan_id):
     return render_template('strategic_planning/kpis.html',
                          plan=plan,
                          kpis=kpis,
+                         charts=get_plan_charts(plan, kpis, lang),
                          lang=lang)
 
 @strategic_planning_bp.route('/plan/<int:plan_id>/generate-kpis', methods=['POST'])
@@ -451,7 +452,7 @@ def generate_kpis(plan_id):
         return jsonify({'success': False, 'error': 'Unauthorized access'}), 403
     
     try:
-        strategic_goals = json.loads(plan.strategic_goals) if plan.strategic_goals else []
+        strategic_goals = plan.strategic_goals or []
         
         prompt = f"""قم بتوليد مؤشرات أداء رئيسية (KPIs) قابلة للقياس لكل هدف استراتيجي:
 
@@ -546,10 +547,10 @@ def plan_dashboard(plan_id):
     initiatives = db.session.query(StrategicInitiative).filter_by(plan_id=plan_id).all()
     
     # Parse JSON fields
-    swot = json.loads(plan.swot_analysis) if plan.swot_analysis else {}
-    pestel = json.loads(plan.pestel_analysis) if plan.pestel_analysis else {}
-    values = json.loads(plan.core_values) if plan.core_values else []
-    goals = json.loads(plan.strategic_goals) if plan.strategic_goals else []
+    swot = plan.swot_analysis or {}
+    pestel = plan.pestel_analysis or {}
+    values = plan.core_values or []
+    goals = plan.strategic_goals or []
     
     return render_template('strategic_planning/dashboard.html',
                          plan=plan,
@@ -559,6 +560,7 @@ def plan_dashboard(plan_id):
                          goals=goals,
                          kpis=kpis,
                          initiatives=initiatives,
+                         charts=get_plan_charts(plan, kpis, lang),
                          lang=lang)
 
 # ==================== EXPORT & REPORTS ====================
@@ -567,8 +569,8 @@ def plan_dashboard(plan_id):
 @login_required
 def export_pdf(plan_id):
     """Export strategic plan as PDF report with Arabic support using WeasyPrint"""
-    from flask import make_response
-    from .pdf_export_strategic_planning import generate_strategic_plan_pdf
+    from .pdf_export_strategic_planning import build_strategic_plan_html
+    from utils.pdf_jobs import pdf_response
     
     db = get_db()
     lang = get_lang()
@@ -581,25 +583,25 @@ def export_pdf(plan_id):
         return redirect(url_for('strategic_planning_ai.index')), 403
     
     try:
-        # Parse JSON fields
-        swot = json.loads(plan.swot_analysis) if plan.swot_analysis else {}
-        pestel = json.loads(plan.pestel_analysis) if plan.pestel_analysis else {}
-        goals = json.loads(plan.strategic_goals) if plan.strategic_goals else []
-        values = json.loads(plan.core_values) if plan.core_values else []
-        
         # Get related data
         kpis = db.session.query(StrategicKPI).filter_by(plan_id=plan_id).all()
         initiatives = db.session.query(StrategicInitiative).filter_by(plan_id=plan_id).all()
         
-        # Generate PDF using WeasyPrint
-        pdf = generate_strategic_plan_pdf(plan, kpis, initiatives, swot, pestel, goals, values, lang)
-        
-        # Prepare response
-        response = make_response(pdf)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename="strategic_plan_{plan_id}.pdf"'
-        
-        return response
+        def build_html():
+            # Parse JSON fields
+            swot = plan.swot_analysis or {}
+            pestel = plan.pestel_analysis or {}
+            goals = plan.strategic_goals or []
+            values = plan.core_values or []
+            charts = get_plan_charts(plan, kpis, lang)
+            return build_strategic_plan_html(plan, kpis, initiatives, swot, pestel, goals, values, lang, charts)
+        
+        # Rendered on the PDF pool; unchanged plans are served from the cache
+        stamp = (plan.updated_at,
+                 [(k.id, k.updated_at) for k in kpis],
+                 [(i.id, i.updated_at) for i in initiatives])
+        return pdf_response('strategic_plan', plan_id, stamp, lang, build_html,
+                            f'strategic_plan_{plan_id}.pdf', user_id)
         
     except Exception as e:
         current_app.logger.error(f"PDF generation error: {str(e)}")
@@ -621,301 +623,87 @@ def export_excel(plan_id):
         return redirect(url_for('strategic_planning_ai.index')), 403
     
     try:
-        # Create workbook
-        wb = Workbook()
-        wb.remove(wb.active)  # Remove default sheet
-        
-        # Define styles
-        header_fill = PatternFill(start_color="1e3a8a", end_color="1e3a8a", fill_type="solid")
-        header_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        subheader_fill = PatternFill(start_color="3b82f6", end_color="3b82f6", fill_type="solid")
-        subheader_font = Font(name='Arial', size=11, bold=True, color="FFFFFF")
-        section_fill = PatternFill(start_color="e0e7ff", end_color="e0e7ff", fill_type="solid")
-        section_font = Font(name='Arial', size=10, bold=True)
-        normal_font = Font(name='Arial', size=10)
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # RTL alignment for Arabic
-        rtl_alignment = Alignment(horizontal='right', vertical='top', wrap_text=True, readingOrder=2)
-        ltr_alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-        center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        report = ExcelReport(lang)
         
         # ===== Sheet 1: Overview (نظرة عامة) =====
-        ws_overview = wb.create_sheet(title="نظرة عامة - Overview" if lang == 'ar' else "Overview")
-        ws_overview.sheet_view.rightToLeft = (lang == 'ar')
-        
-        # Title
-        ws_overview['A1'] = plan.title
-        ws_overview['A1'].font = Font(name='Arial', size=16, bold=True)
-        ws_overview['A1'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-        ws_overview.merge_cells('A1:D1')
-        
-        # Planning Period
-        row = 3
-        ws_overview[f'A{row}'] = "فترة التخطيط:" if lang == 'ar' else "Planning Period:"
-        ws_overview[f'A{row}'].font = section_font
-        ws_overview[f'B{row}'] = plan.planning_period
-        ws_overview[f'B{row}'].font = normal_font
-        
-        # Status
-        row += 1
-        ws_overview[f'A{row}'] = "الحالة:" if lang == 'ar' else "Status:"
-        ws_overview[f'A{row}'].font = section_font
-        ws_overview[f'B{row}'] = plan.status
-        ws_overview[f'B{row}'].font = normal_font
+        ws_overview = report.sheet("نظرة عامة - Overview" if lang == 'ar' else "Overview", widths=(25, 40, 40, 40))
+        ws_overview.row([plan.title], 'title', merge=(1, 4))
+        ws_overview.skip()
+        ws_overview.rows([
+            ["فترة التخطيط:" if lang == 'ar' else "Planning Period:", plan.planning_period],
+            ["الحالة:" if lang == 'ar' else "Status:", plan.status],
+        ], ('label', 'text'))
         
         # Organization Info
-        row += 2
-        ws_overview[f'A{row}'] = "معلومات المنظمة - Organization Information" if lang == 'ar' else "Organization Information"
-        ws_overview[f'A{row}'].font = subheader_font
-        ws_overview[f'A{row}'].fill = subheader_fill
-        ws_overview[f'A{row}'].alignment = center_alignment
-        ws_overview.merge_cells(f'A{row}:D{row}')
-        
-        row += 1
-        ws_overview[f'A{row}'] = "اسم المنظمة:" if lang == 'ar' else "Organization Name:"
-        ws_overview[f'A{row}'].font = section_font
-        ws_overview[f'B{row}'] = plan.organization_name or ""
-        ws_overview[f'B{row}'].font = normal_font
-        ws_overview[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-        
-        row += 1
-        ws_overview[f'A{row}'] = "القطاع:" if lang == 'ar' else "Industry Sector:"
-        ws_overview[f'A{row}'].font = section_font
-        ws_overview[f'B{row}'] = plan.industry_sector or ""
-        ws_overview[f'B{row}'].font = normal_font
-        ws_overview[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-        
-        row += 1
-        ws_overview[f'A{row}'] = "عدد الموظفين:" if lang == 'ar' else "Employee Count:"
-        ws_overview[f'A{row}'].font = section_font
-        ws_overview[f'B{row}'] = plan.employee_count or ""
-        ws_overview[f'B{row}'].font = normal_font
+        ws_overview.skip()
+        ws_overview.banner("معلومات المنظمة - Organization Information" if lang == 'ar' else "Organization Information", 'subheader')
+        ws_overview.rows([
+            ["القطاع:" if lang == 'ar' else "Industry Sector:", plan.industry_sector or ""],
+            ["عدد الموظفين:" if lang == 'ar' else "Employee Count:", plan.employee_count or ""],
+        ], ('label', 'text'))
         
         # Vision & Mission
-        row += 2
+        ws_overview.skip()
         if plan.vision_statement:
-            ws_overview[f'A{row}'] = "الرؤية - Vision" if lang == 'ar' else "Vision"
-            ws_overview[f'A{row}'].font = subheader_font
-            ws_overview[f'A{row}'].fill = subheader_fill
-            ws_overview[f'A{row}'].alignment = center_alignment
-            ws_overview.merge_cells(f'A{row}:D{row}')
-            
-            row += 1
-            ws_overview[f'A{row}'] = plan.vision_statement
-            ws_overview[f'A{row}'].font = normal_font
-            ws_overview[f'A{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-            ws_overview.merge_cells(f'A{row}:D{row}')
-            ws_overview.row_dimensions[row].height = 50
-            row += 2
+            ws_overview.banner("الرؤية - Vision" if lang == 'ar' else "Vision", 'subheader')
+            ws_overview.banner(plan.vision_statement, 'text', height=50)
+            ws_overview.skip()
         
         if plan.mission_statement:
-            ws_overview[f'A{row}'] = "الرسالة - Mission" if lang == 'ar' else "Mission"
-            ws_overview[f'A{row}'].font = subheader_font
-            ws_overview[f'A{row}'].fill = subheader_fill
-            ws_overview[f'A{row}'].alignment = center_alignment
-            ws_overview.merge_cells(f'A{row}:D{row}')
-            
-            row += 1
-            ws_overview[f'A{row}'] = plan.mission_statement
-            ws_overview[f'A{row}'].font = normal_font
-            ws_overview[f'A{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-            ws_overview.merge_cells(f'A{row}:D{row}')
-            ws_overview.row_dimensions[row].height = 50
-        
-        # Set column widths
-        ws_overview.column_dimensions['A'].width = 25
-        ws_overview.column_dimensions['B'].width = 40
-        ws_overview.column_dimensions['C'].width = 40
-        ws_overview.column_dimensions['D'].width = 40
+            ws_overview.banner("الرسالة - Mission" if lang == 'ar' else "Mission", 'subheader')
+            ws_overview.banner(plan.mission_statement, 'text', height=50)
         
         # ===== Sheet 2: Core Values (القيم الجوهرية) =====
-        core_values = json.loads(plan.core_values) if plan.core_values else []
+        core_values = plan.core_values or []
         if core_values:
-            ws_values = wb.create_sheet(title="القيم الجوهرية - Core Values" if lang == 'ar' else "Core Values")
-            ws_values.sheet_view.rightToLeft = (lang == 'ar')
-            
-            # Header
-            ws_values['A1'] = "القيم الجوهرية - Core Values" if lang == 'ar' else "Core Values"
-            ws_values['A1'].font = header_font
-            ws_values['A1'].fill = header_fill
-            ws_values['A1'].alignment = center_alignment
-            ws_values.merge_cells('A1:C1')
-            
-            # Column headers
-            ws_values['A3'] = "#"
-            ws_values['B3'] = "القيمة - Value" if lang == 'ar' else "Value"
-            ws_values['C3'] = "الوصف - Description" if lang == 'ar' else "Description"
-            
-            for col in ['A', 'B', 'C']:
-                ws_values[f'{col}3'].font = section_font
-                ws_values[f'{col}3'].fill = section_fill
-                ws_values[f'{col}3'].alignment = center_alignment
-                ws_values[f'{col}3'].border = border
-            
-            # Data
-            row = 4
-            for idx, value in enumerate(core_values, 1):
-                ws_values[f'A{row}'] = idx
-                ws_values[f'B{row}'] = value.get('value', '')
-                ws_values[f'C{row}'] = value.get('description', '')
-                
-                for col in ['A', 'B', 'C']:
-                    ws_values[f'{col}{row}'].font = normal_font
-                    ws_values[f'{col}{row}'].alignment = rtl_alignment if lang == 'ar' and col != 'A' else center_alignment if col == 'A' else ltr_alignment
-                    ws_values[f'{col}{row}'].border = border
-                
-                ws_values.row_dimensions[row].height = 40
-                row += 1
-            
-            ws_values.column_dimensions['A'].width = 8
-            ws_values.column_dimensions['B'].width = 30
-            ws_values.column_dimensions['C'].width = 60
+            ws_values = report.sheet("القيم الجوهرية - Core Values" if lang == 'ar' else "Core Values", widths=(8, 30, 60))
+            ws_values.banner("القيم الجوهرية - Core Values" if lang == 'ar' else "Core Values")
+            ws_values.skip()
+            ws_values.row(["#", "القيمة - Value" if lang == 'ar' else "Value",
+                           "الوصف - Description" if lang == 'ar' else "Description"], 'column')
+            ws_values.rows(
+                ([idx, value.get('value', ''), value.get('description', '')] for idx, value in enumerate(core_values, 1)),
+                ('cell_center', 'cell', 'cell'), height=40
+            )
         
         # ===== Sheet 3: Strategic Goals (الأهداف الاستراتيجية) =====
-        goals = json.loads(plan.strategic_goals) if plan.strategic_goals else []
+        goals = plan.strategic_goals or []
         if goals:
-            ws_goals = wb.create_sheet(title="الأهداف - Strategic Goals" if lang == 'ar' else "Strategic Goals")
-            ws_goals.sheet_view.rightToLeft = (lang == 'ar')
-            
-            # Header
-            ws_goals['A1'] = "الأهداف الاستراتيجية - Strategic Goals" if lang == 'ar' else "Strategic Goals"
-            ws_goals['A1'].font = header_font
-            ws_goals['A1'].fill = header_fill
-            ws_goals['A1'].alignment = center_alignment
-            ws_goals.merge_cells('A1:D1')
-            
-            # Column headers
-            ws_goals['A3'] = "#"
-            ws_goals['B3'] = "الهدف - Goal" if lang == 'ar' else "Goal"
-            ws_goals['C3'] = "الوصف - Description" if lang == 'ar' else "Description"
-            ws_goals['D3'] = "الإطار الزمني - Timeline" if lang == 'ar' else "Timeline"
-            
-            for col in ['A', 'B', 'C', 'D']:
-                ws_goals[f'{col}3'].font = section_font
-                ws_goals[f'{col}3'].fill = section_fill
-                ws_goals[f'{col}3'].alignment = center_alignment
-                ws_goals[f'{col}3'].border = border
-            
-            # Data
-            row = 4
-            for idx, goal in enumerate(goals, 1):
-                ws_goals[f'A{row}'] = idx
-                ws_goals[f'B{row}'] = goal.get('goal', '')
-                ws_goals[f'C{row}'] = goal.get('description', '')
-                ws_goals[f'D{row}'] = goal.get('timeline', '')
-                
-                for col in ['A', 'B', 'C', 'D']:
-                    ws_goals[f'{col}{row}'].font = normal_font
-                    ws_goals[f'{col}{row}'].alignment = rtl_alignment if lang == 'ar' and col != 'A' else center_alignment if col == 'A' else ltr_alignment
-                    ws_goals[f'{col}{row}'].border = border
-                
-                ws_goals.row_dimensions[row].height = 40
-                row += 1
-            
-            ws_goals.column_dimensions['A'].width = 8
-            ws_goals.column_dimensions['B'].width = 35
-            ws_goals.column_dimensions['C'].width = 50
-            ws_goals.column_dimensions['D'].width = 20
+            ws_goals = report.sheet("الأهداف - Strategic Goals" if lang == 'ar' else "Strategic Goals", widths=(8, 35, 50, 20))
+            ws_goals.banner("الأهداف الاستراتيجية - Strategic Goals" if lang == 'ar' else "Strategic Goals")
+            ws_goals.skip()
+            ws_goals.row(["#", "الهدف - Goal" if lang == 'ar' else "Goal",
+                          "الوصف - Description" if lang == 'ar' else "Description",
+                          "الإطار الزمني - Timeline" if lang == 'ar' else "Timeline"], 'column')
+            ws_goals.rows(
+                ([idx, goal.get('goal', ''), goal.get('description', ''), goal.get('timeline', '')]
+                 for idx, goal in enumerate(goals, 1)),
+                ('cell_center', 'cell', 'cell', 'cell'), height=40
+            )
         
         # ===== Sheet 4: SWOT Analysis =====
-        swot = json.loads(plan.swot_analysis) if plan.swot_analysis else {}
+        swot = plan.swot_analysis or {}
         if swot:
-            ws_swot = wb.create_sheet(title="تحليل SWOT" if lang == 'ar' else "SWOT Analysis")
-            ws_swot.sheet_view.rightToLeft = (lang == 'ar')
-            
-            # Header
-            ws_swot['A1'] = "تحليل SWOT" if lang == 'ar' else "SWOT Analysis"
-            ws_swot['A1'].font = header_font
-            ws_swot['A1'].fill = header_fill
-            ws_swot['A1'].alignment = center_alignment
-            ws_swot.merge_cells('A1:B1')
-            
-            # Strengths
-            row = 3
-            ws_swot[f'A{row}'] = "نقاط القوة - Strengths" if lang == 'ar' else "Strengths"
-            ws_swot[f'A{row}'].font = subheader_font
-            ws_swot[f'A{row}'].fill = subheader_fill
-            ws_swot[f'A{row}'].alignment = center_alignment
-            ws_swot.merge_cells(f'A{row}:B{row}')
-            
-            for idx, item in enumerate(swot.get('strengths', []), 1):
-                row += 1
-                ws_swot[f'A{row}'] = idx
-                ws_swot[f'B{row}'] = item
-                ws_swot[f'A{row}'].alignment = center_alignment
-                ws_swot[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                ws_swot[f'B{row}'].font = normal_font
-            
-            # Weaknesses
-            row += 2
-            ws_swot[f'A{row}'] = "نقاط الضعف - Weaknesses" if lang == 'ar' else "Weaknesses"
-            ws_swot[f'A{row}'].font = subheader_font
-            ws_swot[f'A{row}'].fill = subheader_fill
-            ws_swot[f'A{row}'].alignment = center_alignment
-            ws_swot.merge_cells(f'A{row}:B{row}')
-            
-            for idx, item in enumerate(swot.get('weaknesses', []), 1):
-                row += 1
-                ws_swot[f'A{row}'] = idx
-                ws_swot[f'B{row}'] = item
-                ws_swot[f'A{row}'].alignment = center_alignment
-                ws_swot[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                ws_swot[f'B{row}'].font = normal_font
-            
-            # Opportunities
-            row += 2
-            ws_swot[f'A{row}'] = "الفرص - Opportunities" if lang == 'ar' else "Opportunities"
-            ws_swot[f'A{row}'].font = subheader_font
-            ws_swot[f'A{row}'].fill = subheader_fill
-            ws_swot[f'A{row}'].alignment = center_alignment
-            ws_swot.merge_cells(f'A{row}:B{row}')
-            
-            for idx, item in enumerate(swot.get('opportunities', []), 1):
-                row += 1
-                ws_swot[f'A{row}'] = idx
-                ws_swot[f'B{row}'] = item
-                ws_swot[f'A{row}'].alignment = center_alignment
-                ws_swot[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                ws_swot[f'B{row}'].font = normal_font
-            
-            # Threats
-            row += 2
-            ws_swot[f'A{row}'] = "التهديدات - Threats" if lang == 'ar' else "Threats"
-            ws_swot[f'A{row}'].font = subheader_font
-            ws_swot[f'A{row}'].fill = subheader_fill
-            ws_swot[f'A{row}'].alignment = center_alignment
-            ws_swot.merge_cells(f'A{row}:B{row}')
-            
-            for idx, item in enumerate(swot.get('threats', []), 1):
-                row += 1
-                ws_swot[f'A{row}'] = idx
-                ws_swot[f'B{row}'] = item
-                ws_swot[f'A{row}'].alignment = center_alignment
-                ws_swot[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                ws_swot[f'B{row}'].font = normal_font
-            
-            ws_swot.column_dimensions['A'].width = 8
-            ws_swot.column_dimensions['B'].width = 80
+            ws_swot = report.sheet("تحليل SWOT" if lang == 'ar' else "SWOT Analysis", widths=(8, 80))
+            ws_swot.banner("تحليل SWOT" if lang == 'ar' else "SWOT Analysis")
+            
+            swot_categories = [
+                ("نقاط القوة - Strengths" if lang == 'ar' else "Strengths", swot.get('strengths', [])),
+                ("نقاط الضعف - Weaknesses" if lang == 'ar' else "Weaknesses", swot.get('weaknesses', [])),
+                ("الفرص - Opportunities" if lang == 'ar' else "Opportunities", swot.get('opportunities', [])),
+                ("التهديدات - Threats" if lang == 'ar' else "Threats", swot.get('threats', []))
+            ]
+            for category, items in swot_categories:
+                ws_swot.skip()
+                ws_swot.banner(category, 'subheader')
+                ws_swot.rows(([idx, item] for idx, item in enumerate(items, 1)), ('center', 'text'))
         
         # ===== Sheet 5: PESTEL Analysis =====
-        pestel = json.loads(plan.pestel_analysis) if plan.pestel_analysis else {}
+        pestel = plan.pestel_analysis or {}
         if pestel:
-            ws_pestel = wb.create_sheet(title="تحليل PESTEL" if lang == 'ar' else "PESTEL Analysis")
-            ws_pestel.sheet_view.rightToLeft = (lang == 'ar')
-            
-            # Header
-            ws_pestel['A1'] = "تحليل PESTEL" if lang == 'ar' else "PESTEL Analysis"
-            ws_pestel['A1'].font = header_font
-            ws_pestel['A1'].fill = header_fill
-            ws_pestel['A1'].alignment = center_alignment
-            ws_pestel.merge_cells('A1:B1')
+            ws_pestel = report.sheet("تحليل PESTEL" if lang == 'ar' else "PESTEL Analysis", widths=(8, 80))
+            ws_pestel.banner("تحليل PESTEL" if lang == 'ar' else "PESTEL Analysis")
+            ws_pestel.skip()
             
             categories = [
                 ("سياسية - Political" if lang == 'ar' else "Political", pestel.get('political', [])),
@@ -926,42 +714,21 @@ def export_excel(plan_id):
                 ("قانونية - Legal" if lang == 'ar' else "Legal", pestel.get('legal', []))
             ]
             
-            row = 3
             for category, items in categories:
-                ws_pestel[f'A{row}'] = category
-                ws_pestel[f'A{row}'].font = subheader_font
-                ws_pestel[f'A{row}'].fill = subheader_fill
-                ws_pestel[f'A{row}'].alignment = center_alignment
-                ws_pestel.merge_cells(f'A{row}:B{row}')
-                
-                for idx, item in enumerate(items, 1):
-                    row += 1
-                    ws_pestel[f'A{row}'] = idx
-                    ws_pestel[f'B{row}'] = item
-                    ws_pestel[f'A{row}'].alignment = center_alignment
-                    ws_pestel[f'B{row}'].alignment = rtl_alignment if lang == 'ar' else ltr_alignment
-                    ws_pestel[f'B{row}'].font = normal_font
-                
-                row += 2
-            
-            ws_pestel.column_dimensions['A'].width = 8
-            ws_pestel.column_dimensions['B'].width = 80
+                ws_pestel.banner(category, 'subheader')
+                ws_pestel.rows(([idx, item] for idx, item in enumerate(items, 1)), ('center', 'text'))
+                ws_pestel.skip()
         
         # ===== Sheet 6: KPIs =====
         kpis = db.session.query(StrategicKPI).filter_by(plan_id=plan_id).all()
         if kpis:
-            ws_kpis = wb.create_sheet(title="مؤشرات الأداء - KPIs" if lang == 'ar' else "KPIs")
-            ws_kpis.sheet_view.rightToLeft = (lang == 'ar')
-            
-            # Header
-            ws_kpis['A1'] = "مؤشرات الأداء الرئيسية - KPIs" if lang == 'ar' else "Key Performance Indicators"
-            ws_kpis['A1'].font = header_font
-            ws_kpis['A1'].fill = header_fill
-            ws_kpis['A1'].alignment = center_alignment
-            ws_kpis.merge_cells('A1:H1')
+            ws_kpis = report.sheet("مؤشرات الأداء - KPIs" if lang == 'ar' else "KPIs",
+                                   widths=(6, 35, 20, 15, 15, 15, 15, 12))
+            ws_kpis.banner("مؤشرات الأداء الرئيسية - KPIs" if lang == 'ar' else "Key Performance Indicators")
+            ws_kpis.skip()
             
             # Column headers
-            headers = [
+            ws_kpis.row([
                 "#",
                 "اسم المؤشر - KPI Name" if lang == 'ar' else "KPI Name",
                 "الفئة - Category" if lang == 'ar' else "Category",
@@ -970,67 +737,21 @@ def export_excel(plan_id):
                 "وحدة القياس - Unit" if lang == 'ar' else "Unit",
                 "الحالة - Status" if lang == 'ar' else "Status",
                 "التقدم % - Progress %" if lang == 'ar' else "Progress %"
-            ]
+            ], 'column')
             
-            for idx, header in enumerate(headers, 1):
-                col_letter = get_column_letter(idx)
-                ws_kpis[f'{col_letter}3'] = header
-                ws_kpis[f'{col_letter}3'].font = section_font
-                ws_kpis[f'{col_letter}3'].fill = section_fill
-                ws_kpis[f'{col_letter}3'].alignment = center_alignment
-                ws_kpis[f'{col_letter}3'].border = border
-            
-            # Data
-            row = 4
+            # Data; the progress cell is color coded
             for idx, kpi in enumerate(kpis, 1):
                 progress = 0
                 if kpi.target_value and kpi.target_value != 0:
-                    progress = round((kpi.current_value / kpi.target_value) * 100, 1)
-                
-                ws_kpis[f'A{row}'] = idx
-                ws_kpis[f'B{row}'] = kpi.name
-                ws_kpis[f'C{row}'] = kpi.category or ""
-                ws_kpis[f'D{row}'] = kpi.current_value
-                ws_kpis[f'E{row}'] = kpi.target_value
-                ws_kpis[f'F{row}'] = kpi.measurement_unit
-                ws_kpis[f'G{row}'] = kpi.status
-                ws_kpis[f'H{row}'] = f"{progress}%"
-                
-                for col in ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']:
-                    ws_kpis[f'{col}{row}'].font = normal_font
-                    ws_kpis[f'{col}{row}'].alignment = rtl_alignment if lang == 'ar' and col in ['B', 'C', 'F', 'G'] else center_alignment
-                    ws_kpis[f'{col}{row}'].border = border
-                
-                # Color code progress
-                if progress >= 80:
-                    ws_kpis[f'H{row}'].fill = PatternFill(start_color="22c55e", end_color="22c55e", fill_type="solid")
-                elif progress >= 50:
-                    ws_kpis[f'H{row}'].fill = PatternFill(start_color="eab308", end_color="eab308", fill_type="solid")
-                else:
-                    ws_kpis[f'H{row}'].fill = PatternFill(start_color="ef4444", end_color="ef4444", fill_type="solid")
+                    progress = round(((kpi.current_value or 0) / kpi.target_value) * 100, 1)
                 
-                row += 1
-            
-            ws_kpis.column_dimensions['A'].width = 6
-            ws_kpis.column_dimensions['B'].width = 35
-            ws_kpis.column_dimensions['C'].width = 20
-            ws_kpis.column_dimensions['D'].width = 15
-            ws_kpis.column_dimensions['E'].width = 15
-            ws_kpis.column_dimensions['F'].width = 15
-            ws_kpis.column_dimensions['G'].width = 15
-            ws_kpis.column_dimensions['H'].width = 12
-        
-        # Save to BytesIO
-        excel_buffer = BytesIO()
-        wb.save(excel_buffer)
-        excel_buffer.seek(0)
-        
-        # Prepare response
-        response = make_response(excel_buffer.getvalue())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename="strategic_plan_{plan_id}.xlsx"'
+                ws_kpis.row(
+                    [idx, kpi.name, kpi.category or "", kpi.current_value, kpi.target_value,
+                     kpi.measurement_unit, kpi.status, f"{progress}%"],
+                    ('cell_center', 'cell', 'cell', 'cell_center', 'cell_center', 'cell', 'cell', progress_style(progress))
+                )
         
-        return response
+        return report.response(f"strategic_plan_{plan_id}.xlsx")
         
     except Exception as e:
         current_app.logger.error(f"Excel generation error: {str(e)}")
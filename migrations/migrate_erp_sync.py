@@ -0,0 +1,35 @@
+"""
+Migration script to add incremental-sync columns to erp_integrations
+Run: python migrations/migrate_erp_sync.py
+"""
+import sys
+sys.path.append('.')
+
+from app import create_app, db
+
+COLUMNS = {
+    'sync_state': 'TEXT',
+    'sync_lease_owner': 'VARCHAR(100)',
+    'sync_lease_expires_at': 'TIMESTAMP',
+}
+
+def migrate():
+    """Add watermark state and lease columns"""
+    app = create_app()
+    
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        existing = {c['name'] for c in inspector.get_columns('erp_integrations')}
+        
+        with db.engine.begin() as connection:
+            for name, ddl in COLUMNS.items():
+                if name in existing:
+                    print(f"ℹ️ Column '{name}' already exists")
+                    continue
+                connection.execute(db.text(f"ALTER TABLE erp_integrations ADD COLUMN {name} {ddl}"))
+                print(f"✓ Column '{name}' added to erp_integrations")
+        
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == '__main__':
+    migrate()
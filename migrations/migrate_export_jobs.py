@@ -0,0 +1,38 @@
+"""
+Migration script to add worker lease columns to export_jobs
+Run: python migrations/migrate_export_jobs.py
+"""
+import sys
+sys.path.append('.')
+
+from app import create_app, db
+
+COLUMNS = {
+    'lease_owner': 'VARCHAR(100)',
+    'lease_expires_at': 'TIMESTAMP',
+    'heartbeat_at': 'TIMESTAMP',
+}
+
+def migrate():
+    """Add lease columns"""
+    app = create_app()
+    
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        if not inspector.has_table('export_jobs'):
+            print("ℹ️ Table 'export_jobs' does not exist (it is created on startup)")
+            return
+        existing = {c['name'] for c in inspector.get_columns('export_jobs')}
+        
+        with db.engine.begin() as connection:
+            for name, ddl in COLUMNS.items():
+                if name in existing:
+                    print(f"ℹ️ Column '{name}' already exists")
+                    continue
+                connection.execute(db.text(f"ALTER TABLE export_jobs ADD COLUMN {name} {ddl}"))
+                print(f"✓ Column '{name}' added to export_jobs")
+        
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == '__main__':
+    migrate()
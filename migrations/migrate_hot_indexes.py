@@ -0,0 +1,62 @@
+"""
+Migration script to add composite indexes for hot tenant queries
+Run: python migrations/migrate_hot_indexes.py [--check] [--seed ROWS]
+
+  --check        EXPLAIN the hot queries and exit non-zero if any of them
+                 falls back to a sequential scan on a hot table
+  --seed ROWS    seed a synthetic tenant of ROWS rows per table before the
+                 check (rolled back afterwards)
+"""
+import sys
+import argparse
+sys.path.append('.')
+
+from app import create_app, db
+from models import Organization, User, HREmployee
+from utils.db_indexes import ensure_indexes, audit_hot_queries, seed_audit_dataset
+
+def migrate():
+    """Create missing hot-query indexes"""
+    created = ensure_indexes(db)
+    for name in created:
+        print(f"✓ Index '{name}' created")
+    if not created:
+        print("ℹ️ All hot-query indexes already exist")
+
+def check(seed_rows=0):
+    """EXPLAIN the hot queries; returns True when none of them scans a hot table"""
+    try:
+        if seed_rows:
+            org_id, user_id, employee_id = seed_audit_dataset(db.session, seed_rows)
+        else:
+            org_id = db.session.query(Organization.id).order_by(Organization.id).limit(1).scalar()
+            user_id = db.session.query(User.id).order_by(User.id).limit(1).scalar()
+            employee_id = db.session.query(HREmployee.id).order_by(HREmployee.id).limit(1).scalar()
+        
+        results = audit_hot_queries(db.session, org_id, user_id, employee_id)
+    finally:
+        db.session.rollback()
+    
+    ok = True
+    for result in results:
+        if result['seq_scans']:
+            ok = False
+            print(f"✗ {result['name']}: sequential scan on {', '.join(result['seq_scans'])}")
+            print(result['plan'])
+        else:
+            print(f"✓ {result['name']}")
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add and audit hot-query indexes')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        migrate()
+        if args.check and not check(args.seed):
+            print("\n❌ Hot queries fall back to sequential scans")
+            sys.exit(1)
+    print("\n✅ Migration completed successfully!")
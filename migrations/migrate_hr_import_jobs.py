@@ -0,0 +1,36 @@
+"""
+Migration script to add background-processing columns to hr_data_imports
+Run: python migrations/migrate_hr_import_jobs.py
+"""
+import sys
+sys.path.append('.')
+
+from app import create_app, db
+
+COLUMNS = {
+    'processed_rows': 'INTEGER DEFAULT 0',
+    'lease_owner': 'VARCHAR(100)',
+    'lease_expires_at': 'TIMESTAMP',
+    'heartbeat_at': 'TIMESTAMP',
+}
+
+def migrate():
+    """Add checkpoint and lease columns"""
+    app = create_app()
+    
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        existing = {c['name'] for c in inspector.get_columns('hr_data_imports')}
+        
+        with db.engine.begin() as connection:
+            for name, ddl in COLUMNS.items():
+                if name in existing:
+                    print(f"ℹ️ Column '{name}' already exists")
+                    continue
+                connection.execute(db.text(f"ALTER TABLE hr_data_imports ADD COLUMN {name} {ddl}"))
+                print(f"✓ Column '{name}' added to hr_data_imports")
+        
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == '__main__':
+    migrate()
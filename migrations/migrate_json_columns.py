@@ -0,0 +1,86 @@
+"""
+Migration script to convert the JSON text columns of strategic plans and
+strategic identity projects to JSONType (utils/db_types.py)
+Run: python migrations/migrate_json_columns.py
+
+- Every database: empty strings become NULL and values that are not valid JSON
+  (old plain text) are stored as JSON strings, so each value parses.
+- PostgreSQL: the columns are altered from TEXT to JSONB.
+"""
+import sys
+sys.path.append('.')
+
+from app import create_app, db
+from utils.fast_json import dumps, loads
+
+JSON_COLUMNS = {
+    'strategic_plans': (
+        'current_challenges', 'opportunities', 'core_values', 'strategic_goals',
+        'swot_analysis', 'pestel_analysis', 'stakeholder_analysis',
+    ),
+    'strategic_identity_projects': (
+        'uploaded_files', 'swot_analysis', 'pestel_analysis', 'stakeholders_analysis',
+        'core_values', 'strategic_themes',
+    ),
+}
+
+def normalize_column(connection, table, column):
+    """Make every stored value valid JSON; returns the number of rows changed"""
+    rows = connection.execute(db.text(
+        f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL"
+    )).fetchall()
+
+    changed = 0
+    for row_id, value in rows:
+        if not isinstance(value, str):
+            continue
+        if not value.strip():
+            new_value = None
+        else:
+            try:
+                loads(value)
+                continue
+            except ValueError:
+                new_value = dumps(value)
+        connection.execute(
+            db.text(f"UPDATE {table} SET {column} = :value WHERE id = :id"),
+            {'value': new_value, 'id': row_id}
+        )
+        changed += 1
+    return changed
+
+def migrate():
+    """Normalize the stored JSON and switch PostgreSQL columns to JSONB"""
+    app = create_app()
+
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        is_postgres = db.engine.dialect.name == 'postgresql'
+
+        for table, columns in JSON_COLUMNS.items():
+            if not inspector.has_table(table):
+                print(f"ℹ️ Table '{table}' does not exist")
+                continue
+            types = {c['name']: c['type'] for c in inspector.get_columns(table)}
+
+            for column in columns:
+                if column not in types:
+                    print(f"ℹ️ Column '{table}.{column}' does not exist")
+                    continue
+                if is_postgres and types[column].__class__.__name__ == 'JSONB':
+                    print(f"ℹ️ Column '{table}.{column}' is already JSONB")
+                    continue
+
+                with db.engine.begin() as connection:
+                    changed = normalize_column(connection, table, column)
+                    if is_postgres:
+                        connection.execute(db.text(
+                            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB "
+                            f"USING {column}::jsonb"
+                        ))
+                print(f"✓ Column '{table}.{column}' migrated ({changed} values normalized)")
+
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == '__main__':
+    migrate()
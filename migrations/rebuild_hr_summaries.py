@@ -0,0 +1,29 @@
+"""
+Rebuild the HR monthly attendance / payroll summaries from the raw tables
+Run: python migrations/rebuild_hr_summaries.py [--org ID] [--year YYYY] [--month M]
+
+Creates the hr_monthly_summaries table if it does not exist yet, then
+recomputes the selected scope (everything by default). Safe to re-run; use it
+after bulk changes made outside the application (manual SQL, restores).
+"""
+import sys
+import argparse
+sys.path.append('.')
+
+from app import create_app, db
+from models import HRMonthlySummary
+from utils.hr_summaries import rebuild_monthly_summaries
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild HR monthly summaries')
+    parser.add_argument('--org', type=int, default=None)
+    parser.add_argument('--year', type=int, default=None)
+    parser.add_argument('--month', type=int, default=None, choices=range(1, 13), metavar='1-12')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        HRMonthlySummary.__table__.create(db.engine, checkfirst=True)
+        written = rebuild_monthly_summaries(db.session, org_id=args.org, year=args.year, month=args.month)
+        print(f"✓ {written} summary row(s) written")
+    print("\n✅ Rebuild completed successfully!")
@@ -1,6 +1,9 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
+from utils.db_types import JSONType
+from utils import fast_json
 
 class Role(db.Model):
     __tablename__ = 'roles'
@@ -115,6 +118,10 @@ class User(db.Model):
 
 class Project(db.Model):
     __tablename__ = 'projects'
+    __table_args__ = (
+        db.Index('ix_projects_user_status', 'user_id', 'status'),
+        db.Index('ix_projects_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -417,6 +424,11 @@ class UserERPModule(db.Model):
 
 class AILog(db.Model):
     __tablename__ = 'ai_logs'
+    __table_args__ = (
+        db.Index('ix_ai_logs_user_created', 'user_id', 'created_at'),
+        db.Index('ix_ai_logs_org_created', 'organization_id', 'created_at'),
+        db.Index('ix_ai_logs_created', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -455,8 +467,65 @@ class AILog(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+class AIUsageDaily(db.Model):
+    """Daily AI usage rollup - one row per (day, org, user, module, service, provider, status)"""
+    __tablename__ = 'ai_usage_daily'
+    __table_args__ = (
+        db.Index('ix_ai_usage_daily_user_day', 'user_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    organization_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer, nullable=False)
+    module = db.Column(db.String(50))
+    service_type = db.Column(db.String(50))
+    provider_type = db.Column(db.String(50))
+    status = db.Column(db.String(20))
+
+    # Aggregates
+    request_count = db.Column(db.Integer, default=0, nullable=False)
+    tokens_used = db.Column(db.BigInteger, default=0, nullable=False)
+    estimated_cost = db.Column(db.Float, default=0, nullable=False)
+    execution_time_ms = db.Column(db.BigInteger, default=0, nullable=False)  # Sum, for averages
+
+    # Latency histogram (request counts per bucket) used for percentile estimates
+    latency_500ms = db.Column(db.Integer, default=0, nullable=False)
+    latency_1s = db.Column(db.Integer, default=0, nullable=False)
+    latency_2s = db.Column(db.Integer, default=0, nullable=False)
+    latency_5s = db.Column(db.Integer, default=0, nullable=False)
+    latency_10s = db.Column(db.Integer, default=0, nullable=False)
+    latency_30s = db.Column(db.Integer, default=0, nullable=False)
+    latency_slow = db.Column(db.Integer, default=0, nullable=False)  # > 30s
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# One rollup row per key - NULLs never conflict in a unique index, so the nullable
+# key columns are indexed through COALESCE (rollup writes upsert on this index)
+db.Index('ux_ai_usage_daily_key',
+         AIUsageDaily.day,
+         db.func.coalesce(AIUsageDaily.organization_id, db.literal_column('0')),
+         AIUsageDaily.user_id,
+         db.func.coalesce(AIUsageDaily.module, db.literal_column("''")),
+         db.func.coalesce(AIUsageDaily.service_type, db.literal_column("''")),
+         db.func.coalesce(AIUsageDaily.provider_type, db.literal_column("''")),
+         db.func.coalesce(AIUsageDaily.status, db.literal_column("''")),
+         unique=True)
+
+
+@event.listens_for(AILog, 'after_insert')
+def _rollup_ai_log(mapper, connection, target):
+    """Fold every new AI log into the daily usage rollup inside the same transaction"""
+    from utils.ai_usage import record_ai_log
+    record_ai_log(connection, target)
+
 class ChatSession(db.Model):
     __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        db.Index('ix_chat_sessions_user_updated', 'user_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -466,6 +535,24 @@ class ChatSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    def get_messages(self):
+        """The messages array, parsed once per stored value ([] if unreadable)"""
+        raw = self.messages
+        parsed = self.__dict__.get('_parsed_messages')
+        if parsed is not None and parsed[0] is raw:
+            return parsed[1]
+        try:
+            messages = fast_json.loads(raw) if raw else []
+        except ValueError:
+            messages = []
+        self._parsed_messages = (raw, messages)
+        return messages
+    
+    def set_messages(self, messages):
+        """Store the messages array"""
+        self.messages = fast_json.dumps(messages)
+        self._parsed_messages = (self.messages, messages)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -672,6 +759,10 @@ class OrganizationSettings(db.Model):
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_read', 'user_id', 'is_read', 'created_at'),
+        db.Index('ix_notifications_status_created', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # NULL for broadcast
@@ -819,19 +910,19 @@ class StrategicPlan(db.Model):
     industry_sector = db.Column(db.String(100))
     employee_count = db.Column(db.Integer)
     organization_description = db.Column(db.Text)
-    current_challenges = db.Column(db.Text)  # JSON array
-    opportunities = db.Column(db.Text)  # JSON array
+    current_challenges = db.Column(JSONType)  # JSON array
+    opportunities = db.Column(JSONType)  # JSON array
     
     # Strategic Framework (AI-generated)
     vision_statement = db.Column(db.Text)
     mission_statement = db.Column(db.Text)
-    core_values = db.Column(db.Text)  # JSON array
-    strategic_goals = db.Column(db.Text)  # JSON array of goals
+    core_values = db.Column(JSONType)  # JSON array
+    strategic_goals = db.Column(JSONType)  # JSON array of goals
     
     # Analysis Results (stored as JSON)
-    swot_analysis = db.Column(db.Text)  # JSON: {strengths:[], weaknesses:[], opportunities:[], threats:[]}
-    pestel_analysis = db.Column(db.Text)  # JSON: {political:[], economic:[], social:[], technological:[], environmental:[], legal:[]}
-    stakeholder_analysis = db.Column(db.Text)  # JSON array of stakeholders
+    swot_analysis = db.Column(JSONType)  # JSON: {strengths:[], weaknesses:[], opportunities:[], threats:[]}
+    pestel_analysis = db.Column(JSONType)  # JSON: {political:[], economic:[], social:[], technological:[], environmental:[], legal:[]}
+    stakeholder_analysis = db.Column(JSONType)  # JSON array of stakeholders
     
     # Status & Metadata
     status = db.Column(db.String(50), default='draft')  # draft, active, completed, archived
@@ -845,7 +936,6 @@ class StrategicPlan(db.Model):
     initiatives = db.relationship('StrategicInitiative', backref='plan', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
-        import json
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -854,8 +944,8 @@ class StrategicPlan(db.Model):
             'planning_period': self.planning_period,
             'vision_statement': self.vision_statement,
             'mission_statement': self.mission_statement,
-            'core_values': json.loads(self.core_values) if self.core_values else [],
-            'strategic_goals': json.loads(self.strategic_goals) if self.strategic_goals else [],
+            'core_values': self.core_values or [],
+            'strategic_goals': self.strategic_goals or [],
             'status': self.status,
             'completion_percentage': self.completion_percentage,
             'kpis_count': len(self.kpis) if self.kpis else 0,
@@ -927,23 +1017,23 @@ class StrategicIdentityProject(db.Model):
     description = db.Column(db.Text)  # وصف مختصر للمؤسسة
     
     # File uploads for analysis
-    uploaded_files = db.Column(db.Text)  # JSON array of file paths
+    uploaded_files = db.Column(JSONType)  # JSON array of file paths
     
     # Current state inputs
     current_objectives = db.Column(db.Text)  # الأهداف الحالية أو المقترحة
     ongoing_initiatives = db.Column(db.Text)  # المبادرات أو المشاريع الجارية
     
     # AI-Generated Strategic Analysis (Output 1)
-    swot_analysis = db.Column(db.Text)  # JSON: strengths, weaknesses, opportunities, threats
-    pestel_analysis = db.Column(db.Text)  # JSON: political, economic, social, technological, environmental, legal
-    stakeholders_analysis = db.Column(db.Text)  # JSON: list of stakeholders with influence/interest
+    swot_analysis = db.Column(JSONType)  # JSON: strengths, weaknesses, opportunities, threats
+    pestel_analysis = db.Column(JSONType)  # JSON: political, economic, social, technological, environmental, legal
+    stakeholders_analysis = db.Column(JSONType)  # JSON: list of stakeholders with influence/interest
     current_state_summary = db.Column(db.Text)  # ملخص الوضع الحالي
     
     # Strategic Identity (Output 2)
     vision_statement = db.Column(db.Text)  # الرؤية
     mission_statement = db.Column(db.Text)  # الرسالة
-    core_values = db.Column(db.Text)  # JSON array: القيم المؤسسية
-    strategic_themes = db.Column(db.Text)  # JSON array: المجالات الاستراتيجية
+    core_values = db.Column(JSONType)  # JSON array: القيم المؤسسية
+    strategic_themes = db.Column(JSONType)  # JSON array: المجالات الاستراتيجية
     
     # Status & Metadata
     status = db.Column(db.String(50), default='draft')  # draft, analysis_complete, final
@@ -1107,6 +1197,8 @@ class HREmployee(db.Model):
     __tablename__ = 'hr_employees'
     __table_args__ = (
         db.UniqueConstraint('organization_id', 'employee_number', name='uq_org_employee_number'),
+        db.Index('ix_hr_employees_org_status', 'organization_id', 'status'),
+        db.Index('ix_hr_employees_org_department', 'organization_id', 'department'),
     )
     
     id = db.Column(db.Integer, primary_key=True)
@@ -1193,6 +1285,10 @@ class HRContract(db.Model):
 class HRAttendance(db.Model):
     """HR Attendance - جدول الحضور والانصراف"""
     __tablename__ = 'hr_attendance'
+    __table_args__ = (
+        db.Index('ix_hr_attendance_org_date', 'organization_id', 'date'),
+        db.Index('ix_hr_attendance_employee_date', 'employee_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('hr_employees.id'), nullable=False)
@@ -1256,6 +1352,10 @@ class HRLeave(db.Model):
 class HRPayroll(db.Model):
     """HR Payroll - جدول الرواتب"""
     __tablename__ = 'hr_payroll'
+    __table_args__ = (
+        db.Index('ix_hr_payroll_org_period', 'organization_id', 'year', 'month'),
+        db.Index('ix_hr_payroll_employee_period', 'employee_id', 'year', 'month'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('hr_employees.id'), nullable=False)
@@ -1306,6 +1406,35 @@ class HRPayroll(db.Model):
         }
 
 
+class HRMonthlySummary(db.Model):
+    """Monthly attendance / payroll summary - one row per (organization, employee, year, month)"""
+    __tablename__ = 'hr_monthly_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'employee_id', 'year', 'month', name='uq_hr_monthly_summary'),
+        db.Index('ix_hr_monthly_summaries_org_period', 'organization_id', 'year', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    employee_id = db.Column(db.Integer, nullable=False)  # No FK: rows are re-derived after the employee's rows change
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)  # 1-12
+
+    # Attendance
+    attendance_days = db.Column(db.Integer, default=0, nullable=False)
+    present_days = db.Column(db.Integer, default=0, nullable=False)
+    absent_days = db.Column(db.Integer, default=0, nullable=False)
+    late_days = db.Column(db.Integer, default=0, nullable=False)
+    half_days = db.Column(db.Integer, default=0, nullable=False)
+    total_hours = db.Column(db.Float, default=0, nullable=False)
+
+    # Payroll
+    payroll_records = db.Column(db.Integer, default=0, nullable=False)
+    base_salary = db.Column(db.Float, default=0, nullable=False)
+    net_salary = db.Column(db.Float, default=0, nullable=False)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class HRReward(db.Model):
     """HR Rewards - جدول المكافآت والحوافز"""
     __tablename__ = 'hr_rewards'
@@ -1462,9 +1591,15 @@ class HRDataImport(db.Model):
     column_mapping = db.Column(db.Text)  # JSON mapping of CSV columns to DB fields
     error_log = db.Column(db.Text)  # JSON array of errors
     
-    status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
+    status = db.Column(db.String(50), default='pending')  # pending, queued, processing, completed, failed
     imported_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     
+    # Background processing: checkpoint (last committed row) and worker lease
+    processed_rows = db.Column(db.Integer, default=0)
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
@@ -1478,12 +1613,59 @@ class HRDataImport(db.Model):
             'records_total': self.records_total,
             'records_imported': self.records_imported,
             'records_failed': self.records_failed,
+            'processed_rows': self.processed_rows or 0,
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
 
+# HR rows that feed the cached HR analytics / dashboard KPIs
+HR_DATA_MODELS = (HREmployee, HRContract, HRAttendance, HRLeave, HRPayroll,
+                  HRReward, HRDepartment, TerminationRecord, HRPerformance, HRDataImport)
+
+
+def _keep_previous_period(target, value, oldvalue, initiator):
+    """No-op: registering it with active_history is what loads the old value"""
+
+
+# Load the replaced value on assignment, so the flush hook also refreshes the
+# employee-month a row is moved out of (expired attributes have no history otherwise)
+for _attribute in (HRAttendance.organization_id, HRAttendance.employee_id, HRAttendance.date,
+                   HRPayroll.organization_id, HRPayroll.employee_id, HRPayroll.year, HRPayroll.month):
+    event.listen(_attribute, 'set', _keep_previous_period, active_history=True)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_hr_writes(session, flush_context):
+    """Remember which organizations' HR data this transaction changed"""
+    summary_keys = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, HR_DATA_MODELS) and obj.organization_id:
+            session.info.setdefault('hr_dirty_orgs', set()).add(obj.organization_id)
+        if isinstance(obj, (HRAttendance, HRPayroll)):
+            from utils.hr_summaries import summary_keys_for
+            summary_keys |= summary_keys_for(obj)
+    if summary_keys:
+        # Re-derive the touched employee-months inside the same transaction
+        from utils.hr_summaries import refresh_monthly_summaries
+        refresh_monthly_summaries(session.connection(), summary_keys)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_hr_caches(session):
+    org_ids = session.info.pop('hr_dirty_orgs', None)
+    if org_ids:
+        from utils.hr_analytics import invalidate_hr_analytics
+        for org_id in org_ids:
+            invalidate_hr_analytics(org_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_hr_writes(session):
+    session.info.pop('hr_dirty_orgs', None)
+
+
 class ERPIntegration(db.Model):
     """ERP Integration Configuration - تكامل ERP الخارجي"""
     __tablename__ = 'erp_integrations'
@@ -1505,9 +1687,14 @@ class ERPIntegration(db.Model):
     sync_performance = db.Column(db.Boolean, default=False)
     
     last_sync_at = db.Column(db.DateTime)
-    last_sync_status = db.Column(db.String(50))  # success, failed, partial
+    last_sync_status = db.Column(db.String(50))  # queued, running, success, failed, partial
     last_sync_message = db.Column(db.Text)
     
+    # Incremental sync: JSON {entity: {watermark, cursor, ...}} and the worker lease
+    sync_state = db.Column(db.Text)
+    sync_lease_owner = db.Column(db.String(100))
+    sync_lease_expires_at = db.Column(db.DateTime)
+    
     is_active = db.Column(db.Boolean, default=False)
     connection_status = db.Column(db.String(50), default='disconnected')  # connected, disconnected, error
     
@@ -1522,7 +1709,9 @@ class ERPIntegration(db.Model):
             'api_base_url': self.api_base_url,
             'is_active': self.is_active,
             'connection_status': self.connection_status,
-            'last_sync_at': self.last_sync_at.isoformat() if self.last_sync_at else None
+            'last_sync_at': self.last_sync_at.isoformat() if self.last_sync_at else None,
+            'last_sync_status': self.last_sync_status,
+            'last_sync_message': self.last_sync_message
         }
 
 
@@ -1621,6 +1810,138 @@ class BackupLog(db.Model):
         }
 
 
+class ExportJob(db.Model):
+    """Background data export jobs - مهام التصدير"""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    export_type = db.Column(db.String(50), nullable=False)  # users, organizations, ...
+    file_format = db.Column(db.String(10), nullable=False)  # csv, xlsx, pdf
+    params = db.Column(db.Text)  # JSON: filters and language
+
+    status = db.Column(db.String(50), default='pending')  # pending, running, completed, failed
+    row_count = db.Column(db.Integer, default=0)
+    file_path = db.Column(db.String(500))
+    file_name = db.Column(db.String(255))
+    error_message = db.Column(db.Text)
+
+    # Worker lease (utils/exports.py): renewed while rows are written, a job
+    # whose lease expired is resubmitted when polled or at startup
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'export_type': self.export_type,
+            'file_format': self.file_format,
+            'status': self.status,
+            'row_count': self.row_count,
+            'file_name': self.file_name,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class PDFJob(db.Model):
+    """Background PDF render jobs - مهام إنشاء ملفات PDF"""
+    __tablename__ = 'pdf_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # sha256 of (kind, entity, stamp, lang, template version) - also the cached file's name
+    cache_key = db.Column(db.String(64), nullable=False, index=True)
+    kind = db.Column(db.String(50), nullable=False)  # strategic_plan, consultation, project, ...
+    entity_id = db.Column(db.Integer)
+    lang = db.Column(db.String(5))
+
+    status = db.Column(db.String(50), default='pending')  # pending, completed, failed
+    file_path = db.Column(db.String(500))
+    file_name = db.Column(db.String(255))
+    file_size = db.Column(db.Integer)
+    error_message = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'entity_id': self.entity_id,
+            'status': self.status,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'error_message': self.error_message,
+            'done': self.status in ('completed', 'failed'),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class ReportFragment(db.Model):
+    """Formatted HTML of one message/section of a report - أجزاء التقارير المنسقة"""
+    __tablename__ = 'report_fragments'
+    __table_args__ = (
+        db.UniqueConstraint('owner_type', 'owner_id', 'variant', 'position', name='uq_report_fragment_slot'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_type = db.Column(db.String(30), nullable=False)  # chat_session, project
+    owner_id = db.Column(db.Integer, nullable=False)
+    variant = db.Column(db.String(20), nullable=False, default='')  # e.g. language of the formatting
+    position = db.Column(db.Integer, nullable=False)
+    source_hash = db.Column(db.String(40), nullable=False)  # sha1 of the formatter version and source
+    html = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PurgeJob(db.Model):
+    """Background tenant data purge jobs - مهام حذف بيانات المؤسسة"""
+    __tablename__ = 'purge_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No FK: the job outlives the organization it deletes
+    organization_id = db.Column(db.Integer, nullable=False, index=True)
+    scope = db.Column(db.String(20), nullable=False)  # hr, organization
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    status = db.Column(db.String(50), default='queued')  # queued, running, completed, failed
+    total_rows = db.Column(db.Integer, default=0)
+    deleted_rows = db.Column(db.Integer, default=0)
+    current_table = db.Column(db.String(100))
+    error_message = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # renewed by every committed batch
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        total = self.total_rows or 0
+        deleted = self.deleted_rows or 0
+        return {
+            'id': self.id,
+            'organization_id': self.organization_id,
+            'scope': self.scope,
+            'status': self.status,
+            'total_rows': total,
+            'deleted_rows': deleted,
+            'percent': round(min(deleted, total) * 100 / total, 1) if total else (100.0 if self.status == 'completed' else 0.0),
+            'current_table': self.current_table,
+            'error_message': self.error_message,
+            'done': self.status in ('completed', 'failed'),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
 class HRAnalysisReport(db.Model):
     __tablename__ = 'hr_analysis_reports'
     
@@ -1647,8 +1968,8 @@ class HRAnalysisReport(db.Model):
             'total_employees': self.total_employees,
             'active_employees': self.active_employees,
             'inactive_employees': self.inactive_employees,
-            'departments': json.loads(self.departments) if self.departments else {},
-            'job_titles': json.loads(self.job_titles) if self.job_titles else {},
-            'salary_stats': json.loads(self.salary_stats) if self.salary_stats else {},
+            'departments': fast_json.loads(self.departments) if self.departments else {},
+            'job_titles': fast_json.loads(self.job_titles) if self.job_titles else {},
+            'salary_stats': fast_json.loads(self.salary_stats) if self.salary_stats else {},
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
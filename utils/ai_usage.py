@@ -0,0 +1,384 @@
+"""
+AI Usage Rollups
+Maintains the ai_usage_daily table so admin dashboards never scan ai_logs.
+
+Rows are fed at write time by an after_insert hook on AILog (see models.py) and
+can be recompacted from the raw logs at any time with rebuild_ai_usage().
+Each (day, org, user, module, ...) key has exactly one row, enforced by the
+unique index ux_ai_usage_daily_key: writes upsert on it (INSERT ... ON CONFLICT
+DO UPDATE on PostgreSQL and SQLite), so workers racing on a new key add to the
+same row. Empty strings in the key are stored as NULL, which the index treats alike.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, case, select, and_, inspect, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import AILog, AIUsageDaily, User
+
+# (column, upper bound in ms) - the last bucket catches everything slower
+LATENCY_BUCKETS = (
+    ('latency_500ms', 500),
+    ('latency_1s', 1000),
+    ('latency_2s', 2000),
+    ('latency_5s', 5000),
+    ('latency_10s', 10000),
+    ('latency_30s', 30000),
+    ('latency_slow', None),
+)
+
+KEY_COLUMNS = ('day', 'organization_id', 'user_id', 'module', 'service_type', 'provider_type', 'status')
+KEY_STRING_COLUMNS = ('module', 'service_type', 'provider_type', 'status')
+KEY_INDEX = 'ux_ai_usage_daily_key'
+SUM_COLUMNS = ('request_count', 'tokens_used', 'estimated_cost', 'execution_time_ms') + tuple(
+    column for column, _ in LATENCY_BUCKETS)
+
+UPSERT_INSERTS = {
+    'postgresql': pg_insert,
+    'sqlite': sqlite_insert,
+}
+
+
+def _bucket_for(execution_time_ms):
+    ms = execution_time_ms or 0
+    for column, upper in LATENCY_BUCKETS:
+        if upper is None or ms <= upper:
+            return column
+
+
+def _key_index():
+    table = AIUsageDaily.__table__
+    return next(index for index in table.indexes if index.name == KEY_INDEX)
+
+
+def _key_conditions(table, key):
+    return [
+        table.c[name].is_(None) if value is None else table.c[name] == value
+        for name, value in key.items()
+    ]
+
+
+def record_ai_log(connection, log):
+    """
+    Add a single AILog to its daily rollup row.
+
+    Args:
+        connection: SQLAlchemy connection of the flush that inserted the log
+        log: The freshly inserted AILog instance
+    """
+    table = AIUsageDaily.__table__
+    created_at = log.created_at or datetime.utcnow()
+    key = {
+        'day': created_at.date(),
+        'organization_id': log.organization_id,
+        'user_id': log.user_id,
+        'module': log.module or None,
+        'service_type': log.service_type or None,
+        'provider_type': log.provider_type or None,
+        'status': log.status or None,
+    }
+    bucket = _bucket_for(log.execution_time_ms)
+
+    values = dict(key)
+    values.update({column: 0 for column, _ in LATENCY_BUCKETS})
+    values.update({
+        'request_count': 1,
+        'tokens_used': log.tokens_used or 0,
+        'estimated_cost': log.estimated_cost or 0,
+        'execution_time_ms': log.execution_time_ms or 0,
+        'updated_at': datetime.utcnow(),
+        bucket: 1,
+    })
+
+    upsert = UPSERT_INSERTS.get(connection.dialect.name)
+    if upsert is not None:
+        statement = upsert(table).values(**values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(_key_index().expressions),
+            set_={
+                'request_count': table.c.request_count + 1,
+                'tokens_used': table.c.tokens_used + statement.excluded.tokens_used,
+                'estimated_cost': table.c.estimated_cost + statement.excluded.estimated_cost,
+                'execution_time_ms': table.c.execution_time_ms + statement.excluded.execution_time_ms,
+                'updated_at': statement.excluded.updated_at,
+                bucket: table.c[bucket] + 1,
+            }
+        ))
+        return
+
+    # Other databases: update the key's row, or insert it (the unique index
+    # turns a racing second insert into an error instead of a duplicate row)
+    first_row = select(func.min(table.c.id)).where(and_(*_key_conditions(table, key))).scalar_subquery()
+    result = connection.execute(
+        table.update().where(table.c.id == first_row).values(
+            request_count=table.c.request_count + 1,
+            tokens_used=table.c.tokens_used + values['tokens_used'],
+            estimated_cost=table.c.estimated_cost + values['estimated_cost'],
+            execution_time_ms=table.c.execution_time_ms + values['execution_time_ms'],
+            updated_at=values['updated_at'],
+            **{bucket: table.c[bucket] + 1}
+        )
+    )
+    if not result.rowcount:
+        connection.execute(table.insert().values(**values))
+
+
+def _index_exists(engine, name):
+    # Read the catalogs directly: reflection skips expression indexes on SQLite
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            query = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"
+        elif engine.dialect.name == 'postgresql':
+            query = "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND indexname = :name"
+        else:
+            return name in {index['name'] for index in inspect(connection).get_indexes(AIUsageDaily.__tablename__)}
+        return connection.execute(text(query), {'name': name}).first() is not None
+
+
+def ensure_ai_usage_key_index(engine):
+    """
+    Create the unique rollup key index on databases that predate it, first
+    merging the duplicate rows that racing writers could leave behind.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        int: Duplicate rows merged away, or None when the index already existed
+    """
+    if not inspect(engine).has_table(AIUsageDaily.__tablename__) or _index_exists(engine, KEY_INDEX):
+        return None
+
+    table = AIUsageDaily.__table__
+    index = _key_index()
+    key = list(index.expressions)
+    merged = 0
+    with engine.begin() as connection:
+        # Empty strings and NULLs share an index entry - store NULL like record_ai_log
+        for name in KEY_STRING_COLUMNS:
+            connection.execute(table.update().where(table.c[name] == '').values(
+                {name: None, 'updated_at': table.c.updated_at}
+            ))
+
+        duplicates = connection.execute(
+            select(*key).group_by(*key).having(func.count(table.c.id) > 1)
+        ).all()
+        for values in duplicates:
+            match = and_(*[expression == value for expression, value in zip(key, values)])
+            row = connection.execute(
+                select(func.min(table.c.id), func.count(table.c.id), func.max(table.c.updated_at),
+                       *[func.sum(table.c[column]) for column in SUM_COLUMNS]).where(match)
+            ).one()
+            keep_id, count, updated_at = row[0], row[1], row[2]
+            connection.execute(table.update().where(table.c.id == keep_id).values(
+                updated_at=updated_at, **dict(zip(SUM_COLUMNS, row[3:]))
+            ))
+            connection.execute(table.delete().where(and_(match, table.c.id != keep_id)))
+            merged += count - 1
+
+        connection.execute(text('DROP INDEX IF EXISTS ix_ai_usage_daily_key'))
+        index.create(connection)
+    return merged
+
+
+def rebuild_ai_usage(session, start_day=None, end_day=None):
+    """
+    Recompute rollup rows from ai_logs for an inclusive day range (whole history by default).
+
+    Args:
+        session: SQLAlchemy database session
+        start_day: First day to rebuild (date) or None
+        end_day: Last day to rebuild (date) or None
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    table = AIUsageDaily.__table__
+    day_expr = func.date(AILog.created_at)
+    elapsed = func.coalesce(AILog.execution_time_ms, 0)
+
+    bucket_sums = []
+    lower = None
+    for column, upper in LATENCY_BUCKETS:
+        if upper is None:
+            condition = elapsed > lower
+        elif lower is None:
+            condition = elapsed <= upper
+        else:
+            condition = and_(elapsed > lower, elapsed <= upper)
+        bucket_sums.append(func.sum(case((condition, 1), else_=0)))
+        lower = upper
+
+    # Empty strings are grouped and stored as NULL, like record_ai_log stores them
+    group_columns = [AILog.organization_id, AILog.user_id] + [
+        func.nullif(getattr(AILog, name), '') for name in KEY_STRING_COLUMNS
+    ]
+    aggregate = select(
+        day_expr,
+        *group_columns,
+        func.count(AILog.id),
+        func.coalesce(func.sum(AILog.tokens_used), 0),
+        func.coalesce(func.sum(AILog.estimated_cost), 0),
+        func.sum(elapsed),
+        *bucket_sums,
+        func.max(AILog.created_at),
+    ).group_by(day_expr, *group_columns)
+
+    delete = table.delete()
+    if start_day:
+        delete = delete.where(table.c.day >= start_day)
+        aggregate = aggregate.where(AILog.created_at >= datetime.combine(start_day, time.min))
+    if end_day:
+        delete = delete.where(table.c.day <= end_day)
+        aggregate = aggregate.where(AILog.created_at < datetime.combine(end_day + timedelta(days=1), time.min))
+
+    target_columns = list(KEY_COLUMNS) + list(SUM_COLUMNS) + ['updated_at']
+
+    try:
+        session.execute(delete)
+        result = session.execute(table.insert().from_select(target_columns, aggregate))
+        session.commit()
+        return result.rowcount or 0
+    except Exception:
+        session.rollback()
+        raise
+
+
+def ensure_ai_usage_backfilled(session):
+    """Backfill the rollup table once on deployments that already have AI logs"""
+    if session.query(AIUsageDaily.id).first() is not None:
+        return False
+    if session.query(AILog.id).first() is None:
+        return False
+    rebuild_ai_usage(session)
+    return True
+
+
+def latency_percentile(buckets, percentile):
+    """
+    Estimate a latency percentile from histogram bucket counts.
+
+    Args:
+        buckets: Sequence of counts, ordered like LATENCY_BUCKETS
+        percentile: 0-100
+
+    Returns:
+        int: Upper bound (ms) of the bucket holding the percentile; the overflow
+             bucket reports the last finite bound. None when there is no data.
+    """
+    counts = [int(count or 0) for count in buckets]
+    total = sum(counts)
+    if not total:
+        return None
+    threshold = total * percentile / 100.0
+    running = 0
+    last_bound = None
+    for (column, upper), count in zip(LATENCY_BUCKETS, counts):
+        last_bound = upper or last_bound
+        running += count
+        if running >= threshold:
+            return upper or last_bound
+    return last_bound
+
+
+def _since(days):
+    # Rollup days are UTC dates (AILog.created_at is stored in UTC)
+    return datetime.utcnow().date() - timedelta(days=days - 1) if days else None
+
+
+def _bucket_columns():
+    return [func.sum(getattr(AIUsageDaily, column)) for column, _ in LATENCY_BUCKETS]
+
+
+def usage_totals(session, days=None):
+    """Request, token, cost and status totals plus latency percentiles in one query"""
+    query = session.query(
+        func.coalesce(func.sum(AIUsageDaily.request_count), 0),
+        func.coalesce(func.sum(AIUsageDaily.tokens_used), 0),
+        func.coalesce(func.sum(AIUsageDaily.estimated_cost), 0),
+        func.coalesce(func.sum(case((AIUsageDaily.status == 'success', AIUsageDaily.request_count), else_=0)), 0),
+        func.coalesce(func.sum(case((AIUsageDaily.status == 'failed', AIUsageDaily.request_count), else_=0)), 0),
+        *_bucket_columns()
+    )
+    since = _since(days)
+    if since:
+        query = query.filter(AIUsageDaily.day >= since)
+    row = query.one()
+    buckets = row[5:]
+    return {
+        'total_requests': int(row[0]),
+        'total_tokens': int(row[1]),
+        'total_cost': float(row[2]),
+        'success_count': int(row[3]),
+        'failed_count': int(row[4]),
+        'latency_p50_ms': latency_percentile(buckets, 50),
+        'latency_p95_ms': latency_percentile(buckets, 95),
+    }
+
+
+def usage_breakdown(session, column_name, days=None, order_by_count=False, limit=None, exclude_null=False):
+    """
+    Group rollups by one key column.
+
+    Returns:
+        list: (value, request_count, tokens, cost) tuples
+    """
+    column = getattr(AIUsageDaily, column_name)
+    count = func.sum(AIUsageDaily.request_count)
+    query = session.query(
+        column,
+        count.label('count'),
+        func.sum(AIUsageDaily.tokens_used).label('tokens'),
+        func.sum(AIUsageDaily.estimated_cost).label('cost')
+    )
+    since = _since(days)
+    if since:
+        query = query.filter(AIUsageDaily.day >= since)
+    if exclude_null:
+        query = query.filter(column != None)
+    query = query.group_by(column)
+    query = query.order_by(count.desc()) if order_by_count else query.order_by(column)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def daily_usage(session, days=30):
+    """Per-day request, token and cost totals, oldest first"""
+    query = session.query(
+        AIUsageDaily.day,
+        func.sum(AIUsageDaily.request_count).label('requests'),
+        func.sum(AIUsageDaily.tokens_used).label('tokens'),
+        func.sum(AIUsageDaily.estimated_cost).label('cost')
+    )
+    since = _since(days)
+    if since:
+        query = query.filter(AIUsageDaily.day >= since)
+    return query.group_by(AIUsageDaily.day).order_by(AIUsageDaily.day).all()
+
+
+def top_users(session, days=30, limit=10):
+    """Top users by request count: (user_id, username, email, request_count, total_cost)"""
+    count = func.sum(AIUsageDaily.request_count)
+    query = session.query(
+        User.id,
+        User.username,
+        User.email,
+        count.label('request_count'),
+        func.sum(AIUsageDaily.estimated_cost).label('total_cost')
+    ).join(AIUsageDaily, AIUsageDaily.user_id == User.id)
+    since = _since(days)
+    if since:
+        query = query.filter(AIUsageDaily.day >= since)
+    return query.group_by(User.id, User.username, User.email).order_by(count.desc()).limit(limit).all()
+
+
+if __name__ == '__main__':
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        print("🔄 Rebuilding AI usage rollups from ai_logs...")
+        written = rebuild_ai_usage(db.session)
+        print(f"✅ {written} rollup rows written")
@@ -0,0 +1,45 @@
+"""
+Background Task Utility
+Runs long jobs (large exports, imports, purges) off the request thread on a
+small bounded thread pool, each inside its own application context so it gets
+a fresh scoped database session.
+"""
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        max_workers = int(os.getenv('BACKGROUND_WORKERS', '2'))
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mcidia-bg')
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Queue fn(*args, **kwargs) on the background pool.
+
+    Must be called from within an app/request context; the task runs inside a
+    new app context of the same application.
+
+    Returns:
+        concurrent.futures.Future
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                print(f"[background] Task {getattr(fn, '__name__', fn)} failed: {e}")
+                traceback.print_exc()
+                raise
+
+    return get_executor().submit(run)
@@ -0,0 +1,277 @@
+"""
+TTL Cache Utility
+Two-tier cache for expensive, slowly-changing values (dashboard snapshots, KPIs):
+a per-worker in-memory dict backed by a shared on-disk store so every gunicorn
+worker on the host reuses the same computed value.
+
+Supports stale-while-revalidate: once an entry is older than `ttl` but younger
+than `stale_ttl`, callers get the stale value immediately while a single
+background thread recomputes it.
+
+The shared store holds pickles, so its directories are created private to the
+app user (0700); a directory owned by another user or writable by anyone else
+is refused and the cache falls back to the in-memory tier.
+
+LRUCache is the per-worker, size-bounded counterpart for values derived purely
+from their key (e.g. HTML rendered from a content hash) that never go stale.
+"""
+import os
+import stat
+import pickle
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.getenv('APP_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mcidia_cache')
+
+
+def private_directory(path):
+    """
+    Create `path` (mode 0700) if needed and check that only this user can
+    write to it. Returns False for a directory owned by another user, writable
+    by group/others, or that is not a real directory (e.g. a symlink).
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(info.st_mode):
+        return False
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        return False
+    return not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class TTLCache:
+    """
+    Usage:
+        cache = TTLCache('admin_dashboard', ttl=60, stale_ttl=600)
+        snapshot = cache.get_or_compute('snapshot', compute_snapshot)
+    """
+
+    def __init__(self, namespace, ttl=60, stale_ttl=None, shared=True, directory=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl if stale_ttl is not None else ttl
+        self.shared = shared
+        self.root = directory or DEFAULT_CACHE_DIR
+        self.directory = os.path.join(self.root, namespace)
+        self._directory_checked = False
+        self._local = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    # ---------- storage tiers ----------
+
+    def _shared_ready(self):
+        """True once the shared directory is known to be private to this user"""
+        if not self.shared:
+            return False
+        if not self._directory_checked:
+            if not (private_directory(self.root) and private_directory(self.directory)):
+                print(f"[TTLCache:{self.namespace}] Refusing cache directory {self.directory}: "
+                      f"it must be owned by this user and not writable by others; using memory only")
+                self.shared = False
+                return False
+            self._directory_checked = True
+        return True
+
+    def _path(self, key):
+        digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def _read_shared(self, key):
+        if not self._shared_ready():
+            return None
+        try:
+            with open(self._path(key), 'rb') as fh:
+                return pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _write_shared(self, key, entry):
+        if not self._shared_ready():
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            print(f"[TTLCache:{self.namespace}] Shared write failed: {e}")
+
+    def _entry(self, key):
+        entry = self._local.get(key)
+        if entry is None:
+            entry = self._read_shared(key)
+            if entry is not None:
+                self._local[key] = entry
+        else:
+            # Another worker may have refreshed the shared copy since
+            shared = self._read_shared(key) if time.time() - entry[0] > self.ttl else None
+            if shared is not None and shared[0] > entry[0]:
+                entry = self._local[key] = shared
+        return entry
+
+    # ---------- public API ----------
+
+    def get(self, key, allow_stale=False):
+        """Return the cached value or None when missing/expired"""
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        age = time.time() - entry[0]
+        limit = self.stale_ttl if allow_stale else self.ttl
+        return entry[1] if age <= limit else None
+
+    def set(self, key, value):
+        entry = (time.time(), value)
+        self._local[key] = entry
+        self._write_shared(key, entry)
+
+    def delete(self, key):
+        self._local.pop(key, None)
+        if self._shared_ready():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        for key in list(self._local):
+            self.delete(key)
+
+    # ---------- generations ----------
+
+    def _generation_path(self, group):
+        digest = hashlib.sha1(f"generation:{group}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.gen")
+
+    def generation(self, group):
+        """
+        Current generation token of a key group. Build keys as
+        f"{group}:{cache.generation(group)}:..." and call bump(group) to
+        invalidate all of them at once, in every worker.
+        """
+        if not self._shared_ready():
+            return self._generations.get(group, '0')
+        try:
+            with open(self._generation_path(group), encoding='utf-8') as fh:
+                return fh.read().strip() or '0'
+        except OSError:
+            return '0'
+
+    def bump(self, group):
+        """Invalidate every key built from the group's current generation"""
+        token = str(time.time_ns())
+        if self._shared_ready():
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                    fh.write(token)
+                os.replace(tmp_path, self._generation_path(group))
+            except OSError as e:
+                print(f"[TTLCache:{self.namespace}] Generation bump failed: {e}")
+        else:
+            self._generations[group] = token
+        # Entries of older generations are unreachable now; drop them locally
+        prefix = f"{group}:"
+        for key in [k for k in self._local if str(k).startswith(prefix)]:
+            self._local.pop(key, None)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return a cached value, computing it if needed.
+
+        Args:
+            key: Cache key
+            compute: Zero-argument callable producing the value. Must be safe to
+                     run in a background thread (push its own app context).
+        """
+        entry = self._entry(key)
+        now = time.time()
+        if entry is not None:
+            age = now - entry[0]
+            if age <= self.ttl:
+                return entry[1]
+            if age <= self.stale_ttl:
+                self._refresh_in_background(key, compute)
+                return entry[1]
+
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key, compute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.set(key, compute())
+            except Exception as e:
+                print(f"[TTLCache:{self.namespace}] Background refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"cache-refresh-{self.namespace}", daemon=True).start()
+
+
+class LRUCache:
+    """
+    In-memory cache holding at most `maxsize` entries, evicting the least
+    recently used one.
+
+    Usage:
+        cache = LRUCache(maxsize=512)
+        html = cache.get_or_compute(content_hash, render)
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Computed outside the lock; two threads may both compute a new key
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
@@ -1,12 +1,32 @@
 """
 Chart Data Generator Module for MCIDIA
 Generates AI-powered chart configurations for Plotly and Chart.js
+
+- AI responses: chart blocks are extracted once, when the response is stored,
+  and kept on the message in normalized form (numeric data, colors and
+  options applied, tagged with CHART_SPEC_VERSION). Reading a session back
+  never scans or re-styles them.
+- Plan charts: the SWOT, PESTEL and KPI payloads of a strategic plan are
+  built once per plan revision (plan and KPI updated_at) and kept in a
+  per-worker LRU; bump CHART_PAYLOAD_VERSION when a generator changes.
+- PDFs draw the same configs on the server (utils/chart_images).
 """
 
+import os
 import json
 import re
 from typing import Dict, List, Any, Optional
 
+from utils.cache import LRUCache
+
+CHART_SPEC_VERSION = 1
+CHART_PAYLOAD_VERSION = '1'
+CHART_PAYLOAD_CACHE_SIZE = int(os.getenv('CHART_PAYLOAD_CACHE_SIZE', '256'))
+
+CHART_BLOCK_PATTERN = re.compile(r'```chart\s*\n?([\s\S]*?)\n?```', re.IGNORECASE)
+
+_payload_cache = LRUCache(CHART_PAYLOAD_CACHE_SIZE)
+
 
 class ChartDataGenerator:
     """
@@ -134,29 +154,21 @@ Be accurate with the data and numbers provided.
     def extract_charts_from_response(cls, response: str) -> tuple:
         """
         Extracts chart JSON blocks from AI response.
-        Returns: (cleaned_response, list_of_chart_configs)
+        Returns: (cleaned_response, list_of_normalized_chart_configs)
         """
         charts = []
-        cleaned_response = response
         
-        # Pattern to match ```chart ... ``` blocks
-        chart_pattern = r'```chart\s*\n?([\s\S]*?)\n?```'
-        
-        matches = re.findall(chart_pattern, response, re.IGNORECASE)
-        
-        for match in matches:
+        def collect(match):
             try:
-                chart_data = json.loads(match.strip())
-                # Validate and enhance chart config
-                if cls._validate_chart_config(chart_data):
-                    enhanced_chart = cls._enhance_chart_config(chart_data)
-                    charts.append(enhanced_chart)
+                chart = cls.normalize_chart_config(json.loads(match.group(1).strip()))
             except json.JSONDecodeError:
-                continue
+                chart = None
+            if chart:
+                charts.append(chart)
+            return ''
         
-        # Remove chart blocks from response
-        cleaned_response = re.sub(chart_pattern, '', response, flags=re.IGNORECASE)
-        cleaned_response = cleaned_response.strip()
+        # One pass both collects the ```chart``` blocks and removes them
+        cleaned_response = CHART_BLOCK_PATTERN.sub(collect, response).strip()
         
         return cleaned_response, charts
     
@@ -166,6 +178,51 @@ Be accurate with the data and numbers provided.
         required = ['type', 'labels', 'datasets']
         return all(key in config for key in required)
     
+    @staticmethod
+    def _number(value):
+        """A data point as a number ({x, y} points are kept for scatter charts)"""
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, dict):
+            return value
+        try:
+            return float(str(value).replace(',', '').rstrip('%'))
+        except (TypeError, ValueError):
+            return 0
+    
+    @classmethod
+    def normalize_chart_config(cls, config: Any) -> Optional[Dict]:
+        """
+        Canonical stored form of a chart config: validated, numeric data,
+        styled once. Returns None when the config cannot be drawn.
+        """
+        if not isinstance(config, dict) or not cls._validate_chart_config(config):
+            return None
+        if config.get('v') == CHART_SPEC_VERSION:
+            return config
+        
+        datasets = []
+        for dataset in config.get('datasets') or []:
+            if isinstance(dataset, dict):
+                dataset = dict(dataset)
+                dataset['data'] = [cls._number(v) for v in dataset.get('data') or []]
+                datasets.append(dataset)
+        if not datasets:
+            return None
+        
+        chart = {
+            'type': str(config.get('type') or 'bar').strip(),
+            'title': str(config.get('title') or ''),
+            'labels': [str(label) for label in config.get('labels') or []],
+            'datasets': datasets,
+            'options': dict(config['options']) if isinstance(config.get('options'), dict) else {}
+        }
+        chart = cls._enhance_chart_config(chart)
+        chart['v'] = CHART_SPEC_VERSION
+        return chart
+    
     @classmethod
     def _enhance_chart_config(cls, config: Dict) -> Dict:
         """Enhances chart config with colors and styling."""
@@ -328,6 +385,100 @@ Be accurate with the data and numbers provided.
             }]
         }
     
+    @classmethod
+    def generate_pestel_radar_chart(cls, pestel_data: Dict, lang: str = 'ar') -> Dict:
+        """Generates a radar chart of the number of factors per PESTEL category."""
+        return {
+            'type': 'radar',
+            'title': 'توزيع عوامل PESTEL' if lang == 'ar' else 'PESTEL Factors Distribution',
+            'labels': cls._pestel_labels(lang),
+            'datasets': [{
+                'label': 'عدد العوامل' if lang == 'ar' else 'Number of Factors',
+                'data': cls._pestel_counts(pestel_data),
+                'backgroundColor': 'rgba(39, 103, 177, 0.2)',
+                'borderColor': '#2767B1',
+                'borderWidth': 2
+            }],
+            'options': {
+                'scales': {
+                    'r': {'beginAtZero': True}
+                }
+            }
+        }
+    
+    @classmethod
+    def generate_pestel_bar_chart(cls, pestel_data: Dict, lang: str = 'ar') -> Dict:
+        """Generates a bar chart comparing the PESTEL categories."""
+        return {
+            'type': 'bar',
+            'title': 'مقارنة عوامل PESTEL' if lang == 'ar' else 'PESTEL Factors Comparison',
+            'labels': cls._pestel_labels(lang),
+            'datasets': [{
+                'label': 'عدد العوامل' if lang == 'ar' else 'Number of Factors',
+                'data': cls._pestel_counts(pestel_data),
+                'backgroundColor': ['#0A2756', '#2767B1', '#17a2b8', '#ffc107', '#28a745', '#dc3545']
+            }]
+        }
+    
+    @staticmethod
+    def _pestel_labels(lang: str) -> List[str]:
+        if lang == 'ar':
+            return ['سياسي', 'اقتصادي', 'اجتماعي', 'تقني', 'بيئي', 'قانوني']
+        return ['Political', 'Economic', 'Social', 'Technological', 'Environmental', 'Legal']
+    
+    @staticmethod
+    def _pestel_counts(pestel_data: Dict) -> List[int]:
+        keys = ['political', 'economic', 'social', 'technological', 'environmental', 'legal']
+        return [len(pestel_data.get(k) or []) for k in keys]
+    
+    @staticmethod
+    def _kpi_progress(kpi: Dict) -> float:
+        target = kpi.get('target_value') or 0
+        return ((kpi.get('current_value') or 0) / target) * 100 if target > 0 else 0
+    
+    @classmethod
+    def generate_kpi_status_chart(cls, kpis: List[Dict], lang: str = 'ar') -> Dict:
+        """Generates a doughnut chart of KPIs on track, at risk and behind."""
+        on_track = at_risk = behind = 0
+        for kpi in kpis:
+            progress = cls._kpi_progress(kpi)
+            if progress >= 80:
+                on_track += 1
+            elif progress >= 50:
+                at_risk += 1
+            else:
+                behind += 1
+        
+        return {
+            'type': 'doughnut',
+            'title': 'حالة المؤشرات' if lang == 'ar' else 'KPI Status',
+            'labels': ['على المسار', 'في خطر', 'متأخر'] if lang == 'ar' else ['On Track', 'At Risk', 'Behind'],
+            'datasets': [{
+                'data': [on_track, at_risk, behind],
+                'backgroundColor': ['#28a745', '#ffc107', '#dc3545']
+            }]
+        }
+    
+    @classmethod
+    def generate_kpi_progress_chart(cls, kpis: List[Dict], lang: str = 'ar') -> Dict:
+        """Generates a horizontal bar chart of the progress of the first five KPIs."""
+        return {
+            'type': 'bar',
+            'title': 'نسبة التقدم' if lang == 'ar' else 'Progress %',
+            'labels': [kpi.get('name', '')[:15] for kpi in kpis[:5]],
+            'datasets': [{
+                'label': 'التقدم %' if lang == 'ar' else 'Progress %',
+                'data': [round(cls._kpi_progress(kpi), 1) for kpi in kpis[:5]],
+                'backgroundColor': '#2767B1'
+            }],
+            'options': {
+                'indexAxis': 'y',
+                'scales': {
+                    'x': {'beginAtZero': True, 'max': 100}
+                }
+            }
+        }
+    
     @classmethod
     def generate_strategic_goals_chart(cls, goals: List[Dict], lang: str = 'ar') -> Dict:
         """Generates a horizontal bar chart for strategic goals by focus area."""
@@ -427,3 +578,50 @@ def get_ai_chart_instructions(lang: str = 'ar') -> str:
 def process_ai_response_for_charts(response: str) -> tuple:
     """Helper function to extract charts from AI response."""
     return ChartDataGenerator.extract_charts_from_response(response)
+
+
+def _build_plan_charts(swot: Dict, pestel: Dict, kpis: List[Dict], lang: str) -> Dict:
+    generator = ChartDataGenerator
+    return {
+        'swot': generator.generate_swot_chart(swot, lang) if swot else None,
+        'pestel_radar': generator.generate_pestel_radar_chart(pestel, lang) if pestel else None,
+        'pestel_bar': generator.generate_pestel_bar_chart(pestel, lang) if pestel else None,
+        'kpis': generator.generate_kpis_bar_chart(kpis, lang) if kpis else None,
+        'kpi_status': generator.generate_kpi_status_chart(kpis, lang) if kpis else None,
+        'kpi_progress': generator.generate_kpi_progress_chart(kpis, lang) if kpis else None
+    }
+
+
+def get_plan_charts(plan, kpis, lang: str = 'ar') -> Dict:
+    """
+    Chart payloads of a strategic plan's dashboards and PDF (SWOT, PESTEL, KPIs).
+    
+    Built once per plan revision and shared; callers must not modify them.
+    Charts whose data is missing are None.
+    """
+    key = (CHART_PAYLOAD_VERSION, 'strategic_plan', plan.id, plan.updated_at,
+           tuple((k.id, k.updated_at) for k in kpis), lang)
+    
+    def build():
+        try:
+            swot = plan.swot_analysis or {}
+            pestel = plan.pestel_analysis or {}
+        except (TypeError, ValueError):
+            swot, pestel = {}, {}
+        swot = swot if isinstance(swot, dict) else {}
+        pestel = pestel if isinstance(pestel, dict) else {}
+        kpi_data = [{'name': k.name or '', 'current_value': k.current_value or 0,
+                     'target_value': k.target_value or 0} for k in kpis]
+        return _build_plan_charts(swot, pestel, kpi_data, lang)
+    
+    return _payload_cache.get_or_compute(key, build)
+
+
+def stored_charts(message: Dict) -> List[Dict]:
+    """Normalized charts of a stored chat message (older messages are normalized on read)"""
+    charts = []
+    for chart in message.get('charts') or []:
+        chart = ChartDataGenerator.normalize_chart_config(chart)
+        if chart:
+            charts.append(chart)
+    return charts
@@ -0,0 +1,355 @@
+"""
+Chart Images
+Draws chart configs (as built by utils/chart_generator) as SVG on the server,
+so PDF reports carry their charts without images captured in the browser.
+
+- Types: bar (vertical and horizontal), line, area, scatter, pie, doughnut,
+  polar area, radar, funnel and gauge; other types are drawn as bars.
+- Output: standalone SVG, embedded in reports as data URIs. WeasyPrint draws
+  it as vectors and lays out the (Arabic) text itself.
+- Cache: images are kept in a per-worker LRU keyed by a hash of the config, so
+  a chart shared by several reports is drawn once.
+
+Usage:
+    <img src="{{ chart_image_uri(chart) }}">
+"""
+import os
+import json
+import math
+import base64
+import hashlib
+
+from markupsafe import escape
+
+from utils.cache import LRUCache
+
+CHART_IMAGE_CACHE_SIZE = int(os.getenv('CHART_IMAGE_CACHE_SIZE', '256'))
+CHART_WIDTH = 640
+CHART_HEIGHT = 360
+FONT_FAMILY = "Cairo, 'DejaVu Sans', sans-serif"
+PALETTE = ['#0A2756', '#2767B1', '#2C8C56', '#F59E0B', '#EF4444', '#8B5CF6', '#3498db', '#1abc9c']
+
+_image_cache = LRUCache(CHART_IMAGE_CACHE_SIZE)
+
+
+# ==================== helpers ====================
+
+def _value(point):
+    if isinstance(point, dict):
+        point = point.get('y', point.get('r', 0))
+    try:
+        value = float(point)
+    except (TypeError, ValueError):
+        return 0.0
+    return value if math.isfinite(value) else 0.0
+
+
+def _color(color, index, fallback_index=None):
+    """Color of item `index` from a dataset color (a list or a single color)"""
+    if isinstance(color, (list, tuple)):
+        color = color[index % len(color)] if color else None
+    if isinstance(color, str) and color:
+        return color
+    return PALETTE[(index if fallback_index is None else fallback_index) % len(PALETTE)]
+
+
+def _short(text, length=16):
+    text = str(text)
+    return text if len(text) <= length else text[:length - 1] + '…'
+
+
+def _fmt(value):
+    return f'{value:,.0f}' if abs(value) >= 100 or value == int(value) else f'{value:,.1f}'
+
+
+def _text(x, y, text, size=11, anchor='middle', color='#4b5563', weight='normal'):
+    return (f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size}" text-anchor="{anchor}" '
+            f'fill="{color}" font-weight="{weight}">{escape(text)}</text>')
+
+
+def _nice_ticks(low, high, count=5):
+    """Round axis ticks covering [low, high]"""
+    if high <= low:
+        high = low + 1
+    raw = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    start = math.floor(low / step) * step
+    ticks = []
+    tick = start
+    while tick < high + step * 0.5:
+        ticks.append(round(tick, 10))
+        tick += step
+    return ticks
+
+
+def _legend(items, y, width):
+    """One centered row of (label, color) swatches"""
+    items = items[:8]
+    slot = min(140, (width - 40) / max(len(items), 1))
+    x = (width - slot * len(items)) / 2
+    parts = []
+    for label, color in items:
+        parts.append(f'<rect x="{x:.1f}" y="{y - 9:.1f}" width="10" height="10" rx="2" fill="{escape(color)}"/>')
+        parts.append(_text(x + 14, y, _short(label, 18), size=10, anchor='start'))
+        x += slot
+    return parts
+
+
+def _series(config):
+    labels = config.get('labels') or []
+    datasets = [d for d in config.get('datasets') or [] if isinstance(d, dict)]
+    count = max([len(labels)] + [len(d.get('data') or []) for d in datasets])
+    labels = list(labels) + [''] * (count - len(labels))
+    values = [[_value(p) for p in (d.get('data') or [])] + [0.0] * (count - len(d.get('data') or []))
+              for d in datasets]
+    return labels, datasets, values
+
+
+# ==================== chart types ====================
+
+def _bar(config, width, height, top):
+    labels, datasets, values = _series(config)
+    options = config.get('options') or {}
+    horizontal = options.get('indexAxis') == 'y' or config.get('type') == 'funnel'
+    flat = [v for series in values for v in series] or [0]
+    ticks = _nice_ticks(min(0, min(flat)), max(flat))
+    low, high = ticks[0], ticks[-1]
+    legend = len(datasets) > 1
+    bottom = height - (46 if legend else 28)
+    parts = []
+
+    if horizontal:
+        left, right = 130, width - 24
+        scale = lambda v: left + (v - low) / (high - low) * (right - left)
+        for tick in ticks:
+            x = scale(tick)
+            parts.append(f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" y2="{bottom}" stroke="#e5e7eb"/>')
+            parts.append(_text(x, bottom + 14, _fmt(tick), size=9, color='#6b7280'))
+        band = (bottom - top) / max(len(labels), 1)
+        bar = band * 0.7 / max(len(datasets), 1)
+        for i, label in enumerate(labels):
+            y = top + band * i + band * 0.15
+            parts.append(_text(left - 8, y + band * 0.35 + 4, _short(label, 20), size=10, anchor='end'))
+            for d, dataset in enumerate(datasets):
+                x0, x1 = sorted((scale(0), scale(values[d][i])))
+                color = _color(dataset.get('backgroundColor'), i, d if len(datasets) > 1 else i)
+                parts.append(f'<rect x="{x0:.1f}" y="{y + bar * d:.1f}" width="{max(x1 - x0, 0.5):.1f}" '
+                             f'height="{bar * 0.9:.1f}" rx="2" fill="{escape(color)}"/>')
+    else:
+        left, right = 56, width - 20
+        scale = lambda v: bottom - (v - low) / (high - low) * (bottom - top)
+        for tick in ticks:
+            y = scale(tick)
+            parts.append(f'<line x1="{left}" y1="{y:.1f}" x2="{right}" y2="{y:.1f}" stroke="#e5e7eb"/>')
+            parts.append(_text(left - 6, y + 3, _fmt(tick), size=9, anchor='end', color='#6b7280'))
+        band = (right - left) / max(len(labels), 1)
+        bar = band * 0.7 / max(len(datasets), 1)
+        for i, label in enumerate(labels):
+            x = left + band * i + band * 0.15
+            parts.append(_text(left + band * (i + 0.5), bottom + 14, _short(label, max(int(band / 6), 4)), size=10))
+            for d, dataset in enumerate(datasets):
+                y0, y1 = sorted((scale(0), scale(values[d][i])))
+                color = _color(dataset.get('backgroundColor'), i, d if len(datasets) > 1 else i)
+                parts.append(f'<rect x="{x + bar * d:.1f}" y="{y0:.1f}" width="{bar * 0.9:.1f}" '
+                             f'height="{max(y1 - y0, 0.5):.1f}" rx="2" fill="{escape(color)}"/>')
+
+    if legend:
+        parts += _legend([(d.get('label', ''), _color(d.get('backgroundColor'), 0, i))
+                          for i, d in enumerate(datasets)], height - 10, width)
+    return parts
+
+
+def _line(config, width, height, top):
+    labels, datasets, values = _series(config)
+    chart_type = config.get('type')
+    flat = [v for series in values for v in series] or [0]
+    ticks = _nice_ticks(min(0, min(flat)), max(flat))
+    low, high = ticks[0], ticks[-1]
+    legend = len(datasets) > 1
+    left, right, bottom = 56, width - 24, height - (46 if legend else 28)
+    scale = lambda v: bottom - (v - low) / (high - low) * (bottom - top)
+    step = (right - left) / max(len(labels) - 1, 1)
+    parts = []
+
+    for tick in ticks:
+        y = scale(tick)
+        parts.append(f'<line x1="{left}" y1="{y:.1f}" x2="{right}" y2="{y:.1f}" stroke="#e5e7eb"/>')
+        parts.append(_text(left - 6, y + 3, _fmt(tick), size=9, anchor='end', color='#6b7280'))
+    for i, label in enumerate(labels):
+        parts.append(_text(left + step * i, bottom + 14, _short(label, max(int(step / 6), 4)), size=10))
+
+    for d, dataset in enumerate(datasets):
+        color = _color(dataset.get('borderColor') or dataset.get('backgroundColor'), d)
+        points = [(left + step * i, scale(v)) for i, v in enumerate(values[d])]
+        if not points:
+            continue
+        path = ' '.join(f'{x:.1f},{y:.1f}' for x, y in points)
+        if chart_type == 'area' or dataset.get('fill'):
+            area = f'{left:.1f},{scale(max(low, 0)):.1f} {path} {points[-1][0]:.1f},{scale(max(low, 0)):.1f}'
+            parts.append(f'<polygon points="{area}" fill="{escape(color)}" fill-opacity="0.2"/>')
+        if chart_type != 'scatter':
+            parts.append(f'<polyline points="{path}" fill="none" stroke="{escape(color)}" stroke-width="2.5"/>')
+        for x, y in points:
+            parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3.5" fill="{escape(color)}"/>')
+
+    if legend:
+        parts += _legend([(d.get('label', ''), _color(d.get('borderColor') or d.get('backgroundColor'), i))
+                          for i, d in enumerate(datasets)], height - 10, width)
+    return parts
+
+
+def _pie(config, width, height, top):
+    labels, datasets, values = _series(config)
+    if not datasets:
+        return []
+    colors = datasets[0].get('backgroundColor')
+    data = [max(v, 0) for v in values[0]]
+    total = sum(data)
+    chart_type = config.get('type')
+    radius = min(height - top - 20, width / 2 - 40) / 2
+    cx, cy = width * 0.34, top + (height - top - 10) / 2
+    parts = []
+
+    if chart_type in ('polarArea', 'polar'):
+        peak = max(data, default=0) or 1
+        angle = 2 * math.pi / max(len(data), 1)
+        for i, value in enumerate(data):
+            parts.append(_slice(cx, cy, radius * math.sqrt(value / peak), angle * i, angle * (i + 1),
+                                _color(colors, i)))
+    elif total > 0:
+        start = 0.0
+        for i, value in enumerate(data):
+            end = start + value / total * 2 * math.pi
+            parts.append(_slice(cx, cy, radius, start, end, _color(colors, i)))
+            start = end
+        if chart_type == 'doughnut':
+            parts.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{radius * 0.55:.1f}" fill="#ffffff"/>')
+
+    # Legend with values, to the side of the pie
+    y = cy - len(labels[:10]) * 11
+    for i, label in enumerate(labels[:10]):
+        share = f' ({data[i] / total * 100:.0f}%)' if total and chart_type not in ('polarArea', 'polar') else ''
+        parts.append(f'<rect x="{width * 0.62:.1f}" y="{y - 9:.1f}" width="10" height="10" rx="2" '
+                     f'fill="{escape(_color(colors, i))}"/>')
+        parts.append(_text(width * 0.62 + 16, y, f'{_short(label, 24)}{share}', size=10, anchor='start'))
+        y += 22
+    return parts
+
+
+def _slice(cx, cy, radius, start, end, color):
+    if end - start >= 2 * math.pi - 1e-9:
+        return f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{radius:.1f}" fill="{escape(color)}"/>'
+    # Angles run clockwise from 12 o'clock, as in Chart.js
+    x0, y0 = cx + radius * math.sin(start), cy - radius * math.cos(start)
+    x1, y1 = cx + radius * math.sin(end), cy - radius * math.cos(end)
+    large = 1 if end - start > math.pi else 0
+    return (f'<path d="M{cx:.1f},{cy:.1f} L{x0:.1f},{y0:.1f} A{radius:.1f},{radius:.1f} 0 {large} 1 '
+            f'{x1:.1f},{y1:.1f} Z" fill="{escape(color)}" stroke="#ffffff" stroke-width="2"/>')
+
+
+def _radar(config, width, height, top):
+    labels, datasets, values = _series(config)
+    count = len(labels)
+    if count < 3:
+        return _bar(config, width, height, top)
+    legend = len(datasets) > 1
+    flat = [v for series in values for v in series] or [0]
+    ticks = _nice_ticks(0, max(flat), 4)
+    high = ticks[-1]
+    radius = (height - top - (50 if legend else 34)) / 2
+    cx, cy = width / 2, top + 8 + radius
+    point = lambda i, r: (cx + r * math.sin(2 * math.pi * i / count), cy - r * math.cos(2 * math.pi * i / count))
+    parts = []
+
+    for tick in ticks[1:]:
+        ring = ' '.join(f'{x:.1f},{y:.1f}' for x, y in (point(i, radius * tick / high) for i in range(count)))
+        parts.append(f'<polygon points="{ring}" fill="none" stroke="#e5e7eb"/>')
+    for i, label in enumerate(labels):
+        x, y = point(i, radius)
+        parts.append(f'<line x1="{cx:.1f}" y1="{cy:.1f}" x2="{x:.1f}" y2="{y:.1f}" stroke="#e5e7eb"/>')
+        lx, ly = point(i, radius + 14)
+        anchor = 'middle' if abs(lx - cx) < 8 else ('start' if lx > cx else 'end')
+        parts.append(_text(lx, ly + 4, _short(label, 18), size=10, anchor=anchor))
+
+    for d, dataset in enumerate(datasets):
+        color = _color(dataset.get('borderColor') or dataset.get('backgroundColor'), d)
+        shape = ' '.join(f'{x:.1f},{y:.1f}' for x, y in (point(i, radius * max(v, 0) / high)
+                                                          for i, v in enumerate(values[d])))
+        parts.append(f'<polygon points="{shape}" fill="{escape(color)}" fill-opacity="0.2" '
+                     f'stroke="{escape(color)}" stroke-width="2"/>')
+
+    if legend:
+        parts += _legend([(d.get('label', ''), _color(d.get('borderColor') or d.get('backgroundColor'), i))
+                          for i, d in enumerate(datasets)], height - 10, width)
+    return parts
+
+
+def _gauge(config, width, height, top):
+    if 'value' in config:
+        value, target = _value(config.get('value')), _value(config.get('target')) or 100
+    else:
+        _, _, values = _series(config)
+        value, target = (values[0][0] if values and values[0] else 0), 100
+    share = min(max(value / target, 0), 1) if target else 0
+    color = config.get('color') or ('#2C8C56' if share >= 0.75 else '#E8B93B' if share >= 0.5 else '#E74C3C')
+    radius = min(width / 2 - 40, height - top - 50)
+    cx, cy = width / 2, top + 10 + radius
+    arc = lambda end: (f'M{cx - radius:.1f},{cy:.1f} A{radius:.1f},{radius:.1f} 0 0 1 '
+                       f'{cx - radius * math.cos(math.pi * end):.1f},{cy - radius * math.sin(math.pi * end):.1f}')
+    parts = [f'<path d="{arc(1)}" fill="none" stroke="#e5e7eb" stroke-width="24"/>']
+    if share > 0:
+        parts.append(f'<path d="{arc(share)}" fill="none" stroke="{escape(color)}" stroke-width="24"/>')
+    parts.append(_text(cx, cy - 8, _fmt(value) + ('%' if target == 100 else ''), size=26, color='#0A2756', weight='bold'))
+    subtitle = (config.get('options') or {}).get('subtitle')
+    if subtitle:
+        parts.append(_text(cx, cy + 24, subtitle, size=11))
+    return parts
+
+
+_RENDERERS = {
+    'bar': _bar, 'funnel': _bar, 'waterfall': _bar,
+    'line': _line, 'area': _line, 'scatter': _line,
+    'pie': _pie, 'doughnut': _pie, 'polarArea': _pie, 'polar': _pie,
+    'radar': _radar,
+    'gauge': _gauge,
+}
+
+
+# ==================== public API ====================
+
+def render_chart_svg(config, width=CHART_WIDTH, height=CHART_HEIGHT):
+    """
+    Draw a chart config as an SVG document.
+
+    Args:
+        config: {'type', 'title', 'labels', 'datasets', 'options'} as stored on
+            chat messages or built by ChartDataGenerator
+
+    Returns:
+        SVG markup (str)
+    """
+    title = config.get('title') or ''
+    top = 44 if title else 16
+    renderer = _RENDERERS.get(config.get('type'), _bar)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{FONT_FAMILY}">',
+        f'<rect width="{width}" height="{height}" fill="#ffffff"/>'
+    ]
+    if title:
+        parts.append(_text(width / 2, 26, title, size=15, color='#0A2756', weight='bold'))
+    parts += renderer(config, width, height, top)
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def chart_image_uri(config):
+    """The chart as an SVG data URI for <img src>, drawn once per distinct config"""
+    key = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def draw():
+        svg = render_chart_svg(config)
+        return 'data:image/svg+xml;base64,' + base64.b64encode(svg.encode('utf-8')).decode('ascii')
+
+    return _image_cache.get_or_compute(key, draw)
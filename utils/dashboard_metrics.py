@@ -0,0 +1,166 @@
+"""
+Admin Dashboard Metrics Service
+Computes the whole admin dashboard snapshot in one pass and serves it from a
+TTL cache (per worker + shared on disk) with stale-while-revalidate refresh,
+so admin page loads don't re-run the heavy aggregate queries.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, case
+
+from models import User, Project, Transaction, Role
+from utils import ai_usage
+from utils.cache import TTLCache
+
+# Fresh for a minute, served stale (while refreshing) for up to ten
+snapshot_cache = TTLCache('admin_dashboard', ttl=60, stale_ttl=600)
+
+SNAPSHOT_KEY = 'snapshot'
+METRICS_KEY = 'daily_metrics'
+
+
+def compute_admin_snapshot(session):
+    """
+    Build every number shown on /admin/dashboard/.
+
+    Returns:
+        dict: Plain, picklable values (no ORM instances) ready for the template
+    """
+    now = datetime.utcnow()
+    thirty_days_ago = now - timedelta(days=30)
+    six_months_ago = now - timedelta(days=180)
+
+    total_users, active_users, total_ai_usage = session.query(
+        func.count(User.id),
+        func.coalesce(func.sum(case((User.last_login >= thirty_days_ago, 1), else_=0)), 0),
+        func.coalesce(func.sum(User.ai_credits_used), 0)
+    ).one()
+    total_projects = session.query(func.count(Project.id)).scalar() or 0
+    total_revenue = session.query(func.sum(Transaction.amount)).filter(Transaction.status == 'succeeded').scalar() or 0
+
+    recent_users = [
+        {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': role_name,
+            'created_at': user.created_at,
+        }
+        for user, role_name in session.query(User, Role.name)
+        .outerjoin(Role, User.role_id == Role.id)
+        .order_by(User.created_at.desc()).limit(10).all()
+    ]
+
+    recent_transactions = [
+        {
+            'id': trans.id,
+            'amount': trans.amount,
+            'description': trans.description,
+            'status': trans.status,
+            'created_at': trans.created_at,
+        }
+        for trans in session.query(Transaction).order_by(Transaction.created_at.desc()).limit(10).all()
+    ]
+
+    role_distribution = [
+        (name, count) for name, count in session.query(
+            Role.name,
+            func.count(User.id).label('count')
+        ).join(User).group_by(Role.name).all()
+    ]
+
+    monthly_revenue = [
+        (month, revenue) for month, revenue in session.query(
+            func.date_trunc('month', Transaction.created_at).label('month'),
+            func.sum(Transaction.amount).label('revenue')
+        ).filter(
+            Transaction.status == 'succeeded',
+            Transaction.created_at >= six_months_ago
+        ).group_by('month').order_by('month').all()
+    ]
+
+    ai_by_module = [
+        (module, count, tokens)
+        for module, count, tokens, cost in ai_usage.usage_breakdown(session, 'module', days=30)
+    ]
+    most_used_services = [
+        (service_type, count, cost)
+        for service_type, count, tokens, cost in ai_usage.usage_breakdown(
+            session, 'service_type', days=30, order_by_count=True, limit=10, exclude_null=True
+        )
+    ]
+    top_ai_users = [tuple(row) for row in ai_usage.top_users(session, days=30, limit=10)]
+
+    return {
+        'total_users': total_users,
+        'active_users': int(active_users),
+        'total_projects': total_projects,
+        'total_revenue': total_revenue,
+        'total_ai_usage': int(total_ai_usage),
+        'recent_users': recent_users,
+        'recent_transactions': recent_transactions,
+        'role_distribution': role_distribution,
+        'monthly_revenue': monthly_revenue,
+        'ai_by_module': ai_by_module,
+        'most_used_services': most_used_services,
+        'top_ai_users': top_ai_users,
+        'generated_at': now,
+    }
+
+
+def compute_admin_daily_metrics(session):
+    """Daily users / revenue / AI series for the dashboard charts (last 30 days)"""
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+
+    daily_users = session.query(
+        func.date(User.created_at).label('date'),
+        func.count(User.id).label('count')
+    ).filter(
+        User.created_at >= thirty_days_ago
+    ).group_by('date').order_by('date').all()
+
+    daily_revenue = session.query(
+        func.date(Transaction.created_at).label('date'),
+        func.sum(Transaction.amount).label('revenue')
+    ).filter(
+        Transaction.status == 'succeeded',
+        Transaction.created_at >= thirty_days_ago
+    ).group_by('date').order_by('date').all()
+
+    daily_ai = ai_usage.daily_usage(session, days=30)
+
+    return {
+        'daily_users': [{'date': str(r.date), 'count': r.count} for r in daily_users],
+        'daily_revenue': [{'date': str(r.date), 'revenue': float(r.revenue or 0)} for r in daily_revenue],
+        'daily_ai': [{'date': str(r.day), 'requests': int(r.requests or 0), 'tokens': int(r.tokens or 0)} for r in daily_ai]
+    }
+
+
+def _cached(key, compute_fn, force_refresh=False):
+    app = current_app._get_current_object()
+
+    def compute():
+        # Own app context so background refreshes get their own scoped session
+        with app.app_context():
+            db = app.extensions['sqlalchemy']
+            return compute_fn(db.session)
+
+    if force_refresh:
+        snapshot_cache.delete(key)
+    return snapshot_cache.get_or_compute(key, compute)
+
+
+def get_admin_snapshot(force_refresh=False):
+    """Cached admin dashboard snapshot"""
+    return _cached(SNAPSHOT_KEY, compute_admin_snapshot, force_refresh)
+
+
+def get_admin_daily_metrics(force_refresh=False):
+    """Cached admin dashboard chart series"""
+    return _cached(METRICS_KEY, compute_admin_daily_metrics, force_refresh)
+
+
+def invalidate_admin_snapshot():
+    snapshot_cache.delete(SNAPSHOT_KEY)
+    snapshot_cache.delete(METRICS_KEY)
@@ -0,0 +1,49 @@
+"""
+Database Column Types
+JSONType stores JSON documents (SWOT/PESTEL analyses, core values, goals, ...)
+that used to live in Text columns and were parsed with json.loads in every
+view, export and template that read them.
+
+- PostgreSQL: a native JSONB column, (de)serialized by the driver with the
+  engine's json_serializer / json_deserializer (utils/fast_json).
+- Other databases (SQLite in development): JSON text, encoded with
+  utils/fast_json.
+
+Values are parsed once when a row is loaded, so reading the attribute again in
+the same request returns the same Python object. Assign a new object to store
+a change: in-place edits of a loaded value are not tracked.
+
+Existing Text columns are converted by migrations/migrate_json_columns.py.
+"""
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import Text, TypeDecorator
+
+from utils.fast_json import dumps, loads
+
+
+class JSONType(TypeDecorator):
+    """A JSON document column: jsonb on PostgreSQL, JSON text elsewhere"""
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if dialect.name == 'postgresql' or not isinstance(value, (str, bytes)):
+            return value
+        if not value:
+            return None
+        try:
+            return loads(value)
+        except ValueError:
+            # Text written before the column held JSON; the migration wraps such values
+            return value
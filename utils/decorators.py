@@ -1,7 +1,17 @@
 from functools import wraps
 from flask import redirect, url_for, flash, session, request
+from sqlalchemy.orm import joinedload
 from models import User, OrganizationMembership, Organization
 
+def load_user(db_session, user_id):
+    """
+    The user with their role and plan, in one statement.
+
+    Every page reads both (role checks, the navigation's current_user), and
+    the identity map returns the same object to later lookups in the request.
+    """
+    return db_session.get(User, int(user_id), options=[joinedload(User.role_ref), joinedload(User.plan_ref)])
+
 def login_required(f):
     """Decorator for routes that require authentication"""
     @wraps(f)
@@ -70,7 +80,7 @@ def role_required(*roles):
                     print(f"[role_required] Using session fallback: user_id={user_id}")
                 
                 db = current_app.extensions['sqlalchemy']
-                user = db.session.query(User).get(user_id)
+                user = load_user(db.session, user_id)
                 
                 # Debug logging
                 print(f"[role_required] User ID: {user_id}, User: {user.username if user else 'None'}, Required roles: {roles}")
@@ -126,7 +136,7 @@ def organization_role_required(*allowed_roles, org_id_param='id'):
                 user_id = int(get_jwt_identity())
                 
                 db = current_app.extensions['sqlalchemy']
-                user = db.session.query(User).get(user_id)
+                user = load_user(db.session, user_id)
                 
                 if not user:
                     lang = session.get('language', 'ar')
@@ -222,7 +232,7 @@ def require_org_context(f):
             user_id = int(get_jwt_identity())
             
             db = current_app.extensions['sqlalchemy']
-            user = db.session.query(User).get(user_id)
+            user = load_user(db.session, user_id)
             
             if not user:
                 raise Exception("User not found")
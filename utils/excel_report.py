@@ -0,0 +1,290 @@
+"""
+Excel Reports
+Builds the XLSX downloads of strategic plans, strategic identity projects,
+consultation projects and HR analyses.
+
+- Styles: every look used by the reports is declared once in EXCEL_STYLES and
+  registered on the workbook as a NamedStyle. Cells refer to a style by name,
+  so no Font/Fill/Border/Alignment objects are built per cell and the file
+  holds one style record per look instead of one per styled cell.
+- Write-only: sheets use openpyxl write-only mode. Rows are serialized as they
+  are appended (row heights and merged ranges are recorded alongside), so a
+  large plan no longer keeps a cell object per value in memory.
+- Rows: ReportSheet.rows() appends a batch of value rows with one style per
+  column; unstyled values are written as plain values.
+
+Usage:
+    report = ExcelReport(lang)
+    sheet = report.sheet('KPIs', widths=(6, 35, 20))
+    sheet.banner('Key Performance Indicators')
+    sheet.row(['#', 'Name', 'Category'], 'column')
+    sheet.rows(kpi_rows, ('cell_center', 'cell', 'cell'))
+    return report.response('kpis.xlsx')
+
+Benchmark against the in-memory workbook on a large plan:
+    python -m utils.excel_report
+"""
+import io
+import time
+from copy import copy
+import tracemalloc
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+from flask import send_file
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+DEFAULT_ACCENT = '1e3a8a'
+
+THIN_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                     top=Side(style='thin'), bottom=Side(style='thin'))
+CENTER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+RTL_ALIGNMENT = Alignment(horizontal='right', vertical='top', wrap_text=True, readingOrder=2)
+LTR_ALIGNMENT = Alignment(horizontal='left', vertical='top', wrap_text=True)
+
+
+def _fill(color):
+    return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+# name -> (font, fill, border, alignment)
+# fill 'accent' is the workbook accent color; alignment 'text' follows the workbook language
+EXCEL_STYLES = {
+    'banner': (Font(name='Arial', size=16, bold=True, color='FFFFFF'), 'accent', None, CENTER_ALIGNMENT),
+    'header': (Font(name='Arial', size=12, bold=True, color='FFFFFF'), 'accent', None, CENTER_ALIGNMENT),
+    'subheader': (Font(name='Arial', size=11, bold=True, color='FFFFFF'), _fill('3b82f6'), None, CENTER_ALIGNMENT),
+    'section': (Font(name='Arial', size=12, bold=True, color='2c5282'), _fill('e2e8f0'), None, 'text'),
+    'column': (Font(name='Arial', size=10, bold=True), _fill('e0e7ff'), THIN_BORDER, CENTER_ALIGNMENT),
+    'title': (Font(name='Arial', size=16, bold=True), None, None, 'text'),
+    'label': (Font(name='Arial', size=10, bold=True), None, None, 'text'),
+    'key': (Font(name='Arial', size=10, bold=True, color='2c5282'), _fill('f7fafc'), None, 'text'),
+    'text': (Font(name='Arial', size=10), None, None, 'text'),
+    'muted': (Font(name='Arial', size=10, color='718096'), None, None, CENTER_ALIGNMENT),
+    'center': (Font(name='Arial', size=10), None, None, CENTER_ALIGNMENT),
+    'cell': (Font(name='Arial', size=10), None, THIN_BORDER, 'text'),
+    'cell_center': (Font(name='Arial', size=10), None, THIN_BORDER, CENTER_ALIGNMENT),
+    'good': (Font(name='Arial', size=10), _fill('22c55e'), THIN_BORDER, CENTER_ALIGNMENT),
+    'warn': (Font(name='Arial', size=10), _fill('eab308'), THIN_BORDER, CENTER_ALIGNMENT),
+    'bad': (Font(name='Arial', size=10), _fill('ef4444'), THIN_BORDER, CENTER_ALIGNMENT),
+}
+
+
+def progress_style(progress):
+    """Cell style of a KPI progress percentage"""
+    return 'good' if progress >= 80 else 'warn' if progress >= 50 else 'bad'
+
+
+class ReportSheet:
+    """A write-only worksheet of an ExcelReport; rows are written top to bottom"""
+
+    def __init__(self, report, worksheet, span):
+        self.report = report
+        self.ws = worksheet
+        self.span = span
+        self.row_index = 0
+
+    def _cell(self, value, style):
+        if not style:
+            return value
+        cell = WriteOnlyCell(self.ws, value=value)
+        resolved = self.report._resolved.get(style)
+        if resolved is None:
+            cell.style = self.report.style_name(style)
+            self.report._resolved[style] = copy(cell._style)
+        else:
+            # Same as assigning the name, without looking the style up again for every cell
+            cell._style = copy(resolved)
+        return cell
+
+    def row(self, values, styles=None, height=None, merge=None):
+        """
+        Append one row.
+
+        Args:
+            values: cell values, from column A
+            styles: a style name for every cell, or one name (or None) per column
+            height: row height in points
+            merge: (first, last) 1-based columns merged into one cell
+        """
+        self.row_index += 1
+        if height:
+            self.ws.row_dimensions[self.row_index].height = height
+        if merge:
+            first, last = merge
+            self.ws.merged_cells.add(
+                f'{get_column_letter(first)}{self.row_index}:{get_column_letter(last)}{self.row_index}'
+            )
+        if isinstance(styles, (list, tuple)):
+            self.ws.append([self._cell(value, style) for value, style in zip(values, styles)])
+        else:
+            self.ws.append([self._cell(value, styles) for value in values])
+
+    def rows(self, rows, styles=None, height=None, merge=None):
+        """Append a batch of rows sharing the same column styles, height and merge"""
+        for values in rows:
+            self.row(values, styles, height, merge)
+
+    def banner(self, text, style='header', height=None):
+        """A row holding one value merged across the sheet's columns"""
+        self.row([text], style, height, merge=(1, self.span) if self.span > 1 else None)
+
+    def skip(self, count=1):
+        """Leave empty rows"""
+        for _ in range(count):
+            self.row([])
+
+
+class ExcelReport:
+    """
+    A write-only workbook with the EXCEL_STYLES registered as named styles.
+
+    Args:
+        lang: 'ar' lays sheets out right to left and aligns text to the right
+        accent: hex color of the banner and header styles
+    """
+
+    def __init__(self, lang='ar', accent=DEFAULT_ACCENT):
+        self.lang = lang
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self._resolved = {}  # style name -> the cell style array it resolves to
+        text_alignment = RTL_ALIGNMENT if lang == 'ar' else LTR_ALIGNMENT
+        accent_fill = _fill((accent or DEFAULT_ACCENT).lstrip('#'))
+
+        for name, (font, fill, border, alignment) in EXCEL_STYLES.items():
+            style = NamedStyle(name=self.style_name(name), font=font)
+            if fill is not None:
+                style.fill = accent_fill if fill == 'accent' else fill
+            if border is not None:
+                style.border = border
+            if alignment is not None:
+                style.alignment = text_alignment if alignment == 'text' else alignment
+            self.workbook.add_named_style(style)
+
+    @staticmethod
+    def style_name(name):
+        # Prefixed so they never collide with Excel's built-in styles (Title, Normal, ...)
+        return f'Mcidia {name}'
+
+    def sheet(self, title, widths=()):
+        """Add a worksheet; widths are the column widths from column A"""
+        worksheet = self.workbook.create_sheet(title=title[:31])
+        worksheet.sheet_view.rightToLeft = self.lang == 'ar'
+        for index, width in enumerate(widths, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = width
+        return ReportSheet(self, worksheet, len(widths))
+
+    def save(self, target):
+        """Write the workbook to a path or file object (once: write-only workbooks close on save)"""
+        self.workbook.save(target)
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        self.save(buffer)
+        return buffer.getvalue()
+
+    def response(self, file_name):
+        """The workbook as a download"""
+        buffer = io.BytesIO()
+        self.save(buffer)
+        buffer.seek(0)
+        return send_file(buffer, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=file_name)
+
+
+# ==================== reports ====================
+
+def project_workbook(session, project, lang):
+    """Workbook of a service consultation project (services and dashboard exports)"""
+    from utils.projects import project_content, project_service
+    from utils.markdown_formatter import extract_sections_from_markdown, clean_markdown_for_excel
+
+    project_data = project_content(project)
+    service, offering = project_service(session, project)
+
+    report = ExcelReport(lang, accent=service.color if service and service.color else None)
+    sheet = report.sheet("الاستشارة" if lang == 'ar' else "Consultation", widths=(25, 60, 15, 15, 15))
+
+    sheet.banner(project.title, 'banner', height=35)
+    if service and offering:
+        sheet.banner(f"{service.title_ar if lang == 'ar' else service.title_en} - "
+                     f"{offering.title_ar if lang == 'ar' else offering.title_en}", 'muted')
+    sheet.banner(f"{'التاريخ' if lang == 'ar' else 'Date'}: {project.created_at.strftime('%Y-%m-%d %H:%M')}", 'muted')
+    sheet.skip()
+
+    sheet.banner("البيانات المدخلة" if lang == 'ar' else "Input Data", height=30)
+    sheet.rows(
+        ([str(key).replace('_', ' ').title(), str(value)] for key, value in project_data.get('input', {}).items()),
+        ('key', 'text'), height=20, merge=(2, 5)
+    )
+    sheet.skip()
+
+    sheet.banner("نتيجة الاستشارة الذكية" if lang == 'ar' else "AI Consultation Result", height=30)
+    output_text = project_data.get('output', '')
+    sections = extract_sections_from_markdown(output_text)
+    if sections:
+        for section in sections:
+            sheet.banner(section['title'], 'section', height=25)
+            content = clean_markdown_for_excel(section['content'])
+            lines = content.count('\n') + 1
+            sheet.banner(content, 'text', height=max(20, min(lines * 15, 200)))
+            sheet.skip()
+    else:
+        sheet.banner(clean_markdown_for_excel(output_text), 'text')
+    return report
+
+
+# ==================== benchmark ====================
+
+def _benchmark_rows(count):
+    return [(i, f'مؤشر الأداء رقم {i}', 'تشغيلي', i * 1.5, 100, '%', 'active', i % 100)
+            for i in range(1, count + 1)]
+
+
+def _in_memory_workbook(rows):
+    """The previous approach: normal mode, style objects assigned cell by cell"""
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+    for row_number, values in enumerate(rows, 4):
+        for column, value in enumerate(values, 1):
+            cell = ws.cell(row=row_number, column=column, value=value)
+            cell.font = Font(name='Arial', size=10)
+            cell.alignment = Alignment(horizontal='right', vertical='top', wrap_text=True, readingOrder=2)
+            cell.border = border
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _write_only_workbook(rows):
+    report = ExcelReport('ar')
+    sheet = report.sheet('KPIs', widths=(6, 35, 20, 15, 15, 15, 15, 12))
+    sheet.skip(3)
+    sheet.rows(rows, 'cell')
+    return report.to_bytes()
+
+
+def benchmark(count=10000):
+    """Time and peak memory (traced in a second run) of both approaches on `count` KPI rows"""
+    rows = _benchmark_rows(count)
+    results = {}
+    for name, build in (('in-memory', _in_memory_workbook), ('write-only', _write_only_workbook)):
+        started = time.perf_counter()
+        size = len(build(rows))
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        build(rows)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'seconds': round(elapsed, 3), 'peak_mb': round(peak / 1024 / 1024, 1), 'bytes': size}
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, result in benchmark(count).items():
+        print(f"{name:>10}: {result['seconds']:.3f}s  peak {result['peak_mb']} MB  file {result['bytes'] // 1024} KB")
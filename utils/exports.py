@@ -0,0 +1,512 @@
+"""
+Streaming Export Utility
+Bounded-memory CSV / XLSX / PDF exports for large admin datasets.
+
+Rows are read through a server-side cursor (yield_per) and written as they
+arrive: CSV is streamed straight to the response, XLSX goes through openpyxl
+write-only mode, and PDF is rendered in fixed-size row chunks that are merged
+page-wise. Exports above EXPORT_SYNC_ROW_LIMIT rows run as ExportJob records on
+the background pool and are downloaded from /admin/exports/<id>/download.
+
+Background jobs hold a lease like HR imports (utils/hr_import_jobs.py): a
+worker claims the job with a conditional UPDATE and renews the lease every
+batch of rows. A job whose worker died (running, lease expired) is resubmitted
+when its status is polled, and at startup together with queued ones.
+
+Job files are only written to and served from EXPORT_DIR while it is private
+to this user (utils.cache.private_directory); otherwise jobs fail.
+"""
+import csv
+import io
+import os
+import json
+import html
+import uuid
+import socket
+import tempfile
+from datetime import datetime, timedelta
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+from markupsafe import Markup, escape
+from flask import current_app, Response, stream_with_context, send_file, flash, redirect, url_for, session as flask_session
+from sqlalchemy import update, or_
+
+from utils.pdf_renderer import render_pdf, WEASYPRINT_AVAILABLE
+
+try:
+    from PyPDF2 import PdfMerger
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+    PdfMerger = None
+
+from utils.pagination import estimate_count
+from utils.cache import private_directory
+from utils import background
+
+EXPORT_DIR = os.getenv('EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'mcidia_exports')
+EXPORT_SYNC_ROW_LIMIT = int(os.getenv('EXPORT_SYNC_ROW_LIMIT', '5000'))
+EXPORT_TTL = timedelta(hours=24)
+EXPORT_LEASE_SECONDS = int(os.getenv('EXPORT_LEASE_SECONDS', '120'))
+BATCH_SIZE = 1000
+CSV_FLUSH_ROWS = 500
+PDF_CHUNK_ROWS = 500
+
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+# Header style shared by every XLSX export
+HEADER_FILL = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+HEADER_FONT = Font(bold=True, color='FFFFFF', size=11)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+_registry = {}
+
+
+def register_export(name):
+    """
+    Register an export factory so background jobs can rebuild it from stored params.
+
+    Usage:
+        @register_export('users')
+        def users_export(params):
+            return TabularExport(...)
+    """
+    def decorator(factory):
+        _registry[name] = factory
+        return factory
+    return decorator
+
+
+def build_export(name, params):
+    factory = _registry.get(name)
+    if not factory:
+        raise ValueError(f"Unknown export type: {name}")
+    return factory(params or {})
+
+
+class TabularExport:
+    """
+    A table of rows that can be written as CSV, XLSX or PDF with bounded memory.
+
+    Args:
+        name: Export type (used for file names)
+        title: Sheet / report title
+        headers: Column headers
+        query_factory: callable(session) -> query yielding records
+        row_formatter: callable(record) -> list of cell values
+        column_widths: Optional XLSX column widths
+        lang: 'ar' or 'en' (controls RTL)
+        summary_factory: Optional callable(session) -> [(label, value)] shown atop the PDF
+    """
+
+    def __init__(self, name, title, headers, query_factory, row_formatter,
+                 column_widths=None, lang='ar', summary_factory=None):
+        self.name = name
+        self.title = title
+        self.headers = headers
+        self.query_factory = query_factory
+        self.row_formatter = row_formatter
+        self.column_widths = column_widths or []
+        self.lang = lang
+        self.summary_factory = summary_factory
+        self.rows_written = 0
+        # Optional callable run after every batch of rows (background job lease)
+        self.heartbeat = None
+
+    @property
+    def rtl(self):
+        return self.lang == 'ar'
+
+    def file_name(self, file_format):
+        return f"{self.name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+
+    def count(self, session):
+        return estimate_count(self.query_factory(session))[0]
+
+    def iter_rows(self, session, batch_size=BATCH_SIZE):
+        """Yield formatted rows through a server-side cursor"""
+        self.rows_written = 0
+        for record in self.query_factory(session).yield_per(batch_size):
+            self.rows_written += 1
+            if self.heartbeat and self.rows_written % batch_size == 0:
+                self.heartbeat()
+            yield self.row_formatter(record)
+
+    # ---------- CSV ----------
+
+    def iter_csv(self, session):
+        """Yield CSV text chunks (UTF-8 BOM first so Excel shows Arabic correctly)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        yield '\ufeff'
+        writer.writerow(self.headers)
+        for index, row in enumerate(self.iter_rows(session), 1):
+            writer.writerow(row)
+            if index % CSV_FLUSH_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    def write_csv(self, session, path):
+        with open(path, 'w', encoding='utf-8', newline='') as fh:
+            for chunk in self.iter_csv(session):
+                fh.write(chunk)
+
+    # ---------- XLSX ----------
+
+    def write_xlsx(self, session, path):
+        """Write through openpyxl write-only mode (rows are flushed to disk as appended)"""
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title=self.title[:31])
+        ws.sheet_view.rightToLeft = self.rtl
+        for index, width in enumerate(self.column_widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+        header_cells = []
+        for header in self.headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.border = HEADER_BORDER
+            cell.alignment = HEADER_ALIGNMENT
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        for row in self.iter_rows(session):
+            ws.append(row)
+        wb.save(path)
+
+    # ---------- PDF ----------
+
+    def _pdf_html(self, rows, summary, timestamp, first, last):
+        direction = 'rtl' if self.rtl else 'ltr'
+        header_html = ''
+        if first:
+            stats_html = ''.join(
+                f'<div class="stat-item"><span class="stat-label">{html.escape(str(label))}</span>'
+                f'<span class="stat-value">{html.escape(str(value))}</span></div>'
+                for label, value in summary
+            )
+            header_html = f"""
+            <div class="header">
+                <h1>{html.escape(self.title)}</h1>
+                <div class="report-date">{timestamp}</div>
+            </div>
+            {f'<div class="stats">{stats_html}</div>' if stats_html else ''}
+            """
+        footer_html = ''
+        if last:
+            generated_by = 'تم التوليد بواسطة نظام Mcidia' if self.rtl else 'Generated by Mcidia System'
+            footer_html = f'<div class="footer"><p>{generated_by} | {timestamp}</p></div>'
+
+        head_cells = ''.join(f'<th>{html.escape(str(h))}</th>' for h in self.headers)
+        body_rows = ''.join(
+            '<tr>' + ''.join(f'<td>{html.escape("" if v is None else str(v))}</td>' for v in row) + '</tr>'
+            for row in rows
+        )
+        return f"""
+        <!DOCTYPE html>
+        <html dir="{direction}">
+        <head>
+            <meta charset="UTF-8">
+            <style>
+                @page {{ size: A4; margin: 0.5cm; }}
+                * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+                body {{ font-family: 'DejaVu Sans', sans-serif; padding: 8px; direction: {direction}; font-size: 9pt; line-height: 1.3; }}
+                .header {{ text-align: center; margin-bottom: 12px; border-bottom: 2px solid #366092; padding-bottom: 8px; }}
+                h1 {{ color: #366092; font-size: 14pt; font-weight: bold; }}
+                .report-date {{ color: #666; font-size: 8pt; margin-top: 2px; }}
+                .stats {{ display: flex; justify-content: space-around; margin-bottom: 10px; background-color: #f5f5f5; padding: 6px; border: 1px solid #ddd; }}
+                .stat-item {{ text-align: center; flex: 1; }}
+                .stat-label {{ color: #666; font-size: 7pt; display: block; margin-bottom: 2px; }}
+                .stat-value {{ color: #366092; font-weight: bold; font-size: 11pt; }}
+                table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 8pt; }}
+                th {{ background-color: #366092; color: #fff; padding: 5px 3px; text-align: center; font-weight: bold; border: 1px solid #2c5aa0; }}
+                td {{ padding: 4px 3px; border: 1px solid #ddd; text-align: center; word-wrap: break-word; }}
+                tbody tr:nth-child(odd) {{ background-color: #f9f9f9; }}
+                .footer {{ text-align: center; color: #999; font-size: 7pt; margin-top: 10px; padding-top: 6px; border-top: 1px solid #ddd; }}
+            </style>
+        </head>
+        <body>
+            {header_html}
+            <table>
+                <thead><tr>{head_cells}</tr></thead>
+                <tbody>{body_rows}</tbody>
+            </table>
+            {footer_html}
+        </body>
+        </html>
+        """
+
+    def write_pdf(self, session, path):
+        """Render PDF_CHUNK_ROWS rows at a time and merge the chunk PDFs page-wise"""
+        if not WEASYPRINT_AVAILABLE:
+            raise RuntimeError('WeasyPrint is not available for PDF export')
+        if not PYPDF2_AVAILABLE:
+            raise RuntimeError('PyPDF2 is not available for PDF export')
+
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        summary = self.summary_factory(session) if self.summary_factory else []
+        part_dir = tempfile.mkdtemp(prefix='pdf_parts_', dir=os.path.dirname(path) or None)
+        part_paths = []
+
+        def flush(rows, first, last):
+            part_path = os.path.join(part_dir, f"{len(part_paths):05d}.pdf")
+            render_pdf(self._pdf_html(rows, summary, timestamp, first, last), target=part_path)
+            part_paths.append(part_path)
+
+        try:
+            chunk = []
+            for row in self.iter_rows(session):
+                chunk.append(row)
+                if len(chunk) >= PDF_CHUNK_ROWS:
+                    flush(chunk, first=not part_paths, last=False)
+                    chunk = []
+            flush(chunk, first=not part_paths, last=True)
+
+            merger = PdfMerger()
+            for part_path in part_paths:
+                merger.append(part_path)
+            merger.write(path)
+            merger.close()
+        finally:
+            for part_path in part_paths:
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+            try:
+                os.rmdir(part_dir)
+            except OSError:
+                pass
+
+    def write(self, session, file_format, path):
+        writer = {'csv': self.write_csv, 'xlsx': self.write_xlsx, 'pdf': self.write_pdf}.get(file_format)
+        if not writer:
+            raise ValueError(f"Unsupported export format: {file_format}")
+        writer(session, path)
+
+
+# ==================== Background jobs ====================
+
+CLAIMABLE_STATUSES = ('pending', 'running')
+
+
+class LeaseLost(Exception):
+    """Another worker took over the export (our lease expired)"""
+
+
+def _new_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _lease_free():
+    from models import ExportJob
+
+    return or_(ExportJob.lease_owner.is_(None), ExportJob.lease_expires_at < datetime.utcnow())
+
+
+def claim_export(session, job_id, owner):
+    """Atomically take the lease on an export job; returns True if this worker got it"""
+    from models import ExportJob
+
+    now = datetime.utcnow()
+    result = session.execute(
+        update(ExportJob)
+        .where(ExportJob.id == job_id, ExportJob.status.in_(CLAIMABLE_STATUSES), _lease_free())
+        .values(lease_owner=owner, lease_expires_at=now + timedelta(seconds=EXPORT_LEASE_SECONDS),
+                heartbeat_at=now, status='running')
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _heartbeat(engine, job_id, owner):
+    """Extend the lease on a separate connection (the job's session is streaming rows)"""
+    from models import ExportJob
+
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        result = connection.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.lease_owner == owner)
+            .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=EXPORT_LEASE_SECONDS))
+        )
+    if result.rowcount != 1:
+        raise LeaseLost(job_id)
+
+
+def _finish(session, job_id, owner, **values):
+    """Record the outcome and release the lease, unless another worker took the job over"""
+    from models import ExportJob
+
+    result = session.execute(
+        update(ExportJob)
+        .where(ExportJob.id == job_id, ExportJob.lease_owner == owner)
+        .values(lease_owner=None, lease_expires_at=None, completed_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def export_dir_ready():
+    """Create EXPORT_DIR if needed; False when another user could write to it"""
+    if private_directory(EXPORT_DIR):
+        return True
+    print(f"[exports] Refusing export directory {EXPORT_DIR}: "
+          f"it must be owned by this user and not writable by others")
+    return False
+
+
+def is_private_export(path):
+    """True for an existing export file inside a directory only this user can write to"""
+    return bool(path) and private_directory(os.path.dirname(path)) and os.path.isfile(path)
+
+
+def run_export_job(job_id):
+    """Background task: write an ExportJob's file to EXPORT_DIR"""
+    from models import ExportJob
+
+    db = current_app.extensions['sqlalchemy']
+    owner = _new_owner()
+    if not claim_export(db.session, job_id, owner):
+        return
+    job = db.session.get(ExportJob, job_id)
+    db.session.refresh(job)
+
+    if not export_dir_ready():
+        _finish(db.session, job_id, owner, status='failed',
+                error_message=f'Export directory {EXPORT_DIR} must be owned by the app user and not writable by others')
+        return
+
+    # Written under a per-job name and moved into place once complete, so a
+    # resumed job overwrites the partial file of the worker that died
+    partial_path = os.path.join(EXPORT_DIR, f"{job_id}.partial")
+    try:
+        export = build_export(job.export_type, json.loads(job.params) if job.params else {})
+        export.heartbeat = lambda: _heartbeat(db.engine, job_id, owner)
+        file_name = export.file_name(job.file_format)
+        path = os.path.join(EXPORT_DIR, f"{job_id}_{file_name}")
+        export.write(db.session, job.file_format, partial_path)
+        db.session.rollback()
+
+        if _finish(db.session, job_id, owner, status='completed', file_name=file_name,
+                   file_path=path, row_count=export.rows_written):
+            os.replace(partial_path, path)
+        else:
+            _remove(partial_path)
+    except LeaseLost:
+        db.session.rollback()
+        _remove(partial_path)
+    except Exception as e:
+        db.session.rollback()
+        _remove(partial_path)
+        _finish(db.session, job_id, owner, status='failed', error_message=str(e))
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def requeue_stale_exports(session, job_id=None, include_pending=False):
+    """
+    Resubmit export jobs whose worker died mid-run (status running, lease
+    expired). With include_pending (used at startup) jobs that were queued in a
+    pool that no longer exists are resubmitted too.
+
+    Returns:
+        List of requeued job ids
+    """
+    from models import ExportJob
+
+    stale = (ExportJob.status == 'running') & (ExportJob.lease_expires_at < datetime.utcnow())
+    if include_pending:
+        stale = stale | (ExportJob.status == 'pending')
+    query = session.query(ExportJob.id).filter(stale)
+    if job_id is not None:
+        query = query.filter(ExportJob.id == job_id)
+    stale_ids = [i for (i,) in query.all()]
+    for stale_id in stale_ids:
+        background.submit(run_export_job, stale_id)
+    return stale_ids
+
+
+def cleanup_expired_exports(session):
+    """Remove export files and job records older than EXPORT_TTL"""
+    from models import ExportJob
+
+    cutoff = datetime.utcnow() - EXPORT_TTL
+    expired = session.query(ExportJob).filter(ExportJob.created_at < cutoff).all()
+    for job in expired:
+        if job.file_path:
+            _remove(job.file_path)
+        _remove(os.path.join(EXPORT_DIR, f"{job.id}.partial"))
+        session.delete(job)
+    if expired:
+        session.commit()
+
+
+def start_export_job(session, export_type, file_format, params, user_id):
+    from models import ExportJob
+
+    cleanup_expired_exports(session)
+    job = ExportJob(
+        user_id=user_id,
+        export_type=export_type,
+        file_format=file_format,
+        params=json.dumps(params, ensure_ascii=False)
+    )
+    session.add(job)
+    session.commit()
+    background.submit(run_export_job, job.id)
+    return job
+
+
+def export_response(export_type, file_format, params, user_id, back_url):
+    """
+    Serve an export: small ones inline (CSV streamed, XLSX/PDF via a temp file),
+    large ones queued as a background job with a download link flashed to the user.
+    """
+    db = current_app.extensions['sqlalchemy']
+    lang = flask_session.get('language', 'ar')
+    export = build_export(export_type, params)
+
+    if export.count(db.session) > EXPORT_SYNC_ROW_LIMIT:
+        job = start_export_job(db.session, export_type, file_format, params, user_id)
+        link = escape(url_for('admin.exports.download', job_id=job.id))
+        flash(Markup(
+            f'جاري تجهيز الملف في الخلفية، سيكون متاحاً للتنزيل هنا: <a href="{link}">{link}</a>' if lang == 'ar'
+            else f'Your export is being prepared in the background. Download it here when ready: <a href="{link}">{link}</a>'
+        ), 'info')
+        return redirect(back_url)
+
+    file_name = export.file_name(file_format)
+    headers = {'Content-Disposition': f'attachment; filename={file_name}'}
+
+    if file_format == 'csv':
+        return Response(stream_with_context(export.iter_csv(db.session)), mimetype=MIMETYPES['csv'], headers=headers)
+
+    fd, path = tempfile.mkstemp(dir=EXPORT_DIR if export_dir_ready() else None, suffix=f'.{file_format}')
+    os.close(fd)
+    try:
+        export.write(db.session, file_format, path)
+        fh = open(path, 'rb')
+    finally:
+        # Unlinking is safe once open - the data lives until the response closes the handle
+        os.remove(path)
+    return send_file(fh, mimetype=MIMETYPES[file_format], as_attachment=True, download_name=file_name)
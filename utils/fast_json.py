@@ -0,0 +1,179 @@
+"""
+Fast JSON
+JSON encoding and decoding for API responses and stored documents (chat
+histories, vector store, JSON columns). Uses orjson when it is installed,
+several times faster than the json module on our payloads, and falls back to
+the json module otherwise.
+
+- dumps / loads: str in, str out; non-ASCII text is kept as is. Values orjson
+  cannot encode (integers over 64 bits, ...) are encoded by the json module.
+- read_file / write_file: JSON documents on disk (utils/knowledge/vector_store).
+- FastJSONProvider: Flask's JSON provider (jsonify, request.get_json, the
+  |tojson filter) on orjson. Output matches the default provider (HTTP dates,
+  sorted keys, indented in debug) except that non-ASCII text is sent as UTF-8
+  instead of \\u escapes.
+
+Benchmark on the payload shapes we serialize (chat history, vector store
+document, HR import preview, dashboard metrics):
+    python -m utils.fast_json
+"""
+import json
+import os
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+    # Dates and dataclasses go through Flask's `default`, as with the json module
+    _PROVIDER_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                         | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+def dumps(value):
+    """Serialize to a JSON string"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, option=_ORJSON_OPTIONS).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False)
+
+
+def loads(text):
+    """Parse a JSON string or bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def read_file(path):
+    """Parse the JSON document stored at `path`"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def write_file(path, value):
+    """
+    Store `value` as a JSON document at `path`.
+
+    Written to a temporary file and moved into place, so a reader never sees
+    a partly written document.
+    """
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(dumps(value))
+    os.replace(temp_path, path)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (see the module docstring)"""
+
+    def _encode(self, obj, sort_keys=None, indent=False):
+        option = _PROVIDER_OPTIONS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # The |tojson filter passes sort_keys; any other json.dumps argument uses the json module
+        if set(kwargs) <= {'sort_keys'}:
+            try:
+                return self._encode(obj, kwargs.get('sort_keys')).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = self._encode(obj, indent=indent)
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+# ==================== benchmark ====================
+
+def _benchmark_payloads():
+    """Synthetic payloads shaped like the real ones"""
+    from datetime import datetime
+    reply = ('## تحليل الوضع الحالي\n\n**نقاط القوة:** فريق عمل متمرس وحضور قوي في السوق المحلي.\n'
+             '| المؤشر | القيمة |\n|---|---|\n| رضا العملاء | 87% |\n') * 6
+    chat_history = []
+    for i in range(30):
+        chat_history.append({'role': 'user', 'content': f'سؤال رقم {i} عن الاستراتيجية والتشغيل',
+                             'timestamp': datetime(2025, 1, 1, 10, i).isoformat()})
+        chat_history.append({'role': 'assistant', 'content': reply, 'timestamp': datetime(2025, 1, 1, 10, i).isoformat(),
+                             'cost': 0.0042, 'charts': [{'type': 'bar', 'labels': ['Q1', 'Q2', 'Q3', 'Q4'],
+                                                         'datasets': [{'label': 'الإيرادات', 'data': [12.5, 14.1, 15.8, 17.2]}],
+                                                         'v': 1}]})
+
+    vector_document = {'documents': {
+        f'doc_{i}': {'text': 'سياسة الموارد البشرية: ' * 40, 'embedding': [((i * 31 + j) % 997) / 997 for j in range(1536)],
+                     'org_id': 1, 'metadata': {'title': f'Policy {i}', 'chunk': i}, 'created_at': '2025-01-01T00:00:00'}
+        for i in range(50)
+    }}
+
+    hr_preview = {'success': True, 'columns': ['employee_number', 'first_name', 'last_name', 'email', 'department',
+                                               'job_title', 'salary', 'hire_date', 'status', 'phone', 'city', 'manager'],
+                  'rows': [{'employee_number': f'E{i:05d}', 'first_name': 'محمد', 'last_name': 'العتيبي',
+                            'email': f'employee{i}@example.com', 'department': 'المالية', 'job_title': 'محاسب',
+                            'salary': 8500 + i, 'hire_date': '2021-03-15', 'status': 'active',
+                            'phone': '+966500000000', 'city': 'الرياض', 'manager': 'E00001'} for i in range(2000)]}
+
+    dashboard_metrics = {'totals': {'users': 1520, 'organizations': 87, 'projects': 4210, 'ai_requests': 91234, 'revenue': 125400.5},
+                         'daily': [{'date': f'2025-01-{d:02d}', 'count': 300 + d, 'cost': 1.25 * d} for d in range(1, 31)],
+                         'providers': [{'provider': p, 'count': 1000, 'cost': 12.5} for p in ('openai', 'huggingface', 'ollama')],
+                         'recent_projects': [{'id': i, 'title': f'مشروع {i}', 'status': 'completed', 'module': 'strategy_swot'}
+                                             for i in range(20)]}
+
+    return {'chat_history': chat_history, 'vector_document': vector_document,
+            'hr_preview': hr_preview, 'dashboard_metrics': dashboard_metrics}
+
+
+def _best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark(repeat=20):
+    """Best dumps/loads time (ms) of the json module and this module per payload"""
+    results = {}
+    for name, payload in _benchmark_payloads().items():
+        text = json.dumps(payload, ensure_ascii=False)
+        results[name] = {
+            'kb': len(text.encode('utf-8')) // 1024,
+            'json_dumps_ms': _best_time(lambda: json.dumps(payload, ensure_ascii=False), repeat) * 1000,
+            'fast_dumps_ms': _best_time(lambda: dumps(payload), repeat) * 1000,
+            'json_loads_ms': _best_time(lambda: json.loads(text), repeat) * 1000,
+            'fast_loads_ms': _best_time(lambda: loads(text), repeat) * 1000,
+        }
+    return results
+
+
+if __name__ == '__main__':
+    print(f"orjson available: {ORJSON_AVAILABLE}")
+    for name, result in benchmark().items():
+        print(f"{name:>18} ({result['kb']} KB): "
+              f"dumps {result['json_dumps_ms']:.2f} -> {result['fast_dumps_ms']:.2f} ms, "
+              f"loads {result['json_loads_ms']:.2f} -> {result['fast_loads_ms']:.2f} ms")
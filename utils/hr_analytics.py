@@ -0,0 +1,231 @@
+"""
+HR Analytics Engine
+Computes the /erp/hr/analyze and /erp/hr/api/hr-stats numbers from column
+arrays instead of ORM objects.
+
+One query pulls only the columns the analytics need (department, job title,
+status, salary, hire date) for an organization; they become NumPy arrays and
+every statistic (histograms, salary distribution, tenure buckets, turnover)
+is a vectorized operation over them. The monthly attendance / payroll trend
+comes from hr_monthly_summaries.
+
+Results are cached per organization. The cache key carries the org's HR data
+generation, which is bumped after every commit that touches HR rows (see the
+session hooks in models.py) and by the bulk writers that bypass the ORM, so
+all workers drop their copy as soon as HR data changes.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from models import HREmployee, TerminationRecord
+from utils.cache import TTLCache
+from utils.hr_summaries import monthly_series
+
+# Invalidation is generation based, the TTL only bounds memory/disk use
+analytics_cache = TTLCache('hr_analytics', ttl=3600, stale_ttl=3600)
+
+UNASSIGNED = 'Unassigned'
+CURRENT_STATUSES = ('active', 'on_leave')
+TENURE_EDGES = (1, 3, 5, 10)
+TENURE_LABELS = ('<1', '1-3', '3-5', '5-10', '10+')
+SALARY_PERCENTILES = (25, 50, 75, 90)
+SALARY_BINS = 10
+TURNOVER_DAYS = 365
+
+
+def hr_data_group(org_id):
+    return f"org:{int(org_id)}"
+
+
+def hr_data_generation(org_id):
+    """Token that changes whenever the organization's HR data changes"""
+    return analytics_cache.generation(hr_data_group(org_id))
+
+
+def invalidate_hr_analytics(org_id):
+    """Drop every cached HR aggregate of an organization (all workers)"""
+    analytics_cache.bump(hr_data_group(org_id))
+
+
+def mark_hr_data_changed(session, org_id):
+    """
+    Invalidate the org's HR caches when the session's transaction commits.
+    For writes the ORM flush hooks can't see (Core inserts, bulk query.delete()).
+    """
+    session.info.setdefault('hr_dirty_orgs', set()).add(org_id)
+
+
+# ==================== computation ====================
+
+def _histogram(labels, order_by_count=True):
+    """{label: count} of a string column array"""
+    if not len(labels):
+        return {}
+    values, counts = np.unique(labels, return_counts=True)
+    order = np.argsort(-counts, kind='stable') if order_by_count else np.arange(len(values))
+    return {str(values[i]): int(counts[i]) for i in order}
+
+
+def _labels(column):
+    return np.array([value if value else UNASSIGNED for value in column], dtype=object).astype(str)
+
+
+def _salary_stats(salaries, departments):
+    paid = np.isfinite(salaries)
+    values = salaries[paid]
+    if not len(values):
+        return {
+            'total': 0.0, 'average': 0.0, 'median': 0.0, 'max': 0.0, 'min': 0.0, 'std': 0.0,
+            'percentiles': {f'p{p}': 0.0 for p in SALARY_PERCENTILES},
+            'histogram': {'edges': [], 'counts': []},
+            'by_department': {},
+        }
+
+    counts, edges = np.histogram(values, bins=SALARY_BINS)
+    percentiles = np.percentile(values, SALARY_PERCENTILES)
+
+    # Per-department totals in one pass: bincount over the category codes
+    dept_values, codes = np.unique(departments[paid], return_inverse=True)
+    dept_totals = np.bincount(codes, weights=values)
+    dept_counts = np.bincount(codes)
+
+    return {
+        'total': float(values.sum()),
+        'average': float(values.mean()),
+        'median': float(np.median(values)),
+        'max': float(values.max()),
+        'min': float(values.min()),
+        'std': float(values.std()),
+        'percentiles': {f'p{p}': round(float(v), 2) for p, v in zip(SALARY_PERCENTILES, percentiles)},
+        'histogram': {
+            'edges': [round(float(e), 2) for e in edges],
+            'counts': [int(c) for c in counts],
+        },
+        'by_department': {
+            str(dept): {
+                'total': float(total),
+                'average': round(float(total / count), 2),
+                'count': int(count),
+            }
+            for dept, total, count in zip(dept_values, dept_totals, dept_counts)
+        },
+    }
+
+
+def _tenure_stats(hire_dates, current, today):
+    known = current & ~np.isnat(hire_dates)
+    years = (np.datetime64(today, 'D') - hire_dates[known]).astype('int64') / 365.25
+    years = np.clip(years, 0, None)
+    buckets = np.bincount(np.digitize(years, TENURE_EDGES), minlength=len(TENURE_LABELS))
+    return {
+        'buckets': {label: int(count) for label, count in zip(TENURE_LABELS, buckets)},
+        'average_years': round(float(years.mean()), 2) if len(years) else 0.0,
+        'median_years': round(float(np.median(years)), 2) if len(years) else 0.0,
+    }
+
+
+def _turnover_stats(session, org_id, hire_dates, current, departments, today):
+    since = today - timedelta(days=TURNOVER_DAYS)
+    rows = session.execute(
+        select(TerminationRecord.termination_date, TerminationRecord.department)
+        .where(TerminationRecord.organization_id == org_id,
+               TerminationRecord.termination_date >= since,
+               TerminationRecord.termination_date <= today)
+    ).all()
+    exit_dates = np.array([r[0] for r in rows], dtype='datetime64[D]')
+    exit_departments = _labels([r[1] for r in rows])
+
+    # Headcount a year ago = today's headcount minus this year's hires plus this year's exits
+    headcount_end = int(current.sum())
+    hired_in_period = int((current & (hire_dates >= np.datetime64(since, 'D'))).sum())
+    headcount_start = max(headcount_end - hired_in_period + len(rows), 0)
+    average_headcount = (headcount_start + headcount_end) / 2
+
+    # Exits per calendar month (last 12 months, oldest first)
+    first_month = np.datetime64(today, 'M') - 11
+    months = first_month + np.arange(12)
+    month_offsets = (exit_dates.astype('datetime64[M]') - first_month).astype('int64')
+    monthly = np.bincount(month_offsets[month_offsets >= 0], minlength=12)
+
+    dept_headcount = _histogram(departments[current], order_by_count=False)
+    dept_exits = _histogram(exit_departments, order_by_count=False)
+    by_department = {}
+    for dept in sorted(set(dept_headcount) | set(dept_exits)):
+        exits = dept_exits.get(dept, 0)
+        base = dept_headcount.get(dept, 0) + exits / 2
+        by_department[dept] = {
+            'exits': exits,
+            'headcount': dept_headcount.get(dept, 0),
+            'rate': round(exits * 100 / base, 2) if base else 0.0,
+        }
+
+    return {
+        'period_days': TURNOVER_DAYS,
+        'exits': len(rows),
+        'headcount_start': headcount_start,
+        'headcount_end': headcount_end,
+        'average_headcount': average_headcount,
+        'rate': round(len(rows) * 100 / average_headcount, 2) if average_headcount else 0.0,
+        'monthly_exits': {str(m): int(c) for m, c in zip(months, monthly)},
+        'by_department': by_department,
+    }
+
+
+def compute_hr_analytics(session, org_id, today=None):
+    """
+    Build every HR analytics figure of an organization.
+
+    Returns:
+        dict: JSON-serializable statistics (no ORM instances)
+    """
+    today = today or date.today()
+    # Core select on the table columns: plain tuples, no ORM row processing
+    table = HREmployee.__table__
+    rows = session.connection().execute(
+        select(table.c.department, table.c.job_title, table.c.status,
+               table.c.base_salary, table.c.hire_date)
+        .where(table.c.organization_id == org_id)
+    ).all()
+
+    columns = list(zip(*rows)) if rows else [()] * 5
+    departments = _labels(columns[0])
+    job_titles = _labels(columns[1])
+    statuses = np.array([s or 'unknown' for s in columns[2]], dtype=object).astype(str)
+    salaries = np.array([np.nan if s is None else s for s in columns[3]], dtype=float)
+    hire_dates = np.array(columns[4], dtype='datetime64[D]')
+    current = np.isin(statuses, CURRENT_STATUSES)
+
+    status_counts = _histogram(statuses)
+    return {
+        'total_employees': len(rows),
+        'active_employees': status_counts.get('active', 0),
+        'inactive_employees': status_counts.get('inactive', 0),
+        'current_employees': int(current.sum()),
+        'status_counts': status_counts,
+        'departments': _histogram(departments),
+        'job_titles': _histogram(job_titles),
+        'salary_stats': _salary_stats(salaries, departments),
+        'tenure': _tenure_stats(hire_dates, current, today),
+        'turnover': _turnover_stats(session, org_id, hire_dates, current, departments, today),
+        'monthly': monthly_series(session, org_id, months=12, today=today),
+        'generated_at': datetime.utcnow().isoformat(),
+    }
+
+
+def get_hr_analytics(org_id, force_refresh=False):
+    """Cached HR analytics of an organization"""
+    app = current_app._get_current_object()
+    key = f"{hr_data_group(org_id)}:{hr_data_generation(org_id)}"
+
+    def compute():
+        # Own app context so background refreshes get their own scoped session
+        with app.app_context():
+            db = app.extensions['sqlalchemy']
+            return compute_hr_analytics(db.session, org_id)
+
+    if force_refresh:
+        analytics_cache.delete(key)
+    return analytics_cache.get_or_compute(key, compute)
@@ -0,0 +1,502 @@
+"""
+HR Import Engine
+Validates, coerces and writes staged HR import rows in chunks.
+
+Each chunk of rows is coerced column by column (one pass per mapped field),
+invalid rows are reported individually and dropped, and the remaining rows are
+written with one executemany INSERT per chunk. Employees are upserted on
+(organization_id, employee_number); attendance, payroll, performance and
+resignation rows are linked to HREmployee.id through a per-import
+employee_number map, creating missing employees in batches.
+Each chunk commits on its own together with its progress checkpoint, so a
+bad row never hides the errors of the others, a failed chunk does not roll
+back earlier ones and an interrupted import can resume after the last
+committed row.
+"""
+import re
+from datetime import datetime, date, time as dt_time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import HREmployee, HRAttendance, HRPayroll, HRPerformance, TerminationRecord
+from utils.hr_analytics import mark_hr_data_changed
+from utils.hr_summaries import refresh_monthly_summaries
+
+CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 200
+
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%Y/%m/%d')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M:%S %p')
+
+
+class RowError(ValueError):
+    pass
+
+
+# ==================== Coercion ====================
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and value.strip() in ('', 'None', 'nan'))
+
+
+def to_str(value):
+    return str(value).strip()
+
+
+def to_float(value):
+    try:
+        return float(str(value).replace(',', '').strip())
+    except ValueError:
+        raise RowError(f"'{value}' is not a number")
+
+
+def to_int(value):
+    number = to_float(value)
+    if number != int(number):
+        raise RowError(f"'{value}' is not a whole number")
+    return int(number)
+
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f"'{value}' is not a date")
+
+
+def to_time(value):
+    if isinstance(value, dt_time):
+        return value
+    if isinstance(value, datetime):
+        return value.time()
+    text = str(value).strip()
+    # Excel exports datetimes as "1900-01-01 08:30:00"
+    match = re.search(r'(\d{1,2}:\d{2}(:\d{2})?(\s?[AaPp][Mm])?)$', text)
+    if match:
+        text = match.group(1).upper()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            continue
+    raise RowError(f"'{value}' is not a time")
+
+
+# field -> (coercer, default); a default of REQUIRED makes the field mandatory
+REQUIRED = object()
+
+FIELD_SPECS = {
+    'employees': {
+        'employee_number': (to_str, None),
+        'full_name': (to_str, 'Employee'),
+        'national_id': (to_str, None),
+        'email': (to_str, None),
+        'phone': (to_str, None),
+        'department': (to_str, 'General'),
+        'job_title': (to_str, 'Staff'),
+        'hire_date': (to_date, date.today),
+        'contract_type': (to_str, 'permanent'),
+        'base_salary': (to_float, 0.0),
+        'status': (to_str, 'active'),
+    },
+    'attendance': {
+        'employee_number': (to_str, REQUIRED),
+        'date': (to_date, date.today),
+        'check_in': (to_time, None),
+        'check_out': (to_time, None),
+        'status': (to_str, 'present'),
+        'notes': (to_str, None),
+    },
+    'payroll': {
+        'employee_number': (to_str, REQUIRED),
+        'month': (to_int, lambda: date.today().month),
+        'year': (to_int, lambda: date.today().year),
+        'base_salary': (to_float, 0.0),
+        'rewards': (to_float, 0.0),
+        'overtime': (to_float, 0.0),
+        'bonus': (to_float, 0.0),
+        'absence_deduction': (to_float, 0.0),
+        'late_deduction': (to_float, 0.0),
+        'other_deductions': (to_float, 0.0),
+        'net_salary': (to_float, None),
+        'working_days': (to_int, 0),
+        'absent_days': (to_int, 0),
+        'late_days': (to_int, 0),
+    },
+    'performance': {
+        'employee_number': (to_str, REQUIRED),
+        'review_period': (to_str, None),
+        'review_date': (to_date, date.today),
+        'overall_rating': (to_float, 4.0),
+        'productivity_rating': (to_float, None),
+        'quality_rating': (to_float, None),
+        'teamwork_rating': (to_float, None),
+        'punctuality_rating': (to_float, None),
+        'initiative_rating': (to_float, None),
+    },
+    'resignations': {
+        'employee_number': (to_str, REQUIRED),
+        'employee_name': (to_str, 'Employee'),
+        'department': (to_str, None),
+        'job_title': (to_str, None),
+        'termination_type': (to_str, 'resignation'),
+        'termination_date': (to_date, date.today),
+        'reason': (to_str, None),
+    },
+}
+
+TARGET_MODELS = {
+    'attendance': HRAttendance,
+    'payroll': HRPayroll,
+    'performance': HRPerformance,
+    'resignations': TerminationRecord,
+}
+
+
+def provided_fields(rows, file_type, mapping):
+    """Fields a chunk carries values for: mapped to a source column or present by name"""
+    present = set(rows[0]) if rows else set()
+    return {field for field in FIELD_SPECS[file_type]
+            if mapping.get(field) in present or field in present}
+
+
+def coerce_chunk(rows, file_type, mapping):
+    """
+    Coerce a chunk of raw row dicts column by column.
+
+    Args:
+        rows: list of dicts keyed by source column
+        file_type: employees, attendance, payroll, performance or resignations
+        mapping: {field: source column}; unmapped fields fall back to a column of the same name
+
+    Returns:
+        (records, errors): records is a list of (row_index, dict) for valid rows,
+        errors is {row_index: message} for rejected ones
+    """
+    specs = FIELD_SPECS[file_type]
+    columns = {}
+    errors = {}
+
+    for field, (coercer, default) in specs.items():
+        source = mapping.get(field) or field
+        values = []
+        for index, row in enumerate(rows):
+            raw = row.get(source)
+            if _blank(raw) and source != field:
+                raw = row.get(field)
+            if _blank(raw):
+                if default is REQUIRED:
+                    errors.setdefault(index, f"missing {field}")
+                    values.append(None)
+                else:
+                    values.append(default() if callable(default) else default)
+                continue
+            try:
+                values.append(coercer(raw))
+            except RowError as e:
+                errors.setdefault(index, f"{field}: {e}")
+                values.append(None)
+        columns[field] = values
+
+    fields = list(specs)
+    records = [
+        (index, {field: columns[field][index] for field in fields})
+        for index in range(len(rows)) if index not in errors
+    ]
+    return records, errors
+
+
+# ==================== Employee resolution ====================
+
+class EmployeeResolver:
+    """
+    Per-import employee_number -> HREmployee.id map for one organization.
+
+    The organization's numbers are loaded with one query on first use and kept
+    for the whole import; numbers that are not found are created in one batch
+    per chunk (when create_missing is set) instead of failing the rows.
+    """
+
+    def __init__(self, session, org_id, create_missing=True):
+        self.session = session
+        self.org_id = org_id
+        self.create_missing = create_missing
+        self.created = 0
+        self._ids = None
+
+    def _load(self):
+        self._ids = dict(self.session.query(HREmployee.employee_number, HREmployee.id).filter(
+            HREmployee.organization_id == self.org_id
+        ).all())
+
+    def resolve(self, numbers):
+        """
+        Args:
+            numbers: {employee_number: employee name or None} for one chunk
+
+        Returns:
+            {employee_number: id} for every number that is (now) known
+        """
+        if self._ids is None:
+            self._load()
+        missing = {n: name for n, name in numbers.items() if n and n not in self._ids}
+        if missing and self.create_missing:
+            self._create(missing)
+        return {n: self._ids[n] for n in numbers if n in self._ids}
+
+    def _create(self, missing):
+        now = datetime.utcnow()
+        rows = [{
+            'organization_id': self.org_id,
+            'employee_number': number,
+            'full_name': name or f'Employee {number}',
+            'hire_date': date.today(),
+            'status': 'active',
+            'created_at': now,
+            'updated_at': now,
+        } for number, name in missing.items()]
+
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # Another import may create the same employees concurrently
+            insert_fn = pg_insert if dialect == 'postgresql' else sqlite_insert
+            stmt = insert_fn(HREmployee.__table__).on_conflict_do_nothing(
+                index_elements=['organization_id', 'employee_number'])
+            self.session.execute(stmt, rows)
+        else:
+            self.session.execute(insert(HREmployee.__table__), rows)
+
+        created = dict(self.session.query(HREmployee.employee_number, HREmployee.id).filter(
+            HREmployee.organization_id == self.org_id,
+            HREmployee.employee_number.in_(list(missing))
+        ).all())
+        self._ids.update(created)
+        self.created += len(created)
+
+
+# ==================== Engine ====================
+
+class HRImportEngine:
+    """
+    Write staged import rows for one organization in committed chunks.
+
+    Usage:
+        engine = HRImportEngine(db_session, org_id, 'payroll', mapping, user_id=user_id)
+        result = engine.run(stage.iter_rows(), progress=callback)
+    """
+
+    def __init__(self, session, org_id, file_type, mapping=None, user_id=None, chunk_size=CHUNK_SIZE,
+                 create_missing_employees=True):
+        if file_type not in FIELD_SPECS:
+            raise ValueError(f"Unsupported import type: {file_type}")
+        self.session = session
+        self.org_id = org_id
+        self.file_type = file_type
+        self.mapping = mapping or {}
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.resolver = None if file_type == 'employees' else EmployeeResolver(
+            session, org_id, create_missing=create_missing_employees)
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.update_fields = set()
+
+    @property
+    def dialect(self):
+        return self.session.get_bind().dialect.name
+
+    def run(self, rows, start_row=0, progress=None):
+        """
+        Import an iterable of row dicts.
+
+        Args:
+            rows: iterable of row dicts (already positioned at start_row)
+            start_row: file row offset of the first row (for error messages and progress)
+            progress: optional callable(rows_done, imported, failed) called after each chunk is
+                written; changes it makes to the session commit atomically with the chunk
+
+        Returns:
+            dict with imported, failed and errors
+        """
+        chunk = []
+        offset = start_row
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                offset = self._commit_chunk(chunk, offset, progress)
+                chunk = []
+        if chunk:
+            self._commit_chunk(chunk, offset, progress)
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'employees_created': self.resolver.created if self.resolver else 0,
+        }
+
+    def _commit_chunk(self, chunk, offset, progress):
+        """Write one chunk and commit it together with the progress checkpoint"""
+        self._process_chunk(chunk, offset)
+        offset += len(chunk)
+        if progress:
+            progress(offset, self.imported, self.failed)
+        # Core inserts bypass the ORM flush hooks that invalidate HR caches
+        mark_hr_data_changed(self.session, self.org_id)
+        self.session.commit()
+        return offset
+
+    def _error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {row_number}: {message}")
+
+    def _process_chunk(self, chunk, offset):
+        records, errors = coerce_chunk(chunk, self.file_type, self.mapping)
+        for index, message in sorted(errors.items()):
+            self._error(offset + index + 1, message)
+
+        now = datetime.utcnow()
+        if self.file_type == 'employees':
+            # Fields the file does not carry keep their stored values on update
+            self.update_fields = provided_fields(chunk, self.file_type, self.mapping)
+            mappings = self._employee_mappings(records, offset, now)
+        else:
+            mappings = self._linked_mappings(records, offset, now)
+        if not mappings:
+            return
+
+        try:
+            with self.session.begin_nested():
+                self._write(mappings)
+            self.imported += len(mappings)
+        except SQLAlchemyError:
+            self._write_rows_individually(mappings)
+
+        if self.file_type in ('attendance', 'payroll'):
+            # Core inserts bypass the flush hook that maintains the monthly summaries
+            refresh_monthly_summaries(self.session.connection(), self._summary_keys(mappings))
+
+    def _summary_keys(self, mappings):
+        if self.file_type == 'attendance':
+            return {(self.org_id, m['employee_id'], m['date'].year, m['date'].month)
+                    for _, m in mappings if m.get('date')}
+        return {(self.org_id, m['employee_id'], m['year'], m['month'])
+                for _, m in mappings if m.get('year') and m.get('month')}
+
+    def _write(self, mappings):
+        rows = [m for _, m in mappings]
+        if self.file_type == 'employees':
+            self._upsert_employees(rows)
+        else:
+            self.session.execute(insert(TARGET_MODELS[self.file_type].__table__), rows)
+
+    def _write_rows_individually(self, mappings):
+        """Isolate the rows that break a chunk write, keeping the good ones"""
+        for row_number, mapping in mappings:
+            try:
+                with self.session.begin_nested():
+                    self._write([(row_number, mapping)])
+                self.imported += 1
+            except SQLAlchemyError as e:
+                self._error(row_number, str(getattr(e, 'orig', e)).splitlines()[0])
+
+    # ---------- employees ----------
+
+    def _employee_mappings(self, records, offset, now):
+        # Later rows win when the same employee number appears twice in a chunk
+        by_number = {}
+        for index, record in records:
+            row_number = offset + index + 1
+            record['employee_number'] = record['employee_number'] or f'EMP_{self.org_id}_{row_number}'
+            record.update(organization_id=self.org_id, created_at=now, updated_at=now)
+            by_number[record['employee_number']] = (row_number, record)
+        return list(by_number.values())
+
+    def _upsert_employees(self, rows):
+        table = HREmployee.__table__
+        key = ('organization_id', 'employee_number')
+        update_columns = [c for c in rows[0] if c not in key and (c in self.update_fields or c == 'updated_at')]
+
+        if self.dialect in ('postgresql', 'sqlite'):
+            insert_fn = pg_insert if self.dialect == 'postgresql' else sqlite_insert
+            stmt = insert_fn(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key),
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+            self.session.execute(stmt, rows)
+            return
+
+        existing = dict(self.session.query(HREmployee.employee_number, HREmployee.id).filter(
+            HREmployee.organization_id == self.org_id,
+            HREmployee.employee_number.in_([r['employee_number'] for r in rows])
+        ).all())
+        updates = [dict({c: r[c] for c in update_columns}, id=existing[r['employee_number']])
+                   for r in rows if r['employee_number'] in existing]
+        inserts = [r for r in rows if r['employee_number'] not in existing]
+        if updates:
+            self.session.bulk_update_mappings(HREmployee, updates)
+        if inserts:
+            self.session.execute(insert(table), inserts)
+
+    # ---------- rows linked to an employee ----------
+
+    def _linked_mappings(self, records, offset, now):
+        names = {r['employee_number']: r.get('employee_name') for _, r in records}
+        employee_ids = self.resolver.resolve(names)
+        mappings = []
+        for index, record in records:
+            row_number = offset + index + 1
+            employee_id = employee_ids.get(record['employee_number'])
+            if not employee_id:
+                self._error(row_number, f"unknown employee number {record['employee_number']}")
+                continue
+            mapping = self._build_linked(record, now)
+            mapping.update(organization_id=self.org_id, employee_id=employee_id)
+            mappings.append((row_number, mapping))
+        return mappings
+
+    def _build_linked(self, record, now):
+        if self.file_type == 'attendance':
+            total_hours = 0
+            if record['check_in'] and record['check_out']:
+                start = record['check_in'].hour * 60 + record['check_in'].minute
+                end = record['check_out'].hour * 60 + record['check_out'].minute
+                total_hours = round(max(end - start, 0) / 60, 2)
+            return {
+                'date': record['date'], 'check_in': record['check_in'], 'check_out': record['check_out'],
+                'total_hours': total_hours, 'status': record['status'], 'notes': record['notes'],
+                'created_at': now, 'updated_at': now,
+            }
+        if self.file_type == 'payroll':
+            additions = record['rewards'] + record['overtime'] + record['bonus']
+            deductions = record['absence_deduction'] + record['late_deduction'] + record['other_deductions']
+            mapping = {k: v for k, v in record.items() if k != 'employee_number'}
+            mapping.update(
+                total_additions=additions,
+                total_deductions=deductions,
+                net_salary=record['net_salary'] if record['net_salary'] is not None
+                else record['base_salary'] + additions - deductions,
+                status='calculated',
+                created_at=now, updated_at=now,
+            )
+            return mapping
+        if self.file_type == 'performance':
+            mapping = {k: v for k, v in record.items() if k != 'employee_number'}
+            mapping.update(reviewer_id=self.user_id, created_at=now, updated_at=now)
+            return mapping
+        # resignations
+        mapping = dict(record)
+        mapping.update(created_by=self.user_id, created_at=now)
+        return mapping
@@ -0,0 +1,171 @@
+"""
+Background HR Import Jobs
+Runs HRImportEngine for an HRDataImport on the background pool instead of
+inside the POST that triggers it.
+
+- Lease: a worker claims an import with a conditional UPDATE that only
+  succeeds while nobody else holds an unexpired lease, so an import is
+  processed by one worker at a time even across processes.
+- Heartbeat: every committed chunk extends the lease; a worker that dies
+  stops renewing it and the import becomes claimable again.
+- Checkpoint: processed_rows (the last committed row) is written in the same
+  transaction as each chunk, so a resumed import continues right after it.
+"""
+import os
+import json
+import uuid
+import socket
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update, or_
+
+from models import HRDataImport
+from utils import background
+from utils.import_staging import ImportStage
+from utils.hr_import import HRImportEngine, MAX_REPORTED_ERRORS
+
+LEASE_SECONDS = int(os.getenv('HR_IMPORT_LEASE_SECONDS', '120'))
+CLAIMABLE_STATUSES = ('pending', 'queued', 'processing')
+
+
+class LeaseLost(Exception):
+    """Another worker took over the import (our lease expired)"""
+
+
+def _new_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_import(session, import_id, owner):
+    """Atomically take the lease on an import; returns True if this worker got it"""
+    now = datetime.utcnow()
+    result = session.execute(
+        update(HRDataImport)
+        .where(
+            HRDataImport.id == import_id,
+            HRDataImport.status.in_(CLAIMABLE_STATUSES),
+            or_(HRDataImport.lease_owner.is_(None), HRDataImport.lease_expires_at < now)
+        )
+        .values(
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+            heartbeat_at=now,
+            status='processing'
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _heartbeat(session, import_id, owner):
+    """Extend the lease inside the current chunk transaction"""
+    now = datetime.utcnow()
+    result = session.execute(
+        update(HRDataImport)
+        .where(HRDataImport.id == import_id, HRDataImport.lease_owner == owner)
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise LeaseLost(import_id)
+
+
+def enqueue_import(session, import_record):
+    """Mark an import as queued and hand it to the background pool"""
+    import_record.status = 'queued'
+    session.commit()
+    background.submit(run_import_job, import_record.id)
+
+
+def run_import_job(import_id):
+    """Background task: process (or resume) one HR import"""
+    session = current_app.extensions['sqlalchemy'].session
+    owner = _new_owner()
+    if not claim_import(session, import_id, owner):
+        return
+
+    import_record = session.get(HRDataImport, import_id)
+    session.refresh(import_record)
+    start_row = import_record.processed_rows or 0
+    base_imported = (import_record.records_imported or 0) if start_row else 0
+    base_failed = (import_record.records_failed or 0) if start_row else 0
+    base_errors = json.loads(import_record.error_log) if start_row and import_record.error_log else []
+
+    try:
+        stage = ImportStage.open(import_id)
+        if not stage:
+            raise ValueError('File data not available. Please re-import.')
+
+        mapping = json.loads(import_record.column_mapping) if import_record.column_mapping else {}
+        engine = HRImportEngine(session, import_record.organization_id, import_record.file_type,
+                                mapping, user_id=import_record.imported_by)
+
+        def checkpoint(rows_done, imported, failed):
+            _heartbeat(session, import_id, owner)
+            import_record.processed_rows = rows_done
+            import_record.records_imported = base_imported + imported
+            import_record.records_failed = base_failed + failed
+            errors = (base_errors + engine.errors)[:MAX_REPORTED_ERRORS]
+            import_record.error_log = json.dumps(errors) if errors else None
+
+        engine.run(stage.iter_rows(start_row), start_row=start_row, progress=checkpoint)
+
+        import_record.status = 'completed'
+        import_record.processed_rows = stage.total_rows
+        import_record.completed_at = datetime.utcnow()
+    except LeaseLost:
+        session.rollback()
+        return
+    except Exception as e:
+        session.rollback()
+        import_record = session.get(HRDataImport, import_id)
+        import_record.status = 'failed'
+        errors = json.loads(import_record.error_log) if import_record.error_log else []
+        import_record.error_log = json.dumps(errors + [str(e)])
+        import_record.completed_at = datetime.utcnow()
+        print(f"[hr-import] Import {import_id} failed: {e}")
+
+    import_record.lease_owner = None
+    import_record.lease_expires_at = None
+    session.commit()
+
+
+def requeue_stale_imports(session, import_id=None, include_queued=False):
+    """
+    Resubmit imports whose worker died mid-run (status processing, lease expired).
+    With include_queued (used at startup) imports that were queued in a pool that
+    no longer exists are resubmitted too.
+
+    Returns:
+        List of requeued import ids
+    """
+    stale = (HRDataImport.status == 'processing') & (HRDataImport.lease_expires_at < datetime.utcnow())
+    if include_queued:
+        stale = stale | (HRDataImport.status == 'queued')
+    query = session.query(HRDataImport.id).filter(stale)
+    if import_id is not None:
+        query = query.filter(HRDataImport.id == import_id)
+    stale_ids = [i for (i,) in query.all()]
+    for stale_id in stale_ids:
+        background.submit(run_import_job, stale_id)
+    return stale_ids
+
+
+def import_progress(import_record):
+    """Progress payload for the polling / SSE endpoints"""
+    total = import_record.records_total or 0
+    processed = import_record.processed_rows or 0
+    errors = json.loads(import_record.error_log) if import_record.error_log else []
+    return {
+        'import_id': import_record.id,
+        'status': import_record.status,
+        'total': total,
+        'processed': processed,
+        'percent': round(processed * 100 / total, 1) if total else (100.0 if import_record.status == 'completed' else 0.0),
+        'imported': import_record.records_imported or 0,
+        'failed': import_record.records_failed or 0,
+        'errors': errors[:10],
+        'done': import_record.status in ('completed', 'failed'),
+    }
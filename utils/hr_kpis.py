@@ -0,0 +1,196 @@
+"""
+HR Dashboard KPI Service
+Computes the HR dashboard numbers with a handful of conditional-aggregation
+queries instead of one COUNT/SUM round-trip per figure.
+
+- Every KPI of a table is a SUM(CASE ...) column of one aggregate over that
+  table; the per-table aggregates are single-row subqueries cross-joined into
+  one SELECT, so all scalar KPIs come back in one round-trip.
+- Attendance rate and payroll total read the month's rows of
+  hr_monthly_summaries (utils/hr_summaries.py), never the raw attendance;
+  date filters stay plain ranges so the (organization_id, ...) indexes apply.
+
+Results are cached per organization for a short time. Like the HR analytics
+cache, the key carries the org's HR data generation, so any HR write shows up
+on the next page load.
+"""
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import select, func, case, true
+
+from models import (HREmployee, HRContract, HRAttendance, HRLeave, HRPayroll,
+                    HRPerformance, TerminationRecord, HRDataImport)
+from utils.cache import TTLCache
+from utils.hr_analytics import hr_data_group, hr_data_generation
+from utils.hr_summaries import period_totals_query
+
+kpi_cache = TTLCache('hr_kpis', ttl=30, stale_ttl=120)
+
+EXPIRING_CONTRACT_DAYS = 30
+RECENT_LIMIT = 5
+DATA_STATUS_TYPES = ('employees', 'attendance', 'performance', 'payroll', 'resignations')
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+# ==================== dashboard KPIs ====================
+
+def compute_dashboard_kpis(session, org_id, today=None):
+    """
+    Build the /erp/hr/ dashboard: scalar KPIs, department stats and recent lists.
+
+    Returns:
+        dict: kpis, dept_stats, recent_employees, recent_leaves (plain values)
+    """
+    today = today or date.today()
+    expiring_before = today + timedelta(days=EXPIRING_CONTRACT_DAYS)
+
+    employees = select(
+        _count_if(HREmployee.status == 'active').label('active'),
+    ).where(HREmployee.organization_id == org_id).subquery()
+
+    leaves = select(
+        _count_if((HRLeave.status == 'approved') & (HRLeave.start_date <= today)
+                  & (HRLeave.end_date >= today)).label('on_leave'),
+        _count_if(HRLeave.status == 'pending').label('pending'),
+    ).where(HRLeave.organization_id == org_id).subquery()
+
+    contracts = select(
+        func.count(HRContract.id).label('expiring'),
+    ).where(
+        HRContract.organization_id == org_id,
+        HRContract.status == 'active',
+        HRContract.end_date >= today,
+        HRContract.end_date <= expiring_before
+    ).subquery()
+
+    # Attendance and payroll come from the monthly summaries, not the raw rows
+    month = period_totals_query(org_id, today.year, today.month).subquery()
+
+    row = session.execute(
+        select(employees.c.active, leaves.c.on_leave, leaves.c.pending, contracts.c.expiring,
+               month.c.net_salary, month.c.attendance_days, month.c.present_days)
+        .select_from(employees)
+        .join(leaves, true()).join(contracts, true()).join(month, true())
+    ).one()
+
+    records = int(row.attendance_days or 0)
+    kpis = {
+        'total_employees': int(row.active or 0),
+        'employees_on_leave': int(row.on_leave or 0),
+        'pending_leaves': int(row.pending or 0),
+        'expiring_contracts': int(row.expiring or 0),
+        'total_payroll': float(row.net_salary or 0),
+        'attendance_rate': round(int(row.present_days or 0) / records * 100, 1) if records else 0,
+    }
+
+    dept_stats = [
+        (department, count) for department, count in session.query(
+            HREmployee.department,
+            func.count(HREmployee.id).label('count')
+        ).filter(
+            HREmployee.organization_id == org_id,
+            HREmployee.status == 'active'
+        ).group_by(HREmployee.department).all()
+    ]
+
+    recent_employees = [
+        {
+            'id': r.id,
+            'full_name': r.full_name,
+            'employee_number': r.employee_number,
+            'department': r.department,
+            'status': r.status,
+        }
+        for r in session.query(
+            HREmployee.id, HREmployee.full_name, HREmployee.employee_number,
+            HREmployee.department, HREmployee.status
+        ).filter(HREmployee.organization_id == org_id)
+        .order_by(HREmployee.created_at.desc()).limit(RECENT_LIMIT).all()
+    ]
+
+    # Employee name joined in, instead of a lazy load per leave in the template
+    recent_leaves = [
+        {
+            'id': r.id,
+            'employee_name': r.full_name,
+            'leave_type': r.leave_type,
+            'days_count': r.days_count,
+            'status': r.status,
+        }
+        for r in session.query(
+            HRLeave.id, HREmployee.full_name, HRLeave.leave_type, HRLeave.days_count, HRLeave.status
+        ).join(HREmployee, HRLeave.employee_id == HREmployee.id)
+        .filter(HRLeave.organization_id == org_id, HRLeave.status == 'pending')
+        .order_by(HRLeave.created_at.desc()).limit(RECENT_LIMIT).all()
+    ]
+
+    return {
+        'kpis': kpis,
+        'dept_stats': dept_stats,
+        'recent_employees': recent_employees,
+        'recent_leaves': recent_leaves,
+    }
+
+
+# ==================== data status ====================
+
+def compute_data_status(session, org_id):
+    """
+    Row counts and last import dates per HR data type (hr.index / api_data_status).
+
+    Returns:
+        dict: {file_type: {'count', 'last_completed', 'last_imported'}}
+    """
+    counts = [
+        select(func.count()).select_from(model).where(model.organization_id == org_id).scalar_subquery()
+        for model in (HREmployee, HRAttendance, HRPerformance, HRPayroll, TerminationRecord)
+    ]
+    row = session.execute(select(*counts)).one()
+
+    imports = session.query(
+        HRDataImport.file_type,
+        func.max(case((HRDataImport.status == 'completed', HRDataImport.completed_at))).label('last_completed'),
+        func.max(HRDataImport.created_at).label('last_imported')
+    ).filter(HRDataImport.organization_id == org_id).group_by(HRDataImport.file_type).all()
+    import_dates = {r.file_type: r for r in imports}
+
+    status = {}
+    for file_type, count in zip(DATA_STATUS_TYPES, row):
+        dates = import_dates.get(file_type)
+        status[file_type] = {
+            'count': int(count or 0),
+            'last_completed': dates.last_completed if dates else None,
+            'last_imported': dates.last_imported if dates else None,
+        }
+    return status
+
+
+# ==================== cached access ====================
+
+def _cached(name, org_id, compute_fn, force_refresh=False):
+    app = current_app._get_current_object()
+    key = f"{hr_data_group(org_id)}:{hr_data_generation(org_id)}:{name}:{date.today().isoformat()}"
+
+    def compute():
+        # Own app context so background refreshes get their own scoped session
+        with app.app_context():
+            db = app.extensions['sqlalchemy']
+            return compute_fn(db.session, org_id)
+
+    if force_refresh:
+        kpi_cache.delete(key)
+    return kpi_cache.get_or_compute(key, compute)
+
+
+def get_dashboard_kpis(org_id, force_refresh=False):
+    """Cached HR dashboard KPIs of an organization"""
+    return _cached('dashboard', org_id, compute_dashboard_kpis, force_refresh)
+
+
+def get_data_status(org_id, force_refresh=False):
+    """Cached HR data status counts of an organization"""
+    return _cached('data_status', org_id, compute_data_status, force_refresh)
@@ -0,0 +1,320 @@
+"""
+HR Monthly Summaries
+Maintains hr_monthly_summaries - one row per (organization, employee, year,
+month) with attendance counts / hours and payroll totals - so dashboards and
+reports never aggregate raw hr_attendance / hr_payroll rows.
+
+Rows are kept current at write time:
+- ORM writes: the session after_flush hook in models.py collects the
+  employee-months touched by HRAttendance / HRPayroll changes (old and new
+  values) and calls refresh_monthly_summaries() in the same transaction.
+- Imports: HRImportEngine refreshes the employee-months of each chunk before
+  committing it.
+
+A refresh re-derives the touched employee-months from the raw rows (bounded by
+the (employee/org, date) and (org, year, month) indexes) rather than applying
+deltas, so updates and deletes need no bookkeeping. rebuild_monthly_summaries()
+recomputes any scope from scratch; run it with
+    python migrations/rebuild_hr_summaries.py [--org ID] [--year YYYY] [--month M]
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, func, case, inspect, insert, union
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import HRAttendance, HRPayroll, HRMonthlySummary
+
+KEY_COLUMNS = ('organization_id', 'employee_id', 'year', 'month')
+ATTENDANCE_COLUMNS = ('attendance_days', 'present_days', 'absent_days', 'late_days', 'half_days', 'total_hours')
+PAYROLL_COLUMNS = ('payroll_records', 'base_salary', 'net_salary')
+EMPLOYEE_BATCH = 500
+
+
+def month_range(day):
+    """[first day of the month, first day of the next month)"""
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+# ==================== incremental maintenance ====================
+
+def _attribute_values(state, name):
+    """Current and (if changed in this flush) previous values of an attribute"""
+    history = state.attrs[name].history
+    values = {v for v in (*history.added, *history.unchanged, *history.deleted) if v is not None}
+    if not values:
+        value = getattr(state.obj(), name)
+        if value is not None:
+            values.add(value)
+    return values
+
+
+def summary_keys_for(obj):
+    """
+    Summary keys an HRAttendance / HRPayroll change affects (before and after the change).
+
+    Returns:
+        set of (organization_id, employee_id, year, month)
+    """
+    state = inspect(obj)
+    org_ids = _attribute_values(state, 'organization_id')
+    employee_ids = _attribute_values(state, 'employee_id')
+    if isinstance(obj, HRAttendance):
+        periods = {(d.year, d.month) for d in _attribute_values(state, 'date')}
+    else:
+        periods = {(y, m) for y in _attribute_values(state, 'year') for m in _attribute_values(state, 'month')}
+    return {
+        (org_id, employee_id, year, month)
+        for org_id in org_ids for employee_id in employee_ids for year, month in periods
+    }
+
+
+def refresh_monthly_summaries(connection, keys):
+    """
+    Re-derive the summary rows of the given employee-months from the raw rows.
+
+    Args:
+        connection: Connection of the transaction that changed the raw rows
+        keys: iterable of (organization_id, employee_id, year, month)
+
+    Returns:
+        int: Number of summary rows written
+    """
+    by_period = defaultdict(set)
+    for org_id, employee_id, year, month in keys:
+        if not (1 <= month <= 12 and 1 <= year <= 9999):
+            continue  # Invalid periods are never summarized
+        by_period[(org_id, year, month)].add(employee_id)
+
+    written = 0
+    for (org_id, year, month), employee_ids in by_period.items():
+        employee_ids = sorted(employee_ids)
+        for start in range(0, len(employee_ids), EMPLOYEE_BATCH):
+            written += _refresh_period(connection, org_id, year, month, employee_ids[start:start + EMPLOYEE_BATCH])
+    return written
+
+
+def _aggregate_period(connection, org_id, year, month, employee_ids=None):
+    """{employee_id: summary row} for one organization-month"""
+    start, end = month_range(date(year, month, 1))
+
+    attendance = select(
+        HRAttendance.employee_id,
+        func.count(HRAttendance.id),
+        _count_if(HRAttendance.status == 'present'),
+        _count_if(HRAttendance.status == 'absent'),
+        _count_if(HRAttendance.status == 'late'),
+        _count_if(HRAttendance.status == 'half_day'),
+        func.coalesce(func.sum(HRAttendance.total_hours), 0),
+    ).where(
+        HRAttendance.organization_id == org_id,
+        HRAttendance.date >= start,
+        HRAttendance.date < end
+    ).group_by(HRAttendance.employee_id)
+
+    payroll = select(
+        HRPayroll.employee_id,
+        func.count(HRPayroll.id),
+        func.coalesce(func.sum(HRPayroll.base_salary), 0),
+        func.coalesce(func.sum(HRPayroll.net_salary), 0),
+    ).where(
+        HRPayroll.organization_id == org_id,
+        HRPayroll.year == year,
+        HRPayroll.month == month
+    ).group_by(HRPayroll.employee_id)
+
+    if employee_ids is not None:
+        attendance = attendance.where(HRAttendance.employee_id.in_(employee_ids))
+        payroll = payroll.where(HRPayroll.employee_id.in_(employee_ids))
+
+    now = datetime.utcnow()
+
+    def empty_row(employee_id):
+        row = dict(zip(KEY_COLUMNS, (org_id, employee_id, year, month)))
+        row.update({column: 0 for column in ATTENDANCE_COLUMNS + PAYROLL_COLUMNS})
+        row['updated_at'] = now
+        return row
+
+    rows = {}
+    for employee_id, *values in connection.execute(attendance):
+        rows.setdefault(employee_id, empty_row(employee_id)).update(zip(ATTENDANCE_COLUMNS, values))
+    for employee_id, *values in connection.execute(payroll):
+        rows.setdefault(employee_id, empty_row(employee_id)).update(zip(PAYROLL_COLUMNS, values))
+    return rows
+
+
+def _refresh_period(connection, org_id, year, month, employee_ids):
+    table = HRMonthlySummary.__table__
+    rows = _aggregate_period(connection, org_id, year, month, employee_ids)
+
+    # Employee-months whose raw rows are all gone
+    emptied = [e for e in employee_ids if e not in rows]
+    if emptied:
+        connection.execute(table.delete().where(
+            table.c.organization_id == org_id, table.c.year == year, table.c.month == month,
+            table.c.employee_id.in_(emptied)
+        ))
+    if not rows:
+        return 0
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # Concurrent refreshes of the same employee-month update instead of colliding
+        insert_fn = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert_fn(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={c: stmt.excluded[c] for c in ATTENDANCE_COLUMNS + PAYROLL_COLUMNS + ('updated_at',)}
+        )
+        connection.execute(stmt, list(rows.values()))
+    else:
+        connection.execute(table.delete().where(
+            table.c.organization_id == org_id, table.c.year == year, table.c.month == month,
+            table.c.employee_id.in_(list(rows))
+        ))
+        connection.execute(insert(table), list(rows.values()))
+    return len(rows)
+
+
+# ==================== rebuild ====================
+
+def rebuild_monthly_summaries(session, org_id=None, year=None, month=None):
+    """
+    Recompute summary rows from the raw tables (everything by default).
+
+    Args:
+        session: SQLAlchemy database session
+        org_id: Only this organization, or None
+        year: Only this year, or None
+        month: Only this month (1-12), or None
+
+    Returns:
+        int: Number of summary rows written
+    """
+    table = HRMonthlySummary.__table__
+    attendance_year = func.extract('year', HRAttendance.date)
+    attendance_month = func.extract('month', HRAttendance.date)
+
+    # A full rebuild scans the raw tables anyway, so extract() is fine here
+    attendance_periods = select(HRAttendance.organization_id, attendance_year, attendance_month).distinct()
+    payroll_periods = select(HRPayroll.organization_id, HRPayroll.year, HRPayroll.month).distinct()
+    delete = table.delete()
+    if org_id is not None:
+        attendance_periods = attendance_periods.where(HRAttendance.organization_id == org_id)
+        payroll_periods = payroll_periods.where(HRPayroll.organization_id == org_id)
+        delete = delete.where(table.c.organization_id == org_id)
+    if year is not None:
+        attendance_periods = attendance_periods.where(attendance_year == year)
+        payroll_periods = payroll_periods.where(HRPayroll.year == year)
+        delete = delete.where(table.c.year == year)
+    if month is not None:
+        attendance_periods = attendance_periods.where(attendance_month == month)
+        payroll_periods = payroll_periods.where(HRPayroll.month == month)
+        delete = delete.where(table.c.month == month)
+
+    try:
+        connection = session.connection()
+        periods = sorted({
+            (int(o), int(y), int(m))
+            for o, y, m in connection.execute(union(attendance_periods, payroll_periods))
+        })
+        connection.execute(delete)
+        written = 0
+        for period_org, period_year, period_month in periods:
+            rows = _aggregate_period(connection, period_org, period_year, period_month)
+            if rows:
+                connection.execute(insert(table), list(rows.values()))
+                written += len(rows)
+        session.commit()
+        return written
+    except Exception:
+        session.rollback()
+        raise
+
+
+def ensure_monthly_summaries_backfilled(session):
+    """Backfill the summary table once on deployments that already have attendance / payroll"""
+    if session.query(HRMonthlySummary.id).first() is not None:
+        return False
+    if session.query(HRAttendance.id).first() is None and session.query(HRPayroll.id).first() is None:
+        return False
+    rebuild_monthly_summaries(session)
+    return True
+
+
+# ==================== readers ====================
+
+def period_totals_query(org_id, year, month):
+    """Single-row SELECT of an organization's totals for one month (usable as a subquery)"""
+    return select(
+        func.coalesce(func.sum(HRMonthlySummary.attendance_days), 0).label('attendance_days'),
+        func.coalesce(func.sum(HRMonthlySummary.present_days), 0).label('present_days'),
+        func.coalesce(func.sum(HRMonthlySummary.absent_days), 0).label('absent_days'),
+        func.coalesce(func.sum(HRMonthlySummary.late_days), 0).label('late_days'),
+        func.coalesce(func.sum(HRMonthlySummary.total_hours), 0).label('total_hours'),
+        func.coalesce(func.sum(HRMonthlySummary.net_salary), 0).label('net_salary'),
+    ).where(
+        HRMonthlySummary.organization_id == org_id,
+        HRMonthlySummary.year == year,
+        HRMonthlySummary.month == month
+    )
+
+
+def monthly_series(session, org_id, months=12, today=None, employee_id=None):
+    """
+    Per-month totals for the last `months` months (oldest first), for an
+    organization or a single employee.
+
+    Returns:
+        list of dicts: period, attendance_days, present_days, absent_days, late_days,
+        total_hours, net_salary, attendance_rate
+    """
+    today = today or date.today()
+    periods = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        periods.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    periods.reverse()
+
+    first_year = periods[0][0]
+    query = session.query(
+        HRMonthlySummary.year, HRMonthlySummary.month,
+        func.sum(HRMonthlySummary.attendance_days),
+        func.sum(HRMonthlySummary.present_days),
+        func.sum(HRMonthlySummary.absent_days),
+        func.sum(HRMonthlySummary.late_days),
+        func.sum(HRMonthlySummary.total_hours),
+        func.sum(HRMonthlySummary.net_salary),
+    ).filter(
+        HRMonthlySummary.organization_id == org_id,
+        HRMonthlySummary.year >= first_year,
+        HRMonthlySummary.year <= today.year
+    )
+    if employee_id is not None:
+        query = query.filter(HRMonthlySummary.employee_id == employee_id)
+    # Whole years are fetched; months before the window are simply not looked up
+    totals = {(r[0], r[1]): r[2:] for r in query.group_by(HRMonthlySummary.year, HRMonthlySummary.month)}
+
+    series = []
+    for year, month in periods:
+        attendance_days, present, absent, late, hours, net = totals.get((year, month), (0, 0, 0, 0, 0, 0))
+        attendance_days = int(attendance_days or 0)
+        series.append({
+            'period': f'{year:04d}-{month:02d}',
+            'attendance_days': attendance_days,
+            'present_days': int(present or 0),
+            'absent_days': int(absent or 0),
+            'late_days': int(late or 0),
+            'total_hours': round(float(hours or 0), 2),
+            'net_salary': float(net or 0),
+            'attendance_rate': round(int(present or 0) / attendance_days * 100, 1) if attendance_days else 0,
+        })
+    return series
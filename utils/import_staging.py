@@ -0,0 +1,185 @@
+"""
+HR Import Staging Store
+Keeps the parsed rows of an uploaded HR file on local disk, keyed by import_id,
+instead of in the Flask session cookie.
+
+Layout of a stage (one directory per import):
+    <HR_STAGING_DIR>/<import_id>/meta.json          headers, file_type, total_rows, batches
+    <HR_STAGING_DIR>/<import_id>/batch_00000.json.gz  up to BATCH_ROWS rows as value lists
+
+Rows are written in gzip-compressed batches as they are parsed and read back
+batch by batch, so neither the upload nor processing/preview needs the whole
+file in memory. Stages older than HR_STAGING_TTL_HOURS are removed by
+cleanup_expired_stages(). HR_STAGING_DIR holds employee data and is read back
+into the database, so it is only used while it is private to this user
+(utils.cache.private_directory); otherwise uploads fail and no stage is read.
+"""
+import os
+import json
+import gzip
+import time
+import shutil
+import tempfile
+
+from utils.cache import private_directory
+
+STAGING_DIR = os.getenv('HR_STAGING_DIR') or os.path.join(tempfile.gettempdir(), 'mcidia_hr_staging')
+STAGING_TTL_SECONDS = int(float(os.getenv('HR_STAGING_TTL_HOURS', '24')) * 3600)
+BATCH_ROWS = 1000
+
+
+def _stage_dir(import_id):
+    return os.path.join(STAGING_DIR, str(int(import_id)))
+
+
+def _staging_ready():
+    """Create STAGING_DIR if needed; False when another user could write to it"""
+    if private_directory(STAGING_DIR):
+        return True
+    print(f"[import-staging] Refusing staging directory {STAGING_DIR}: "
+          f"it must be owned by this user and not writable by others")
+    return False
+
+
+class ImportStage:
+    """Disk-backed row store for one HR import"""
+
+    def __init__(self, import_id, headers, file_type, total_rows=0, batches=0, created_at=None):
+        self.import_id = int(import_id)
+        self.headers = list(headers)
+        self.file_type = file_type
+        self.total_rows = total_rows
+        self.batches = batches
+        self.created_at = created_at or time.time()
+        self._buffer = []
+
+    @property
+    def path(self):
+        return _stage_dir(self.import_id)
+
+    # ---------- writing ----------
+
+    @classmethod
+    def create(cls, import_id, headers, file_type):
+        """Start a new (empty) stage, replacing any previous one for this import"""
+        if not _staging_ready():
+            raise RuntimeError(f'HR staging directory {STAGING_DIR} must be owned by the app user '
+                               f'and not writable by others')
+        path = _stage_dir(import_id)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        return cls(import_id, headers, file_type)
+
+    def set_headers(self, headers):
+        self.headers = list(headers)
+
+    def append(self, row):
+        """Append one row (dict keyed by header, or a list in header order)"""
+        if isinstance(row, dict):
+            row = [row.get(h, '') for h in self.headers]
+        self._buffer.append(row)
+        self.total_rows += 1
+        if len(self._buffer) >= BATCH_ROWS:
+            self._flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        batch_path = os.path.join(self.path, f'batch_{self.batches:05d}.json.gz')
+        with gzip.open(batch_path, 'wt', encoding='utf-8') as fh:
+            json.dump(self._buffer, fh, ensure_ascii=False, separators=(',', ':'))
+        self.batches += 1
+        self._buffer = []
+
+    def close(self):
+        """Flush pending rows and write the metadata (the stage is readable after this)"""
+        self._flush()
+        meta = {
+            'headers': self.headers,
+            'file_type': self.file_type,
+            'total_rows': self.total_rows,
+            'batches': self.batches,
+            'batch_rows': BATCH_ROWS,
+            'created_at': self.created_at,
+        }
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+        return self
+
+    # ---------- reading ----------
+
+    @classmethod
+    def open(cls, import_id):
+        """Open a closed stage; returns None if it is missing or expired"""
+        if not _staging_ready():
+            return None
+        meta_path = os.path.join(_stage_dir(import_id), 'meta.json')
+        try:
+            with open(meta_path, encoding='utf-8') as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if time.time() - meta.get('created_at', 0) > STAGING_TTL_SECONDS:
+            return None
+        return cls(import_id, meta['headers'], meta.get('file_type'),
+                   total_rows=meta['total_rows'], batches=meta['batches'],
+                   created_at=meta.get('created_at'))
+
+    def _read_batch(self, index):
+        with gzip.open(os.path.join(self.path, f'batch_{index:05d}.json.gz'), 'rt', encoding='utf-8') as fh:
+            return json.load(fh)
+
+    def iter_batches(self, start_batch=0):
+        """Yield lists of row dicts, one list per stored batch"""
+        for index in range(start_batch, self.batches):
+            yield [dict(zip(self.headers, values)) for values in self._read_batch(index)]
+
+    def iter_rows(self, start_row=0):
+        """Yield row dicts in file order, optionally starting at a row offset"""
+        first_batch, skip = divmod(start_row, BATCH_ROWS)
+        for batch in self.iter_batches(first_batch):
+            for row in batch[skip:]:
+                yield row
+            skip = 0
+
+    def page(self, page=1, per_page=100):
+        """Rows for one 1-based page, reading only the batches that page spans"""
+        offset = max(page - 1, 0) * per_page
+        rows = []
+        for row in self.iter_rows(offset):
+            rows.append(row)
+            if len(rows) >= per_page:
+                break
+        return rows
+
+    def delete(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def delete_stages(import_ids):
+    for import_id in import_ids:
+        shutil.rmtree(_stage_dir(import_id), ignore_errors=True)
+
+
+def cleanup_expired_stages(ttl_seconds=None):
+    """Remove stage directories older than the TTL; returns the number removed"""
+    ttl_seconds = STAGING_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    if not os.path.isdir(STAGING_DIR) or not _staging_ready():
+        return 0
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for name in os.listdir(STAGING_DIR):
+        path = os.path.join(STAGING_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -3,12 +3,13 @@ Vector Store implementation using JSON-based storage
 Supports: add_document, search, delete, persist, list_documents
 Multi-tenant with org_id isolation
 """
-import json
 import os
 from typing import List, Dict, Optional
 import numpy as np
 from datetime import datetime
 
+from utils import fast_json
+
 class JSONVectorStore:
     """Simple JSON-based vector store with semantic search"""
     
@@ -24,8 +25,7 @@ class JSONVectorStore:
         """Load vector store from JSON file"""
         if os.path.exists(self.store_path):
             try:
-                with open(self.store_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return fast_json.read_file(self.store_path)
             except:
                 return {'documents': {}}
         return {'documents': {}}
@@ -34,8 +34,7 @@ class JSONVectorStore:
         """Save vector store to JSON file"""
         try:
             os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
-            with open(self.store_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            fast_json.write_file(self.store_path, self.data)
             return True
         except Exception as e:
             print(f"Error persisting vector store: {e}")
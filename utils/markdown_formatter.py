@@ -1,13 +1,70 @@
 """
 Markdown Formatter for AI Consultation Output
 Converts Markdown to beautifully formatted HTML with cards, grids, tables, and stat boxes
+
+- Converters: markdown.Markdown instances are built once per thread and reset
+  between documents instead of being re-created (and their extensions
+  re-loaded) for every call.
+- Transform: the BeautifulSoup post-processing collects every element it
+  touches in one walk of the tree and applies the card, stat box, info grid,
+  table and image rules from that list.
+- Cache: rendered HTML is kept in a per-worker LRU keyed by a hash of the
+  source (MARKDOWN_CACHE_SIZE entries), so stored AI outputs shown again are
+  not converted again.
+
+Benchmark on stored consultation outputs:
+    python -m utils.markdown_formatter
 """
 
+import os
 import re
+import time
+import hashlib
+import threading
 import markdown
 from bs4 import BeautifulSoup
 from typing import Dict, List, Tuple
 
+from utils.cache import LRUCache
+
+MARKDOWN_CACHE_SIZE = int(os.getenv('MARKDOWN_CACHE_SIZE', '512'))
+
+CONSULTATION_EXTENSIONS = ('tables', 'fenced_code', 'nl2br', 'sane_lists')
+# Used by the md_to_html template filter
+PAGE_EXTENSIONS = ('tables', 'fenced_code', 'codehilite', 'nl2br')
+
+# Exact pattern from JS: /^(\d+[%$]?|\$?\d+(?:,\d{3})*(?:\.\d+)?)\s*[-:–]\s*(.+)$/
+STAT_PATTERN = re.compile(r'^(\d+[%$]?|\$?\d+(?:,\d{3})*(?:\.\d+)?)\s*[-:–]\s*(.+)$')
+
+_local = threading.local()
+_html_cache = LRUCache(MARKDOWN_CACHE_SIZE)
+
+
+def _converter(extensions):
+    """This thread's Markdown instance for an extension set, reset for a new document"""
+    converters = getattr(_local, 'converters', None)
+    if converters is None:
+        converters = _local.converters = {}
+    md = converters.get(extensions)
+    if md is None:
+        md = converters[extensions] = markdown.Markdown(extensions=list(extensions))
+    return md.reset()
+
+
+def _cache_key(kind, text, lang=''):
+    return (kind, lang, hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+
+def markdown_to_html(text: str) -> str:
+    """Plain Markdown to HTML (md_to_html filter), cached by content"""
+    if not text:
+        return ""
+    return _html_cache.get_or_compute(
+        _cache_key('page', text),
+        lambda: _converter(PAGE_EXTENSIONS).convert(text)
+    )
+
+
 def format_consultation_output(markdown_text: str, lang: str = 'ar') -> str:
     """
     Convert Markdown AI output to beautifully formatted HTML
@@ -21,41 +78,55 @@ def format_consultation_output(markdown_text: str, lang: str = 'ar') -> str:
     """
     if not markdown_text:
         return ""
-    
+    return _html_cache.get_or_compute(
+        _cache_key('consultation', markdown_text, lang),
+        lambda: _format_consultation_output(markdown_text, lang)
+    )
+
+
+def _format_consultation_output(markdown_text: str, lang: str) -> str:
     # Convert Markdown to HTML using markdown library
-    md = markdown.Markdown(extensions=[
-        'tables',
-        'fenced_code',
-        'nl2br',
-        'sane_lists'
-    ])
-    html = md.convert(markdown_text)
+    html = _converter(CONSULTATION_EXTENSIONS).convert(markdown_text)
     
     # Parse HTML with BeautifulSoup for transformation
     soup = BeautifulSoup(html, 'html.parser')
     
+    # One walk collects everything the rules below look at
+    elements = {'ul': [], 'p': [], 'strong': [], 'table': [], 'img': []}
+    for tag in soup.find_all(list(elements)):
+        elements[tag.name].append(tag)
+    
     # Transform lists to cards (3+ items)
-    _transform_lists_to_cards(soup, lang)
+    _transform_lists_to_cards(elements['ul'])
     
     # Extract and format stat boxes
-    _extract_stat_boxes(soup)
+    _extract_stat_boxes(soup, elements['p'])
     
-    # Transform key-value patterns to info grids
-    _transform_info_grids(soup, lang)
+    # Transform key-value patterns to info grids (strongs of replaced paragraphs are gone)
+    _transform_info_grids(soup, [s for s in elements['strong'] if _attached(s, soup)])
     
     # Enhance tables
-    _enhance_tables(soup, lang)
+    _enhance_tables(soup, [t for t in elements['table'] if _attached(t, soup)])
     
     # Add responsive classes to images
-    for img in soup.find_all('img'):
-        img['class'] = img.get('class', []) + ['img-fluid', 'rounded']
+    for img in elements['img']:
+        if _attached(img, soup):
+            img['class'] = img.get('class', []) + ['img-fluid', 'rounded']
     
     return str(soup)
 
 
-def _transform_lists_to_cards(soup: BeautifulSoup, lang: str) -> None:
+def _attached(tag, soup: BeautifulSoup) -> bool:
+    """Whether tag is still part of the document (not inside a replaced/removed element)"""
+    for parent in tag.parents:
+        if parent is soup:
+            return True
+    return False
+
+
+def _transform_lists_to_cards(lists) -> None:
     """Add card-list class to lists with 3+ items (matches JS logic exactly)"""
-    for ul in soup.find_all('ul'):
+    for ul in lists:
         items = ul.find_all('li', recursive=False)
         
         # If list has 3+ items and doesn't have 'no-cards' class, add 'card-list' class
@@ -67,14 +138,11 @@ def _transform_lists_to_cards(soup: BeautifulSoup, lang: str) -> None:
                 ul['class'] = classes
 
 
-def _extract_stat_boxes(soup: BeautifulSoup) -> None:
+def _extract_stat_boxes(soup: BeautifulSoup, paragraphs) -> None:
     """Extract and format statistics (matches JS logic exactly)"""
-    # Exact pattern from JS: /^(\d+[%$]?|\$?\d+(?:,\d{3})*(?:\.\d+)?)\s*[-:–]\s*(.+)$/
-    stat_pattern = re.compile(r'^(\d+[%$]?|\$?\d+(?:,\d{3})*(?:\.\d+)?)\s*[-:–]\s*(.+)$')
-    
-    for p in soup.find_all('p'):
+    for p in paragraphs:
         text = p.get_text().strip()
-        match = stat_pattern.match(text)
+        match = STAT_PATTERN.match(text)
         
         if match and match.group(1) and match.group(2):
             # Create stat box with span elements (not div)
@@ -93,12 +161,12 @@ def _extract_stat_boxes(soup: BeautifulSoup) -> None:
             p.replace_with(stat_box)
 
 
-def _transform_info_grids(soup: BeautifulSoup, lang: str) -> None:
+def _transform_info_grids(soup: BeautifulSoup, strongs) -> None:
     """Transform key-value patterns into info grids (matches JS logic exactly)"""
     # Find all <strong> elements and check for : or - pattern
     grid_items = []
     
-    for strong in soup.find_all('strong'):
+    for strong in strongs:
         # Check next sibling for text node starting with : or -
         next_sibling = strong.next_sibling
         if next_sibling and isinstance(next_sibling, str):  # Text node
@@ -149,9 +217,9 @@ def _transform_info_grids(soup: BeautifulSoup, lang: str) -> None:
             body.insert(0, grid_container)
 
 
-def _enhance_tables(soup: BeautifulSoup, lang: str) -> None:
+def _enhance_tables(soup: BeautifulSoup, tables) -> None:
     """Wrap tables in responsive containers (matches JS logic exactly)"""
-    for table in soup.find_all('table'):
+    for table in tables:
         # Only wrap if not already wrapped
         if not table.parent or not table.parent.has_attr('class') or 'table-responsive' not in table.parent.get('class', []):
             # Create wrapper div
@@ -242,3 +310,69 @@ def extract_sections_from_markdown(markdown_text: str) -> List[Dict[str, str]]:
         })
     
     return sections
+
+
+# ==================== benchmark ====================
+
+def benchmark(texts: List[str], rounds: int = 5) -> Dict[str, float]:
+    """
+    Average milliseconds per document for the formatting pipeline.
+
+    Returns:
+        {'fresh_converter': ..., 'reused_converter': ..., 'cached': ...}
+        - fresh_converter: a new markdown.Markdown per document (the old setup)
+        - reused_converter: this thread's converter, cache bypassed
+        - cached: LRU hits on content already formatted
+    """
+    texts = [t for t in texts if t]
+    if not texts:
+        return {}
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                fn(text)
+        return (time.perf_counter() - start) * 1000 / (rounds * len(texts))
+
+    def fresh(text):
+        _local.converters = {}
+        _format_consultation_output(text, 'ar')
+
+    results = {
+        'fresh_converter': timed(fresh),
+        'reused_converter': timed(lambda text: _format_consultation_output(text, 'ar')),
+    }
+    for text in texts:
+        format_consultation_output(text, 'ar')
+    results['cached'] = timed(lambda text: format_consultation_output(text, 'ar'))
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    from app import create_app, db
+    from models import Project, ChatSession
+
+    app = create_app()
+    with app.app_context():
+        # Real outputs: project results and assistant messages of consultation sessions
+        texts = []
+        for (content,) in db.session.query(Project.content).filter(Project.content.isnot(None)).limit(200):
+            try:
+                texts.append((json.loads(content) or {}).get('output') or '')
+            except (TypeError, ValueError, AttributeError):
+                pass
+        for (messages,) in db.session.query(ChatSession.messages).filter(ChatSession.messages.isnot(None)).limit(100):
+            try:
+                texts.extend(m.get('content', '') for m in json.loads(messages) if m.get('role') == 'assistant')
+            except (TypeError, ValueError, AttributeError):
+                pass
+
+        texts = [t for t in texts if isinstance(t, str) and t.strip()]
+        if not texts:
+            print("⚠️ No stored consultation outputs to benchmark")
+        else:
+            print(f"📊 Formatting {len(texts)} stored outputs ({sum(map(len, texts)) // len(texts)} chars on average)")
+            for name, ms in benchmark(texts).items():
+                print(f"   {name:<18} {ms:8.3f} ms/document")
@@ -119,6 +119,11 @@ class ObjectStorageService:
         bucket_name = os.getenv('OBJECT_STORAGE_BUCKET', 'hr-files')
         return bucket_name
     
+    def _new_storage_filename(self, filename: str) -> str:
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        unique_id = str(uuid.uuid4())[:8]
+        return f"uploads/{timestamp}_{unique_id}_{filename}"
+    
     def upload_file(self, file_content: bytes, filename: str, content_type: str = 'application/octet-stream') -> Optional[str]:
         """
         Upload file to object storage
@@ -139,9 +144,7 @@ class ObjectStorageService:
             bucket = self.client.bucket(bucket_name)
             
             # Generate unique filename
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            unique_id = str(uuid.uuid4())[:8]
-            storage_filename = f"uploads/{timestamp}_{unique_id}_{filename}"
+            storage_filename = self._new_storage_filename(filename)
             
             # Create blob and upload
             blob = bucket.blob(storage_filename)
@@ -154,6 +157,32 @@ class ObjectStorageService:
             print(f"Error uploading file: {e}")
             return None
     
+    def upload_stream(self, stream, filename: str, content_type: str = 'application/octet-stream') -> Optional[str]:
+        """
+        Upload a file object to object storage without reading it into memory
+        
+        Args:
+            stream: Seekable binary file object (rewound before upload)
+            filename: Original filename
+            content_type: MIME type of the file
+            
+        Returns:
+            Storage path of uploaded file or None if failed
+        """
+        if not self.client:
+            return None
+        
+        try:
+            bucket_name = self.get_bucket_name()
+            storage_filename = self._new_storage_filename(filename)
+            blob = self.client.bucket(bucket_name).blob(storage_filename)
+            blob.upload_from_file(stream, rewind=True, content_type=content_type)
+            return f"/{bucket_name}/{storage_filename}"
+        
+        except Exception as e:
+            print(f"Error uploading file: {e}")
+            return None
+    
     def get_file(self, storage_path: str) -> Optional[tuple]:
         """
         Get file from object storage
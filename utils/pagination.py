@@ -0,0 +1,285 @@
+"""
+Keyset Pagination Utility
+Shared pagination/filter helpers for admin list views.
+
+Pages are addressed by an opaque cursor holding the last seen primary key, so
+fetching page N costs the same index range scan as page 1 (no OFFSET), and
+totals come from the planner's row estimate on PostgreSQL when the result is
+large, falling back to an exact COUNT when it is small or on other databases.
+"""
+import base64
+import json
+
+from flask import request
+from sqlalchemy import or_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+EXACT_COUNT_THRESHOLD = 10000
+TYPEAHEAD_LIMIT = 20
+
+
+def encode_cursor(value):
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def get_page_args(default_per_page=DEFAULT_PER_PAGE):
+    """Read cursor/direction/per_page from the query string"""
+    per_page = request.args.get('per_page', default_per_page, type=int) or default_per_page
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    direction = 'prev' if request.args.get('dir') == 'prev' else 'next'
+    return request.args.get('cursor') or None, direction, per_page
+
+
+def estimate_count(query):
+    """
+    Row count for a filtered query without a full scan on large tables.
+
+    Returns:
+        tuple: (count, is_estimate)
+    """
+    count_query = query.order_by(None)
+    session = query.session
+    bind = session.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        try:
+            compiled = count_query.statement.compile(dialect=bind.dialect)
+            plan = session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+            ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate > EXACT_COUNT_THRESHOLD:
+                return estimate, True
+        except Exception as e:
+            print(f"[pagination] Count estimate failed, using exact count: {e}")
+
+    return count_query.count(), False
+
+
+def keyset_paginate(query, key_column, cursor=None, direction='next', per_page=DEFAULT_PER_PAGE,
+                    descending=True, with_total=True):
+    """
+    Paginate a query on a unique, indexed key column (normally the primary key).
+
+    Args:
+        query: Filtered SQLAlchemy query (without ORDER BY / LIMIT)
+        key_column: Unique column to page on, e.g. User.id
+        cursor: Opaque cursor from a previous page (None for the first page)
+        direction: 'next' or 'prev' relative to the cursor
+        per_page: Page size
+        descending: Newest-first ordering when True
+        with_total: Also compute a (possibly estimated) total
+
+    Returns:
+        KeysetPage
+    """
+    total, total_is_estimate = estimate_count(query) if with_total else (None, False)
+
+    after = decode_cursor(cursor)
+    backwards = direction == 'prev' and after is not None
+    # Walking backwards flips both the comparison and the sort order
+    forward_desc = descending != backwards
+
+    page_query = query
+    if after is not None:
+        page_query = page_query.filter(key_column < after if forward_desc else key_column > after)
+    page_query = page_query.order_by(key_column.desc() if forward_desc else key_column.asc())
+    rows = page_query.limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key_of(row):
+        entity = row[0] if isinstance(row, tuple) or hasattr(row, '_fields') else row
+        return getattr(entity, key_column.key)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = encode_cursor(key_of(rows[-1]))
+            prev_cursor = encode_cursor(key_of(rows[0])) if has_more else None
+        else:
+            next_cursor = encode_cursor(key_of(rows[-1])) if has_more else None
+            prev_cursor = encode_cursor(key_of(rows[0])) if after is not None else None
+
+    return KeysetPage(rows, per_page, next_cursor, prev_cursor, total, total_is_estimate)
+
+
+def typeahead(query, key_column, label_column, search_columns, term, limit=TYPEAHEAD_LIMIT):
+    """
+    Small id/label lookup for filter dropdowns instead of loading whole tables.
+
+    Returns:
+        list: [{'id': ..., 'text': ...}]
+    """
+    term = (term or '').strip()
+    if term:
+        query = query.filter(or_(*[column.ilike(f'%{term}%') for column in search_columns]))
+    rows = query.with_entities(key_column, label_column).order_by(label_column).limit(limit).all()
+    return [{'id': row[0], 'text': row[1]} for row in rows]
+
+
+def selftest():
+    """
+    Render every admin list that uses the keyset_nav macro against a temporary
+    SQLite database: each template is found by its keyset_nav call, and every
+    view that renders it is requested first, next and previous page (one row
+    per page), in Arabic and English, as a system admin.
+
+    Returns:
+        True when every check passed
+    """
+    import inspect
+    import os
+    import re
+    import tempfile
+    from flask import current_app, template_rendered, url_for
+    from flask_jwt_extended import create_access_token
+
+    work_dir = tempfile.mkdtemp(prefix='pagination_selftest_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'selftest.db')}"
+    os.environ.setdefault('APP_CACHE_DIR', os.path.join(work_dir, 'cache'))
+    from app import create_app
+    from models import Role, User, Organization, Transaction, AILog
+    app = create_app()
+    failures = []
+
+    def check(name, condition, detail=''):
+        print(f"{'✓' if condition else '✗'} {name}{'' if condition else f' ({detail})'}")
+        if not condition:
+            failures.append(name)
+
+    # Templates calling keyset_nav, with the endpoint their links point to
+    templates = {}
+    call = re.compile(r"keyset_nav\(\s*page\s*,\s*'([\w.]+)'")
+    for root, _, files in os.walk(app.template_folder if os.path.isabs(app.template_folder)
+                                  else os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, encoding='utf-8') as f:
+                match = call.search(f.read())
+            if match:
+                relative = os.path.relpath(path, os.path.join(app.root_path, app.template_folder))
+                templates[relative.replace(os.sep, '/')] = match.group(1)
+    check('templates using keyset_nav found', bool(templates))
+
+    # Views rendering those templates (GET routes without URL arguments)
+    views = {}
+    for rule in app.url_map.iter_rules():
+        if rule.arguments or 'GET' not in rule.methods:
+            continue
+        source = inspect.getsource(inspect.unwrap(app.view_functions[rule.endpoint]))
+        for template, endpoint in templates.items():
+            if f"'{template}'" in source:
+                views.setdefault(template, set()).add(rule.endpoint)
+
+    rendered = []
+    template_rendered.connect(lambda sender, template, context, **extra: rendered.append(template.name),
+                              app, weak=False)
+
+    with app.app_context():
+        session = current_app.extensions['sqlalchemy'].session
+        admin_role = session.query(Role).filter_by(name='system_admin').one()
+        admin = User(username='pagination_selftest', email='pagination-selftest@example.com', role_id=admin_role.id)
+        admin.set_password(os.urandom(16).hex())
+        session.add(admin)
+        session.flush()
+        for n in range(3):
+            session.add(Organization(name=f'Pagination self-test {n}'))
+            session.add(User(username=f'pagination_user_{n}', email=f'pagination-{n}@example.com',
+                             password_hash='-', role_id=admin_role.id))
+            session.add(Transaction(user_id=admin.id, amount=10 + n, status='succeeded',
+                                    transaction_type='subscription'))
+            session.add(AILog(user_id=admin.id, module='selftest', service_type='selftest'))
+        session.commit()
+        admin_id = admin.id
+        token = create_access_token(identity=str(admin_id))
+
+    client = app.test_client()
+    client.set_cookie('access_token_cookie', token)
+    for template, endpoint in sorted(templates.items()):
+        check(f'{template} is rendered by {endpoint}', endpoint in views.get(template, ()),
+              sorted(views.get(template, ())))
+        for view in sorted(views.get(template, ())):
+            for lang in ('ar', 'en'):
+                with client.session_transaction() as s:
+                    s['user_id'] = admin_id
+                    s['language'] = lang
+                with app.test_request_context():
+                    url = url_for(view, per_page=1)
+                # First page, then its Next link, then that page's Previous link
+                for step, follow in (('first', 'next'), ('next', 'prev'), ('prev', None)):
+                    del rendered[:]
+                    response = client.get(url)
+                    check(f'{view} [{lang}] {step} page', response.status_code == 200 and template in rendered,
+                          f'{response.status_code} {response.location or ""}'.strip())
+                    if response.status_code != 200 or follow is None:
+                        break
+                    links = [link.replace('&amp;', '&') for link in
+                             re.findall(r'href="([^"#]*cursor=[^"]*)"', response.get_data(as_text=True))]
+                    links = [link for link in links if ('dir=prev' in link) == (follow == 'prev')]
+                    check(f'{view} [{lang}] {step} page links to the {follow} page', bool(links))
+                    if not links:
+                        break
+                    url = links[0]
+
+    return not failures
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Keyset pagination helpers')
+    parser.add_argument('--selftest', action='store_true',
+                        help='render every admin list using keyset_nav against a temporary SQLite database')
+    args = parser.parse_args()
+    if not args.selftest:
+        parser.print_help()
+        sys.exit(2)
+
+    # Run the module's canonical copy, the one the app and its blueprints import
+    from utils.pagination import selftest as run_selftest
+    sys.exit(0 if run_selftest() else 1)
@@ -0,0 +1,273 @@
+"""
+PDF Render Jobs
+Renders report PDFs on a small process pool and keeps the results on disk.
+
+- Pool: PDF_RENDER_WORKERS spawned processes running at a lower CPU priority
+  (PDF_RENDER_NICE), so a render of several seconds no longer holds a web
+  worker's CPU or GIL.
+- Cache: every PDF is stored as PDF_CACHE_DIR/<key>.pdf where the key hashes
+  (kind, entity id, stamp, language, PDF_TEMPLATE_VERSION). The stamp is the
+  entity's updated_at plus whatever else the document depends on, so an edit
+  yields a new key. Repeat downloads are plain file responses that skip
+  building the HTML. Bump PDF_TEMPLATE_VERSION when a report template changes.
+  The keys are predictable, so PDF_CACHE_DIR is only used while it is private
+  to this user (utils.cache.private_directory); otherwise each process renders
+  into a private temporary directory of its own.
+- Jobs: each render is recorded in pdf_jobs. The request waits up to
+  PDF_INLINE_WAIT_SECONDS for it; slower renders finish in the background
+  while the user is sent to a page polling the job (fetch callers get a 202
+  with the status URL). Identical concurrent requests share one job.
+
+Usage:
+    return pdf_response('strategic_plan', plan.id, plan.updated_at, lang,
+                        lambda: build_plan_html(plan), f'strategic_plan_{plan.id}.pdf', user_id)
+"""
+import os
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, request, redirect, url_for, send_file, jsonify
+from sqlalchemy import update
+
+from models import PDFJob
+from utils.cache import private_directory
+from utils.pdf_renderer import WEASYPRINT_AVAILABLE, init_render_process, render_to_file
+
+PDF_TEMPLATE_VERSION = os.getenv('PDF_TEMPLATE_VERSION', '3')
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mcidia_pdf_cache')
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', '2'))
+PDF_RENDER_NICE = int(os.getenv('PDF_RENDER_NICE', '10'))
+PDF_INLINE_WAIT_SECONDS = float(os.getenv('PDF_INLINE_WAIT_SECONDS', '5'))
+PDF_RENDER_TIMEOUT = int(os.getenv('PDF_RENDER_TIMEOUT', '300'))
+PDF_CACHE_TTL = timedelta(days=int(os.getenv('PDF_CACHE_DAYS', '7')))
+
+_pool = None
+_pool_lock = threading.Lock()
+_futures = {}  # job id -> Future, for renders submitted by this process
+_fallback_dir = None  # private directory of this process when PDF_CACHE_DIR is refused
+_fallback_lock = threading.Lock()
+
+
+# ==================== process pool ====================
+
+def get_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                # spawn: never fork a web worker holding DB connections and threads
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_render_process,
+                initargs=(PDF_RENDER_NICE,)
+            )
+        return _pool
+
+
+def _submit_render(html, path, stylesheets=()):
+    global _pool
+    pool = get_render_pool()
+    try:
+        return pool.submit(render_to_file, html, path, tuple(stylesheets))
+    except BrokenProcessPool:
+        # A renderer died (e.g. killed for memory); start a fresh pool once
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return get_render_pool().submit(render_to_file, html, path, tuple(stylesheets))
+
+
+# ==================== cache ====================
+
+def pdf_cache_key(kind, entity_id, stamp, lang):
+    """sha256 of everything the rendered document depends on"""
+    raw = '|'.join((kind, str(entity_id), repr(stamp), lang or '', PDF_TEMPLATE_VERSION))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def pdf_cache_dir():
+    """PDF_CACHE_DIR while it is private to this user, else this process's own temporary directory"""
+    global _fallback_dir
+    if private_directory(PDF_CACHE_DIR):
+        return PDF_CACHE_DIR
+    with _fallback_lock:
+        if _fallback_dir is None:
+            _fallback_dir = tempfile.mkdtemp(prefix='mcidia_pdf_')
+            print(f"[pdf-jobs] Refusing cache directory {PDF_CACHE_DIR}: it must be owned by this user "
+                  f"and not writable by others; rendering into {_fallback_dir}")
+    return _fallback_dir
+
+
+def cached_pdf_path(key):
+    return os.path.join(pdf_cache_dir(), f'{key}.pdf')
+
+
+def is_private_pdf(path):
+    """True for an existing PDF inside a directory only this user can write to"""
+    return bool(path) and private_directory(os.path.dirname(path)) and os.path.isfile(path)
+
+
+def send_cached_pdf(path, file_name):
+    # Touching the file keeps frequently downloaded PDFs out of the cleanup
+    os.utime(path)
+    return send_file(path, mimetype='application/pdf', as_attachment=True, download_name=file_name)
+
+
+def cleanup_pdf_cache(session):
+    """Remove cached PDFs unused for PDF_CACHE_TTL and job records older than that"""
+    cutoff = datetime.utcnow() - PDF_CACHE_TTL
+    cache_dir = pdf_cache_dir()
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            try:
+                if datetime.utcfromtimestamp(os.path.getmtime(path)) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+    session.query(PDFJob).filter(PDFJob.created_at < cutoff).delete(synchronize_session=False)
+    session.commit()
+
+
+# ==================== jobs ====================
+
+def _record_result(app, job_id, future):
+    """Done-callback of a render: store the outcome on the job"""
+    _futures.pop(job_id, None)
+    values = {'completed_at': datetime.utcnow()}
+    try:
+        values.update(status='completed', file_size=future.result())
+    except Exception as e:
+        values.update(status='failed', error_message=str(e) or e.__class__.__name__)
+        print(f"[pdf-jobs] Render {job_id} failed: {e}")
+
+    with app.app_context():
+        session = app.extensions['sqlalchemy'].session
+        session.execute(update(PDFJob).where(PDFJob.id == job_id).values(**values))
+        session.commit()
+
+
+def active_pdf_job(session, key):
+    """A pending render of the same document that has not timed out, if any"""
+    cutoff = datetime.utcnow() - timedelta(seconds=PDF_RENDER_TIMEOUT)
+    return session.query(PDFJob).filter(
+        PDFJob.cache_key == key,
+        PDFJob.status == 'pending',
+        PDFJob.created_at >= cutoff
+    ).order_by(PDFJob.id.desc()).first()
+
+
+def start_pdf_job(session, kind, entity_id, key, lang, html, file_name, user_id, stylesheets=()):
+    """
+    Create a PDFJob and submit its render to the process pool.
+
+    Returns:
+        (job, future)
+    """
+    cleanup_pdf_cache(session)
+
+    job = PDFJob(user_id=user_id, cache_key=key, kind=kind, entity_id=entity_id, lang=lang,
+                 status='pending', file_path=cached_pdf_path(key), file_name=file_name)
+    session.add(job)
+    session.commit()
+
+    try:
+        future = _submit_render(html, job.file_path, stylesheets)
+    except Exception as e:
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.completed_at = datetime.utcnow()
+        session.commit()
+        raise
+
+    _futures[job.id] = future
+    future.add_done_callback(partial(_record_result, current_app._get_current_object(), job.id))
+    return job, future
+
+
+def refresh_pdf_job(session, job):
+    """
+    Settle a pending job whose outcome this process did not record: completed
+    if its file exists (rendered by another worker), failed once it has been
+    pending longer than PDF_RENDER_TIMEOUT (its pool went away with a restart).
+    """
+    if job.status != 'pending' or job.id in _futures:
+        return job
+    if is_private_pdf(job.file_path):
+        job.status = 'completed'
+        job.file_size = os.path.getsize(job.file_path)
+    elif job.created_at and job.created_at < datetime.utcnow() - timedelta(seconds=PDF_RENDER_TIMEOUT):
+        job.status = 'failed'
+        job.error_message = 'Render timed out or was interrupted'
+    else:
+        return job
+    job.completed_at = datetime.utcnow()
+    session.commit()
+    return job
+
+
+def pending_pdf_response(job):
+    """Point the client at a render that is still running"""
+    if request.is_json:
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': url_for('pdf_jobs.status', job_id=job.id),
+            'download_url': url_for('pdf_jobs.download', job_id=job.id)
+        }), 202
+    return redirect(url_for('pdf_jobs.view', job_id=job.id))
+
+
+def pdf_response(kind, entity_id, stamp, lang, build_html, file_name, user_id):
+    """
+    Serve a PDF from the cache, rendering it on the process pool on a miss.
+
+    Args:
+        kind: document type (part of the cache key)
+        entity_id: id of the rendered entity
+        stamp: value that changes whenever the document must change (usually updated_at)
+        lang: document language
+        build_html: callable returning the document HTML, or (html, stylesheets)
+            as built by utils/report_renderer; only called on a miss
+        file_name: download name
+        user_id: requesting user, owner of a new job
+
+    Returns:
+        The PDF as an attachment, or for renders slower than PDF_INLINE_WAIT_SECONDS
+        a redirect to the job page (202 JSON for fetch callers)
+
+    Raises:
+        RuntimeError: WeasyPrint is not available on this server
+        Exception: the render error, when the render failed within the inline wait
+    """
+    key = pdf_cache_key(kind, entity_id, stamp, lang)
+    path = cached_pdf_path(key)
+    if is_private_pdf(path):
+        return send_cached_pdf(path, file_name)
+    if not WEASYPRINT_AVAILABLE:
+        raise RuntimeError('WeasyPrint is not available on this server')
+
+    session = current_app.extensions['sqlalchemy'].session
+    job = active_pdf_job(session, key)
+    future = _futures.get(job.id) if job else None
+    if job is None:
+        document = build_html()
+        html, stylesheets = document if isinstance(document, tuple) else (document, ())
+        job, future = start_pdf_job(session, kind, entity_id, key, lang, html, file_name, user_id, stylesheets)
+
+    if future is not None:
+        try:
+            future.result(timeout=PDF_INLINE_WAIT_SECONDS)
+        except FutureTimeout:
+            pass
+
+    if is_private_pdf(path):
+        return send_cached_pdf(path, file_name)
+    return pending_pdf_response(job)
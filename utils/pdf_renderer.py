@@ -0,0 +1,259 @@
+"""
+PDF Rendering Service
+Renders HTML to PDF with WeasyPrint without touching the network.
+
+- Fonts: the report templates link Google Fonts (Cairo, Inter, Poppins). The
+  url_fetcher answers those stylesheet requests with @font-face rules that
+  point at the TTF files bundled in static/fonts. Families that are not
+  bundled are served from PDF_FALLBACK_FONT (Amiri) instead of stalling on
+  fonts.googleapis.com.
+- Assets: /static/... URLs are read from disk and kept in memory. Other
+  remote URLs are refused unless PDF_ALLOW_REMOTE_ASSETS=1. Works with both
+  the function url_fetcher (WeasyPrint < 68) and URLFetcher classes.
+- Caching: the generated font CSS, parsed CSS objects and the WeasyPrint
+  FontConfiguration are built once per worker thread and reused by every
+  render.
+- Processes: render_to_file is the entry point of the render process pool
+  (utils/pdf_jobs), so CPU-heavy renders run outside the web workers.
+
+Usage:
+    from utils.pdf_renderer import render_pdf
+    pdf_bytes = render_pdf(html_content)
+"""
+import os
+import glob
+import threading
+import mimetypes
+from functools import lru_cache
+from urllib.parse import urlparse, parse_qs, unquote
+
+try:
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+    WEASYPRINT_AVAILABLE = True
+except (ImportError, OSError):
+    WEASYPRINT_AVAILABLE = False
+    HTML = CSS = FontConfiguration = None
+
+# WeasyPrint 68+ takes URLFetcher instances, older releases a fetcher function
+URLFetcher = URLFetcherResponse = default_url_fetcher = None
+if WEASYPRINT_AVAILABLE:
+    try:
+        from weasyprint.urls import URLFetcher, URLFetcherResponse
+    except ImportError:
+        from weasyprint import default_url_fetcher
+
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
+FONT_DIR = os.path.join(STATIC_DIR, 'fonts')
+FALLBACK_FONT = os.getenv('PDF_FALLBACK_FONT', 'Amiri')
+ALLOW_REMOTE_ASSETS = os.getenv('PDF_ALLOW_REMOTE_ASSETS') == '1'
+GOOGLE_FONT_HOSTS = ('fonts.googleapis.com', 'fonts.gstatic.com')
+MAX_CACHED_ASSET_BYTES = 2 * 1024 * 1024
+
+FONT_WEIGHTS = {
+    'thin': 100, 'extralight': 200, 'light': 300, 'regular': 400, 'medium': 500,
+    'semibold': 600, 'bold': 700, 'extrabold': 800, 'black': 900,
+}
+FONT_FORMATS = {'.ttf': 'truetype', '.otf': 'opentype', '.woff': 'woff', '.woff2': 'woff2'}
+
+_local = threading.local()
+
+
+# ==================== fonts ====================
+
+@lru_cache(maxsize=1)
+def bundled_fonts():
+    """{family: [(weight, path), ...]} of the font files in static/fonts"""
+    fonts = {}
+    for path in sorted(glob.glob(os.path.join(FONT_DIR, '*'))):
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() not in FONT_FORMATS:
+            continue
+        family, _, style = name.partition('-')
+        weight = FONT_WEIGHTS.get(style.lower().replace('italic', '') or 'regular', 400)
+        fonts.setdefault(family, []).append((weight, path))
+    return fonts
+
+
+def _requested_families(url):
+    """Family names of a fonts.googleapis.com css/css2 URL"""
+    families = []
+    for value in parse_qs(urlparse(url).query).get('family', []):
+        for family in value.split('|'):
+            families.append(unquote(family.split(':')[0]).replace('+', ' '))
+    return families
+
+
+@lru_cache(maxsize=64)
+def font_face_css(families):
+    """@font-face rules serving each family from the bundled files (or the fallback)"""
+    fonts = bundled_fonts()
+    rules = []
+    for family in families:
+        faces = fonts.get(family.replace(' ', '')) or fonts.get(FALLBACK_FONT, [])
+        for weight, path in faces:
+            fmt = FONT_FORMATS[os.path.splitext(path)[1].lower()]
+            rules.append(
+                f"@font-face {{ font-family: '{family}'; font-weight: {weight}; "
+                f"src: url('file://{path}') format('{fmt}'); }}"
+            )
+    return '\n'.join(rules)
+
+
+# ==================== url fetcher ====================
+
+@lru_cache(maxsize=256)
+def _read_static(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _static_path(url):
+    """Filesystem path of a /static/... or file:// URL inside static/, or None"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        path = unquote(parsed.path)
+    elif parsed.path.startswith('/static/'):
+        path = os.path.join(STATIC_DIR, unquote(parsed.path)[len('/static/'):])
+    else:
+        return None
+    path = os.path.abspath(path)
+    return path if path.startswith(STATIC_DIR + os.sep) and os.path.isfile(path) else None
+
+
+def local_resource(url):
+    """
+    Serve a URL from disk when possible.
+
+    Returns:
+        (body, mime_type) for Google Fonts stylesheets and files under static/,
+        None for any other URL
+    """
+    host = urlparse(url).hostname or ''
+    if host in GOOGLE_FONT_HOSTS:
+        # The stylesheet becomes local @font-face rules; font files are never fetched
+        css = font_face_css(tuple(_requested_families(url))) if host == GOOGLE_FONT_HOSTS[0] else ''
+        return css, 'text/css'
+
+    path = _static_path(url)
+    if not path:
+        return None
+    mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if os.path.getsize(path) <= MAX_CACHED_ASSET_BYTES:
+        return _read_static(path), mime_type
+    with open(path, 'rb') as f:
+        return f.read(), mime_type
+
+
+def _remote_allowed(url):
+    return url.startswith('data:') or ALLOW_REMOTE_ASSETS
+
+
+if URLFetcher is not None:
+    class LocalURLFetcher(URLFetcher):
+        """URLFetcher serving fonts and static assets from disk, no network by default"""
+
+        def fetch(self, url, headers=None):
+            resource = local_resource(url)
+            if resource is not None:
+                body, mime_type = resource
+                return URLFetcherResponse(url, body, {'Content-Type': mime_type})
+            if _remote_allowed(url):
+                return super().fetch(url, headers)
+            raise ValueError(f'Remote asset blocked in PDF rendering: {url}')
+
+    def local_url_fetcher():
+        # Fetchers keep per-request state, so each thread gets its own
+        if getattr(_local, 'url_fetcher', None) is None:
+            _local.url_fetcher = LocalURLFetcher()
+        return _local.url_fetcher
+else:
+    def _fetch_local(url, timeout=10, ssl_context=None):
+        resource = local_resource(url)
+        if resource is not None:
+            body, mime_type = resource
+            return {'string': body, 'mime_type': mime_type, 'redirected_url': url}
+        if _remote_allowed(url):
+            return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+        raise ValueError(f'Remote asset blocked in PDF rendering: {url}')
+
+    def local_url_fetcher():
+        return _fetch_local
+
+
+# ==================== rendering ====================
+
+def _font_config():
+    """Per-thread FontConfiguration (WeasyPrint's is not shared across threads)"""
+    if getattr(_local, 'font_config', None) is None:
+        _local.font_config = FontConfiguration()
+        _local.stylesheets = {}
+    return _local.font_config
+
+
+def cached_css(css_text):
+    """Parsed CSS object for a stylesheet string, built once per thread"""
+    font_config = _font_config()
+    css = _local.stylesheets.get(css_text)
+    if css is None:
+        css = CSS(string=css_text, font_config=font_config, url_fetcher=local_url_fetcher(),
+                  base_url=STATIC_DIR + os.sep)
+        _local.stylesheets[css_text] = css
+    return css
+
+
+def render_pdf(html, stylesheets=(), base_url=None, target=None):
+    """
+    Render an HTML string to PDF.
+
+    Args:
+        html: full HTML document
+        stylesheets: extra CSS strings applied to the document (parsed once per thread)
+        base_url: base for relative URLs (defaults to the static directory)
+        target: optional path or file object to write to
+
+    Returns:
+        PDF bytes, or None when target is given
+    """
+    if not WEASYPRINT_AVAILABLE:
+        raise RuntimeError('WeasyPrint is not available on this server')
+    font_config = _font_config()
+    document = HTML(string=html, base_url=base_url or STATIC_DIR + os.sep, url_fetcher=local_url_fetcher())
+    return document.write_pdf(
+        target,
+        stylesheets=[cached_css(css) for css in stylesheets],
+        font_config=font_config
+    )
+
+
+
+# ==================== render processes ====================
+
+def init_render_process(nice=0):
+    """Initializer of the render process pool: lower the CPU priority of renderers"""
+    if nice and hasattr(os, 'nice'):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def render_to_file(html, path, stylesheets=()):
+    """
+    Render an HTML string into a PDF file (process pool entry point).
+    Stylesheets are parsed once per process and reused by later renders.
+
+    The PDF is written next to path and moved into place, so readers never
+    see a partial file.
+
+    Returns:
+        Size of the written file in bytes
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        render_pdf(html, stylesheets=stylesheets, target=tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(path)
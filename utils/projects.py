@@ -0,0 +1,71 @@
+"""
+Service Consultation Projects
+Helpers around Project rows created by the service offerings: their stored
+content and the service/offering encoded in project.module as
+"<service slug>_<offering slug>".
+
+project_services resolves a whole list of projects with two queries (services,
+then offerings) instead of two per project.
+"""
+import json
+
+from models import Service, ServiceOffering
+
+
+def split_module(module):
+    """(service slug, offering slug) of a project module, or None"""
+    if module and '_' in module:
+        return tuple(module.split('_', 1))
+    return None
+
+
+def project_content(project):
+    """Stored {'input': {...}, 'output': markdown} of a service consultation project"""
+    try:
+        return json.loads(project.content) if project.content else {}
+    except (TypeError, ValueError):
+        return {'input': {}, 'output': ''}
+
+
+def project_service(session, project):
+    """(service, offering) of a project (None if unknown)"""
+    service = offering = None
+    slugs = split_module(project.module)
+    if slugs:
+        service = session.query(Service).filter_by(slug=slugs[0]).first()
+        if service:
+            offering = session.query(ServiceOffering).filter_by(service_id=service.id, slug=slugs[1]).first()
+    return service, offering
+
+
+def project_services(session, projects, require_offering=True):
+    """
+    Service and offering of each project whose offering exists (or, with
+    require_offering=False, whose service exists; offering may be None).
+
+    Returns:
+        {project.id: {'service': Service, 'offering': ServiceOffering}}
+    """
+    slugs = {project.id: split_module(project.module) for project in projects}
+    service_slugs = {pair[0] for pair in slugs.values() if pair}
+    if not service_slugs:
+        return {}
+
+    services = {service.slug: service
+                for service in session.query(Service).filter(Service.slug.in_(service_slugs))}
+    offerings = {}
+    if services:
+        offering_slugs = {pair[1] for pair in slugs.values() if pair and pair[0] in services}
+        for offering in session.query(ServiceOffering).filter(
+            ServiceOffering.service_id.in_([service.id for service in services.values()]),
+            ServiceOffering.slug.in_(offering_slugs)
+        ):
+            offerings.setdefault((offering.service_id, offering.slug), offering)
+
+    result = {}
+    for project_id, pair in slugs.items():
+        service = services.get(pair[0]) if pair else None
+        offering = offerings.get((service.id, pair[1])) if service else None
+        if offering or (service and not require_offering):
+            result[project_id] = {'service': service, 'offering': offering}
+    return result
@@ -0,0 +1,220 @@
+"""
+Query Budget
+Counts and times the SQL statements issued while a request is handled, holds
+list views to a maximum, and keeps per-route statistics, so a relationship
+loaded per row (N+1) or a slow statement shows up as soon as it is introduced.
+
+- Counting and timing: before/after_cursor_execute listeners on every engine
+  add each statement to the request's count and DB time (flask.g).
+  Statements outside a request are not counted.
+- Slow statements: a statement taking SLOW_QUERY_MS (default 200) or more is
+  logged as one JSON line ("slow_query": route, duration, statement) and kept
+  with the route's statistics.
+- Route statistics: statements and DB time per endpoint since the process
+  started (each worker keeps its own), shown on /admin/logs/queries.
+- Debug headers: with DEBUG (or QUERY_STATS_HEADERS=1) every response carries
+  X-Query-Count, X-Query-Time and a Server-Timing "db" entry.
+- Budgets: @query_budget(n) on a view compares the statements the view issued
+  (template rendering included, login/role lookups excluded) with n. Over
+  budget, the app logs a warning; with TESTING or QUERY_BUDGET_STRICT=1 the
+  request fails with an AssertionError instead.
+- count_queries() counts the statements of a block of code (scripts, shells).
+
+Usage:
+    @consultation_bp.route('/api/sessions')
+    @login_required
+    @query_budget(4)
+    def get_sessions_api():
+        ...
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from flask import g, has_request_context, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils import fast_json
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text kept in the slow query log and the admin page
+STATEMENT_PREVIEW_LENGTH = 500
+
+_local = threading.local()
+_listening = False
+
+
+class QueryStats:
+    """Statement counts and DB time per endpoint, plus the latest slow statements"""
+
+    def __init__(self, slow_limit=50):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._slow = deque(maxlen=slow_limit)
+        self.started_at = datetime.utcnow()
+
+    def record_request(self, endpoint, statements, db_ms):
+        with self._lock:
+            route = self._routes.get(endpoint)
+            if route is None:
+                route = self._routes[endpoint] = {
+                    'endpoint': endpoint, 'requests': 0, 'statements': 0, 'max_statements': 0,
+                    'db_ms': 0.0, 'max_db_ms': 0.0, 'slow_statements': 0,
+                }
+            route['requests'] += 1
+            route['statements'] += statements
+            route['max_statements'] = max(route['max_statements'], statements)
+            route['db_ms'] += db_ms
+            route['max_db_ms'] = max(route['max_db_ms'], db_ms)
+
+    def record_slow(self, entry):
+        with self._lock:
+            self._slow.appendleft(entry)
+            route = self._routes.get(entry['endpoint'])
+            if route is not None:
+                route['slow_statements'] += 1
+
+    def routes(self):
+        """Per-endpoint totals and averages, most total DB time first"""
+        with self._lock:
+            rows = [dict(route) for route in self._routes.values()]
+        for row in rows:
+            row['avg_statements'] = row['statements'] / row['requests']
+            row['avg_db_ms'] = row['db_ms'] / row['requests']
+        return sorted(rows, key=lambda row: row['db_ms'], reverse=True)
+
+    def slow_statements(self):
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._slow.clear()
+            self.started_at = datetime.utcnow()
+
+
+query_stats = QueryStats()
+
+
+def _log(event_name, **fields):
+    logger.warning(fast_json.dumps({'event': event_name, **fields}))
+
+
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    counters = getattr(_local, 'counters', None)
+    if counters:
+        for counter in counters:
+            counter.append(statement)
+
+
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    duration_ms = (time.perf_counter() - started.pop()) * 1000
+    if not has_request_context():
+        return
+    g.query_time_ms = g.get('query_time_ms', 0.0) + duration_ms
+
+    if duration_ms >= current_app.config['SLOW_QUERY_MS']:
+        entry = {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'duration_ms': round(duration_ms, 1),
+            'statement': ' '.join(statement.split())[:STATEMENT_PREVIEW_LENGTH],
+            'at': datetime.utcnow().isoformat(timespec='seconds'),
+        }
+        query_stats.record_slow(entry)
+        _log('slow_query', **entry)
+
+
+def request_query_count():
+    """Statements issued so far by the current request"""
+    return g.get('query_count', 0)
+
+
+def request_query_time():
+    """Milliseconds spent so far in SQL statements by the current request"""
+    return g.get('query_time_ms', 0.0)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the statements executed by this thread inside the block.
+
+    Usage:
+        with count_queries() as statements:
+            build_dashboard()
+        print(len(statements))
+    """
+    statements = []
+    counters = getattr(_local, 'counters', None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(statements)
+    try:
+        yield statements
+    finally:
+        counters.remove(statements)
+
+
+def query_budget(limit):
+    """Hold a view to at most `limit` SQL statements (see the module docstring)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            start = request_query_count()
+            response = view(*args, **kwargs)
+            used = request_query_count() - start
+            if used > limit:
+                _log('query_budget_exceeded', endpoint=request.endpoint, path=request.path,
+                     statements=used, budget=limit)
+                # Raised after the view returns: login_required retries views that raise
+                g.query_budget_exceeded = f"{request.endpoint} issued {used} SQL statements (budget {limit})"
+            return response
+        return wrapper
+    return decorator
+
+
+def init_query_budget(app):
+    """Start counting and timing statements, record route statistics and enforce budgets"""
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_statement)
+        event.listen(Engine, 'after_cursor_execute', _after_statement)
+        _listening = True
+
+    strict = app.testing or os.getenv('QUERY_BUDGET_STRICT') == '1'
+    app.config.setdefault('QUERY_BUDGET_STRICT', strict)
+    app.config.setdefault('SLOW_QUERY_MS', float(os.getenv('SLOW_QUERY_MS', '200')))
+    app.config.setdefault('QUERY_STATS_HEADERS', os.getenv('QUERY_STATS_HEADERS') == '1')
+
+    @app.after_request
+    def record_query_stats(response):
+        count = request_query_count()
+        db_ms = request_query_time()
+        if request.endpoint and request.endpoint != 'static':
+            query_stats.record_request(request.endpoint, count, db_ms)
+
+        if app.debug or app.config['QUERY_STATS_HEADERS']:
+            response.headers['X-Query-Count'] = str(count)
+            response.headers['X-Query-Time'] = f'{db_ms:.1f}ms'
+            response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{count} SQL statements"')
+
+        message = g.get('query_budget_exceeded')
+        if message and app.config['QUERY_BUDGET_STRICT']:
+            raise AssertionError(message)
+        return response
@@ -0,0 +1,157 @@
+"""
+Report Rendering
+Builds the HTML of PDF reports from the Jinja templates in templates/reports.
+
+- Templates: a report is a page template (<name>.html) and a stylesheet
+  template (<name>.css). Flask compiles each template once and keeps it in the
+  Jinja cache, so building a report only assembles precomputed pieces.
+- CSS: a stylesheet depends only on a few variables (language, accent color),
+  so report_css renders it once per combination. It reaches WeasyPrint as a
+  separate stylesheet, which each render process parses once and reuses.
+- Fragments: formatting message text (markdown, tables, BeautifulSoup) is the
+  expensive part of a report. cached_fragments stores the formatted HTML in
+  report_fragments per owner (chat session, project) and position, keyed by a
+  hash of the source. Exporting a session again only formats new or edited
+  messages. Bump REPORT_FRAGMENT_VERSION when a formatter's output changes.
+
+Usage:
+    fragments = cached_fragments(db.session, 'chat_session', chat.id, texts, format_text)
+    html, stylesheets = render_report('consultation_session', {'lang': lang}, fragments=fragments, ...)
+"""
+import hashlib
+from functools import lru_cache
+
+from flask import render_template
+from markupsafe import escape, Markup
+from sqlalchemy.exc import IntegrityError
+
+from models import ReportFragment
+from utils.markdown_formatter import format_consultation_output
+from utils.projects import project_content, project_service
+
+REPORT_FRAGMENT_VERSION = '1'
+
+
+# ==================== templates ====================
+
+@lru_cache(maxsize=64)
+def _report_css(name, items):
+    return render_template(f'reports/{name}.css', **dict(items))
+
+
+def report_css(name, **context):
+    """Stylesheet of a report, rendered once per distinct context"""
+    return _report_css(name, tuple(sorted(context.items())))
+
+
+def render_report(name, css_context=None, **context):
+    """
+    Render a report page template.
+
+    Args:
+        name: template base name in templates/reports
+        css_context: variables of the report's stylesheet (e.g. {'lang': 'ar'})
+        **context: variables of the page template
+
+    Returns:
+        (html, stylesheets) - as accepted by render_pdf and pdf_response
+    """
+    html = render_template(f'reports/{name}.html', **context)
+    return html, (report_css(name, **(css_context or {})),)
+
+
+# ==================== fragments ====================
+
+def text_to_html(text):
+    """Plain text as HTML: escaped, line breaks kept"""
+    return str(escape(text or '')).replace('\n', '<br>')
+
+
+def _source_hash(source):
+    return hashlib.sha1(f'{REPORT_FRAGMENT_VERSION}|{source!r}'.encode('utf-8')).hexdigest()
+
+
+def cached_fragments(session, owner_type, owner_id, sources, formatter, variant=''):
+    """
+    Formatted HTML of each source, reusing the fragments stored for the owner.
+
+    Args:
+        owner_type: 'chat_session', 'project', ...
+        owner_id: id of the owner row
+        sources: list of hashable items (texts or tuples), in report order
+        formatter: callable(source) -> HTML string
+        variant: distinguishes formattings of the same owner (e.g. language)
+
+    Returns:
+        List of Markup, one per source
+    """
+    stored = {
+        fragment.position: fragment
+        for fragment in session.query(ReportFragment).filter_by(
+            owner_type=owner_type, owner_id=owner_id, variant=variant
+        )
+    }
+
+    fragments = []
+    changed = False
+    for position, source in enumerate(sources):
+        source_hash = _source_hash(source)
+        fragment = stored.get(position)
+        if fragment is not None and fragment.source_hash == source_hash:
+            fragments.append(Markup(fragment.html))
+            continue
+
+        html = formatter(source)
+        fragments.append(Markup(html))
+        if fragment is None:
+            session.add(ReportFragment(owner_type=owner_type, owner_id=owner_id, variant=variant,
+                                       position=position, source_hash=source_hash, html=html))
+        else:
+            fragment.source_hash = source_hash
+            fragment.html = html
+        changed = True
+
+    for position, fragment in stored.items():
+        if position >= len(sources):
+            session.delete(fragment)
+            changed = True
+
+    if changed:
+        try:
+            session.commit()
+        except IntegrityError:
+            # A concurrent export stored the same slot first; the fragments are only a cache
+            session.rollback()
+    return fragments
+
+
+def delete_fragments(session, owner_type, owner_id):
+    """Drop the stored fragments of a deleted owner (caller commits)"""
+    session.query(ReportFragment).filter_by(owner_type=owner_type, owner_id=owner_id).delete(
+        synchronize_session=False
+    )
+
+
+# ==================== reports ====================
+
+def project_report(session, project, lang):
+    """
+    Report of a service consultation project (services and dashboard exports).
+
+    Returns:
+        (html, stylesheets)
+    """
+    project_data = project_content(project)
+    service, offering = project_service(session, project)
+
+    # The formatted output (markdown to cards, grids and tables) is kept per language
+    formatted_output = cached_fragments(
+        session, 'project', project.id, [project_data.get('output', '')],
+        lambda text: format_consultation_output(text, lang), variant=lang
+    )[0]
+
+    return render_report(
+        'project', {'lang': lang, 'color': service.color if service else None},
+        project=project, service=service, offering=offering,
+        input_data=project_data.get('input', {}), formatted_output=formatted_output, lang=lang
+    )
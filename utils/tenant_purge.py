@@ -0,0 +1,231 @@
+"""
+Tenant Data Purge
+Deletes an organization's data in bounded batches on the background pool
+instead of one long transaction that locks every table it touches.
+
+- Scope: 'hr' clears the HR module (hr.clear_all_data); 'organization' removes
+  every row that belongs to the organization and then the organization itself
+  (admin organizations.delete).
+- Order: tables are processed children first (reverse of the metadata's FK
+  dependency order), so no batch ever violates a foreign key.
+- Batches: each batch deletes at most PURGE_BATCH_SIZE rows by primary key and
+  commits on its own together with the job's progress. A purge is idempotent,
+  so one interrupted by a restart is simply run again.
+- Files: import uploads in object storage and their staging directories are
+  removed with the import rows that reference them.
+"""
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, delete, update, func, or_, and_
+
+from models import (db, PurgeJob, Organization, User, HRDataImport, HRMonthlySummary,
+                    HRAnalysisReport, HR_DATA_MODELS)
+from utils import background
+from utils.import_staging import delete_stages
+from utils.object_storage import ObjectStorageService
+from utils.hr_analytics import invalidate_hr_analytics
+
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '2000'))
+PURGE_STALE_SECONDS = int(os.getenv('PURGE_STALE_SECONDS', '300'))
+SCOPES = ('hr', 'organization')
+ACTIVE_STATUSES = ('queued', 'running')
+
+HR_TABLES = frozenset(model.__tablename__ for model in (*HR_DATA_MODELS, HRMonthlySummary, HRAnalysisReport))
+# Purged before anything else: a running import loses its lease (its heartbeat
+# no longer finds the row) before the rows it writes are deleted
+FIRST_TABLES = ('hr_data_imports',)
+# Never touched by an organization purge; deletion is refused while users remain
+KEPT_TABLES = ('users', PurgeJob.__tablename__)
+
+
+# ==================== plan ====================
+
+def purge_plan(scope):
+    """
+    Tables of a purge in FK-safe order.
+
+    Returns:
+        List of (table, mode) with mode 'delete' (rows removed) or 'detach'
+        (optional organization_id set to NULL, e.g. AI logs kept for billing)
+    """
+    plan = []
+    for table in reversed(db.metadata.sorted_tables):
+        column = table.c.get('organization_id')
+        if column is None or table.name in KEPT_TABLES:
+            continue
+        if table.name in HR_TABLES or (scope == 'organization' and not column.nullable):
+            plan.append((table, 'delete'))
+        elif scope == 'organization' and column.foreign_keys:
+            plan.append((table, 'detach'))
+    plan.sort(key=lambda item: item[0].name not in FIRST_TABLES)
+    return plan
+
+
+def _primary_key(table):
+    return list(table.primary_key.columns)[0]
+
+
+def _count(session, table, org_id):
+    return session.execute(
+        select(func.count()).select_from(table).where(table.c.organization_id == org_id)
+    ).scalar() or 0
+
+
+def _remove_import_files(session, import_ids):
+    """Delete the uploads and staged rows of the given imports"""
+    paths = session.execute(
+        select(HRDataImport.file_storage_path)
+        .where(HRDataImport.id.in_(import_ids), HRDataImport.file_storage_path.isnot(None))
+    ).scalars().all()
+    if paths:
+        storage = ObjectStorageService()
+        for path in paths:
+            storage.delete_file(path)
+    delete_stages(import_ids)
+
+
+# Files that live outside the database, removed with the rows pointing at them
+FILE_CLEANERS = {
+    'hr_data_imports': _remove_import_files,
+}
+
+
+def _purge_batch(session, table, mode, org_id, batch_size=PURGE_BATCH_SIZE):
+    """Delete (or detach) up to batch_size rows of one table; returns the row count"""
+    pk = _primary_key(table)
+    ids = session.execute(
+        select(pk).where(table.c.organization_id == org_id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    if mode == 'detach':
+        session.execute(update(table).where(pk.in_(ids)).values(organization_id=None))
+        return len(ids)
+
+    cleaner = FILE_CLEANERS.get(table.name)
+    if cleaner:
+        cleaner(session, ids)
+    session.execute(delete(table).where(pk.in_(ids)))
+    return len(ids)
+
+
+def organization_has_users(session, org_id):
+    return session.execute(
+        select(func.count()).select_from(User).where(User.organization_id == org_id)
+    ).scalar() > 0
+
+
+# ==================== jobs ====================
+
+def _stalled():
+    """Running purges whose worker stopped renewing the heartbeat"""
+    cutoff = datetime.utcnow() - timedelta(seconds=PURGE_STALE_SECONDS)
+    return and_(PurgeJob.status == 'running',
+                or_(PurgeJob.heartbeat_at.is_(None), PurgeJob.heartbeat_at < cutoff))
+
+
+def claim_purge(session, job_id):
+    """Take a queued (or stalled) purge; returns True if this worker got it"""
+    now = datetime.utcnow()
+    result = session.execute(
+        update(PurgeJob)
+        .where(PurgeJob.id == job_id, or_(PurgeJob.status == 'queued', _stalled()))
+        .values(status='running', started_at=now, heartbeat_at=now, error_message=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _progress(session, job_id, **values):
+    session.execute(
+        update(PurgeJob).where(PurgeJob.id == job_id)
+        .values(heartbeat_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def run_purge_job(job_id):
+    """Background task: run (or re-run) one purge"""
+    session = current_app.extensions['sqlalchemy'].session
+    if not claim_purge(session, job_id):
+        return
+
+    job = session.get(PurgeJob, job_id)
+    session.refresh(job)
+    org_id, scope = job.organization_id, job.scope
+
+    try:
+        if scope == 'organization' and organization_has_users(session, org_id):
+            raise ValueError('Organization still has users')
+
+        plan = purge_plan(scope)
+        _progress(session, job_id, total_rows=sum(_count(session, table, org_id) for table, _ in plan),
+                  deleted_rows=0)
+        session.commit()
+
+        deleted = 0
+        for table, mode in plan:
+            while True:
+                count = _purge_batch(session, table, mode, org_id)
+                if not count:
+                    break
+                deleted += count
+                # Progress is written in the batch's own transaction
+                _progress(session, job_id, deleted_rows=deleted, current_table=table.name)
+                session.commit()
+
+        if scope == 'organization':
+            session.execute(delete(Organization.__table__).where(Organization.__table__.c.id == org_id))
+        _progress(session, job_id, status='completed', current_table=None, completed_at=datetime.utcnow())
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        _progress(session, job_id, status='failed', error_message=str(e), completed_at=datetime.utcnow())
+        session.commit()
+        print(f"[tenant-purge] Purge {job_id} of organization {org_id} failed: {e}")
+    finally:
+        # Whatever was deleted, the cached aggregates are stale now
+        invalidate_hr_analytics(org_id)
+
+
+def active_purge(session, org_id):
+    """The organization's queued or running purge, if any"""
+    return session.query(PurgeJob).filter(
+        PurgeJob.organization_id == org_id,
+        PurgeJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(PurgeJob.id.desc()).first()
+
+
+def start_purge(session, org_id, scope, user_id=None):
+    """Create a PurgeJob and queue it on the background pool; returns the job"""
+    if scope not in SCOPES:
+        raise ValueError(f'Unknown purge scope: {scope}')
+    job = PurgeJob(organization_id=org_id, scope=scope, requested_by=user_id, status='queued')
+    session.add(job)
+    session.commit()
+    background.submit(run_purge_job, job.id)
+    return job
+
+
+def requeue_stale_purges(session, job_id=None, include_queued=False):
+    """
+    Resubmit purges whose worker died mid-run. With include_queued (used at
+    startup) purges queued in a pool that no longer exists are resubmitted too.
+
+    Returns:
+        List of requeued job ids
+    """
+    stale = _stalled()
+    if include_queued:
+        stale = stale | (PurgeJob.status == 'queued')
+    query = session.query(PurgeJob.id).filter(stale)
+    if job_id is not None:
+        query = query.filter(PurgeJob.id == job_id)
+    job_ids = [i for (i,) in query.all()]
+    for stale_id in job_ids:
+        background.submit(run_purge_job, stale_id)
+    return job_ids